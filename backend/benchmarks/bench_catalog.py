@@ -0,0 +1,142 @@
+"""Memory and filter latency of the columnar catalog against lists of dicts.
+
+A synthetic multi-outlet menu (by default 100k items over 300 outlets, with
+names and categories shared between outlets as chains do) is held both as
+``{outlet: [item dicts]}``, the shape ``load_menu_items`` produces, and as a
+compiled ``Catalog``. Memory is measured with tracemalloc while building
+each; the catalog is also opened from a memory-mapped file, whose pages do
+not count as Python allocations. Filters are timed over the whole catalog
+and for one outlet.
+
+Run from the backend directory:
+
+    python -m benchmarks.bench_catalog --items 100000 --outlets 300
+"""
+import argparse
+import gc
+import json
+import os
+import random
+import tempfile
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List
+
+from benchmarks.common import run_metadata
+from utils.catalog import Catalog, compile_catalog
+
+CATEGORIES = ["pizza", "sides", "drinks", "desserts", "pasta", "salads", "burgers", "wraps"]
+
+
+def synthetic_outlets(n_items: int, n_outlets: int, seed: int = 7) -> Dict[str, List[Dict[str, Any]]]:
+    rng = random.Random(seed)
+    dishes = [
+        {"name": f"Dish {i}", "description": f"House special number {i} with seasonal toppings",
+         "category": CATEGORIES[i % len(CATEGORIES)], "image": f"/images/dish-{i}.jpg", "isVeg": i % 3 != 0}
+        for i in range(2000)
+    ]
+    outlets: Dict[str, List[Dict[str, Any]]] = {f"outlet-{o}": [] for o in range(n_outlets)}
+    names = list(outlets)
+    for i in range(n_items):
+        dish = rng.choice(dishes)
+        # Fresh dicts as json.load would build them; only the strings are shared
+        outlets[names[i % n_outlets]].append({
+            "id": f"item-{i}", "name": dish["name"], "description": dish["description"],
+            "category": dish["category"], "image": dish["image"], "isVeg": dish["isVeg"],
+            "price": float(rng.randrange(49, 1500)),
+        })
+    return outlets
+
+
+def measure_memory(build: Callable[[], Any]):
+    gc.collect()
+    tracemalloc.start()
+    result = build()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, size
+
+
+def dict_search(outlets, outlet=None, min_price=None, max_price=None, veg=None, category=None):
+    return [
+        item
+        for name, items in outlets.items() if outlet is None or name == outlet
+        for item in items
+        if (min_price is None or item["price"] >= min_price)
+        and (max_price is None or item["price"] <= max_price)
+        and (veg is None or item.get("isVeg") is veg)
+        and (category is None or item.get("category") == category)
+    ]
+
+
+def time_ms(fn: Callable[[], Any], repeat: int) -> float:
+    fn()
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def run(n_items: int, n_outlets: int, repeat: int) -> Dict[str, Any]:
+    source = json.dumps(synthetic_outlets(n_items, n_outlets))
+    dicts, dict_bytes = measure_memory(lambda: json.loads(source))
+    image = compile_catalog(dicts)
+    catalog, catalog_bytes = measure_memory(lambda: Catalog(image))
+    catalog_bytes += len(image)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "catalog.bin")
+        with open(path, "wb") as f:
+            f.write(image)
+        mapped, mapped_bytes = measure_memory(lambda: Catalog.open(path))
+
+        per_100k = 100_000 / n_items
+        filters = {
+            "price 200-400": {"min_price": 200, "max_price": 400},
+            "veg": {"veg": True},
+            "veg, price <= 300, pizza": {"veg": True, "max_price": 300, "category": "pizza"},
+            "one outlet, price 200-400": {"outlet": "outlet-0", "min_price": 200, "max_price": 400},
+        }
+        latency = {}
+        for label, kwargs in filters.items():
+            expected = len(dict_search(dicts, **kwargs))
+            assert len(catalog.search(**kwargs)) == expected == len(mapped.search(**kwargs)), label
+            dict_ms = time_ms(lambda: dict_search(dicts, **kwargs), repeat)
+            catalog_ms = time_ms(lambda: catalog.search(**kwargs), repeat)
+            latency[label] = {
+                "matches": expected,
+                "dicts_ms": round(dict_ms, 3),
+                "catalog_ms": round(catalog_ms, 3),
+                "speedup": round(dict_ms / catalog_ms, 1) if catalog_ms else None,
+            }
+        del mapped
+
+    return {
+        "items": n_items,
+        "outlets": n_outlets,
+        "memory_mb_per_100k": {
+            "dicts": round(dict_bytes * per_100k / 2**20, 2),
+            "catalog": round(catalog_bytes * per_100k / 2**20, 2),
+            "catalog_mmap_heap": round(mapped_bytes * per_100k / 2**20, 2),
+            "image_file": round(len(image) * per_100k / 2**20, 2),
+        },
+        "filter_latency": latency,
+    }
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--items", type=int, default=100_000)
+    parser.add_argument("--outlets", type=int, default=300)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    print(json.dumps({
+        "benchmark": "catalog",
+        "metadata": run_metadata(),
+        "results": run(args.items, args.outlets, args.repeat),
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,109 @@
+"""Scaling of spatial property queries from 10k to 1M listings.
+
+For each size, the index is built over the first N mock listings (scattered
+around the neighbourhood centres) and each query kind is run from random
+points near those centres:
+
+- radius: listings within 1 or 5 km, first page by price;
+- radius+filters: the same with listing type and bedrooms;
+- bbox: a box about 3 km across;
+- nearest: the 5 nearest listings, with and without a property type.
+
+A brute-force scan of the listing dicts for the 5 km radius is timed
+alongside, as the baseline without the index.
+
+Run from the backend directory:
+
+    python -m benchmarks.bench_geo --sizes 10000 100000 1000000 --queries 300
+"""
+import argparse
+import json
+import random
+import time
+from typing import Any, Callable, Dict, List
+
+from benchmarks.common import percentile, run_metadata
+from models.property import LOCATION_COORDINATES, PROPERTY_TYPES, mock_properties
+from utils.geo_index import haversine_km
+from utils.property_index import PropertyIndex
+
+CENTRES = list(LOCATION_COORDINATES.values())
+
+
+def random_point(rng: random.Random):
+    lat, lng = rng.choice(CENTRES)
+    return lat + rng.uniform(-0.01, 0.01), lng + rng.uniform(-0.01, 0.01)
+
+
+def timed(fn: Callable[[], Any], n: int, rng: random.Random) -> Dict[str, float]:
+    latencies: List[float] = []
+    for _ in range(n):
+        call = fn(rng)
+        start = time.perf_counter()
+        call()
+        latencies.append(time.perf_counter() - start)
+    latencies.sort()
+    return {
+        "p50_ms": round(percentile(latencies, 50) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 3),
+    }
+
+
+def run(sizes: List[int], n_queries: int, seed: int) -> List[Dict[str, Any]]:
+    listings = mock_properties(max(sizes))
+    results = []
+    for size in sizes:
+        subset = listings[:size]
+        start = time.perf_counter()
+        index = PropertyIndex(subset)
+        build_seconds = time.perf_counter() - start
+
+        def radius(km):
+            return lambda rng: (lambda point=random_point(rng): index.search(near=(*point, km), limit=20))
+
+        def brute_force(rng):
+            lat, lng = random_point(rng)
+            return lambda: sorted(
+                (item for item in subset if haversine_km(lat, lng, item["lat"], item["lng"]) <= 5),
+                key=lambda item: (item["price"], item["id"]),
+            )[:20]
+
+        queries = {
+            "radius_1km": radius(1),
+            "radius_5km": radius(5),
+            "radius_5km+filters": lambda rng: (lambda point=random_point(rng): index.search(
+                near=(*point, 5), listing_types=["For Sale"], beds="3+", limit=20)),
+            "bbox_3km": lambda rng: (lambda point=random_point(rng): index.search(
+                bbox=(point[0] - 0.0135, point[1] - 0.015, point[0] + 0.0135, point[1] + 0.015), limit=20)),
+            "nearest_5": lambda rng: (lambda point=random_point(rng): index.nearest(*point, 5)),
+            "nearest_5+type": lambda rng: (lambda point=random_point(rng): index.nearest(
+                *point, 5, property_types=[rng.choice(PROPERTY_TYPES)])),
+        }
+        rng = random.Random(seed)
+        timings = {name: timed(query, n_queries, rng) for name, query in queries.items()}
+        timings["radius_5km_scan_baseline"] = timed(brute_force, max(3, n_queries // 30), rng)
+        results.append({
+            "listings": size,
+            "grid_cells": len(index.geo.cells),
+            "index_build_s": round(build_seconds, 2),
+            "queries": timings,
+        })
+    return results
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--queries", type=int, default=300)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    print(json.dumps({
+        "benchmark": "geo",
+        "metadata": run_metadata(),
+        "results": run(args.sizes, args.queries, args.seed),
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,168 @@
+"""Before/after benchmark for the middleware stack.
+
+Compares the previous stack (Starlette CORSMiddleware, a no-op
+TrustedHostMiddleware and an ``@app.middleware("http")`` CORS hook) with the
+pure ASGI stack used by ``main.app``. Requests are driven straight through the
+ASGI interface, so the numbers isolate framework and middleware overhead from
+socket and HTTP parsing cost.
+
+Run from the backend directory:
+
+    python -m benchmarks.bench_middleware --requests 5000 --concurrency 32
+"""
+import argparse
+import asyncio
+import json
+import logging
+import time
+from typing import Dict, List
+
+from fastapi import FastAPI, Request
+from fastapi.middleware.cors import CORSMiddleware as StarletteCORSMiddleware
+from fastapi.middleware.trustedhost import TrustedHostMiddleware
+
+from benchmarks.common import percentile
+
+ORIGIN = b"http://localhost:5173"
+PATHS = ["/", "/api/menu/"]
+
+
+def build_legacy_app() -> FastAPI:
+    """Rebuild the middleware stack main.py used before the ASGI rewrite"""
+    import main
+    from routes import menu
+
+    legacy = FastAPI(title="Global Estates API (legacy stack)")
+    legacy.add_middleware(
+        StarletteCORSMiddleware,
+        allow_origins=["http://localhost:5173"],
+        allow_origin_regex=r"https?://(localhost|127\.0\.0\.1)(:[0-9]+)?",
+        allow_credentials=True,
+        allow_methods=["*"],
+        allow_headers=["*", "cache-control", "pragma", "expires", "content-type", "authorization"],
+    )
+    legacy.add_middleware(TrustedHostMiddleware, allowed_hosts=["*"])
+
+    @legacy.middleware("http")
+    async def add_cors_headers(request: Request, call_next):
+        response = await call_next(request)
+        origin = request.headers.get("origin")
+        if origin and (origin == "http://localhost:5173" or origin.startswith("http://localhost:") or origin.startswith("http://127.0.0.1:")):
+            response.headers["Access-Control-Allow-Origin"] = origin
+            response.headers["Access-Control-Allow-Credentials"] = "true"
+            response.headers["Access-Control-Allow-Methods"] = "*"
+            response.headers["Access-Control-Allow-Headers"] = "Content-Type, Authorization, Cache-Control, Pragma, Expires, X-Requested-With"
+            response.headers["Access-Control-Max-Age"] = "86400"
+        return response
+
+    legacy.include_router(menu.router, prefix="/api/menu", tags=["menu"])
+    legacy.add_api_route("/", main.root, methods=["GET"])
+    return legacy
+
+
+def make_scope(path: str) -> dict:
+    return {
+        "type": "http",
+        "asgi": {"version": "3.0", "spec_version": "2.3"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode("ascii"),
+        "root_path": "",
+        "query_string": b"",
+        "headers": [
+            (b"host", b"localhost:8000"),
+            (b"origin", ORIGIN),
+            (b"accept", b"application/json"),
+        ],
+        "client": ("127.0.0.1", 50000),
+        "server": ("127.0.0.1", 8000),
+    }
+
+
+async def call_asgi(app, path: str) -> int:
+    status = 0
+    request_sent = False
+    response_done = asyncio.Event()
+
+    async def receive():
+        nonlocal request_sent
+        if not request_sent:
+            request_sent = True
+            return {"type": "http.request", "body": b"", "more_body": False}
+        # Like a real server, only report the disconnect once the response is out
+        await response_done.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+        elif message["type"] == "http.response.body" and not message.get("more_body", False):
+            response_done.set()
+
+    await app(make_scope(path), receive, send)
+    return status
+
+
+async def run_path(app, path: str, total: int, concurrency: int) -> Dict[str, float]:
+    latencies: List[float] = []
+    remaining = total
+
+    async def worker():
+        nonlocal remaining
+        while remaining > 0:
+            remaining -= 1
+            start = time.perf_counter()
+            status = await call_asgi(app, path)
+            latencies.append(time.perf_counter() - start)
+            if status != 200:
+                raise RuntimeError(f"{path} returned {status}")
+
+    # Warm up route resolution, the middleware stack and any caches
+    for _ in range(50):
+        await call_asgi(app, path)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "requests": total,
+        "rps": round(total / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 3),
+    }
+
+
+async def run(total: int, concurrency: int) -> dict:
+    import main
+
+    apps = {"before": build_legacy_app(), "after": main.app}
+    results = {}
+    for path in PATHS:
+        results[path] = {}
+        for label, app in apps.items():
+            results[path][label] = await run_path(app, path, total, concurrency)
+    return results
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    args = parser.parse_args()
+
+    import main  # noqa: F401  (configures logging on import)
+
+    # Keep per-request log lines out of the measurement
+    logging.getLogger("global_estates").setLevel(logging.WARNING)
+
+    results = asyncio.run(run(args.requests, args.concurrency))
+    print(json.dumps({"benchmark": "middleware", "concurrency": args.concurrency, "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,102 @@
+"""Latency of property search over a large synthetic listing set.
+
+Builds a ``PropertyIndex`` over ``--listings`` mock listings (the frontend's
+generator, so the attribute mix matches what users search) and runs a
+randomized mix of SearchFilters-style queries against it, following cursors
+for some of them. Only the index is measured, not HTTP or JSON.
+
+Run from the backend directory:
+
+    python -m benchmarks.bench_property_search --listings 1000000 --queries 2000
+"""
+import argparse
+import json
+import random
+import time
+from typing import Any, Dict, List
+
+from benchmarks.common import run_metadata, summarize
+from models.property import FEATURES, LISTING_TYPES, LOCATIONS, PROPERTY_TYPES, mock_properties
+from utils.property_index import PropertyIndex
+
+AMENITIES = [feature for feature in FEATURES if feature.startswith("Near ")]
+PLAIN_FEATURES = [feature for feature in FEATURES if not feature.startswith("Near ")]
+
+
+def random_query(rng: random.Random) -> Dict[str, Any]:
+    query: Dict[str, Any] = {"limit": rng.choice([9, 20, 50])}
+    listing_type = rng.choice(LISTING_TYPES + [None])
+    if listing_type:
+        query["listing_types"] = [listing_type]
+    if rng.random() < 0.7:
+        low = rng.choice([0, 3000, 500000, 1000000, 2000000])
+        query["min_price"] = low
+        query["max_price"] = low * 3 + rng.choice([10000, 1000000, 5000000])
+    if rng.random() < 0.5:
+        query["beds"] = rng.choice(["1", "2", "3", "4", "5+", "2+", "3+"])
+    if rng.random() < 0.3:
+        query["baths"] = rng.choice(["1", "2", "3", "4+"])
+    if rng.random() < 0.4:
+        query["property_types"] = rng.sample(PROPERTY_TYPES, rng.choice([1, 2]))
+    if rng.random() < 0.4:
+        query["features"] = rng.sample(PLAIN_FEATURES, rng.choice([1, 2, 3])) + rng.sample(AMENITIES, rng.choice([0, 1]))
+    if rng.random() < 0.3:
+        query["location"] = rng.choice(LOCATIONS).split(",")[rng.choice([0, 1])].strip()
+    if rng.random() < 0.2:
+        query["min_area"], query["max_area"] = rng.choice([(1000, 2500), (1250, 3333), (2000, 5000)])
+    query["descending"] = rng.random() < 0.3
+    return query
+
+
+def run(n_listings: int, n_queries: int, seed: int) -> Dict[str, Any]:
+    start = time.perf_counter()
+    listings = mock_properties(n_listings)
+    generate_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    index = PropertyIndex(listings)
+    build_seconds = time.perf_counter() - start
+
+    rng = random.Random(seed)
+    latencies: List[float] = []
+    matches: List[int] = []
+    started = time.perf_counter()
+    for _ in range(n_queries):
+        query = random_query(rng)
+        t0 = time.perf_counter()
+        page = index.search(**query)
+        latencies.append(time.perf_counter() - t0)
+        matches.append(page["total"])
+        # Users page through about a third of their searches
+        if page["nextCursor"] and rng.random() < 0.3:
+            t0 = time.perf_counter()
+            index.search(**query, cursor=page["nextCursor"])
+            latencies.append(time.perf_counter() - t0)
+    elapsed = time.perf_counter() - started
+
+    matches.sort()
+    return {
+        "listings": n_listings,
+        "generate_s": round(generate_seconds, 2),
+        "index_build_s": round(build_seconds, 2),
+        "median_matches": matches[len(matches) // 2],
+        "latency": summarize(latencies, elapsed),
+    }
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--listings", type=int, default=1_000_000)
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    print(json.dumps({
+        "benchmark": "property_search",
+        "metadata": run_metadata(),
+        "results": run(args.listings, args.queries, args.seed),
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main_cli()
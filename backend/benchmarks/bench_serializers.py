@@ -0,0 +1,171 @@
+"""Before/after benchmark for response serialization.
+
+For each endpoint, "before" is what the handler used to return plus
+FastAPI's own response pipeline (validation against ``response_model``,
+``jsonable_encoder`` and ``JSONResponse``); "after" is the precompiled
+serializer rendered by ``FastJSONResponse``. Only serialization is measured:
+no database, routing or middleware.
+
+Run from the backend directory:
+
+    python -m benchmarks.bench_serializers --iterations 20000
+"""
+import argparse
+import asyncio
+import inspect
+import json
+import sys
+import time
+from contextlib import redirect_stdout
+from datetime import datetime
+from typing import Callable, Dict
+
+from bson import ObjectId
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+
+from benchmarks.common import run_metadata
+
+ADDRESS = {
+    "street": "221 Baker Street", "city": "Mumbai", "state": "Maharashtra",
+    "zipCode": "400001", "phone": "+91 98200 00000", "landmark": "Near the station",
+}
+USER_DOCUMENT = {
+    "_id": ObjectId(),
+    "email": "buyer@example.com",
+    "name": "Priya Buyer",
+    "hashed_password": "$2b$12$" + "x" * 53,
+    "created_at": datetime(2024, 5, 1, 12, 30, 15, 123456),
+    "is_active": True,
+    "address": ADDRESS,
+}
+ORDER = {
+    "items": [
+        {"id": f"vp{i}", "quantity": 1 + i % 3, "price": 299.0 + i * 50, "name": f"Pizza {i}"}
+        for i in range(6)
+    ],
+    "total": 4293.0,
+    "customer_name": "Priya Buyer",
+    "customer_phone": "+91 98200 00000",
+    "delivery_address": "221 Baker Street, Mumbai",
+    "payment_method": "card",
+}
+
+
+def response_field(app, path: str, method: str):
+    for route in app.routes:
+        if getattr(route, "path", None) == path and method in getattr(route, "methods", ()):
+            return route.response_field
+    raise LookupError(f"{method} {path}")
+
+
+async def time_per_call(fn: Callable, iterations: int) -> float:
+    """Microseconds per call of ``fn``, awaiting its result if it returns a coroutine"""
+    probe = fn()
+    is_async = inspect.isawaitable(probe)
+    if is_async:
+        await probe
+    for _ in range(200):
+        await fn() if is_async else fn()
+    start = time.perf_counter()
+    for _ in range(iterations):
+        await fn() if is_async else fn()
+    return (time.perf_counter() - start) / iterations * 1e6
+
+
+def build_cases(app) -> Dict[str, Dict[str, Callable]]:
+    from models.user import Address, User, serialize_address, serialize_user
+    from routes.order import Order, serialize_order
+    from utils.fast_json import FastJSONResponse, trusted_model
+
+    doc = USER_DOCUMENT
+    address_model = Address(**ADDRESS)
+    order_model = Order(**ORDER)
+    stored_order = {**serialize_order(order_model), "order_id": "ORD0001", "status": "pending",
+                    "created_at": datetime.now().isoformat()}
+
+    def old_user_dict(document):
+        return {
+            "id": str(document["_id"]), "email": document["email"], "name": document["name"],
+            "is_active": document.get("is_active", True),
+            "created_at": document.get("created_at", datetime.utcnow()), "address": document.get("address"),
+        }
+
+    async def validated(field, content):
+        rendered = await serialize_response(field=field, response_content=content, is_coroutine=True)
+        return JSONResponse(rendered).body
+
+    me = response_field(app, "/api/auth/me", "GET")
+    register = response_field(app, "/api/auth/register", "POST")
+    address_update = response_field(app, "/api/users/address", "POST")
+    address_get = response_field(app, "/api/users/address", "GET")
+
+    return {
+        "GET /api/auth/me": {
+            "before": lambda: validated(me, User(**old_user_dict(doc))),
+            "after": lambda: FastJSONResponse(serialize_user(doc)).body,
+        },
+        "POST /api/auth/register": {
+            "before": lambda: validated(register, {k: v for k, v in old_user_dict(doc).items() if k != "address"}),
+            "after": lambda: FastJSONResponse(serialize_user(doc)).body,
+        },
+        "POST /api/users/address": {
+            "before": lambda: validated(address_update, old_user_dict(doc)),
+            "after": lambda: FastJSONResponse(serialize_user(doc)).body,
+        },
+        "GET /api/users/address": {
+            "before": lambda: validated(address_get, doc["address"]),
+            "after": lambda: FastJSONResponse(serialize_address(doc["address"])).body,
+        },
+        "get_current_user (User model)": {
+            "before": lambda: User(id=str(doc["_id"]), email=doc["email"], name=doc["name"],
+                                   is_active=True, created_at=doc["created_at"], address=address_model),
+            "after": lambda: trusted_model(User, id=str(doc["_id"]), email=doc["email"], name=doc["name"],
+                                           is_active=True, created_at=doc["created_at"], address=address_model),
+        },
+        "POST /api/orders/": {
+            "before": lambda: JSONResponse(jsonable_encoder({**order_model.dict(), "order_id": "ORD0001"})).body,
+            "after": lambda: FastJSONResponse({**serialize_order(order_model), "order_id": "ORD0001"}).body,
+        },
+        "GET /api/orders/{order_id}": {
+            "before": lambda: JSONResponse(jsonable_encoder(stored_order)).body,
+            "after": lambda: FastJSONResponse(stored_order).body,
+        },
+    }
+
+
+async def run(iterations: int) -> Dict[str, Dict[str, float]]:
+    import main
+
+    results = {}
+    for endpoint, variants in build_cases(main.app).items():
+        before = await time_per_call(variants["before"], iterations)
+        after = await time_per_call(variants["after"], iterations)
+        results[endpoint] = {
+            "before_us": round(before, 2),
+            "after_us": round(after, 2),
+            "speedup": round(before / after, 1) if after else None,
+        }
+    return results
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=20000)
+    args = parser.parse_args()
+
+    with redirect_stdout(sys.stderr):
+        import main  # noqa: F401  (configures logging on import)
+
+    results = asyncio.run(run(args.iterations))
+    print(json.dumps({
+        "benchmark": "serializers",
+        "metadata": run_metadata(),
+        "iterations": args.iterations,
+        "results": results,
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,179 @@
+"""Local stand-in for Ultravox webhook deliveries.
+
+Builds correctly signed call-lifecycle events, either for tests or to measure
+how many events per second the webhook endpoint ingests while fanning them
+out to SSE subscribers. Events are driven straight through the ASGI
+interface of ``main.app`` unless ``--url`` points at a running server.
+
+Run from the backend directory:
+
+    python -m benchmarks.event_simulator --calls 2000 --subscribers 2
+    python -m benchmarks.event_simulator --url http://localhost:8000 --secret $ULTRAVOX_WEBHOOK_SECRET
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sys
+import time
+import uuid
+from contextlib import redirect_stdout
+from datetime import datetime, timezone
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from benchmarks.common import run_metadata, summarize
+from utils.call_events import sign_webhook
+
+WEBHOOK_PATH = "/api/voice-agent/webhooks/ultravox"
+LIFECYCLE = ("call.started", "call.joined", "call.ended")
+DEFAULT_SECRET = "simulator-secret"
+
+
+def build_event(event: str, call_id: str, **call_fields) -> Dict:
+    call = {"callId": call_id, "created": datetime.now(timezone.utc).isoformat()}
+    if event == "call.ended":
+        call.setdefault("endReason", "hangup")
+    call.update(call_fields)
+    return {"event": event, "call": call}
+
+
+def signed_request(secret: str, payload: Dict, timestamp: Optional[str] = None) -> Tuple[bytes, Dict[str, str]]:
+    """Body and headers for one delivery, signed the way Ultravox signs them"""
+    body = json.dumps(payload).encode("utf-8")
+    timestamp = timestamp or datetime.now(timezone.utc).isoformat()
+    return body, {
+        "content-type": "application/json",
+        "x-ultravox-webhook-timestamp": timestamp,
+        "x-ultravox-webhook-signature": sign_webhook(secret, body, timestamp),
+    }
+
+
+def call_lifecycle(call_id: Optional[str] = None) -> Iterator[Dict]:
+    call_id = call_id or uuid.uuid4().hex
+    for event in LIFECYCLE:
+        yield build_event(event, call_id)
+
+
+async def post_asgi(app, body: bytes, headers: Dict[str, str]) -> int:
+    status = 0
+    sent = False
+
+    async def receive():
+        nonlocal sent
+        if not sent:
+            sent = True
+            return {"type": "http.request", "body": body, "more_body": False}
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0", "spec_version": "2.3"},
+        "http_version": "1.1",
+        "method": "POST",
+        "scheme": "http",
+        "path": WEBHOOK_PATH,
+        "raw_path": WEBHOOK_PATH.encode("ascii"),
+        "root_path": "",
+        "query_string": b"",
+        "headers": [(b"host", b"localhost:8000")] + [
+            (name.encode("latin-1"), value.encode("latin-1")) for name, value in headers.items()
+        ],
+        "client": ("127.0.0.1", 50000),
+        "server": ("127.0.0.1", 8000),
+    }
+    await app(scope, receive, send)
+    return status
+
+
+async def run(args) -> Dict:
+    deliveries = [
+        signed_request(args.secret, event)
+        for _ in range(args.calls)
+        for event in call_lifecycle()
+    ]
+
+    subscriber_queues: List[asyncio.Queue] = []
+    if args.url:
+        import httpx
+
+        client = httpx.AsyncClient(base_url=args.url, timeout=10)
+
+        async def deliver(body, headers):
+            response = await client.post(WEBHOOK_PATH, content=body, headers=headers)
+            return response.status_code
+    else:
+        import main
+        from utils.call_events import hub
+
+        client = None
+
+        async def deliver(body, headers):
+            return await post_asgi(main.app, body, headers)
+
+        # Attach subscribers the way open SSE streams would
+        for body, _ in deliveries[::len(LIFECYCLE)]:
+            call_id = json.loads(body)["call"]["callId"]
+            subscriber_queues.extend(hub.subscribe(call_id) for _ in range(args.subscribers))
+
+    latencies: List[float] = []
+    errors = 0
+    pending = iter(deliveries)
+
+    async def worker():
+        nonlocal errors
+        for body, headers in pending:
+            start = time.perf_counter()
+            status = await deliver(body, headers)
+            latencies.append(time.perf_counter() - start)
+            if status != 200:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+    elapsed = time.perf_counter() - started
+
+    fanned_out = sum(queue.qsize() for queue in subscriber_queues)
+    if client is not None:
+        await client.aclose()
+
+    summary = summarize(latencies, elapsed, errors)
+    summary["events_fanned_out"] = fanned_out
+    return summary
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--calls", type=int, default=2000, help="simulated calls (3 events each)")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--subscribers", type=int, default=1, help="SSE subscribers per call (in-process only)")
+    parser.add_argument("--url", help="post to a running server instead of the in-process app")
+    parser.add_argument("--secret", default=os.getenv("ULTRAVOX_WEBHOOK_SECRET", DEFAULT_SECRET))
+    args = parser.parse_args()
+
+    if not args.url:
+        os.environ["ULTRAVOX_WEBHOOK_SECRET"] = args.secret
+        os.environ.setdefault("ULTRAVOX_API_KEY", "simulator-key")
+        with redirect_stdout(sys.stderr):
+            import main  # noqa: F401  (configures logging on import)
+        logging.getLogger("global_estates").setLevel(logging.WARNING)
+
+    results = asyncio.run(run(args))
+    print(json.dumps({
+        "benchmark": "webhook_ingest",
+        "metadata": run_metadata(),
+        "calls": args.calls,
+        "events": args.calls * len(LIFECYCLE),
+        "concurrency": args.concurrency,
+        "subscribers_per_call": args.subscribers if not args.url else None,
+        "results": results,
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,515 @@
+"""Mixed-workload load test for every API route, against local stand-ins.
+
+The API runs in-process under uvicorn on its own thread and event loop.
+MongoDB is replaced by mongomock-motor, unless ``--mongo-url`` points at a
+local mongod. Ultravox is replaced by a stub HTTP server on a second thread.
+Worker coroutines drive a weighted mix of menu browsing, login bursts, order
+creation and call creation/polling at a fixed concurrency.
+
+Results are printed as JSON: RPS and p50/p95/p99 per operation, plus
+event-loop lag sampled on the server loop. Runs can be compared for
+regressions:
+
+    python -m benchmarks.loadtest --duration 20 --output before.json
+    python -m benchmarks.loadtest --duration 20 --output after.json
+    python -m benchmarks.loadtest --compare before.json after.json
+
+``--measure-startup`` instead launches ``uvicorn main:app`` in a fresh
+process several times. It reports the time until the first request is served
+and the per-phase startup timings the app exports on /metrics:
+
+    python -m benchmarks.loadtest --measure-startup --startup-runs 5
+
+The load generator shares the process (and the GIL) with the server, so
+absolute numbers are lower than against a separate client. Compare runs
+taken on the same machine with the same arguments.
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import random
+import re
+import socket
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from typing import Callable, Dict, List, Optional, Tuple
+
+from benchmarks.common import run_metadata, summarize
+
+DEFAULT_MIX = "menu=60,login=5,order=20,call=15"
+BENCH_PASSWORD = "bench-password"
+
+
+def parse_mix(raw: str) -> Dict[str, int]:
+    mix = {}
+    for part in raw.split(","):
+        name, _, weight = part.partition("=")
+        mix[name.strip()] = int(weight)
+    unknown = set(mix) - set(SCENARIOS)
+    if unknown:
+        raise SystemExit(f"Unknown scenarios in --mix: {', '.join(sorted(unknown))}")
+    return mix
+
+
+def bound_socket() -> socket.socket:
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind(("127.0.0.1", 0))
+    return sock
+
+
+class ServerThread:
+    """Run an ASGI app under uvicorn on a background thread with its own loop"""
+
+    def __init__(self, app, name: str):
+        import uvicorn
+
+        self.sock = bound_socket()
+        self.port = self.sock.getsockname()[1]
+        self.url = f"http://127.0.0.1:{self.port}"
+        self.server = uvicorn.Server(uvicorn.Config(app, log_level="warning", lifespan="on"))
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.thread = threading.Thread(target=self._run, name=name, daemon=True)
+
+    def _run(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_until_complete(self.server.serve(sockets=[self.sock]))
+
+    def start(self, timeout: float = 30.0):
+        self.thread.start()
+        deadline = time.monotonic() + timeout
+        while not self.server.started:
+            if not self.thread.is_alive() or time.monotonic() > deadline:
+                raise RuntimeError(f"{self.thread.name} failed to start")
+            time.sleep(0.01)
+
+    def submit(self, coro):
+        """Run a coroutine on the server loop and return a concurrent future"""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def stop(self):
+        self.server.should_exit = True
+        self.thread.join(timeout=10)
+
+
+def build_stub_ultravox(latency_ms: float):
+    """Tiny stand-in for the Ultravox REST API"""
+    from starlette.applications import Starlette
+    from starlette.responses import JSONResponse, Response
+    from starlette.routing import Route
+
+    calls: Dict[str, dict] = {}
+    delay = latency_ms / 1000
+
+    async def create_call(request):
+        await asyncio.sleep(delay)
+        await request.body()
+        call_id = str(uuid.uuid4())
+        calls[call_id] = {"callId": call_id, "created": time.time(), "ended": None}
+        return JSONResponse({"callId": call_id, "joinUrl": f"wss://stub.invalid/calls/{call_id}"}, status_code=201)
+
+    async def call_detail(request):
+        await asyncio.sleep(delay)
+        call = calls.get(request.path_params["call_id"])
+        if call is None:
+            return JSONResponse({"detail": "Not found."}, status_code=404)
+        if request.method == "DELETE":
+            calls.pop(call["callId"], None)
+            return Response(status_code=204)
+        return JSONResponse(call)
+
+    async def voices(request):
+        await asyncio.sleep(delay)
+        return JSONResponse({"results": [{"voiceId": f"voice-{i}", "name": f"Voice {i}"} for i in range(20)]})
+
+    return Starlette(routes=[
+        Route("/api/calls", create_call, methods=["POST"]),
+        Route("/api/calls/{call_id}", call_detail, methods=["GET", "DELETE"]),
+        Route("/api/voices", voices, methods=["GET"]),
+    ])
+
+
+class LoopLagProbe:
+    """Samples how late the server loop wakes up from a short sleep"""
+
+    def __init__(self, interval: float = 0.01):
+        self.interval = interval
+        self.samples: List[float] = []
+        self.running = True
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while self.running:
+            expected = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            self.samples.append(max(0.0, loop.time() - expected))
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = {}
+        self.errors: Dict[str, int] = {}
+        self.recording = False
+
+    async def request(self, client, method: str, url: str, op: str, **kwargs):
+        start = time.perf_counter()
+        try:
+            response = await client.request(method, url, **kwargs)
+            failed = response.status_code >= 400
+        except Exception:
+            response, failed = None, True
+        elapsed = time.perf_counter() - start
+        if self.recording:
+            self.latencies.setdefault(op, []).append(elapsed)
+            if failed:
+                self.errors[op] = self.errors.get(op, 0) + 1
+        return response
+
+
+# Scenarios -------------------------------------------------------------------
+
+async def scenario_menu(client, rec: Recorder, rng: random.Random, ctx: dict):
+    await rec.request(client, "GET", "/api/menu/", "GET /api/menu/")
+    await rec.request(client, "GET", "/api/menu/categories", "GET /api/menu/categories")
+    category = rng.choice(ctx["categories"])
+    await rec.request(client, "GET", f"/api/menu/category/{category}", "GET /api/menu/category/{category}")
+
+
+async def scenario_login(client, rec: Recorder, rng: random.Random, ctx: dict):
+    email = rng.choice(ctx["users"])
+    response = await rec.request(
+        client, "POST", "/api/auth/token", "POST /api/auth/token",
+        data={"username": email, "password": BENCH_PASSWORD},
+    )
+    if response is not None and response.status_code == 200:
+        token = response.json()["access_token"]
+        await rec.request(
+            client, "GET", "/api/auth/me", "GET /api/auth/me",
+            headers={"Authorization": f"Bearer {token}"},
+        )
+
+
+async def scenario_order(client, rec: Recorder, rng: random.Random, ctx: dict):
+    picked = rng.sample(ctx["menu"], k=min(3, len(ctx["menu"])))
+    items = [
+        {"id": item["id"], "name": item["name"], "price": item["price"], "quantity": rng.randint(1, 3)}
+        for item in picked
+    ]
+    order = {
+        "items": items,
+        "total": sum(item["price"] * item["quantity"] for item in items),
+        "customer_name": "Bench Customer",
+        "customer_phone": "9999999999",
+        "delivery_address": "1 Bench Street, Bengaluru 560001",
+        "payment_method": "cash",
+    }
+    response = await rec.request(client, "POST", "/api/orders/", "POST /api/orders/", json=order)
+    if response is not None and response.status_code == 200:
+        order_id = response.json()["order_id"]
+        await rec.request(client, "GET", f"/api/orders/{order_id}", "GET /api/orders/{order_id}")
+
+
+async def scenario_call(client, rec: Recorder, rng: random.Random, ctx: dict):
+    payload = {
+        "model": "fixie-ai/ultravox",
+        "voice": "Mark",
+        "systemPrompt": ctx["system_prompt"],
+        "temperature": 0.4,
+        "initialMessages": [
+            {"text": "Hi, I'd like to order", "speaker": "user", "medium": "text"},
+            {"text": "Sure, what would you like?", "speaker": "agent", "medium": "voice"},
+        ],
+    }
+    response = await rec.request(client, "POST", "/api/voice-agent/calls", "POST /api/voice-agent/calls", json=payload)
+    if response is None or response.status_code != 200:
+        return
+    call_id = response.json()["callId"]
+    for _ in range(2):
+        await rec.request(client, "GET", f"/api/voice-agent/calls/{call_id}", "GET /api/voice-agent/calls/{call_id}")
+    await rec.request(client, "DELETE", f"/api/voice-agent/calls/{call_id}", "DELETE /api/voice-agent/calls/{call_id}")
+
+
+SCENARIOS: Dict[str, Callable] = {
+    "menu": scenario_menu,
+    "login": scenario_login,
+    "order": scenario_order,
+    "call": scenario_call,
+}
+
+
+# Harness ---------------------------------------------------------------------
+
+def configure_environment(args, ultravox_url: str):
+    os.environ["ULTRAVOX_API_KEY"] = "bench-key"
+    os.environ["ULTRAVOX_BASE_URL"] = ultravox_url
+    os.environ.setdefault("SECRET_KEY", "bench-secret")
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    os.environ["DATABASE_NAME"] = f"bench_{uuid.uuid4().hex[:8]}"
+    # Every simulated user comes from one IP; measure the app, not the limiter
+    os.environ.setdefault("LOGIN_RATE_LIMIT", "1000000/1")
+    os.environ.setdefault("CALL_RATE_LIMIT", "1000000/1")
+    if args.mongo_url:
+        os.environ["MONGODB_URL"] = args.mongo_url
+
+
+def install_mongo_standin():
+    """Swap the Motor client class for mongomock-motor's in-memory client"""
+    try:
+        from mongomock_motor import AsyncMongoMockClient
+    except ImportError:
+        raise SystemExit("mongomock-motor is required without --mongo-url (pip install mongomock-motor)")
+
+    import database
+    database.AsyncIOMotorClient = AsyncMongoMockClient
+
+
+async def seed_users(count: int) -> List[str]:
+    import database
+    from utils.auth import get_password_hash
+
+    # One bcrypt hash for everyone; hashing is deliberately slow
+    hashed = get_password_hash(BENCH_PASSWORD)
+    emails = [f"bench{i}@example.com" for i in range(count)]
+    db = database.get_database()
+    await db.users.delete_many({"email": {"$in": emails}})
+    await db.users.insert_many([
+        {"email": email, "name": f"Bench User {i}", "hashed_password": hashed, "is_active": True}
+        for i, email in enumerate(emails)
+    ])
+    return emails
+
+
+async def drive(base_url: str, args, mix: Dict[str, int], ctx: dict) -> Tuple[Recorder, float]:
+    import httpx
+
+    rec = Recorder()
+    names = list(mix)
+    weights = [mix[name] for name in names]
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=30) as client:
+        async def worker(index: int, stop_at: float):
+            rng = random.Random(args.seed * 1000 + index)
+            while time.perf_counter() < stop_at:
+                name = rng.choices(names, weights)[0]
+                await SCENARIOS[name](client, rec, rng, ctx)
+
+        # Warm up connections, caches and lazily built middleware
+        warmup_end = time.perf_counter() + args.warmup
+        await asyncio.gather(*(worker(i, warmup_end) for i in range(args.concurrency)))
+
+        rec.recording = True
+        started = time.perf_counter()
+        stop_at = started + args.duration
+        await asyncio.gather(*(worker(i, stop_at) for i in range(args.concurrency)))
+        elapsed = time.perf_counter() - started
+        rec.recording = False
+
+    return rec, elapsed
+
+
+def run(args) -> dict:
+    mix = parse_mix(args.mix)
+
+    stub = ServerThread(build_stub_ultravox(args.upstream_latency_ms), "ultravox-stub")
+    stub.start()
+    configure_environment(args, stub.url)
+    if not args.mongo_url:
+        install_mongo_standin()
+
+    import main
+    from routes.menu import load_menu_items
+
+    api = ServerThread(main.app, "api-server")
+    api.start()
+
+    try:
+        menu = load_menu_items()
+        ctx = {
+            "menu": menu,
+            "categories": sorted({item["category"] for item in menu}),
+            "users": api.submit(seed_users(args.users)).result(timeout=60),
+            "system_prompt": "You are a helpful food ordering assistant. " * 200,
+        }
+
+        probe = LoopLagProbe()
+        api.submit(probe.run())
+        rec, elapsed = asyncio.run(drive(api.url, args, mix, ctx))
+        probe.running = False
+    finally:
+        api.stop()
+        stub.stop()
+
+    all_latencies = [value for values in rec.latencies.values() for value in values]
+    lag = sorted(probe.samples)
+    lag_summary = summarize(lag, 1.0)
+    return {
+        "benchmark": "loadtest",
+        "meta": run_metadata(),
+        "config": {
+            "concurrency": args.concurrency,
+            "duration_s": args.duration,
+            "warmup_s": args.warmup,
+            "seed": args.seed,
+            "mix": mix,
+            "upstream_latency_ms": args.upstream_latency_ms,
+            "mongo": args.mongo_url or "mongomock-motor",
+        },
+        "overall": summarize(all_latencies, elapsed, sum(rec.errors.values())),
+        "operations": {
+            op: summarize(values, elapsed, rec.errors.get(op, 0))
+            for op, values in sorted(rec.latencies.items())
+        },
+        "event_loop_lag_ms": {
+            "samples": lag_summary["requests"],
+            "p50": lag_summary["p50_ms"],
+            "p99": lag_summary["p99_ms"],
+            "max": lag_summary["max_ms"],
+        },
+    }
+
+
+_PHASE_LINE = re.compile(r'^startup_phase_seconds\{phase="([^"]+)",status="([^"]+)"\} (\S+)$', re.M)
+_PENDING_LINE = re.compile(r"^startup_phases_pending (\S+)$", re.M)
+
+
+def measure_startup_once(args) -> dict:
+    """Start a fresh server process and time it until the first 200 response"""
+    import httpx
+
+    sock = bound_socket()
+    port = sock.getsockname()[1]
+    sock.close()
+
+    env = dict(os.environ)
+    env["STARTUP_MODE"] = args.startup_mode
+    env.setdefault("LOG_LEVEL", "WARNING")
+    env.setdefault("STARTUP_CHECK_TIMEOUT", "2")
+    env.setdefault("MONGODB_TIMEOUT_MS", "1000")
+
+    started = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+        cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        headers = {"Authorization": f"Bearer {env['METRICS_TOKEN']}"} if env.get("METRICS_TOKEN") else {}
+        with httpx.Client(base_url=f"http://127.0.0.1:{port}", headers=headers, timeout=1.0) as client:
+            first_response = None
+            while first_response is None:
+                if process.poll() is not None:
+                    raise RuntimeError(f"server exited with code {process.returncode}")
+                if time.perf_counter() - started > 60:
+                    raise RuntimeError("server did not answer within 60s")
+                try:
+                    if client.get("/").status_code == 200:
+                        first_response = time.perf_counter() - started
+                except httpx.TransportError:
+                    time.sleep(0.005)
+
+            # Deferred phases finish in the background; wait until the app
+            # reports none pending (each is bounded by STARTUP_CHECK_TIMEOUT)
+            phases = {}
+            deadline = time.perf_counter() + float(env["STARTUP_CHECK_TIMEOUT"]) + 1
+            while time.perf_counter() < deadline:
+                text = client.get("/metrics").text
+                phases = {
+                    name: {"status": status, "duration_ms": round(float(value) * 1000, 2)}
+                    for name, status, value in _PHASE_LINE.findall(text)
+                }
+                pending = _PENDING_LINE.search(text)
+                if pending is not None and float(pending.group(1)) == 0:
+                    break
+                time.sleep(0.05)
+    finally:
+        process.terminate()
+        process.wait(timeout=15)
+
+    return {"time_to_first_request_ms": round(first_response * 1000, 1), "phases": phases}
+
+
+def measure_startup(args) -> dict:
+    runs = [measure_startup_once(args) for _ in range(args.startup_runs)]
+    ttfr = summarize([run["time_to_first_request_ms"] / 1000 for run in runs], 1.0)
+    return {
+        "benchmark": "startup",
+        "meta": run_metadata(),
+        "config": {"runs": args.startup_runs, "startup_mode": args.startup_mode},
+        "time_to_first_request_ms": {key: ttfr[key] for key in ("p50_ms", "p95_ms", "max_ms")},
+        "runs": runs,
+    }
+
+
+def compare(baseline_path: str, current_path: str, threshold: float) -> Tuple[dict, bool]:
+    """Compare two result files; flags p99 growth or RPS loss beyond threshold"""
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    with open(current_path) as f:
+        current = json.load(f)
+
+    report = {}
+    regressed = False
+    ops = {"overall": (baseline["overall"], current["overall"])}
+    for op, stats in current["operations"].items():
+        if op in baseline["operations"]:
+            ops[op] = (baseline["operations"][op], stats)
+
+    for op, (before, after) in ops.items():
+        p99_change = (after["p99_ms"] - before["p99_ms"]) / before["p99_ms"] if before["p99_ms"] else 0.0
+        rps_change = (after["rps"] - before["rps"]) / before["rps"] if before["rps"] else 0.0
+        op_regressed = p99_change > threshold or rps_change < -threshold
+        regressed = regressed or op_regressed
+        report[op] = {
+            "p99_ms": [before["p99_ms"], after["p99_ms"]],
+            "rps": [before["rps"], after["rps"]],
+            "p99_change": round(p99_change, 3),
+            "rps_change": round(rps_change, 3),
+            "regressed": op_regressed,
+        }
+    return report, regressed
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description="Mixed-workload API load test with local stand-ins")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=15.0, help="measured seconds")
+    parser.add_argument("--warmup", type=float, default=2.0, help="unmeasured warm-up seconds")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--mix", default=DEFAULT_MIX, help=f"scenario weights (default {DEFAULT_MIX})")
+    parser.add_argument("--users", type=int, default=50, help="seeded login accounts")
+    parser.add_argument("--upstream-latency-ms", type=float, default=20.0, help="stub Ultravox latency")
+    parser.add_argument("--mongo-url", help="use a real (local) MongoDB instead of mongomock-motor")
+    parser.add_argument("--output", help="write JSON results to this file as well as stdout")
+    parser.add_argument("--compare", nargs=2, metavar=("BASELINE", "CURRENT"), help="compare two result files")
+    parser.add_argument("--threshold", type=float, default=0.10, help="allowed relative regression")
+    parser.add_argument("--measure-startup", action="store_true", help="measure time to first request instead")
+    parser.add_argument("--startup-runs", type=int, default=5)
+    parser.add_argument("--startup-mode", choices=["fast", "full"], default="fast")
+    args = parser.parse_args()
+
+    if args.compare:
+        report, regressed = compare(args.compare[0], args.compare[1], args.threshold)
+        print(json.dumps({"comparison": report, "regressed": regressed}, indent=2))
+        sys.exit(1 if regressed else 0)
+
+    # The app prints diagnostics (e.g. database.py); keep stdout pure JSON
+    with contextlib.redirect_stdout(sys.stderr):
+        results = measure_startup(args) if args.measure_startup else run(args)
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    print(output)
+
+
+if __name__ == "__main__":
+    main_cli()
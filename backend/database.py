@@ -13,22 +13,39 @@ DATABASE_NAME = os.getenv("DATABASE_NAME", "global_estates")
 client = None
 db = None
 
-async def connect_to_mongodb():
+# How long the driver waits to find a usable server before failing an operation
+MONGODB_TIMEOUT_MS = int(os.getenv("MONGODB_TIMEOUT_MS", "5000"))
+
+async def connect_to_mongodb(verify: bool = True):
+    """Create the client; with verify=False no network round trip is made"""
     global client, db
     try:
         print(f"Connecting to MongoDB at {MONGODB_URL} (database: {DATABASE_NAME})")
-        client = AsyncIOMotorClient(MONGODB_URL)
+        # Motor connects lazily, so creating the client does not block
+        client = AsyncIOMotorClient(MONGODB_URL, serverSelectionTimeoutMS=MONGODB_TIMEOUT_MS)
         db = client[DATABASE_NAME]
+    except Exception as e:
+        print(f"Warning: MongoDB client creation failed: {e}")
+        print(traceback.format_exc())
+        return
+    if verify:
+        await verify_mongodb_connection()
+
+async def verify_mongodb_connection() -> bool:
+    """Ping the server and make sure the users collection exists"""
+    try:
         # Test the connection
         await client.admin.command('ping')
         # Create users collection if it doesn't exist
         if 'users' not in await db.list_collection_names():
             await db.create_collection('users')
         print("Successfully connected to MongoDB")
+        return True
     except Exception as e:
         print(f"Warning: MongoDB connection failed: {e}")
         print(traceback.format_exc())
         print("Continuing with JSON file storage...")
+        return False
 
 async def close_mongodb_connection():
     global client
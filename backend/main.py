@@ -1,12 +1,11 @@
 from fastapi import FastAPI, Request, Response, Depends, HTTPException
-from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.middleware.trustedhost import TrustedHostMiddleware
 from contextlib import asynccontextmanager
 import os
 import json
+import asyncio
+import importlib
 import logging
-import coloredlogs
 import socket
 from typing import List
 from dotenv import load_dotenv
@@ -15,12 +14,22 @@ from pydantic import BaseModel
 # Load environment variables
 load_dotenv()
 
-from database import connect_to_mongodb, close_mongodb_connection
+from database import connect_to_mongodb, verify_mongodb_connection, close_mongodb_connection, get_database
+from utils.cors import CORSMiddleware, LOCALHOST_ORIGIN_REGEX
+from utils.middleware import RequestIdMiddleware, TimingMiddleware
+from utils.metrics import MetricsMiddleware
+from utils.logging_config import configure_logging
+from utils.invalidation import bus, build_transport
+from utils.call_registry import call_registry
+from utils.jobs import jobs
+from utils.loop_monitor import LOOP_MONITOR, LoopMonitorMiddleware, loop_monitor
+from utils.profiler import ProfilerMiddleware
+from utils.fast_json import FastJSONResponse
+from utils.order_analytics import analytics_store
+from utils.startup import StartupReport, run_phases, STARTUP_MODE, WARM_CACHES
 
-# Configure logging
-logger = logging.getLogger("global_estates")
-coloredlogs.install(level='INFO', logger=logger, 
-                   fmt='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+# Configure logging (background writer; LOG_FORMAT=json for structured output)
+logger = configure_logging()
 
 # Server configuration
 SERVER_PORT = 8000
@@ -61,20 +70,63 @@ def generate_default_origins() -> List[str]:
             origins.append(f"http://{host}:{port}")
     return origins
 
-@asynccontextmanager
-async def lifespan(app: FastAPI):
-    # Startup: Connect to MongoDB
-    logger.info("Starting Global Estates API server...")
-    await connect_to_mongodb()
-    
-    # Log server information
-    local_ip = get_local_ip()
+# Startup phases. Each one is bounded by a timeout so a missing network or
+# database can never hang the lifespan.
+STARTUP_CHECK_TIMEOUT = float(os.getenv("STARTUP_CHECK_TIMEOUT", "5"))
+
+async def log_server_address():
+    # get_local_ip opens a socket, which can block on hosts without a network
+    local_ip = await asyncio.to_thread(get_local_ip)
     logger.info(f"Server running at: http://{local_ip}:{SERVER_PORT}")
     logger.info(f"API documentation available at: http://{local_ip}:{SERVER_PORT}/docs")
-    
+
+async def check_images_directory():
+    images_dir = os.path.join(os.path.dirname(__file__), "public", "imagedump")
+    if not os.path.exists(images_dir):
+        logger.warning(f"Image directory NOT found at: {images_dir}")
+        return
+    image_count = await asyncio.to_thread(
+        lambda: sum(1 for f in os.listdir(images_dir) if f.endswith(('.jpg', '.jpeg', '.png')))
+    )
+    logger.info(f"Image directory found at: {images_dir} with {image_count} images")
+
+async def check_mongodb():
+    if not await verify_mongodb_connection():
+        raise RuntimeError("MongoDB is not reachable")
+
+async def warm_menu_cache():
+    items = menu.load_menu_items()
+    if not items:
+        raise RuntimeError("menu catalog is empty")
+    # Index it for the voice tool endpoints too
+    tools.get_menu_index()
+
+async def warm_call_profiles():
+    # Validated and serialized once, so create_call only merges per-call fields
+    if not voice_agent.get_call_profiles():
+        raise RuntimeError("no call profiles loaded")
+
+async def warm_property_index():
+    # Indexing a large PROPERTIES_FILE takes a while; keep it off the event loop
+    await asyncio.to_thread(properties.get_property_index)
+
+async def restore_order_analytics():
+    # Restoring merges the stored figures with any orders already taken, and
+    # syncs add deltas, so neither can lose another worker's orders
+    db = get_database()
+    if db is None:
+        raise RuntimeError("no database for order analytics")
+    await analytics_store.start(db)
+    await analytics_store.restore(db)
+
+async def warm_http_clients():
+    # The Ultravox HTTP client library is imported on first use; pay for it
+    # here instead of in the first voice request
+    await asyncio.to_thread(importlib.import_module, "httpx")
+
+def log_configuration():
     # Log CORS configuration
-    cors_origins = get_cors_origins()
-    logger.info(f"CORS configured for origins: {cors_origins}")
+    logger.info(f"CORS configured for origins: {origins}")
     
     # Check environment variables
     ultravox_key = os.getenv("ULTRAVOX_API_KEY")
@@ -87,65 +139,95 @@ async def lifespan(app: FastAPI):
         logger.info(f"ULTRAVOX_API_KEY: {masked_key}")
     
     logger.info(f"JWT_SECRET configured: {'Yes' if jwt_secret else 'No'}")
-    
-    # Check if menu items file exists
-    menu_file_path = os.path.join(os.path.dirname(__file__), "public", "menuitems.json")
-    if os.path.exists(menu_file_path):
-        logger.info(f"Menu items file found at: {menu_file_path}")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    logger.info(f"Starting Global Estates API server (startup mode: {STARTUP_MODE})...")
+    report = StartupReport()
+    app.state.startup_report = report
+
+    # Critical phases must finish before the first request is served. Creating
+    # the Mongo client makes no network call, but every phase that touches the
+    # database needs it to exist.
+    await run_phases(report, [
+        ("mongodb_client", lambda: connect_to_mongodb(verify=False), STARTUP_CHECK_TIMEOUT),
+    ])
+    critical = [
+        ("menu_cache", warm_menu_cache, STARTUP_CHECK_TIMEOUT),
+        ("call_profiles", warm_call_profiles, STARTUP_CHECK_TIMEOUT),
+        ("invalidation_bus", lambda: bus.start(build_transport()), STARTUP_CHECK_TIMEOUT),
+        ("call_reaper", call_registry.start, STARTUP_CHECK_TIMEOUT),
+        ("job_workers", jobs.start, STARTUP_CHECK_TIMEOUT),
+    ]
+
+    # Everything else only produces diagnostics, unless a launcher asked for
+    # warm caches, in which case the cache-filling checks become critical
+    warmers = [
+        ("mongodb_check", check_mongodb, STARTUP_CHECK_TIMEOUT),
+        ("voices_cache", voice_agent.warm_voices_cache, STARTUP_CHECK_TIMEOUT),
+        ("property_index", warm_property_index, STARTUP_CHECK_TIMEOUT),
+        ("order_analytics", restore_order_analytics, STARTUP_CHECK_TIMEOUT),
+    ]
+    checks = [
+        ("server_address", log_server_address, STARTUP_CHECK_TIMEOUT),
+        ("images_directory", check_images_directory, STARTUP_CHECK_TIMEOUT),
+        ("http_clients", warm_http_clients, STARTUP_CHECK_TIMEOUT),
+    ]
+    if WARM_CACHES:
+        critical += warmers
     else:
-        logger.warning(f"Menu items file NOT found at: {menu_file_path}")
-    
-    # Check if images directory exists
-    images_dir = os.path.join(os.path.dirname(__file__), "public", "imagedump")
-    if os.path.exists(images_dir):
-        image_count = len([f for f in os.listdir(images_dir) if f.endswith(('.jpg', '.jpeg', '.png'))])
-        logger.info(f"Image directory found at: {images_dir} with {image_count} images")
+        checks = warmers + checks
+    await run_phases(report, critical)
+    log_configuration()
+
+    background_checks = None
+    if STARTUP_MODE == "full":
+        await run_phases(report, checks)
     else:
-        logger.warning(f"Image directory NOT found at: {images_dir}")
+        # Counted as pending now, so /metrics never looks finished before they start
+        report.expect(checks)
+        background_checks = asyncio.create_task(run_phases(report, checks, deferred=True))
+
+    if LOOP_MONITOR:
+        loop_monitor.start()
+
+    report.mark_ready()
+    logger.info(f"Ready to serve after {report.ready_after * 1000:.1f} ms: {report.phases}")
     
     yield
     
     # Shutdown: Close MongoDB connection
     logger.info("Shutting down Global Estates API server...")
+    if background_checks is not None and not background_checks.done():
+        background_checks.cancel()
+    loop_monitor.stop()
+    await call_registry.stop()
+    # Jobs may still publish invalidations or write to Mongo
+    await jobs.stop()
+    await bus.stop()
+    await analytics_store.stop()
     await close_mongodb_connection()
 
-app = FastAPI(title="Global Estates API", lifespan=lifespan)
+app = FastAPI(title="Global Estates API", lifespan=lifespan, default_response_class=FastJSONResponse)
 
-# Configure CORS using origins from environment
+# Configure CORS using origins from environment. Localhost on any port stays
+# allowed for development; everything is compiled once by the CORS layer.
 origins = get_cors_origins()
 
-# Add CORS middleware
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=["http://localhost:5173"],  # Explicitly specify frontend origin
-    allow_origin_regex=r"https?://(localhost|127\.0\.0\.1)(:[0-9]+)?",  # Allow localhost with any port
+    allow_origins=origins,
+    allow_origin_regex=LOCALHOST_ORIGIN_REGEX,
     allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*", "cache-control", "pragma", "expires", "content-type", "authorization"],
-)
-
-# Add trusted host middleware
-app.add_middleware(
-    TrustedHostMiddleware, allowed_hosts=["*"]
+    expose_headers=["X-Request-ID", "Server-Timing"],
 )
 
-# Add CORS headers middleware
-@app.middleware("http")
-async def add_cors_headers(request: Request, call_next):
-    response = await call_next(request)
-    
-    # Get origin from request headers
-    origin = request.headers.get("origin")
-    
-    # Only add CORS headers if origin is present and matches our allowed origins
-    if origin and (origin == "http://localhost:5173" or origin.startswith("http://localhost:") or origin.startswith("http://127.0.0.1:")):
-        response.headers["Access-Control-Allow-Origin"] = origin
-        response.headers["Access-Control-Allow-Credentials"] = "true"
-        response.headers["Access-Control-Allow-Methods"] = "*"
-        response.headers["Access-Control-Allow-Headers"] = "Content-Type, Authorization, Cache-Control, Pragma, Expires, X-Requested-With"
-        response.headers["Access-Control-Max-Age"] = "86400"  # Cache preflight response for 24 hours
-    
-    return response
+# Request ids, timing, metrics, loop attribution and profiling run outermost so they cover CORS preflights too
+app.add_middleware(ProfilerMiddleware)
+app.add_middleware(LoopMonitorMiddleware)
+app.add_middleware(TimingMiddleware)
+app.add_middleware(MetricsMiddleware)
+app.add_middleware(RequestIdMiddleware)
 
 # Mount static files directory with proper caching headers
 public_dir = os.path.join(os.path.dirname(__file__), "public")
@@ -167,12 +249,20 @@ class CachingStaticFiles(StaticFiles):
 app.mount("/public", CachingStaticFiles(directory=public_dir), name="public")
 
 # Include routers
-from routes import menu, order, auth, users, voice_agent
+from routes import menu, order, auth, users, voice_agent, call_events, tools, bootstrap, debug, metrics, properties, delivery, analytics
 app.include_router(menu.router, prefix="/api/menu", tags=["menu"])
 app.include_router(order.router, prefix="/api/orders", tags=["orders"])
 app.include_router(auth.router, prefix="/api/auth", tags=["auth"])
 app.include_router(users.router, prefix="/api/users", tags=["users"])
 app.include_router(voice_agent.router, prefix="/api/voice-agent", tags=["voice-agent"])
+app.include_router(call_events.router, prefix="/api/voice-agent", tags=["voice-agent"])
+app.include_router(tools.router, prefix="/api/tools", tags=["tools"])
+app.include_router(properties.router, prefix="/api/properties", tags=["properties"])
+app.include_router(delivery.router, prefix="/api/delivery", tags=["delivery"])
+app.include_router(analytics.router, prefix="/api/analytics", tags=["analytics"])
+app.include_router(bootstrap.router, prefix="/api", tags=["bootstrap"])
+app.include_router(debug.router, prefix="/api/debug", tags=["debug"], include_in_schema=False)
+app.include_router(metrics.router, tags=["metrics"])
 
 # Root endpoint for API health check
 @app.get("/")
@@ -187,7 +277,8 @@ async def root():
             "orders": "/api/orders",
             "auth": "/api/auth",
             "users": "/api/users",
-            "voice-agent": "/api/voice-agent"
+            "voice-agent": "/api/voice-agent",
+            "metrics": "/metrics"
         }
     }
 
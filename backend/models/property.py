@@ -0,0 +1,127 @@
+import math
+from random import Random
+from pydantic import BaseModel
+from typing import Any, Dict, List, Optional
+
+class Property(BaseModel):
+    id: str
+    title: str
+    price: float
+    location: str
+    beds: int
+    baths: int
+    sqft: int
+    image: str
+    tag: str
+    propertyType: str
+    listingType: str
+    features: List[str] = []
+    lat: Optional[float] = None
+    lng: Optional[float] = None
+
+class PropertyPage(BaseModel):
+    items: List[Property]
+    total: int
+    nextCursor: Optional[str] = None
+
+# The listings the frontend generates in PropertyList.tsx, so both agree until
+# a real listings file is configured (PROPERTIES_FILE)
+LOCATIONS = [
+    "Dubai Marina, Dubai", "Downtown Dubai, Dubai", "Palm Jumeirah, Dubai", "Business Bay, Dubai",
+    "Jumeirah Beach Residence (JBR), Dubai", "DIFC, Dubai", "Arabian Ranches, Dubai",
+    "Manhattan, New York", "Brooklyn, New York", "Upper East Side, New York",
+    "Kensington, London", "Notting Hill, London", "Chelsea, London",
+    "Corniche Road, Abu Dhabi", "Al Reem Island, Abu Dhabi",
+    "Deansgate, Manchester", "Northern Quarter, Manchester",
+]
+# Approximate centre of each neighbourhood; mock listings are scattered around it
+LOCATION_COORDINATES = {
+    "Dubai Marina, Dubai": (25.0805, 55.1403),
+    "Downtown Dubai, Dubai": (25.1972, 55.2744),
+    "Palm Jumeirah, Dubai": (25.1124, 55.1390),
+    "Business Bay, Dubai": (25.1850, 55.2650),
+    "Jumeirah Beach Residence (JBR), Dubai": (25.0780, 55.1330),
+    "DIFC, Dubai": (25.2110, 55.2790),
+    "Arabian Ranches, Dubai": (25.0550, 55.2680),
+    "Manhattan, New York": (40.7831, -73.9712),
+    "Brooklyn, New York": (40.6782, -73.9442),
+    "Upper East Side, New York": (40.7736, -73.9566),
+    "Kensington, London": (51.4991, -0.1938),
+    "Notting Hill, London": (51.5090, -0.1960),
+    "Chelsea, London": (51.4875, -0.1687),
+    "Corniche Road, Abu Dhabi": (24.4750, 54.3350),
+    "Al Reem Island, Abu Dhabi": (24.4990, 54.4050),
+    "Deansgate, Manchester": (53.4780, -2.2490),
+    "Northern Quarter, Manchester": (53.4840, -2.2350),
+}
+# How far (in degrees of latitude) mock listings are scattered around their centre
+LOCATION_SPREAD_DEG = 0.015
+PROPERTY_TYPES = ["Apartment", "Villa", "Penthouse", "Townhouse", "Duplex", "House", "Office", "Retail", "Land"]
+LISTING_TYPES = ["For Rent", "For Sale", "New Development"]
+FEATURES = [
+    "Sea View", "Private Pool", "Balcony", "Garden", "Gym", "Concierge", "Pet Friendly",
+    "Near Supermarket", "Near Metro Station", "Near Schools", "Waterfront", "High Floor",
+    "Smart Home", "Furnished", "Parking", "24/7 Security", "City View", "Walk-in Closet",
+    "Storage Room", "Maid's Room", "Study Room", "Near Beach", "Near Shopping Mall",
+    "Near Hospital", "Near Restaurant", "Near Park", "Mountain View", "Pool View",
+    "Lake View", "Golf Course View",
+]
+
+def mock_properties(count: int, seed: int = 12345) -> List[Dict[str, Any]]:
+    """Deterministic listings, identical to the frontend's generateMockProperties.
+
+    Coordinates are not part of the frontend's listings; they come from a
+    separate random stream so the shared fields stay the same.
+    """
+    m = 2 ** 35 - 31
+    a = 185852
+    s = seed % m
+
+    def random() -> float:
+        nonlocal s
+        s = (s * a) % m
+        return s / m
+
+    scatter = Random(seed)
+    properties = []
+    for index in range(count):
+        prop_type = PROPERTY_TYPES[int(random() * len(PROPERTY_TYPES))]
+        location = LOCATIONS[int(random() * len(LOCATIONS))]
+        listing_type = LISTING_TYPES[int(random() * len(LISTING_TYPES))]
+        bedrooms = int(random() * 6) + 1
+        bathrooms = max(1, bedrooms - int(random() * 2))
+        sqft = int(random() * (5000 - 800)) + 800
+        if prop_type == "Land":
+            price = int(random() * 5000000) + 1000000
+        elif listing_type == "For Rent":
+            price = int(random() * 15000) + 3000
+        else:
+            price = int(random() * 9000000) + 500000
+
+        features = [feature for feature in FEATURES if random() > 0.7]
+        while len(features) < 3:
+            feature = FEATURES[int(random() * len(FEATURES))]
+            if feature not in features:
+                features.append(feature)
+
+        center_lat, center_lng = LOCATION_COORDINATES[location]
+        lat = center_lat + scatter.uniform(-LOCATION_SPREAD_DEG, LOCATION_SPREAD_DEG)
+        lng = center_lng + scatter.uniform(-LOCATION_SPREAD_DEG, LOCATION_SPREAD_DEG) / math.cos(math.radians(center_lat))
+
+        properties.append({
+            "id": f"property-{index + 1}",
+            "title": f"{prop_type} in {location}",
+            "price": price,
+            "location": location,
+            "beds": 0 if prop_type in ("Office", "Retail", "Land") else bedrooms,
+            "baths": 0 if prop_type == "Land" else bathrooms,
+            "sqft": sqft,
+            "image": f"/src/assets/images/properties/property-{index + 1}.jpg",
+            "tag": listing_type,
+            "propertyType": prop_type,
+            "listingType": listing_type,
+            "features": features,
+            "lat": round(lat, 6),
+            "lng": round(lng, 6),
+        })
+    return properties
@@ -4,6 +4,8 @@ from datetime import datetime
 from bson import ObjectId
 from pydantic_core import core_schema
 
+from utils.fast_json import compile_serializer
+
 class PyObjectId(ObjectId):
     @classmethod
     def __get_pydantic_core_schema__(
@@ -19,6 +21,11 @@ class PyObjectId(ObjectId):
             ]),
         ])
 
+    @classmethod
+    def __get_validators__(cls):
+        # pydantic v1 hook; v2 uses __get_pydantic_core_schema__ above
+        yield cls.validate
+
     @classmethod
     def validate(cls, v):
         if not ObjectId.is_valid(v):
@@ -71,4 +78,10 @@ class Token(BaseModel):
     token_type: str
 
 class TokenData(BaseModel):
-    email: Optional[str] = None 
\ No newline at end of file
+    email: Optional[str] = None
+
+# Response serializers for trusted data (Mongo documents, validated models)
+serialize_address = compile_serializer(Address)
+serialize_user = compile_serializer(User, sources={"id": "_id"}, convert={"id": str})
+# UserInDB (as cached by get_user) keeps its id under "id"
+serialize_user_in_db = compile_serializer(User, convert={"id": str})
@@ -0,0 +1,29 @@
+from fastapi import APIRouter, Depends, Query
+
+from utils.auth import require_admin
+from utils.fast_json import FastJSONResponse
+from utils.order_analytics import ANALYTICS_HOURS, order_analytics
+
+router = APIRouter()
+
+MAX_POPULAR = 50
+
+@router.get("/popular")
+async def get_popular_items(limit: int = Query(10, ge=1, le=MAX_POPULAR)):
+    """Most ordered items, by quantity and then revenue; cancelled orders are not counted"""
+    return FastJSONResponse({"items": order_analytics.popular_items(limit)})
+
+@router.get("/summary", dependencies=[Depends(require_admin)])
+async def get_order_summary():
+    """Order count, revenue, average ticket, orders per status and the status funnel"""
+    return FastJSONResponse(order_analytics.summary())
+
+@router.get("/revenue/hourly", dependencies=[Depends(require_admin)])
+async def get_hourly_revenue(hours: int = Query(24, ge=1, le=ANALYTICS_HOURS)):
+    """Orders and revenue for each of the last ``hours`` hours that had orders, oldest first"""
+    return FastJSONResponse({"hours": order_analytics.hourly_revenue(hours)})
+
+@router.get("/revenue/categories", dependencies=[Depends(require_admin)])
+async def get_category_revenue():
+    """Revenue per menu category, highest first"""
+    return FastJSONResponse({"categories": order_analytics.category_revenue()})
@@ -5,30 +5,71 @@ from datetime import timedelta, datetime
 from typing import Annotated
 from motor.motor_asyncio import AsyncIOMotorDatabase
 from pydantic import EmailStr
+import asyncio
 import traceback
 import logging
 import sys
 
-from models.user import UserCreate, User, Token
+from models.user import UserCreate, User, Token, serialize_user
 from utils.auth import (
     authenticate_user,
     create_access_token,
     get_password_hash,
+    password_needs_rehash,
     ACCESS_TOKEN_EXPIRE_MINUTES,
     get_current_active_user
 )
+from utils.rate_limit import TokenBucketLimiter, client_ip
 from database import get_database
+from utils.audit import audit
+from utils.fast_json import FastJSONResponse
+from utils.invalidation import bus
+from utils.jobs import PRIORITY_LOW, jobs
+import os
 
 # Get logger
 logger = logging.getLogger("global_estates")
 
 router = APIRouter()
 
+# Every attempt costs a bcrypt verification; limit per client IP and per account
+LOGIN_LIMITER = TokenBucketLimiter("login", os.getenv("LOGIN_RATE_LIMIT", "10/60"))
+
+async def limit_login_attempts(request: Request):
+    await LOGIN_LIMITER.check(client_ip(request), "ip")
+    # Starlette caches the parsed form, so the endpoint does not parse it again
+    form = await request.form()
+    username = form.get("username")
+    if username:
+        await LOGIN_LIMITER.check(str(username).lower(), "user")
+
+# The payload holds the plain password, so this job is never written to Mongo
+@jobs.handler("auth.rehash", priority=PRIORITY_LOW, persist=False)
+async def rehash_password(payload: dict):
+    db = get_database()
+    if db is None:
+        return
+    hashed_password = await asyncio.to_thread(get_password_hash, payload["password"])
+    # Only replace the hash that was verified; a password change since then wins
+    result = await db.users.update_one(
+        {"email": payload["email"], "hashed_password": payload["old_hash"]},
+        {"$set": {"hashed_password": hashed_password}}
+    )
+    if result.modified_count:
+        bus.publish("users", payload["email"])
+        logger.info("Re-hashed password for user: %s", payload['email'])
+
+def after_login(user, password: str):
+    """Queue the work a successful login triggers without making the client wait for it"""
+    if password_needs_rehash(user.hashed_password):
+        jobs.enqueue("auth.rehash", {"email": user.email, "password": password, "old_hash": user.hashed_password})
+    audit("login", email=user.email)
+
 @router.post("/register", response_model=User)
 async def register_user(user_data: UserCreate, db: AsyncIOMotorDatabase = Depends(get_database)):
     # Check if user already exists
     if await db.users.find_one({"email": user_data.email}):
-        logger.warning(f"Registration attempt with existing email: {user_data.email}")
+        logger.warning("Registration attempt with existing email: %s", user_data.email)
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Email already registered"
@@ -41,36 +82,21 @@ async def register_user(user_data: UserCreate, db: AsyncIOMotorDatabase = Depend
     user_dict["hashed_password"] = hashed_password
     
     result = await db.users.insert_one(user_dict)
-    logger.info(f"New user registered: {user_data.email}")
+    logger.info("New user registered: %s", user_data.email)
+    audit("register", email=user_data.email)
     
     # Get the created user
     created_user = await db.users.find_one({"_id": result.inserted_id})
     
-    return {
-        "id": str(created_user["_id"]),
-        "email": created_user["email"],
-        "name": created_user["name"],
-        "is_active": created_user.get("is_active", True),
-        "created_at": created_user.get("created_at")
-    }
+    return FastJSONResponse(serialize_user(created_user))
 
-@router.post("/token", response_model=Token)
+@router.post("/token", response_model=Token, dependencies=[Depends(limit_login_attempts)])
 async def login_for_access_token(
-    response: Response,
-    request: Request,
     form_data: Annotated[OAuth2PasswordRequestForm, Depends()],
     db: AsyncIOMotorDatabase = Depends(get_database)
 ):
     try:
-        logger.info(f"Login attempt for user: {form_data.username}")
-        
-        # Add explicit CORS headers for the requesting origin
-        origin = request.headers.get("origin")
-        if origin:
-            response.headers["Access-Control-Allow-Origin"] = origin
-            response.headers["Access-Control-Allow-Credentials"] = "true"
-            response.headers["Access-Control-Allow-Methods"] = "POST, OPTIONS"
-            response.headers["Access-Control-Allow-Headers"] = "Content-Type, Authorization, X-Requested-With"
+        logger.info("Login attempt for user: %s", form_data.username)
         
         if db is None:
             logger.error("Database connection is None!")
@@ -81,7 +107,8 @@ async def login_for_access_token(
             
         user = await authenticate_user(db, form_data.username, form_data.password)
         if not user:
-            logger.warning(f"Authentication failed for user: {form_data.username}")
+            logger.warning("Authentication failed for user: %s", form_data.username)
+            audit("login_failed", email=form_data.username)
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Incorrect email or password",
@@ -93,7 +120,8 @@ async def login_for_access_token(
             data={"sub": user.email}, expires_delta=access_token_expires
         )
         
-        logger.info(f"Login successful for user: {form_data.username}")
+        logger.info("Login successful for user: %s", form_data.username)
+        after_login(user, form_data.password)
         
         # Create response with token
         token_response = {"access_token": access_token, "token_type": "bearer"}
@@ -104,30 +132,15 @@ async def login_for_access_token(
         logger.error(traceback.format_exc())
         raise
 
-@router.options("/token")
-async def options_token(response: Response, request: Request):
-    # Handle preflight request for the token endpoint
-    origin = request.headers.get("origin")
-    if origin:
-        # Add CORS headers for preflight request
-        response.headers["Access-Control-Allow-Origin"] = origin
-        response.headers["Access-Control-Allow-Methods"] = "POST, OPTIONS"
-        response.headers["Access-Control-Allow-Headers"] = "Content-Type, Authorization, X-Requested-With, Cache-Control, Pragma, Expires"
-        response.headers["Access-Control-Allow-Credentials"] = "true"
-        response.headers["Access-Control-Max-Age"] = "86400"  # 24 hours
-    
-    logger.debug(f"Handled OPTIONS request for /token from origin: {origin}")
-    return {}
-
 # Special no-CORS token endpoint for direct form submission
-@router.post("/token-nocors")
+@router.post("/token-nocors", dependencies=[Depends(limit_login_attempts)])
 async def login_no_cors(request: Request, db: AsyncIOMotorDatabase = Depends(get_database)):
     try:
         form_data = await request.form()
         username = form_data.get("username")
         password = form_data.get("password")
         
-        logger.info(f"No-CORS login attempt for user: {username}")
+        logger.info("No-CORS login attempt for user: %s", username)
         
         if db is None:
             logger.error("Database connection is None!")
@@ -138,7 +151,8 @@ async def login_no_cors(request: Request, db: AsyncIOMotorDatabase = Depends(get
             
         user = await authenticate_user(db, username, password)
         if not user:
-            logger.warning(f"No-CORS authentication failed for user: {username}")
+            logger.warning("No-CORS authentication failed for user: %s", username)
+            audit("login_failed", email=username)
             return JSONResponse(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 content={"detail": "Incorrect email or password"},
@@ -153,17 +167,8 @@ async def login_no_cors(request: Request, db: AsyncIOMotorDatabase = Depends(get
             content={"access_token": access_token, "token_type": "bearer"}
         )
         
-        # Add CORS headers to allow any origin
-        origin = request.headers.get("origin")
-        if origin:
-            response.headers["Access-Control-Allow-Origin"] = origin
-            response.headers["Access-Control-Allow-Credentials"] = "true"
-            response.headers["Access-Control-Allow-Methods"] = "POST, OPTIONS"
-            response.headers["Access-Control-Allow-Headers"] = "Content-Type, Authorization, X-Requested-With, Cache-Control, Pragma, Expires"
-        else:
-            response.headers["Access-Control-Allow-Origin"] = "*"
-        
-        logger.info(f"No-CORS login successful for user: {username}")
+        logger.info("No-CORS login successful for user: %s", username)
+        after_login(user, password)
         return response
     except Exception as e:
         logger.error(f"Error in login_no_cors: {str(e)}")
@@ -180,7 +185,7 @@ async def read_users_me(
 ):
     """Get current user profile"""
     try:
-        logger.info(f"User profile accessed: {current_user.email}")
+        logger.info("User profile accessed: %s", current_user.email)
         
         # Get fresh user data from database
         user = await db.users.find_one({"email": current_user.email})
@@ -200,15 +205,8 @@ async def read_users_me(
             except ValueError:
                 user["created_at"] = datetime.utcnow()
         
-        # Convert to User model
-        return User(
-            id=str(user["_id"]),
-            email=user["email"],
-            name=user["name"],
-            is_active=user.get("is_active", True),
-            created_at=user["created_at"],
-            address=user.get("address")
-        )
+        # Only the User fields are sent; the document is trusted, so no re-validation
+        return FastJSONResponse(serialize_user(user))
     except Exception as e:
         logger.error(f"Error in read_users_me: {str(e)}")
         raise HTTPException(
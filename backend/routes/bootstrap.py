@@ -0,0 +1,88 @@
+import asyncio
+import logging
+import os
+from typing import Annotated, Any, Dict, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Response
+
+from database import get_database
+from models.user import serialize_address, serialize_user_in_db
+from routes.menu import menu_history, menu_views
+from routes.voice_agent import cached_voices
+from utils.auth import get_optional_user_email, get_user
+from utils.fast_json import dumps
+
+logger = logging.getLogger("global_estates")
+
+router = APIRouter()
+
+BOOTSTRAP_FIELDS = ("menu", "categories", "user", "address", "voices")
+# Ultravox is only asked on a voices cache miss; app start should not wait long for it
+BOOTSTRAP_VOICES_TIMEOUT = float(os.getenv("BOOTSTRAP_VOICES_TIMEOUT", "2"))
+
+async def _load_user(email: str) -> Optional[Any]:
+    db = get_database()
+    if db is None:
+        raise RuntimeError("database unavailable")
+    return await get_user(db, email)
+
+@router.get("/bootstrap")
+async def bootstrap(
+    email: Annotated[Optional[str], Depends(get_optional_user_email)],
+    fields: Optional[str] = None,
+):
+    """Everything the frontend loads on start, in one response.
+
+    ``fields`` is a comma-separated subset of menu, categories, user, address
+    and voices. A section that cannot be loaded is null and named in
+    ``errors``; the rest of the document is still returned.
+    """
+    wanted = BOOTSTRAP_FIELDS if not fields else tuple(field.strip() for field in fields.split(",") if field.strip())
+    unknown = [field for field in wanted if field not in BOOTSTRAP_FIELDS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown bootstrap fields: {', '.join(unknown)}")
+
+    # The user lookup (one, for both user and address) and the voices fetch run concurrently
+    needs_user = email is not None and ("user" in wanted or "address" in wanted)
+    user_result, voices_result = await asyncio.gather(
+        _load_user(email) if needs_user else asyncio.sleep(0),
+        asyncio.wait_for(cached_voices(BOOTSTRAP_VOICES_TIMEOUT), BOOTSTRAP_VOICES_TIMEOUT)
+        if "voices" in wanted else asyncio.sleep(0),
+        return_exceptions=True,
+    )
+
+    parts: Dict[str, bytes] = {}
+    errors: Dict[str, str] = {}
+    if "menu" in wanted or "categories" in wanted:
+        views = menu_views()
+        if "menu" in wanted:
+            parts["menu"] = views["json"]
+            # Starting point for GET /api/menu/changes
+            parts["menuVersion"] = dumps(menu_history.version)
+        if "categories" in wanted:
+            parts["categories"] = dumps(views["categories"])
+
+    user = None
+    if isinstance(user_result, BaseException):
+        logger.error(f"Bootstrap user lookup failed: {user_result}")
+        errors["user"] = "unavailable"
+    elif needs_user:
+        user = user_result if user_result is not None and user_result.is_active else None
+    if "user" in wanted:
+        parts["user"] = dumps(serialize_user_in_db(user) if user is not None else None)
+    if "address" in wanted:
+        address = user.address if user is not None else None
+        parts["address"] = dumps(serialize_address(address) if address is not None else None)
+
+    if "voices" in wanted:
+        if isinstance(voices_result, BaseException) or voices_result is None:
+            logger.warning(f"Bootstrap voices unavailable: {voices_result!r}")
+            errors["voices"] = "unavailable"
+            voices_result = None
+        parts["voices"] = dumps(voices_result)
+
+    if errors:
+        parts["errors"] = dumps(errors)
+    # Sections are already JSON; the menu in particular is serialized once per load
+    body = b"{" + b",".join(b'"' + name.encode("ascii") + b'":' + value for name, value in parts.items()) + b"}"
+    return Response(content=body, media_type="application/json")
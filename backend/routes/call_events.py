@@ -0,0 +1,123 @@
+import asyncio
+import json
+import logging
+import os
+from typing import Any, Dict
+
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import StreamingResponse
+
+from utils.cache import TTLCache
+from utils.call_events import (
+    WEBHOOK_REJECTIONS,
+    TERMINAL_EVENTS,
+    format_sse,
+    hub,
+    publish_event,
+    verify_webhook,
+)
+from utils.call_registry import call_registry
+
+logger = logging.getLogger("global_estates")
+
+router = APIRouter()
+
+ULTRAVOX_WEBHOOK_SECRET = os.getenv("ULTRAVOX_WEBHOOK_SECRET")
+# Deliveries signed longer ago than this are refused as replays
+WEBHOOK_TOLERANCE_SECONDS = float(os.getenv("WEBHOOK_TOLERANCE_SECONDS", "300"))
+MAX_WEBHOOK_BODY = 64 * 1024
+# Idle streams get a comment line this often so proxies keep them open
+SSE_KEEPALIVE_SECONDS = float(os.getenv("SSE_KEEPALIVE_SECONDS", "15"))
+
+# Ultravox retries deliveries it did not see acknowledged; process each once
+recent_deliveries = TTLCache("webhook_deliveries", ttl=600)
+
+# Webhook endpoint for Ultravox call events (call.started, call.joined, call.ended, ...)
+@router.post("/webhooks/ultravox")
+async def receive_ultravox_webhook(request: Request):
+    if not ULTRAVOX_WEBHOOK_SECRET:
+        raise HTTPException(status_code=503, detail="Webhook secret not configured")
+
+    body = await request.body()
+    if len(body) > MAX_WEBHOOK_BODY:
+        WEBHOOK_REJECTIONS.labels("too_large").inc()
+        raise HTTPException(status_code=413, detail="Webhook body too large")
+
+    rejection = verify_webhook(
+        ULTRAVOX_WEBHOOK_SECRET,
+        body,
+        request.headers.get("x-ultravox-webhook-timestamp"),
+        request.headers.get("x-ultravox-webhook-signature"),
+        WEBHOOK_TOLERANCE_SECONDS,
+    )
+    if rejection:
+        WEBHOOK_REJECTIONS.labels(rejection).inc()
+        logger.warning("Rejected Ultravox webhook: %s", rejection)
+        raise HTTPException(status_code=401, detail="Invalid webhook signature")
+
+    try:
+        payload = json.loads(body)
+        event_type = payload["event"]
+        call = payload.get("call") or {}
+        call_id = call["callId"]
+    except (ValueError, KeyError, TypeError):
+        WEBHOOK_REJECTIONS.labels("malformed").inc()
+        raise HTTPException(status_code=400, detail="Malformed webhook payload")
+
+    delivery_key = f"{event_type}:{call_id}"
+    if recent_deliveries.get(delivery_key):
+        return {"status": "duplicate"}
+    recent_deliveries.set(delivery_key, True)
+
+    event: Dict[str, Any] = {"event": event_type, "callId": call_id}
+    for field in ("created", "joined", "ended", "endReason", "shortSummary"):
+        if call.get(field) is not None:
+            event[field] = call[field]
+
+    # Calls created elsewhere (another worker, a restart) become known here,
+    # keeping the owner and prior call stored by the worker that created them
+    if call_registry.get(call_id) is None and event_type not in TERMINAL_EVENTS:
+        await call_registry.adopt(call_id)
+    publish_event(event)
+    logger.info("Ultravox webhook %s for call %s", event_type, call_id)
+    return {"status": "ok"}
+
+async def event_stream(call_id: str):
+    """Server-sent events for one call, ending after its terminal event.
+
+    The subscription is taken once the response starts streaming, so a client
+    that disconnects before that never leaves a queue behind.
+    """
+    queue = None
+    try:
+        queue = hub.subscribe(call_id)
+        record = call_registry.get(call_id)
+        state = {"event": "state", "callId": call_id, "known": record is not None}
+        if record is not None:
+            state["active"] = record.active
+            state["endReason"] = record.end_reason
+        yield format_sse(state)
+        if record is not None and not record.active:
+            return
+
+        while True:
+            try:
+                event = await asyncio.wait_for(queue.get(), SSE_KEEPALIVE_SECONDS)
+            except asyncio.TimeoutError:
+                yield b": keepalive\n\n"
+                continue
+            yield format_sse(event)
+            if event.get("event") in TERMINAL_EVENTS:
+                return
+    finally:
+        if queue is not None:
+            hub.unsubscribe(call_id, queue)
+
+# Live call state for the frontend, replacing polling of GET /calls/{call_id}
+@router.get("/calls/{call_id}/events")
+async def stream_call_events(call_id: str):
+    return StreamingResponse(
+        event_stream(call_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
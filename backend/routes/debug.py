@@ -0,0 +1,46 @@
+import asyncio
+import re
+
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import PlainTextResponse
+
+from utils.auth import require_admin
+from utils.loop_monitor import loop_monitor
+from utils.profiler import profiler
+
+router = APIRouter(dependencies=[Depends(require_admin)])
+
+MAX_PROFILE_WINDOW = 60
+PROFILE_ID = re.compile(r"^[0-9a-f]{16}$")
+
+@router.get("/loop")
+async def get_loop_report():
+    """Event loop lag and the most recent blocking calls, newest first"""
+    return loop_monitor.snapshot()
+
+@router.get("/profiles")
+async def list_profiles(limit: int = 50):
+    """Saved profiles, newest first"""
+    return {"profiles": await asyncio.to_thread(profiler.recent, limit)}
+
+@router.get("/profiles/{profile_id}", response_class=PlainTextResponse)
+async def get_profile(profile_id: str):
+    """Collapsed stacks, ready for flamegraph.pl or speedscope"""
+    collapsed = await asyncio.to_thread(profiler.read, profile_id) if PROFILE_ID.match(profile_id) else None
+    if collapsed is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return PlainTextResponse(collapsed)
+
+@router.post("/profiles")
+async def profile_window(seconds: float = 10):
+    """Profile everything this worker's event loop does for ``seconds``"""
+    if not 0 < seconds <= MAX_PROFILE_WINDOW:
+        raise HTTPException(status_code=400, detail=f"seconds must be between 0 and {MAX_PROFILE_WINDOW}")
+    profile = profiler.begin("window")
+    if profile is None:
+        raise HTTPException(status_code=429, detail="Too many profiles running")
+    try:
+        await asyncio.sleep(seconds)
+    finally:
+        profiler.end(profile)
+    return await asyncio.to_thread(profiler.save, profile)
@@ -0,0 +1,18 @@
+from fastapi import APIRouter
+from pydantic import BaseModel, Field
+from typing import List
+
+from utils import delivery_zones
+from utils.fast_json import FastJSONResponse
+
+router = APIRouter()
+
+MAX_BATCH = 1000
+
+class ServiceabilityRequest(BaseModel):
+    zipCodes: List[str] = Field(..., max_items=MAX_BATCH)
+
+@router.post("/check")
+async def check_serviceability(request: ServiceabilityRequest):
+    """Whether each postal code is delivered to, and by which zone (fee, minimum order, ETA)"""
+    return FastJSONResponse({"results": delivery_zones.check_many(request.zipCodes)})
@@ -2,45 +2,91 @@ from fastapi import APIRouter, HTTPException, Response
 from typing import List, Dict, Any
 import json
 import os
+import time
 import logging
 from pathlib import Path
 
+from utils.fast_json import dumps
+from utils.invalidation import bus
+from utils.menu_versions import MenuHistory
+from utils.metrics import MENU_CACHE_RELOADS
+
 # Get logger
 logger = logging.getLogger("global_estates")
 
 router = APIRouter()
 
+MENU_FILE_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), "public", "menuitems.json")
+
+# Parsed menu items, keyed by the file's modification time so edits to
+# menuitems.json are picked up without re-reading the file on every request.
+# The file is stat'ed at most once per MENU_CHECK_INTERVAL seconds; the worker
+# that notices a change tells the others through the invalidation bus.
+MENU_CHECK_INTERVAL = float(os.getenv("MENU_CHECK_INTERVAL", "1"))
+_menu_cache: Dict[str, Any] = {"mtime": None, "items": [], "checked_at": 0.0}
+
+def _on_menu_invalidated(key):
+    # Check the file on the next request instead of waiting for the interval
+    _menu_cache["checked_at"] = 0.0
+
+bus.subscribe("menu", _on_menu_invalidated)
+
+# Each load gets a version; diffs of the last MENU_HISTORY_SIZE reloads are kept
+# so clients can fetch only what changed (GET /api/menu/changes)
+MENU_HISTORY_SIZE = int(os.getenv("MENU_HISTORY_SIZE", "50"))
+menu_history = MenuHistory(MENU_HISTORY_SIZE)
+
+def _read_menu_file(menu_file_path: str) -> List[Dict[str, Any]]:
+    """Parse menu items from the JSON file"""
+    logger.info(f"Loading menu items from: {menu_file_path}")
+
+    with open(menu_file_path, "r", encoding='utf-8') as f:
+        menu_data = json.load(f)
+
+    # Check if the JSON has a categories structure or is a flat list
+    if isinstance(menu_data, list):
+        logger.info(f"Successfully loaded {len(menu_data)} menu items from direct list")
+        return menu_data
+    if "categories" in menu_data:
+        # Extract items from categories structure
+        items = []
+        for category_name, category_items in menu_data["categories"].items():
+            items.extend(category_items)
+        logger.info(f"Successfully loaded {len(items)} menu items from categories structure")
+        return items
+    if "items" in menu_data:
+        # Return the items array from the JSON
+        items = menu_data["items"]
+        logger.info(f"Successfully loaded {len(items)} menu items from items array")
+        return items
+
+    logger.error(f"Unexpected JSON structure: {list(menu_data.keys())}")
+    return []
+
 def load_menu_items() -> List[Dict[str, Any]]:
-    """Load menu items from the JSON file in the public directory"""
+    """Return menu items from public/menuitems.json, reloading only when the file changes.
+
+    The returned list is shared between requests and must not be mutated.
+    """
     try:
-        # Get the absolute path to public/menuitems.json
-        menu_file_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), "public", "menuitems.json")
-        logger.info(f"Loading menu items from: {menu_file_path}")
-        
-        with open(menu_file_path, "r", encoding='utf-8') as f:
-            menu_data = json.load(f)
-            
-            # Check if the JSON has a categories structure or is a flat list
-            if "categories" in menu_data:
-                # Extract items from categories structure
-                items = []
-                for category_name, category_items in menu_data["categories"].items():
-                    items.extend(category_items)
-                logger.info(f"Successfully loaded {len(items)} menu items from categories structure")
-                return items
-            elif "items" in menu_data:
-                # Return the items array from the JSON
-                items = menu_data["items"]
-                logger.info(f"Successfully loaded {len(items)} menu items from items array")
-                return items
-            else:
-                # Assume the JSON is already a list of items
-                if isinstance(menu_data, list):
-                    logger.info(f"Successfully loaded {len(menu_data)} menu items from direct list")
-                    return menu_data
-                else:
-                    logger.error(f"Unexpected JSON structure: {list(menu_data.keys())}")
-                    return []
+        now = time.monotonic()
+        if _menu_cache["mtime"] is not None and now - _menu_cache["checked_at"] < MENU_CHECK_INTERVAL:
+            return _menu_cache["items"]
+        _menu_cache["checked_at"] = now
+
+        mtime = os.stat(MENU_FILE_PATH).st_mtime_ns
+        if mtime == _menu_cache["mtime"]:
+            return _menu_cache["items"]
+
+        previous_mtime = _menu_cache["mtime"]
+        items = _read_menu_file(MENU_FILE_PATH)
+        menu_history.record(mtime, _menu_cache["items"] if previous_mtime is not None else None, items)
+        _menu_cache["mtime"] = mtime
+        _menu_cache["items"] = items
+        MENU_CACHE_RELOADS.inc()
+        if previous_mtime is not None:
+            bus.publish("menu")
+        return items
     except FileNotFoundError as e:
         logger.error(f"Menu file not found: {e}")
         return []
@@ -51,44 +97,56 @@ def load_menu_items() -> List[Dict[str, Any]]:
         logger.error(f"Unexpected error loading menu items: {e}")
         return []
 
-def add_cors_headers(response: Response):
-    """Add CORS headers to a response"""
-    response.headers["Access-Control-Allow-Origin"] = "*"
-    response.headers["Access-Control-Allow-Methods"] = "GET, OPTIONS"
-    response.headers["Access-Control-Allow-Headers"] = "Content-Type, Authorization"
-    return response
+# Views derived from the current menu, rebuilt when load_menu_items returns a new list
+_menu_views: Dict[str, Any] = {"items": None, "categories": [], "json": b"[]"}
+
+def menu_views() -> Dict[str, Any]:
+    """Current menu items with their sorted categories and pre-serialized JSON"""
+    items = load_menu_items()
+    if _menu_views["items"] is not items:
+        _menu_views.update(
+            items=items,
+            categories=sorted(set(item.get('category', '') for item in items)),
+            json=dumps(items),
+        )
+    return _menu_views
 
 @router.get("/")
 async def get_menu_items(response: Response):
     """Get all menu items"""
-    # Add CORS headers directly to this response
-    add_cors_headers(response)
-    
     menu_items = load_menu_items()
     if not menu_items:
         logger.warning("No menu items found")
         raise HTTPException(status_code=404, detail="Menu items not found")
     
-    logger.info(f"Returning {len(menu_items)} menu items")
+    logger.info("Returning %d menu items", len(menu_items))
+    response.headers["X-Menu-Version"] = str(menu_history.version)
     return menu_items
 
+@router.get("/changes")
+async def get_menu_changes(since: int):
+    """Items added, removed and changed since menu version ``since``.
+
+    ``resync`` is true when that version is no longer in the history (or was
+    never seen by this worker); the client should then fetch the full menu.
+    Added items replace any item the client has with the same id.
+    """
+    load_menu_items()
+    changes = menu_history.changes_since(since)
+    if changes is None:
+        return {"version": menu_history.version, "resync": True}
+    return {"version": menu_history.version, "resync": False, **changes}
+
 @router.get("/categories")
-async def get_categories(response: Response):
+async def get_categories():
     """Get all unique categories"""
-    # Add CORS headers directly to this response
-    add_cors_headers(response)
-    
-    menu_items = load_menu_items()
-    categories = sorted(list(set(item.get('category', '') for item in menu_items)))
-    logger.info(f"Available categories: {categories}")
+    categories = menu_views()["categories"]
+    logger.info("Available categories: %s", categories)
     return {"categories": categories}
 
 @router.get("/category/{category}")
-async def get_items_by_category(category: str, response: Response):
+async def get_items_by_category(category: str):
     """Get menu items by category"""
-    # Add CORS headers directly to this response
-    add_cors_headers(response)
-    
     menu_items = load_menu_items()
     items = [item for item in menu_items if item.get('category', '').lower() == category.lower()]
     
@@ -96,11 +154,5 @@ async def get_items_by_category(category: str, response: Response):
         logger.warning(f"No items found in category: {category}")
         raise HTTPException(status_code=404, detail=f"No items found in category: {category}")
     
-    logger.info(f"Returning {len(items)} items for category: {category}")
+    logger.info("Returning %d items for category: %s", len(items), category)
     return items
-
-@router.options("/{path:path}")
-async def options_route(path: str, response: Response):
-    """Handle OPTIONS requests for CORS preflight"""
-    add_cors_headers(response)
-    return {"status": "ok"} 
\ No newline at end of file
@@ -3,9 +3,23 @@ from pydantic import BaseModel
 from typing import List
 from datetime import datetime
 import json
+import logging
+import os
+
+from routes.tools import get_menu_index
+from utils import delivery_zones
+from utils.audit import audit
+from utils.fast_json import FastJSONResponse, compile_serializer
+from utils.jobs import PRIORITY_HIGH, jobs
+from utils.order_analytics import order_analytics
+
+logger = logging.getLogger("global_estates")
 
 router = APIRouter()
 
+# Receives every new order and status change as JSON; without it they are only logged
+ORDER_WEBHOOK_URL = os.getenv("ORDER_WEBHOOK_URL")
+
 class OrderItem(BaseModel):
     id: str
     quantity: int
@@ -20,18 +34,48 @@ class Order(BaseModel):
     delivery_address: str
     payment_method: str
 
+serialize_order = compile_serializer(Order)
+
 # In-memory storage for orders (replace with MongoDB later)
 orders = []
 
+@jobs.handler("order.notify", priority=PRIORITY_HIGH, max_attempts=5, timeout=10)
+async def notify_order(order: dict):
+    if not ORDER_WEBHOOK_URL:
+        logger.info("Order %s is %s", order["order_id"], order["status"])
+        return
+    import httpx
+
+    async with httpx.AsyncClient(timeout=10) as client:
+        response = await client.post(ORDER_WEBHOOK_URL, json=order)
+        response.raise_for_status()
+
+def item_category(item_id: str):
+    item = get_menu_index().get(item_id)
+    return item.get("category") if item is not None else None
+
 @router.post("/")
 async def create_order(order: Order):
     """Create a new order"""
-    order_dict = order.dict()
+    # Addresses without a recognisable postal code are accepted as before
+    zip_code = delivery_zones.code_in_address(order.delivery_address)
+    zone = None
+    if zip_code is not None:
+        serviceable, zone = delivery_zones.check(zip_code)
+        if not serviceable:
+            raise HTTPException(status_code=422, detail=f"We do not deliver to {zip_code} yet")
+    order_dict = serialize_order(order)
     order_dict["order_id"] = f"ORD{len(orders) + 1:04d}"
     order_dict["status"] = "pending"
     order_dict["created_at"] = datetime.now().isoformat()
+    if zone is not None:
+        order_dict["delivery_zone"] = zone["id"]
     orders.append(order_dict)
-    return order_dict
+    order_analytics.record_order(order_dict, item_category)
+    # A copy, since status updates change the stored order before the job may run
+    jobs.enqueue("order.notify", dict(order_dict))
+    audit("order_created", order_id=order_dict["order_id"], total=order_dict["total"])
+    return FastJSONResponse(order_dict)
 
 @router.get("/{order_id}")
 async def get_order(order_id: str):
@@ -39,7 +83,7 @@ async def get_order(order_id: str):
     order = next((order for order in orders if order["order_id"] == order_id), None)
     if not order:
         raise HTTPException(status_code=404, detail="Order not found")
-    return order
+    return FastJSONResponse(order)
 
 @router.put("/{order_id}/status")
 async def update_order_status(order_id: str, status: str):
@@ -49,5 +93,9 @@ async def update_order_status(order_id: str, status: str):
         raise HTTPException(status_code=404, detail="Order not found")
     if status not in ["pending", "confirmed", "preparing", "ready", "delivered", "cancelled"]:
         raise HTTPException(status_code=400, detail="Invalid status")
+    previous = order["status"]
     order["status"] = status
-    return order 
\ No newline at end of file
+    order_analytics.record_status(order, previous, status, item_category)
+    jobs.enqueue("order.notify", dict(order))
+    audit("order_status", order_id=order_id, previous=previous, status=status)
+    return FastJSONResponse(order) 
\ No newline at end of file
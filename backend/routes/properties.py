@@ -0,0 +1,163 @@
+import json
+import logging
+import os
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+
+from models.property import LOCATION_COORDINATES, PropertyPage, mock_properties
+from utils.fast_json import FastJSONResponse
+from utils.property_index import PropertyIndex
+
+logger = logging.getLogger("global_estates")
+
+router = APIRouter()
+
+# A JSON list of listings (or {"properties": [...]}); without one the
+# frontend's mock listings are served
+PROPERTIES_FILE = os.getenv("PROPERTIES_FILE")
+PROPERTIES_MOCK_COUNT = int(os.getenv("PROPERTIES_MOCK_COUNT", "100"))
+PROPERTIES_CHECK_INTERVAL = float(os.getenv("PROPERTIES_CHECK_INTERVAL", "5"))
+MAX_PAGE_SIZE = 100
+MAX_NEAREST = 50
+MAX_RADIUS_KM = 500
+
+_state: Dict[str, Any] = {"index": None, "mtime": None, "checked_at": 0.0}
+
+def _read_properties_file(path: str) -> List[Dict[str, Any]]:
+    logger.info(f"Loading properties from: {path}")
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    return data if isinstance(data, list) else data.get("properties", [])
+
+def get_property_index() -> PropertyIndex:
+    """Index of the current listings, rebuilt when PROPERTIES_FILE changes"""
+    index = _state["index"]
+    if not PROPERTIES_FILE:
+        if index is None:
+            index = _state["index"] = PropertyIndex(mock_properties(PROPERTIES_MOCK_COUNT))
+        return index
+
+    now = time.monotonic()
+    if index is not None and now - _state["checked_at"] < PROPERTIES_CHECK_INTERVAL:
+        return index
+    _state["checked_at"] = now
+    try:
+        mtime = os.stat(PROPERTIES_FILE).st_mtime_ns
+        if mtime != _state["mtime"]:
+            start = time.perf_counter()
+            index = _state["index"] = PropertyIndex(_read_properties_file(PROPERTIES_FILE))
+            _state["mtime"] = mtime
+            logger.info("Indexed %d properties in %.0f ms", len(index), (time.perf_counter() - start) * 1000)
+    except (OSError, ValueError, KeyError, TypeError) as e:
+        # Keep serving the previous listings rather than none
+        logger.error(f"Error loading properties from {PROPERTIES_FILE}: {e}")
+        if index is None:
+            index = _state["index"] = PropertyIndex([])
+    return index
+
+def resolve_place(place: str) -> Tuple[float, float]:
+    """Centre of a known neighbourhood or city, e.g. "Downtown Dubai" or "manhattan" """
+    needle = place.casefold().strip()
+    for name, coordinates in LOCATION_COORDINATES.items():
+        if needle and needle in name.casefold():
+            return coordinates
+    raise HTTPException(status_code=400, detail=f"Unknown place: {place}")
+
+def _point(lat: Optional[float], lng: Optional[float], place: Optional[str]) -> Optional[Tuple[float, float]]:
+    if place:
+        return resolve_place(place)
+    if lat is None and lng is None:
+        return None
+    if lat is None or lng is None:
+        raise HTTPException(status_code=400, detail="lat and lng must be given together")
+    return lat, lng
+
+def _bbox(bbox: Optional[str]) -> Optional[Tuple[float, float, float, float]]:
+    if bbox is None:
+        return None
+    try:
+        south, west, north, east = (float(part) for part in bbox.split(","))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="bbox must be south,west,north,east")
+    if south > north or west > east:
+        raise HTTPException(status_code=400, detail="bbox must be south,west,north,east")
+    return south, west, north, east
+
+def property_filters(
+    minPrice: Optional[float] = None,
+    maxPrice: Optional[float] = None,
+    bedrooms: Optional[str] = Query(None, description='Exact count, or "N+" for at least N'),
+    bathrooms: Optional[str] = Query(None, description='Exact count, or "N+" for at least N'),
+    propertyType: List[str] = Query([]),
+    listingType: List[str] = Query([]),
+    features: List[str] = Query([]),
+    amenities: List[str] = Query([], description='Nearby amenities; "Metro Station" matches the "Near Metro Station" feature'),
+    location: Optional[str] = None,
+    minArea: Optional[int] = None,
+    maxArea: Optional[int] = None,
+    bbox: Optional[str] = Query(None, description="south,west,north,east"),
+) -> Dict[str, Any]:
+    """Attribute and bounding-box filters shared by the property endpoints, as PropertyIndex arguments"""
+    return {
+        "min_price": minPrice, "max_price": maxPrice, "beds": bedrooms, "baths": bathrooms,
+        "property_types": propertyType, "listing_types": listingType,
+        "features": [*features, *(f"Near {amenity}" for amenity in amenities)],
+        "location": location, "min_area": minArea, "max_area": maxArea, "bbox": _bbox(bbox),
+    }
+
+@router.get("/search", response_model=PropertyPage)
+async def search_properties(
+    filters: Dict[str, Any] = Depends(property_filters),
+    lat: Optional[float] = Query(None, ge=-90, le=90),
+    lng: Optional[float] = Query(None, ge=-180, le=180),
+    place: Optional[str] = Query(None, description="A known neighbourhood or city instead of lat/lng"),
+    radiusKm: Optional[float] = Query(None, gt=0, le=MAX_RADIUS_KM),
+    sort: str = Query("price_asc", regex="^price_(asc|desc)$"),
+    cursor: Optional[str] = None,
+    limit: int = Query(20, ge=1, le=MAX_PAGE_SIZE),
+):
+    """Listings matching every given filter, ordered by price.
+
+    With ``radiusKm`` and a point (``lat``/``lng`` or ``place``) only
+    listings within that distance match. Pass ``nextCursor`` from a response
+    as ``cursor`` to get the next page; ``total`` counts all matches, not
+    just the page.
+    """
+    point = _point(lat, lng, place)
+    if radiusKm is not None:
+        if point is None:
+            raise HTTPException(status_code=400, detail="radiusKm needs lat/lng or place")
+        filters["near"] = (*point, radiusKm)
+    index = get_property_index()
+    try:
+        page = index.search(descending=sort == "price_desc", cursor=cursor, limit=limit, **filters)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return FastJSONResponse(page)
+
+@router.get("/nearest")
+async def nearest_properties(
+    filters: Dict[str, Any] = Depends(property_filters),
+    lat: Optional[float] = Query(None, ge=-90, le=90),
+    lng: Optional[float] = Query(None, ge=-180, le=180),
+    place: Optional[str] = Query(None, description="A known neighbourhood or city instead of lat/lng"),
+    limit: int = Query(5, ge=1, le=MAX_NEAREST),
+):
+    """The listings closest to a point, nearest first, each with ``distanceKm``.
+
+    Meant for the voice agent ("the closest villas to Dubai Marina"); the
+    attribute filters are the same as for search.
+    """
+    point = _point(lat, lng, place)
+    if point is None:
+        raise HTTPException(status_code=400, detail="lat/lng or place is required")
+    index = get_property_index()
+    try:
+        nearest = index.nearest(*point, limit, **{key: value for key, value in filters.items() if value not in (None, [])})
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return FastJSONResponse({
+        "items": [{**listing, "distanceKm": round(km, 3)} for km, listing in nearest],
+    })
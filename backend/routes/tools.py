@@ -0,0 +1,198 @@
+import hmac
+import json
+import logging
+import os
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Request, Response
+from pydantic import BaseModel
+
+from routes.menu import load_menu_items
+from utils.call_registry import call_registry
+from utils.menu_index import MenuIndex
+from utils.metrics import Counter, Histogram
+from utils.order_analytics import order_analytics
+from utils.tool_carts import CartLimitError, carts
+
+logger = logging.getLogger("global_estates")
+
+router = APIRouter()
+
+# Shared with Ultravox as a static header on each tool definition
+TOOL_SECRET = os.getenv("TOOL_SECRET")
+# Tool answers are on the voice turn's critical path; slower ones are logged
+TOOL_LATENCY_BUDGET = float(os.getenv("TOOL_LATENCY_BUDGET_MS", "20")) / 1000
+MAX_TOOL_RESULTS = 5
+# Upper bound on one cart line, across every add for that item in the call
+MAX_QUANTITY = 20
+
+TOOL_DURATION = Histogram(
+    "voice_tool_duration_seconds", "Time spent answering Ultravox tool calls", ["tool"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1),
+)
+TOOL_OVER_BUDGET = Counter(
+    "voice_tool_over_budget_total", "Tool calls answered slower than TOOL_LATENCY_BUDGET_MS", ["tool"]
+)
+
+_index: Optional[MenuIndex] = None
+_indexed_items: Optional[List[Dict[str, Any]]] = None
+
+def get_menu_index() -> MenuIndex:
+    """Index of the current menu, rebuilt whenever the menu cache reloads the file"""
+    global _index, _indexed_items
+    items = load_menu_items()
+    # load_menu_items returns the same list object until the file changes
+    if items is not _indexed_items:
+        _index = MenuIndex(items)
+        _indexed_items = items
+    return _index
+
+def verify_tool_secret(x_tool_secret: Optional[str] = Header(None)):
+    # Compared as bytes: compare_digest raises TypeError for non-ASCII str
+    if TOOL_SECRET and not hmac.compare_digest((x_tool_secret or "").encode("latin-1"), TOOL_SECRET.encode("utf-8")):
+        raise HTTPException(status_code=401, detail="Invalid tool secret")
+
+@contextmanager
+def tool_budget(tool: str):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        TOOL_DURATION.labels(tool).observe(elapsed)
+        if elapsed > TOOL_LATENCY_BUDGET:
+            TOOL_OVER_BUDGET.labels(tool).inc()
+            logger.warning("Tool %s took %.1f ms (budget %.1f ms)", tool, elapsed * 1000, TOOL_LATENCY_BUDGET * 1000)
+
+def json_bytes(data: Any) -> bytes:
+    return json.dumps(data, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+def tool_response(body: bytes) -> Response:
+    return Response(content=body, media_type="application/json")
+
+def _cart_summary(index: MenuIndex, cart: Dict[str, int]) -> Dict[str, Any]:
+    total = sum(index.by_id[item_id]["price"] * quantity for item_id, quantity in cart.items() if item_id in index.by_id)
+    return {"cartItems": sum(cart.values()), "total": total}
+
+class LookupMenuItem(BaseModel):
+    query: str
+    limit: int = 3
+
+class AddToCart(BaseModel):
+    callId: str
+    itemId: Optional[str] = None
+    name: Optional[str] = None
+    quantity: int = 1
+
+class QuoteOrder(BaseModel):
+    callId: str
+
+class PopularItems(BaseModel):
+    limit: int = 3
+
+@router.post("/menu/lookup", dependencies=[Depends(verify_tool_secret)])
+async def lookup_menu_item(body: LookupMenuItem):
+    """Menu items matching what the caller asked for, best match first"""
+    with tool_budget("lookup_menu_item"):
+        index = get_menu_index()
+        matches = index.find(body.query, max(1, min(body.limit, MAX_TOOL_RESULTS)))
+        if not matches:
+            return tool_response(json_bytes({"items": [], "message": f"No menu items match {body.query!r}"}))
+        return tool_response(b'{"items":[' + b",".join(index.fragments[item_id] for item_id in matches) + b"]}")
+
+@router.post("/cart/add", dependencies=[Depends(verify_tool_secret)])
+async def add_to_cart(body: AddToCart):
+    """Add an item, by id or spoken name, to the call's cart"""
+    with tool_budget("add_to_cart"):
+        index = get_menu_index()
+        item_id = index.resolve(body.itemId, body.name)
+        if item_id is None:
+            return tool_response(json_bytes({"added": None, "message": "No matching menu item; look it up first"}))
+        if not 1 <= body.quantity <= MAX_QUANTITY:
+            return tool_response(json_bytes({"added": None, "message": f"Quantity must be between 1 and {MAX_QUANTITY}"}))
+
+        try:
+            cart = await carts.add(body.callId, item_id, body.quantity, limit=MAX_QUANTITY)
+        except CartLimitError:
+            return tool_response(json_bytes({"added": None, "message": f"At most {MAX_QUANTITY} of one item per order"}))
+        except Exception as e:
+            logger.error("Error updating cart for call %s: %s", body.callId, e)
+            return tool_response(json_bytes({"added": None, "message": "The cart is unavailable; try again"}))
+        call_registry.touch(body.callId)
+        summary = json_bytes({"quantity": cart[item_id], **_cart_summary(index, cart)})
+        return tool_response(b'{"added":' + index.fragments[item_id] + b"," + summary[1:])
+
+@router.post("/menu/popular", dependencies=[Depends(verify_tool_secret)])
+async def popular_menu_items(body: PopularItems):
+    """Best-selling items still on the menu, for "what do people usually order?" """
+    with tool_budget("popular_menu_items"):
+        index = get_menu_index()
+        limit = max(1, min(body.limit, MAX_TOOL_RESULTS))
+        # Extra candidates in case some have since left the menu
+        ranked = order_analytics.popular_items(limit + MAX_TOOL_RESULTS)
+        fragments = [index.fragments[item["id"]] for item in ranked if item["id"] in index.fragments][:limit]
+        if not fragments:
+            return tool_response(json_bytes({"items": [], "message": "No orders yet; suggest something from the menu"}))
+        return tool_response(b'{"items":[' + b",".join(fragments) + b"]}")
+
+@router.post("/order/quote", dependencies=[Depends(verify_tool_secret)])
+async def quote_order(body: QuoteOrder):
+    """Current cart as order items (the shape POST /api/orders takes) with its total"""
+    with tool_budget("quote_order"):
+        index = get_menu_index()
+        try:
+            cart = await carts.get(body.callId)
+        except Exception as e:
+            logger.error("Error reading cart for call %s: %s", body.callId, e)
+            return tool_response(json_bytes({"items": [], "message": "The cart is unavailable; try again"}))
+        items = []
+        for item_id, quantity in cart.items():
+            item = index.get(item_id)
+            if item is not None:
+                items.append({"id": item_id, "name": item.get("name"), "price": item["price"], "quantity": quantity})
+        return tool_response(json_bytes({"items": items, **_cart_summary(index, cart)}))
+
+def tool_definitions(base_url: str) -> List[Dict[str, Any]]:
+    """Ultravox ``selectedTools`` entries pointing at this server"""
+    call_id = {"name": "callId", "location": "PARAMETER_LOCATION_BODY", "knownValue": "KNOWN_PARAM_CALL_ID"}
+
+    def parameter(name: str, kind: str, description: str, required: bool = True):
+        return {
+            "name": name,
+            "location": "PARAMETER_LOCATION_BODY",
+            "schema": {"type": kind, "description": description},
+            "required": required,
+        }
+
+    def tool(name: str, description: str, path: str, parameters, automatic=()):
+        definition = {
+            "modelToolName": name,
+            "description": description,
+            "dynamicParameters": list(parameters),
+            "automaticParameters": list(automatic),
+            "http": {"baseUrlPattern": f"{base_url.rstrip('/')}/api/tools{path}", "httpMethod": "POST"},
+        }
+        if TOOL_SECRET:
+            definition["staticParameters"] = [
+                {"name": "X-Tool-Secret", "location": "PARAMETER_LOCATION_HEADER", "value": TOOL_SECRET}
+            ]
+        return {"temporaryTool": definition}
+
+    return [
+        tool("lookupMenuItem", "Find menu items by name or category, with prices.", "/menu/lookup",
+             [parameter("query", "string", "What the customer asked for")]),
+        tool("addToCart", "Add a menu item to the customer's order.", "/cart/add",
+             [parameter("itemId", "string", "Item id from lookupMenuItem", required=False),
+              parameter("name", "string", "Item name, if the id is not known", required=False),
+              parameter("quantity", "integer", "How many to add", required=False)],
+             [call_id]),
+        tool("popularItems", "The menu items customers order most, for recommendations.", "/menu/popular", []),
+        tool("quoteOrder", "Read back the customer's order and its total.", "/order/quote", [], [call_id]),
+    ]
+
+# Tool definitions for call profiles; includes the tool secret, so it is protected by it too
+@router.get("/definitions", dependencies=[Depends(verify_tool_secret)])
+async def get_tool_definitions(request: Request, baseUrl: Optional[str] = None):
+    return {"selectedTools": tool_definitions(baseUrl or str(request.base_url))}
@@ -1,11 +1,14 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Response, Request
+from fastapi import APIRouter, Depends, HTTPException, status
 from typing import Annotated, List
 import logging
-from datetime import datetime
 
-from models.user import User, Address
+from models.user import User, Address, serialize_address, serialize_user
 from utils.auth import get_current_active_user
+from utils.delivery_zones import check as check_serviceability
+from utils.invalidation import bus
 from database import get_database
+from utils.metrics import MONGO_OPERATION_DURATION
+from utils.fast_json import FastJSONResponse
 
 # Get logger
 logger = logging.getLogger("global_estates")
@@ -14,25 +17,14 @@ router = APIRouter()
 
 @router.post("/address", response_model=User)
 async def update_user_address(
-    request: Request,
-    response: Response,
     address: Address,
     current_user: Annotated[User, Depends(get_current_active_user)],
     db = Depends(get_database)
 ):
     """Update the current user's delivery address"""
     try:
-        logger.info(f"Updating address for user: {current_user.email}")
-        logger.debug(f"Address data received: {address.model_dump()}")
-        
-        # Add CORS headers
-        origin = request.headers.get("origin")
-        if origin:
-            response.headers["Access-Control-Allow-Origin"] = origin
-            response.headers["Access-Control-Allow-Credentials"] = "true"
-            response.headers["Access-Control-Allow-Methods"] = "*"
-            response.headers["Access-Control-Allow-Headers"] = "Content-Type, Authorization, Cache-Control, Pragma, Expires, X-Requested-With"
-            response.headers["Access-Control-Max-Age"] = "86400"  # Cache preflight response for 24 hours
+        logger.info("Updating address for user: %s", current_user.email)
+        logger.debug("Address data received: %s", address)
         
         # Check if database connection is available
         if db is None:
@@ -42,17 +34,26 @@ async def update_user_address(
                 detail="Database connection failed"
             )
 
+        serviceable, _ = check_serviceability(address.zipCode)
+        if not serviceable:
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail=f"We do not deliver to {address.zipCode} yet"
+            )
+
         # Validate address data
-        address_dict = address.model_dump()
-        logger.debug(f"Converted address to dict: {address_dict}")
+        address_dict = serialize_address(address)
+        logger.debug("Converted address to dict: %s", address_dict)
         
         # Update user in database
         try:
-            result = await db.users.update_one(
-                {"email": current_user.email},
-                {"$set": {"address": address_dict}}
-            )
-            logger.debug(f"Update result: {result.raw_result}")
+            with MONGO_OPERATION_DURATION.labels("users.update_one").time():
+                result = await db.users.update_one(
+                    {"email": current_user.email},
+                    {"$set": {"address": address_dict}}
+                )
+            bus.publish("users", current_user.email)
+            logger.debug("Update result: %s", result.raw_result)
         except Exception as db_error:
             logger.error(f"Database update error: {str(db_error)}")
             raise HTTPException(
@@ -62,7 +63,8 @@ async def update_user_address(
         
         if result.modified_count == 0:
             # Check if the document exists but no changes were made
-            existing_user = await db.users.find_one({"email": current_user.email})
+            with MONGO_OPERATION_DURATION.labels("users.find_one").time():
+                existing_user = await db.users.find_one({"email": current_user.email})
             if not existing_user:
                 logger.error(f"User not found during update: {current_user.email}")
                 raise HTTPException(
@@ -73,7 +75,8 @@ async def update_user_address(
                 logger.info("No changes made to address (data might be the same)")
         
         # Get updated user
-        updated_user = await db.users.find_one({"email": current_user.email})
+        with MONGO_OPERATION_DURATION.labels("users.find_one").time():
+            updated_user = await db.users.find_one({"email": current_user.email})
         if not updated_user:
             logger.error(f"User not found after update: {current_user.email}")
             raise HTTPException(
@@ -81,19 +84,12 @@ async def update_user_address(
                 detail="User not found"
             )
         
-        # Convert to User model with proper datetime handling
-        user_data = {
-            "id": str(updated_user["_id"]),
-            "email": updated_user["email"],
-            "name": updated_user["name"],
-            "is_active": updated_user.get("is_active", True),
-            "created_at": updated_user.get("created_at", datetime.utcnow()),  # Provide default if missing
-            "address": updated_user.get("address")
-        }
+        # Only the User fields are sent (created_at defaults to now if missing)
+        user_data = serialize_user(updated_user)
         
-        logger.info(f"Address updated successfully for user: {current_user.email}")
-        logger.debug(f"Returning user data: {user_data}")
-        return user_data
+        logger.info("Address updated successfully for user: %s", current_user.email)
+        logger.debug("Returning user data: %s", user_data)
+        return FastJSONResponse(user_data)
     
     except HTTPException as http_ex:
         logger.error(f"HTTP Exception in update_user_address: {str(http_ex)}")
@@ -108,26 +104,16 @@ async def update_user_address(
 
 @router.get("/address", response_model=Address)
 async def get_user_address(
-    request: Request,
-    response: Response,
     current_user: Annotated[User, Depends(get_current_active_user)],
     db = Depends(get_database)
 ):
     """Get the current user's delivery address"""
     try:
-        logger.info(f"Fetching address for user: {current_user.email}")
-        
-        # Add CORS headers
-        origin = request.headers.get("origin")
-        if origin:
-            response.headers["Access-Control-Allow-Origin"] = origin
-            response.headers["Access-Control-Allow-Credentials"] = "true"
-            response.headers["Access-Control-Allow-Methods"] = "*"
-            response.headers["Access-Control-Allow-Headers"] = "Content-Type, Authorization, Cache-Control, Pragma, Expires, X-Requested-With"
-            response.headers["Access-Control-Max-Age"] = "86400"  # Cache preflight response for 24 hours
+        logger.info("Fetching address for user: %s", current_user.email)
         
         # Get user from database
-        user = await db.users.find_one({"email": current_user.email})
+        with MONGO_OPERATION_DURATION.labels("users.find_one").time():
+            user = await db.users.find_one({"email": current_user.email})
         if not user:
             logger.error(f"User not found: {current_user.email}")
             raise HTTPException(
@@ -137,14 +123,14 @@ async def get_user_address(
         
         # Check if address exists
         if not user.get("address"):
-            logger.info(f"No address found for user: {current_user.email}")
+            logger.info("No address found for user: %s", current_user.email)
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="No address found"
             )
         
-        logger.info(f"Address retrieved successfully for user: {current_user.email}")
-        return user["address"]
+        logger.info("Address retrieved successfully for user: %s", current_user.email)
+        return FastJSONResponse(serialize_address(user["address"]))
     
     except HTTPException:
         raise
@@ -154,15 +140,3 @@ async def get_user_address(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Error fetching address: {str(e)}"
         )
-
-@router.options("/address")
-async def options_address(response: Response, request: Request):
-    """Handle OPTIONS request for the address endpoint"""
-    origin = request.headers.get("origin")
-    if origin:
-        response.headers["Access-Control-Allow-Origin"] = origin
-        response.headers["Access-Control-Allow-Methods"] = "*"
-        response.headers["Access-Control-Allow-Headers"] = "Content-Type, Authorization, Cache-Control, Pragma, Expires, X-Requested-With"
-        response.headers["Access-Control-Allow-Credentials"] = "true"
-        response.headers["Access-Control-Max-Age"] = "86400"  # Cache preflight response for 24 hours
-    return {} 
\ No newline at end of file
@@ -1,22 +1,31 @@
 import os
 import json
-import requests
 import logging
-from typing import Dict, Any, List
-from fastapi import APIRouter, HTTPException, Request
-from fastapi.responses import JSONResponse
-import httpx
+from typing import Dict, Any, List, Optional
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+from urllib.parse import parse_qs, urlsplit
 from dotenv import load_dotenv
 
+from utils.auth import get_optional_user_email
+from utils.cache import TTLCache
+from utils.call_profiles import get_call_profile, get_call_profiles
+from utils.call_registry import call_registry, StaleCallError
+from utils.metrics import ULTRAVOX_REQUEST_DURATION
+from utils.rate_limit import ConcurrencyLimiter, TokenBucketLimiter, concurrency_slot, limit_by_user_or_ip
+
 # Load environment variables
 load_dotenv()
 
 # Set up logging
-logger = logging.getLogger("GlobalEstates.voice_agent")
+logger = logging.getLogger("global_estates.voice_agent")
 
 # Create router
 router = APIRouter()
 
+# Payload fields that are never written to logs
+REDACTED_PAYLOAD_KEYS = frozenset(["systemPrompt", "selectedTools"])
+
 # Ultravox API configuration from environment variables
 ULTRAVOX_API_KEY = os.getenv("ULTRAVOX_API_KEY")
 ULTRAVOX_BASE_URL = os.getenv("ULTRAVOX_BASE_URL", "https://api.ultravox.ai")
@@ -25,9 +34,89 @@ ULTRAVOX_BASE_URL = os.getenv("ULTRAVOX_BASE_URL", "https://api.ultravox.ai")
 if not ULTRAVOX_API_KEY:
     logger.warning("ULTRAVOX_API_KEY environment variable not set. Voice agent functionality may not work.")
 
+# Call creation is limited per user (or IP for anonymous callers), and every
+# route that talks to Ultravox shares one pool of upstream slots; excess load
+# is shed with 429 instead of queueing on the upstream quota
+CALL_LIMITER = TokenBucketLimiter("voice_calls", os.getenv("CALL_RATE_LIMIT", "20/60"))
+ULTRAVOX_SLOTS = ConcurrencyLimiter(
+    "ultravox",
+    int(os.getenv("ULTRAVOX_MAX_CONCURRENCY", "32")),
+    max_wait=float(os.getenv("ULTRAVOX_QUEUE_TIMEOUT", "0.5")),
+)
+ultravox_slot = Depends(concurrency_slot(ULTRAVOX_SLOTS))
+
+# The voice catalog rarely changes; each worker keeps its own copy
+VOICES_CACHE_TTL = float(os.getenv("VOICES_CACHE_TTL", "300"))
+voices_cache = TTLCache("voices", VOICES_CACHE_TTL, max_entries=1)
+
+async def fetch_voices(client):
+    """Fetch the voice catalog from Ultravox, caching it on success"""
+    with ULTRAVOX_REQUEST_DURATION.labels("list_voices").time():
+        response = await client.get(
+            f"{ULTRAVOX_BASE_URL}/api/voices",
+            headers={
+                "X-API-Key": ULTRAVOX_API_KEY
+            }
+        )
+    if response.status_code == 200:
+        voices_cache.set("voices", response.json())
+    return response
+
+async def cached_voices(timeout: float) -> Optional[Any]:
+    """Voice catalog from the cache, or fetched within ``timeout``; None if Ultravox fails"""
+    import httpx
+
+    voices = voices_cache.get("voices")
+    if voices is not None or not ULTRAVOX_API_KEY:
+        return voices
+    async with ULTRAVOX_SLOTS:
+        async with httpx.AsyncClient(timeout=timeout) as client:
+            response = await fetch_voices(client)
+    if response.status_code != 200:
+        logger.error(f"Error fetching Ultravox voices: {response.status_code} - {response.text}")
+        return None
+    return voices_cache.get("voices")
+
+async def warm_voices_cache():
+    """Load the voice catalog before the worker accepts traffic"""
+    import httpx
+
+    if not ULTRAVOX_API_KEY:
+        return
+    async with httpx.AsyncClient() as client:
+        response = await fetch_voices(client)
+    if response.status_code != 200:
+        raise RuntimeError(f"Ultravox voices returned {response.status_code}")
+
+# Ultravox requires role to be an enum ASSISTANT or USER and medium VOICE or
+# TEXT (uppercase); the frontend sends either speaker/type or role/medium
+ASSISTANT_SPEAKERS = frozenset(["assistant", "agent"])
+
+def transform_initial_messages(messages: List[Dict[str, Any]]) -> List[Dict[str, str]]:
+    """Convert frontend messages to Ultravox's format, skipping malformed ones"""
+    transformed = []
+    for msg in messages:
+        try:
+            speaker = msg.get("speaker") or msg.get("role", "user")
+            msg_type = msg.get("type") or msg.get("medium", "text")
+            transformed.append({
+                "text": msg["text"],
+                "role": "ASSISTANT" if speaker.lower() in ASSISTANT_SPEAKERS else "USER",
+                "medium": "VOICE" if msg_type.lower() == "voice" else "TEXT",
+            })
+        except KeyError as e:
+            logger.error(f"Missing required field in message: {e} - {msg}")
+        except Exception as e:
+            logger.error(f"Error transforming message: {e} - {msg}")
+    return transformed
+
 # Proxy endpoint for creating Ultravox calls
-@router.post("/calls")
-async def create_call(request: Request):
+@router.post("/calls", dependencies=[Depends(limit_by_user_or_ip(CALL_LIMITER)), ultravox_slot])
+async def create_call(request: Request, owner: Optional[str] = Depends(get_optional_user_email)):
+    # HTTP client libraries are imported lazily to keep them off the startup
+    # path; main.py warms them in the background once the server is up
+    import httpx
+
     ultravox_api_key = os.getenv("ULTRAVOX_API_KEY")
     if not ultravox_api_key:
         logger.error("ULTRAVOX_API_KEY not configured")
@@ -35,21 +124,45 @@ async def create_call(request: Request):
             status_code=500,
             detail="Voice agent API key not configured",
         )
+
+    # Refuse resumptions the registry already knows are stale, without
+    # asking Ultravox
+    requested_prior_call_id = request.query_params.get("priorCallId")
+    if requested_prior_call_id:
+        try:
+            await call_registry.check_resumable(requested_prior_call_id, owner)
+        except StaleCallError as e:
+            logger.warning("Rejected resumption of %s: %s", requested_prior_call_id, e)
+            raise HTTPException(
+                status_code=403 if e.reason == "owner" else 409,
+                detail=str(e),
+            )
     
     try:
         # Parse query parameters - fix the query_items() method which doesn't exist
         query_params = dict(request.query_params)
         prior_call_id = query_params.get("priorCallId")
         
-        # Get request data
+        # Get request data. With a profileId the body only carries per-call
+        # fields, which are merged into the profile's pre-serialized payload.
         payload = await request.json()
+        profile = None
+        profile_id = payload.pop("profileId", None)
+        if profile_id is not None:
+            profile = get_call_profile(profile_id)
+            if profile is None:
+                raise HTTPException(status_code=400, detail=f"Unknown call profile: {profile_id}")
         
-        # Log payload (exclude sensitive data)
-        logger.info(f"Creating Ultravox call with settings: {json.dumps({k: '***' if k in ['systemPrompt', 'selectedTools'] else v for k, v in payload.items()}, indent=2)}")
+        # Log payload (exclude sensitive and bulky fields); formatted lazily by the log writer
+        logger.info(
+            "Creating Ultravox call (profile: %s) with settings: %s",
+            profile_id,
+            {k: '***' if k in REDACTED_PAYLOAD_KEYS else v for k, v in payload.items() if k != "initialMessages"},
+        )
         
         # Check if we have priorCallId in query parameters
         if prior_call_id:
-            logger.info(f"Resuming previous conversation with priorCallId: {prior_call_id} (from query parameter)")
+            logger.info("Resuming previous conversation with priorCallId: %s (from query parameter)", prior_call_id)
             
             # Make sure initialMessages is not in the payload when using priorCallId
             if "initialMessages" in payload:
@@ -58,36 +171,15 @@ async def create_call(request: Request):
         
         # Only transform initialMessages if we're not using priorCallId
         if "initialMessages" in payload and not prior_call_id:
-            logger.info(f"Initial messages format (from frontend): {json.dumps(payload['initialMessages'], indent=2)}")
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("Initial messages format (from frontend): %s", json.dumps(payload["initialMessages"]))
             
-            # Transform initialMessages to match Ultravox API expectations
-            # Ultravox requires role to be an enum ASSISTANT or USER (uppercase)
-            transformed_messages = []
-            for msg in payload["initialMessages"]:
-                try:
-                    # Handle different possible formats coming from frontend
-                    speaker = msg.get("speaker") or msg.get("role", "user")
-                    msg_type = msg.get("type") or msg.get("medium", "text")
-                    
-                    transformed_msg = {
-                        "text": msg["text"],
-                        "role": "ASSISTANT" if speaker.lower() in ["assistant", "agent"] else "USER",
-                        "medium": "VOICE" if msg_type.lower() == "voice" else "TEXT"
-                    }
-                    transformed_messages.append(transformed_msg)
-                except KeyError as e:
-                    logger.error(f"Missing required field in message: {e} - {msg}")
-                    # Skip this message and continue with others
-                    continue
-                except Exception as e:
-                    logger.error(f"Error transforming message: {e} - {msg}")
-                    # Skip this message and continue with others
-                    continue
+            transformed_messages = transform_initial_messages(payload["initialMessages"])
             
             # Replace with transformed messages only if we have valid messages
             if transformed_messages:
                 payload["initialMessages"] = transformed_messages
-                logger.info(f"Transformed messages for Ultravox API: {json.dumps(transformed_messages, indent=2)}")
+                logger.debug("Transformed %d messages for Ultravox API", len(transformed_messages))
             else:
                 # If all messages failed transformation, remove initialMessages completely
                 logger.warning("All messages failed transformation, removing initialMessages from payload")
@@ -97,41 +189,53 @@ async def create_call(request: Request):
         endpoint = f"{ULTRAVOX_BASE_URL}/api/calls"
         if prior_call_id:
             endpoint += f"?priorCallId={prior_call_id}"
-            logger.info(f"Using Ultravox API endpoint with priorCallId: {endpoint}")
+            logger.info("Using Ultravox API endpoint with priorCallId: %s", endpoint)
         
         # Forward to Ultravox API
-        response = requests.post(
-            endpoint,
-            headers={
-                "Content-Type": "application/json",
-                "X-API-Key": ultravox_api_key,
-            },
-            json=payload,
-            timeout=30  # Add timeout to prevent hanging requests
-        )
+        headers = {
+            "Content-Type": "application/json",
+            "X-API-Key": ultravox_api_key,
+        }
+        # Awaited, so the ultravox_slot admission limit actually bounds concurrent calls
+        async with httpx.AsyncClient(timeout=30) as client:
+            with ULTRAVOX_REQUEST_DURATION.labels("create_call").time():
+                if profile is not None:
+                    response = await client.post(endpoint, headers=headers, content=profile.render(payload))
+                else:
+                    response = await client.post(endpoint, headers=headers, json=payload)
         
         # Log response status code
-        logger.info(f"Ultravox API response status: {response.status_code}")
+        logger.info("Ultravox API response status: %s", response.status_code)
         
         # Raise for status
         response.raise_for_status()
         
         # Return response
         result = response.json()
-        logger.info(f"Successfully created Ultravox call: {result.get('callId', 'Unknown')}")
+        logger.info("Successfully created Ultravox call: %s", result.get('callId', 'Unknown'))
+        if result.get("callId"):
+            call_registry.register(result["callId"], owner=owner, prior_call_id=prior_call_id)
         return result
-    except requests.exceptions.HTTPError as e:
+    except HTTPException:
+        raise
+    except httpx.HTTPStatusError as e:
         logger.error(f"Error creating Ultravox call: {e.response.status_code} - {e.response.text}")
         raise HTTPException(
             status_code=e.response.status_code,
             detail=e.response.text,
         )
-    except requests.exceptions.Timeout:
+    except httpx.TimeoutException:
         logger.error("Timeout while connecting to Ultravox API")
         raise HTTPException(
             status_code=504,
             detail="Timeout while connecting to voice service",
         )
+    except httpx.RequestError as e:
+        logger.error(f"Could not reach Ultravox API: {e}")
+        raise HTTPException(
+            status_code=502,
+            detail="Could not reach voice service",
+        )
     except Exception as e:
         logger.error(f"Unexpected error creating Ultravox call: {str(e)}")
         raise HTTPException(
@@ -139,25 +243,34 @@ async def create_call(request: Request):
             detail=f"Failed to create voice call: {str(e)}",
         )
 
+# Call profiles a client can pass as profileId to POST /calls
+@router.get("/profiles")
+async def list_call_profiles():
+    return {profile_id: profile.summary() for profile_id, profile in get_call_profiles().items()}
+
 # Proxy endpoint for getting call info
-@router.get("/calls/{call_id}")
+@router.get("/calls/{call_id}", dependencies=[ultravox_slot])
 async def get_call_info(call_id: str):
+    import httpx
+
     try:
         if not ULTRAVOX_API_KEY:
             raise HTTPException(status_code=500, detail="Ultravox API key not configured")
             
-        logger.info(f"Getting info for Ultravox call: {call_id}")
+        logger.info("Getting info for Ultravox call: %s", call_id)
         async with httpx.AsyncClient() as client:
-            response = await client.get(
-                f"{ULTRAVOX_BASE_URL}/api/calls/{call_id}",
-                headers={
-                    "X-API-Key": ULTRAVOX_API_KEY
-                }
-            )
+            with ULTRAVOX_REQUEST_DURATION.labels("get_call").time():
+                response = await client.get(
+                    f"{ULTRAVOX_BASE_URL}/api/calls/{call_id}",
+                    headers={
+                        "X-API-Key": ULTRAVOX_API_KEY
+                    }
+                )
             
             # Check if request was successful
             if response.status_code == 200:
-                logger.info(f"Retrieved Ultravox call info successfully: {response.status_code}")
+                logger.info("Retrieved Ultravox call info successfully: %s", response.status_code)
+                call_registry.touch(call_id)
                 return response.json()
             else:
                 logger.error(f"Error getting Ultravox call info: {response.status_code} - {response.text}")
@@ -169,25 +282,133 @@ async def get_call_info(call_id: str):
         logger.error(f"Exception getting Ultravox call info: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Failed to get Ultravox call info: {str(e)}")
 
+# Messages are fetched from Ultravox one page at a time, only when the client
+# has consumed the previous one, so a connection holds at most one page
+MESSAGES_PAGE_SIZE = int(os.getenv("MESSAGES_PAGE_SIZE", "100"))
+MESSAGE_FORMATS = ("ndjson", "sse")
+
+def _next_cursor(page: Dict[str, Any]) -> Optional[str]:
+    """Cursor of the following page, taken from the page's ``next`` URL"""
+    next_url = page.get("next")
+    if not next_url:
+        return None
+    cursor = parse_qs(urlsplit(next_url).query).get("cursor")
+    return cursor[0] if cursor else None
+
+async def fetch_messages_page(client, call_id: str, cursor: Optional[str], page_size: int):
+    params = {"pageSize": page_size}
+    if cursor:
+        params["cursor"] = cursor
+    async with ULTRAVOX_SLOTS:
+        with ULTRAVOX_REQUEST_DURATION.labels("list_messages").time():
+            return await client.get(
+                f"{ULTRAVOX_BASE_URL}/api/calls/{call_id}/messages",
+                params=params,
+                headers={
+                    "X-API-Key": ULTRAVOX_API_KEY
+                }
+            )
+
+def _encode(kind: str, data: Dict[str, Any], fmt: str, cursor: Optional[str] = None) -> bytes:
+    if fmt == "sse":
+        # The cursor doubles as the SSE id, so EventSource resumes via Last-Event-ID
+        event_id = f"id: {cursor}\n" if cursor else ""
+        return f"{event_id}event: {kind}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n".encode("utf-8")
+    return json.dumps({kind: data}, separators=(",", ":")).encode("utf-8") + b"\n"
+
+async def stream_messages(client, call_id: str, first_page: Dict[str, Any], page_size: int, fmt: str):
+    page = first_page
+    try:
+        while True:
+            cursor = _next_cursor(page)
+            for message in page.get("results", ()):
+                yield _encode("message", message, fmt)
+            # Emitted after each page: resume from here with ?cursor=
+            yield _encode("cursor", {"next": cursor}, fmt, cursor)
+            if not cursor:
+                return
+            page = None
+            try:
+                response = await fetch_messages_page(client, call_id, cursor, page_size)
+            except HTTPException as e:
+                yield _encode("error", {"status": e.status_code, "detail": e.detail, "cursor": cursor}, fmt)
+                return
+            if response.status_code != 200:
+                logger.error(f"Error paging Ultravox messages: {response.status_code} - {response.text}")
+                yield _encode("error", {"status": response.status_code, "cursor": cursor}, fmt)
+                return
+            page = response.json()
+    except Exception as e:
+        logger.error(f"Exception streaming Ultravox messages: {str(e)}")
+        yield _encode("error", {"status": 502, "detail": str(e)}, fmt)
+    finally:
+        await client.aclose()
+
+# Streaming proxy for call messages (transcript); NDJSON by default, SSE with
+# format=sse or an event-stream Accept header
+@router.get("/calls/{call_id}/messages")
+async def get_call_messages(
+    call_id: str,
+    request: Request,
+    cursor: Optional[str] = None,
+    format: Optional[str] = None,
+    page_size: int = MESSAGES_PAGE_SIZE,
+):
+    import httpx
+
+    if not ULTRAVOX_API_KEY:
+        raise HTTPException(status_code=500, detail="Ultravox API key not configured")
+    fmt = format or ("sse" if "text/event-stream" in request.headers.get("accept", "") else "ndjson")
+    if fmt not in MESSAGE_FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of {', '.join(MESSAGE_FORMATS)}")
+    page_size = max(1, min(page_size, 1000))
+    cursor = cursor or request.headers.get("last-event-id") or None
+
+    # The first page is fetched before answering so upstream errors keep their status
+    client = httpx.AsyncClient(timeout=30)
+    try:
+        response = await fetch_messages_page(client, call_id, cursor, page_size)
+    except BaseException:
+        await client.aclose()
+        raise
+    if response.status_code != 200:
+        await client.aclose()
+        logger.error(f"Error getting Ultravox call messages: {response.status_code} - {response.text}")
+        return JSONResponse(
+            status_code=response.status_code,
+            content=response.json() if response.headers.get("content-type") == "application/json" else {"error": response.text}
+        )
+
+    call_registry.touch(call_id)
+    return StreamingResponse(
+        stream_messages(client, call_id, response.json(), page_size, fmt),
+        media_type="text/event-stream" if fmt == "sse" else "application/x-ndjson",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
 # Proxy endpoint for ending a call
-@router.delete("/calls/{call_id}")
+@router.delete("/calls/{call_id}", dependencies=[ultravox_slot])
 async def end_call(call_id: str):
+    import httpx
+
     try:
         if not ULTRAVOX_API_KEY:
             raise HTTPException(status_code=500, detail="Ultravox API key not configured")
             
-        logger.info(f"Ending Ultravox call: {call_id}")
+        logger.info("Ending Ultravox call: %s", call_id)
         async with httpx.AsyncClient() as client:
-            response = await client.delete(
-                f"{ULTRAVOX_BASE_URL}/api/calls/{call_id}",
-                headers={
-                    "X-API-Key": ULTRAVOX_API_KEY
-                }
-            )
+            with ULTRAVOX_REQUEST_DURATION.labels("end_call").time():
+                response = await client.delete(
+                    f"{ULTRAVOX_BASE_URL}/api/calls/{call_id}",
+                    headers={
+                        "X-API-Key": ULTRAVOX_API_KEY
+                    }
+                )
             
             # Check if request was successful
             if response.status_code == 200 or response.status_code == 204:
-                logger.info(f"Ended Ultravox call successfully: {response.status_code}")
+                logger.info("Ended Ultravox call successfully: %s", response.status_code)
+                call_registry.end(call_id, "deleted")
                 return {"status": "success", "message": "Call ended successfully"}
             else:
                 logger.error(f"Error ending Ultravox call: {response.status_code} - {response.text}")
@@ -200,25 +421,26 @@ async def end_call(call_id: str):
         raise HTTPException(status_code=500, detail=f"Failed to end Ultravox call: {str(e)}")
 
 # Proxy endpoint for fetching available voices
-@router.get("/voices")
+@router.get("/voices", dependencies=[ultravox_slot])
 async def get_available_voices():
+    import httpx
+
     try:
         if not ULTRAVOX_API_KEY:
             raise HTTPException(status_code=500, detail="Ultravox API key not configured")
             
+        voices = voices_cache.get("voices")
+        if voices is not None:
+            return voices
+
         logger.info("Fetching available Ultravox voices")
         async with httpx.AsyncClient() as client:
-            response = await client.get(
-                f"{ULTRAVOX_BASE_URL}/api/voices",
-                headers={
-                    "X-API-Key": ULTRAVOX_API_KEY
-                }
-            )
+            response = await fetch_voices(client)
             
             # Check if request was successful
             if response.status_code == 200:
-                logger.info(f"Retrieved Ultravox voices successfully: {response.status_code}")
-                return response.json()
+                logger.info("Retrieved Ultravox voices successfully: %s", response.status_code)
+                return voices_cache.get("voices")
             else:
                 logger.error(f"Error fetching Ultravox voices: {response.status_code} - {response.text}")
                 return JSONResponse(
@@ -232,28 +454,41 @@ async def get_available_voices():
 # Proxy endpoint for hanging up a call using the hangUp tool
 @router.post("/calls/{call_id}/hangup")
 async def hangup_call(call_id: str):
+    import httpx
+
     try:
         if not ULTRAVOX_API_KEY:
             raise HTTPException(status_code=500, detail="Ultravox API key not configured")
         
-        logger.info(f"Forwarding hangUp request to Ultravox for call: {call_id}")
+        # Calls created through this backend are known locally; only unknown
+        # ones need to be checked with Ultravox
+        record = await call_registry.lookup(call_id)
+        if record is not None:
+            call_registry.end(call_id, "hangup")
+            logger.info("Call %s found in registry, client handled hangUp", call_id)
+            return {"status": "success", "message": "Call ended successfully"}
+
+        logger.info("Forwarding hangUp request to Ultravox for call: %s", call_id)
         
         # The actual hangUp is implemented client-side through the SDK
         # This endpoint just terminates the call on the server side
         async with httpx.AsyncClient() as client:
             # Rather than trying to invoke tools, just try to get the call status 
-            # to validate the call exists before responding success
-            response = await client.get(
-                f"{ULTRAVOX_BASE_URL}/api/calls/{call_id}",
-                headers={
-                    "X-API-Key": ULTRAVOX_API_KEY
-                }
-            )
+            # to validate the call exists before responding success. Only this
+            # upstream request needs an Ultravox slot; registry hits answer without one.
+            async with ULTRAVOX_SLOTS:
+                with ULTRAVOX_REQUEST_DURATION.labels("get_call").time():
+                    response = await client.get(
+                        f"{ULTRAVOX_BASE_URL}/api/calls/{call_id}",
+                        headers={
+                            "X-API-Key": ULTRAVOX_API_KEY
+                        }
+                    )
             
             if response.status_code == 200:
                 # The call exists, so we'll consider this a success
                 # The client has already handled the actual hangup via SDK
-                logger.info(f"Confirmed call {call_id} exists, client handled hangUp")
+                logger.info("Confirmed call %s exists, client handled hangUp", call_id)
                 return {"status": "success", "message": "Call termination handled by client"}
             else:
                 logger.error(f"Call validation error: {response.status_code} - {response.text}")
@@ -261,6 +496,8 @@ async def hangup_call(call_id: str):
                     status_code=response.status_code,
                     content=response.json() if response.headers.get("content-type") == "application/json" else {"error": response.text}
                 )
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Exception in hangup call endpoint: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Failed to handle hangup: {str(e)}") 
\ No newline at end of file
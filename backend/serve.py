@@ -0,0 +1,274 @@
+"""Production entry point: one pre-bound socket shared by N uvicorn workers.
+
+    python serve.py --workers 4 --port 8000 --max-requests 20000
+
+The supervisor binds the listening socket once and starts the workers, which
+all accept from it. Each worker is a separate process with its own caches
+(menu, voices, users) that are warmed during the lifespan, before the worker
+first calls accept(). Workers exit after ``--max-requests`` (plus jitter) and
+are replaced; SIGTERM/SIGINT drain every worker gracefully. The supervisor
+logs requests per second for each worker every ``--report-interval`` seconds.
+
+A worker that fails or exits within ``--min-uptime`` seconds of starting is
+restarted after an exponential backoff, and after ``--max-crashes`` such
+failures in a row the supervisor gives up and exits non-zero instead of
+forking forever on a broken deploy.
+"""
+import argparse
+import importlib.util
+import logging
+import multiprocessing
+import os
+import random
+import signal
+import socket
+import sys
+import threading
+import time
+from typing import List, Optional
+
+logger = logging.getLogger("global_estates.serve")
+
+# Worker request counts are published to the supervisor this often (seconds)
+PUBLISH_INTERVAL = 1.0
+# First delay before restarting a crashing worker; doubles per crash up to the cap
+RESTART_BACKOFF = 1.0
+RESTART_BACKOFF_MAX = 60.0
+
+
+def default_workers() -> int:
+    return int(os.getenv("WEB_CONCURRENCY", os.cpu_count() or 1))
+
+
+def pick_loop(requested: str) -> str:
+    if requested == "auto":
+        return "uvloop" if importlib.util.find_spec("uvloop") else "asyncio"
+    return requested
+
+
+def pick_http(requested: str) -> str:
+    if requested == "auto":
+        return "httptools" if importlib.util.find_spec("httptools") else "h11"
+    return requested
+
+
+def bind_socket(host: str, port: int, backlog: int) -> socket.socket:
+    family = socket.AF_INET6 if ":" in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.set_inheritable(True)
+    return sock
+
+
+def publish_request_count(counts, slot: int):
+    """Copy this worker's request total into shared memory for the supervisor"""
+    from utils.metrics import HTTP_REQUESTS
+
+    while True:
+        counts[slot] = int(HTTP_REQUESTS.total())
+        time.sleep(PUBLISH_INTERVAL)
+
+
+def run_worker(sock: socket.socket, slot: int, counts, options: dict):
+    """Worker process body: serve main:app on the inherited socket"""
+    import uvicorn
+
+    os.environ["WARM_CACHES"] = "1"
+    counts[slot] = 0
+    threading.Thread(target=publish_request_count, args=(counts, slot), daemon=True).start()
+
+    max_requests = options["max_requests"]
+    if max_requests:
+        max_requests += random.randint(0, options["max_requests_jitter"])
+
+    config = uvicorn.Config(
+        "main:app",
+        loop=options["loop"],
+        http=options["http"],
+        lifespan="on",
+        log_level=options["log_level"],
+        access_log=False,
+        limit_max_requests=max_requests or None,
+        timeout_keep_alive=options["keepalive"],
+        timeout_graceful_shutdown=options["graceful_timeout"],
+        proxy_headers=True,
+    )
+    uvicorn.Server(config).run(sockets=[sock])
+
+
+class Supervisor:
+    """Starts, replaces and drains the worker processes"""
+
+    def __init__(self, sock: socket.socket, workers: int, options: dict, report_interval: float,
+                 min_uptime: float = 10.0, max_crashes: int = 5):
+        self.sock = sock
+        self.options = options
+        self.report_interval = report_interval
+        self.min_uptime = min_uptime
+        self.max_crashes = max_crashes
+        self.context = multiprocessing.get_context("spawn")
+        # Per-slot request totals, written by the worker in that slot
+        self.counts = self.context.Array("Q", workers, lock=False)
+        self.processes: List[Optional[multiprocessing.Process]] = [None] * workers
+        self.restarts = [0] * workers
+        self.started_at = [0.0] * workers
+        # Consecutive crashes per slot and when a crashed slot may be restarted
+        self.crashes = [0] * workers
+        self.restart_at: List[Optional[float]] = [None] * workers
+        self.crash_looping = False
+        self.should_exit = threading.Event()
+
+    def spawn(self, slot: int):
+        process = self.context.Process(
+            target=run_worker,
+            args=(self.sock, slot, self.counts, self.options),
+            name=f"worker-{slot}",
+        )
+        process.start()
+        self.processes[slot] = process
+        self.started_at[slot] = time.monotonic()
+        self.restart_at[slot] = None
+        logger.info("Started worker %d (pid %d)", slot, process.pid)
+
+    def handle_exit(self, signum, frame):
+        self.should_exit.set()
+
+    def run(self):
+        for signum in (signal.SIGTERM, signal.SIGINT):
+            signal.signal(signum, self.handle_exit)
+        for slot in range(len(self.processes)):
+            self.spawn(slot)
+
+        last_counts = [0] * len(self.processes)
+        last_report = time.monotonic()
+        while not self.should_exit.wait(0.5):
+            now = time.monotonic()
+            for slot in self.check_workers(now):
+                last_counts[slot] = 0
+            if self.crash_looping:
+                break
+
+            now = time.monotonic()
+            if now - last_report >= self.report_interval:
+                last_counts = self.report(last_counts, now - last_report)
+                last_report = now
+
+        self.drain()
+
+    def check_workers(self, now: float) -> List[int]:
+        """Replace exited workers, backing off on crashes; returns the slots restarted"""
+        restarted = []
+        for slot, process in enumerate(self.processes):
+            if self.restart_at[slot] is None:
+                if process.is_alive():
+                    continue
+                uptime = now - self.started_at[slot]
+                if process.exitcode == 0 and uptime >= self.min_uptime:
+                    # Recycled after max requests
+                    logger.info("Worker %d (pid %d) exited; replacing it", slot, process.pid)
+                    self.crashes[slot] = 0
+                    self.restart_at[slot] = now
+                else:
+                    self.crashes[slot] = self.crashes[slot] + 1 if uptime < self.min_uptime else 1
+                    if self.crashes[slot] > self.max_crashes:
+                        logger.error("Worker %d crashed %d times in a row within %.0fs of starting; giving up",
+                                     slot, self.crashes[slot], self.min_uptime)
+                        self.crash_looping = True
+                        self.should_exit.set()
+                        return restarted
+                    delay = min(RESTART_BACKOFF_MAX, RESTART_BACKOFF * 2 ** (self.crashes[slot] - 1))
+                    logger.warning("Worker %d (pid %d) exited with %s after %.1fs; restarting in %.1fs",
+                                   slot, process.pid, process.exitcode, uptime, delay)
+                    self.restart_at[slot] = now + delay
+            if now >= self.restart_at[slot]:
+                self.restarts[slot] += 1
+                self.spawn(slot)
+                restarted.append(slot)
+        return restarted
+
+    def report(self, last_counts: List[int], elapsed: float) -> List[int]:
+        counts = list(self.counts)
+        # A replaced worker starts counting from zero again
+        deltas = [
+            current - previous if current >= previous else current
+            for current, previous in zip(counts, last_counts)
+        ]
+        per_worker = " ".join(f"w{slot}={delta / elapsed:.1f}" for slot, delta in enumerate(deltas))
+        logger.info("Requests/s total=%.1f %s restarts=%s", sum(deltas) / elapsed, per_worker, self.restarts)
+        return counts
+
+    def drain(self):
+        """Forward SIGTERM and wait for in-flight requests to finish"""
+        logger.info("Draining %d workers", len(self.processes))
+        for process in self.processes:
+            if process.is_alive():
+                os.kill(process.pid, signal.SIGTERM)
+        deadline = time.monotonic() + self.options["graceful_timeout"] + 5
+        for process in self.processes:
+            process.join(max(0.0, deadline - time.monotonic()))
+            if process.is_alive():
+                logger.warning("Worker pid %d did not drain in time; killing it", process.pid)
+                process.kill()
+                process.join()
+        self.sock.close()
+        logger.info("All workers stopped")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Run the Global Estates API with multiple workers")
+    parser.add_argument("--host", default=os.getenv("HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("PORT", "8000")))
+    parser.add_argument("--workers", type=int, default=default_workers(),
+                        help="worker processes (default: WEB_CONCURRENCY or CPU count)")
+    parser.add_argument("--loop", default="auto", choices=["auto", "uvloop", "asyncio"])
+    parser.add_argument("--http", default="auto", choices=["auto", "httptools", "h11"])
+    parser.add_argument("--backlog", type=int, default=2048)
+    parser.add_argument("--max-requests", type=int, default=int(os.getenv("MAX_REQUESTS", "0")),
+                        help="recycle a worker after this many requests (0 disables)")
+    parser.add_argument("--max-requests-jitter", type=int, default=int(os.getenv("MAX_REQUESTS_JITTER", "0")),
+                        help="random extra requests per worker so they do not all restart at once")
+    parser.add_argument("--graceful-timeout", type=int, default=30,
+                        help="seconds a worker may spend draining on SIGTERM")
+    parser.add_argument("--keepalive", type=int, default=5)
+    parser.add_argument("--report-interval", type=float, default=30.0,
+                        help="seconds between per-worker RPS reports")
+    parser.add_argument("--min-uptime", type=float, default=10.0,
+                        help="a worker exiting sooner than this many seconds counts as a crash")
+    parser.add_argument("--max-crashes", type=int, default=5,
+                        help="consecutive crashes of one worker before the supervisor exits")
+    parser.add_argument("--log-level", default=os.getenv("LOG_LEVEL", "info").lower())
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    logging.basicConfig(level=args.log_level.upper(), format="%(asctime)s %(name)s %(levelname)s %(message)s")
+    options = {
+        "loop": pick_loop(args.loop),
+        "http": pick_http(args.http),
+        "log_level": args.log_level,
+        "max_requests": args.max_requests,
+        "max_requests_jitter": args.max_requests_jitter,
+        "graceful_timeout": args.graceful_timeout,
+        "keepalive": args.keepalive,
+    }
+    # A call's tool requests can reach any worker, so they must share its cart
+    if args.workers > 1 and os.environ.setdefault("TOOL_CARTS_PERSIST", "true").lower() not in ("1", "true", "yes"):
+        logger.warning("TOOL_CARTS_PERSIST is off with %d workers; voice carts will be split between them",
+                       args.workers)
+    sock = bind_socket(args.host, args.port, args.backlog)
+    logger.info("Listening on %s:%d with %d workers (loop=%s, http=%s)",
+                args.host, args.port, args.workers, options["loop"], options["http"])
+    supervisor = Supervisor(sock, max(1, args.workers), options, args.report_interval,
+                            args.min_uptime, args.max_crashes)
+    supervisor.run()
+    if supervisor.crash_looping:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+    sys.path.insert(0, os.getcwd())
+    main()
@@ -0,0 +1,88 @@
+import asyncio
+from datetime import datetime
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+from bson import ObjectId
+from httpx import AsyncClient
+
+from main import app
+from models.user import Address, UserInDB
+from routes import voice_agent
+from routes.menu import load_menu_items
+from utils.auth import get_optional_user_email
+
+USER = UserInDB(
+    _id=ObjectId(), email="buyer@example.com", name="Buyer", hashed_password="hash",
+    created_at=datetime(2024, 5, 1), address=Address(street="1 Main St", city="Pune", state="MH",
+                                                     zipCode="411001", phone="555"),
+)
+
+@pytest.fixture
+async def async_client():
+    async with AsyncClient(app=app, base_url="http://test") as client:
+        yield client
+
+@pytest.fixture
+def signed_in():
+    app.dependency_overrides[get_optional_user_email] = lambda: USER.email
+    yield
+    app.dependency_overrides.pop(get_optional_user_email, None)
+
+@pytest.mark.asyncio
+async def test_bootstrap_anonymous_with_cached_voices(async_client):
+    voice_agent.voices_cache.set("voices", {"results": [{"name": "Emily-English"}]})
+    try:
+        response = await async_client.get("/api/bootstrap")
+    finally:
+        voice_agent.voices_cache.clear()
+
+    assert response.status_code == 200
+    document = response.json()
+    assert len(document["menu"]) == len(load_menu_items())
+    assert "Veg Pizzas" in document["categories"]
+    assert document["user"] is None and document["address"] is None
+    assert document["voices"]["results"][0]["name"] == "Emily-English"
+    assert "errors" not in document
+
+@pytest.mark.asyncio
+async def test_bootstrap_user_and_voices_are_loaded_concurrently(async_client, signed_in):
+    async def slow_user(db, email):
+        await asyncio.sleep(0.2)
+        return USER.copy()
+
+    async def slow_voices(client):
+        await asyncio.sleep(0.2)
+        voice_agent.voices_cache.set("voices", {"results": []})
+        return MagicMock(status_code=200)
+
+    with patch("routes.bootstrap.get_database", return_value=MagicMock()), \
+            patch("routes.bootstrap.get_user", side_effect=slow_user) as get_user, \
+            patch("routes.voice_agent.fetch_voices", side_effect=slow_voices):
+        started = asyncio.get_running_loop().time()
+        response = await async_client.get("/api/bootstrap?fields=user,address,voices")
+        elapsed = asyncio.get_running_loop().time() - started
+    voice_agent.voices_cache.clear()
+
+    document = response.json()
+    assert set(document) == {"user", "address", "voices"}
+    assert document["user"]["email"] == USER.email
+    assert document["user"]["id"] == str(USER.id)
+    assert "hashed_password" not in document["user"]
+    assert document["address"]["city"] == "Pune"
+    get_user.assert_called_once()
+    assert elapsed < 0.35
+
+@pytest.mark.asyncio
+async def test_bootstrap_degrades_per_section(async_client, signed_in):
+    with patch("routes.bootstrap.get_database", return_value=None), \
+            patch("routes.voice_agent.fetch_voices", new=AsyncMock(return_value=MagicMock(status_code=503, text="down"))):
+        response = await async_client.get("/api/bootstrap?fields=categories,user,voices")
+    document = response.json()
+    assert response.status_code == 200
+    assert document["categories"]
+    assert document["user"] is None and document["voices"] is None
+    assert document["errors"] == {"user": "unavailable", "voices": "unavailable"}
+
+    response = await async_client.get("/api/bootstrap?fields=menu,secrets")
+    assert response.status_code == 400
@@ -0,0 +1,28 @@
+import time
+
+from utils.cache import TTLCache
+
+def test_entries_expire_after_ttl():
+    cache = TTLCache("test_expiry", ttl=0.01)
+    cache.set("a", 1)
+    assert cache.get("a") == 1
+    time.sleep(0.02)
+    assert cache.get("a") is None
+    assert len(cache) == 0
+
+def test_least_recently_used_entry_is_evicted():
+    cache = TTLCache("test_capacity", ttl=60, max_entries=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+
+def test_invalidate_removes_entry():
+    cache = TTLCache("test_invalidate", ttl=60)
+    cache.set("user@example.com", {"name": "A"})
+    assert cache.invalidate("user@example.com")
+    assert not cache.invalidate("user@example.com")
+    assert cache.get("user@example.com") is None
@@ -0,0 +1,110 @@
+import json
+import time
+
+import pytest
+from httpx import AsyncClient
+
+from main import app
+from benchmarks.event_simulator import WEBHOOK_PATH, build_event, signed_request
+from routes import call_events
+from utils.call_events import hub, verify_webhook
+from utils.call_registry import CallRegistry, StaleCallError, call_registry
+
+SECRET = "test-webhook-secret"
+
+@pytest.fixture
+async def async_client(monkeypatch):
+    monkeypatch.setattr(call_events, "ULTRAVOX_WEBHOOK_SECRET", SECRET)
+    async with AsyncClient(app=app, base_url="http://test") as client:
+        yield client
+
+def test_verify_webhook_rejects_tampering_and_replays():
+    body, headers = signed_request(SECRET, build_event("call.started", "call-1"))
+    timestamp = headers["x-ultravox-webhook-timestamp"]
+    signature = headers["x-ultravox-webhook-signature"]
+
+    assert verify_webhook(SECRET, body, timestamp, signature, tolerance=300) is None
+    assert verify_webhook(SECRET, body + b" ", timestamp, signature, tolerance=300) == "bad_signature"
+    assert verify_webhook(SECRET, body, timestamp, f"old-signature,{signature}", tolerance=300) is None
+    assert verify_webhook(SECRET, body, timestamp, signature, tolerance=300, now=time.time() + 3600) == "stale"
+    assert verify_webhook(SECRET, body, None, signature, tolerance=300) == "missing_signature"
+
+@pytest.mark.asyncio
+async def test_webhook_updates_registry_and_notifies_subscribers(async_client):
+    queue = hub.subscribe("webhook-call")
+    try:
+        for event in ("call.started", "call.ended"):
+            body, headers = signed_request(SECRET, build_event(event, "webhook-call"))
+            response = await async_client.post(WEBHOOK_PATH, content=body, headers=headers)
+            assert response.status_code == 200
+            assert response.json()["status"] == "ok"
+
+        assert [queue.get_nowait()["event"] for _ in range(2)] == ["call.started", "call.ended"]
+        record = call_registry.get("webhook-call")
+        assert record is not None and not record.active
+    finally:
+        hub.unsubscribe("webhook-call", queue)
+
+@pytest.mark.asyncio
+async def test_webhook_rejects_bad_signature_and_duplicates(async_client):
+    body, headers = signed_request("wrong-secret", build_event("call.started", "forged-call"))
+    response = await async_client.post(WEBHOOK_PATH, content=body, headers=headers)
+    assert response.status_code == 401
+    assert call_registry.get("forged-call") is None
+
+    body, headers = signed_request(SECRET, build_event("call.joined", "retried-call"))
+    await async_client.post(WEBHOOK_PATH, content=body, headers=headers)
+    response = await async_client.post(WEBHOOK_PATH, content=body, headers=headers)
+    assert response.json()["status"] == "duplicate"
+
+@pytest.mark.asyncio
+async def test_event_stream_ends_after_call_ended():
+    stream = call_events.event_stream("streamed-call")
+    chunks = [await stream.__anext__()]
+    hub.deliver({"event": "call.joined", "callId": "streamed-call"})
+    hub.deliver({"event": "call.ended", "callId": "streamed-call", "endReason": "hangup"})
+
+    chunks += [chunk async for chunk in stream]
+
+    assert chunks[0].startswith(b"event: state\n")
+    assert chunks[1].startswith(b"event: call.joined\n")
+    ended = chunks[2].decode()
+    assert ended.startswith("event: call.ended\n")
+    assert json.loads(ended.split("data: ", 1)[1])["endReason"] == "hangup"
+    assert hub.subscriber_count("streamed-call") == 0
+
+@pytest.mark.asyncio
+async def test_event_stream_subscribes_only_while_streaming():
+    # A client that disconnects before the first chunk never subscribes
+    response = await call_events.stream_call_events("abandoned-call")
+    assert hub.subscriber_count("abandoned-call") == 0
+
+    stream = response.body_iterator
+    await stream.__anext__()
+    assert hub.subscriber_count("abandoned-call") == 1
+    await stream.aclose()
+    assert hub.subscriber_count("abandoned-call") == 0
+
+@pytest.mark.asyncio
+async def test_webhook_on_another_worker_keeps_call_ownership(async_client, monkeypatch):
+    mongomock_motor = pytest.importorskip("mongomock_motor")
+    collection = mongomock_motor.AsyncMongoMockClient().db.voice_calls
+    creator = CallRegistry(persist=True)
+    creator._collection = lambda: collection
+    creator.register("owned-call", owner="buyer@example.com", prior_call_id="earlier-call")
+    await creator.flush()
+
+    # This worker has never seen the call
+    registry = CallRegistry(persist=True)
+    registry._collection = lambda: collection
+    monkeypatch.setattr(call_events, "call_registry", registry)
+    body, headers = signed_request(SECRET, build_event("call.joined", "owned-call"))
+    assert (await async_client.post(WEBHOOK_PATH, content=body, headers=headers)).status_code == 200
+    await registry.flush()
+
+    stored = await collection.find_one({"_id": "owned-call"})
+    assert stored["owner"] == "buyer@example.com"
+    assert stored["prior_call_id"] == "earlier-call"
+    assert registry.get("owned-call").owner == "buyer@example.com"
+    with pytest.raises(StaleCallError):
+        await registry.check_resumable("owned-call", owner="someone@example.com")
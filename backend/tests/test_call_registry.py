@@ -0,0 +1,90 @@
+import time
+
+import pytest
+
+from utils.call_registry import CallRegistry, StaleCallError
+
+def test_reaper_ends_idle_calls_and_updates_active_count():
+    registry = CallRegistry(idle_timeout=60, resume_window=3600)
+    registry.register("idle-call")
+    registry.register("busy-call")
+    registry.get("idle-call").last_activity -= 120
+
+    assert registry.reap() == ["idle-call"]
+    assert registry.active_count == 1
+    assert not registry.get("idle-call").active
+    assert registry.get("idle-call").end_reason == "idle"
+
+def test_ended_calls_are_forgotten_after_resume_window():
+    registry = CallRegistry(idle_timeout=60, resume_window=3600)
+    registry.register("old-call")
+    registry.end("old-call", "hangup")
+
+    registry.reap(now=time.time() + 7200)
+    assert registry.get("old-call") is None
+
+def test_registry_is_bounded():
+    registry = CallRegistry(max_calls=2)
+    for call_id in ("a", "b", "c"):
+        registry.register(call_id)
+
+    assert len(registry) == 2
+    assert registry.get("a") is None
+    assert registry.active_count == 2
+
+def test_chain_follows_prior_calls():
+    registry = CallRegistry()
+    registry.register("first")
+    registry.register("second", prior_call_id="first")
+    registry.register("third", prior_call_id="second")
+
+    assert registry.chain("third") == ["third", "second", "first"]
+
+@pytest.mark.asyncio
+async def test_stale_resumptions_are_rejected():
+    registry = CallRegistry(resume_window=3600)
+    registry.register("owned", owner="buyer@example.com")
+    registry.register("expired")
+    registry.get("expired").last_activity -= 7200
+
+    with pytest.raises(StaleCallError) as error:
+        await registry.check_resumable("owned", owner="someone@example.com")
+    assert error.value.reason == "owner"
+    with pytest.raises(StaleCallError) as error:
+        await registry.check_resumable("expired")
+    assert error.value.reason == "expired"
+
+    # Unknown calls and the owner's own calls are allowed
+    await registry.check_resumable("unknown-call")
+    await registry.check_resumable("owned", owner="buyer@example.com")
+
+@pytest.mark.asyncio
+async def test_workers_sharing_a_collection_see_resumptions_and_endings():
+    mongomock_motor = pytest.importorskip("mongomock_motor")
+    collection = mongomock_motor.AsyncMongoMockClient().db.voice_calls
+    first, second = CallRegistry(persist=True), CallRegistry(persist=True)
+    for registry in (first, second):
+        registry._collection = lambda: collection
+
+    first.register("created-on-first", owner="buyer@example.com")
+    await first.flush()
+
+    # Resumed through the second worker, which only knows the call from Mongo
+    await second.check_resumable("created-on-first", owner="buyer@example.com")
+    second.register("resumed-on-second", owner="buyer@example.com", prior_call_id="created-on-first")
+    await second.flush()
+    with pytest.raises(StaleCallError) as error:
+        await first.check_resumable("created-on-first", owner="buyer@example.com")
+    assert error.value.reason == "resumed"
+
+    # Hung up through the first worker, which never held it in memory
+    assert first.end("resumed-on-second", "hangup") is None
+    await first.flush()
+    stored = await collection.find_one({"_id": "resumed-on-second"})
+    assert stored["end_reason"] == "hangup"
+    assert stored["owner"] == "buyer@example.com"
+
+    # The worker holding it cannot overwrite that ending later
+    second.end("resumed-on-second", "idle")
+    await second.flush()
+    assert (await collection.find_one({"_id": "resumed-on-second"}))["end_reason"] == "hangup"
@@ -0,0 +1,59 @@
+from utils.catalog import Catalog, compile_catalog
+
+OUTLETS = {
+    "bandra": [
+        {"id": "vp1", "name": "Margherita", "price": 299, "isVeg": True, "category": "pizza"},
+        {"id": "np1", "name": "Pepperoni", "price": 449, "isVeg": False, "category": "pizza"},
+        {"id": "sd1", "name": "Garlic Bread", "price": 99, "isVeg": True, "category": "sides"},
+        {"id": "x", "name": "Ask for price"},
+    ],
+    "andheri": [
+        {"id": "vp1", "name": "Margherita", "price": 279, "isVeg": True, "category": "pizza"},
+        {"id": "dr1", "name": "Cola", "price": 60, "category": "drinks"},
+    ],
+}
+
+def reference(outlet=None, min_price=None, max_price=None, veg=None, category=None):
+    return [
+        (name, item["id"])
+        for name, items in OUTLETS.items() if outlet in (None, name)
+        for item in items
+        if item.get("price") is not None
+        and (min_price is None or item["price"] >= min_price)
+        and (max_price is None or item["price"] <= max_price)
+        and (veg is None or item.get("isVeg") is veg)
+        and (category is None or item.get("category") == category)
+    ]
+
+def test_search_matches_filtering_the_dicts():
+    catalog = Catalog.from_outlets(OUTLETS)
+    assert len(catalog) == 5
+    assert catalog.outlets == ["bandra", "andheri"]
+
+    def rows_to_ids(rows):
+        ranges = {name: catalog.outlet_range(name) for name in catalog.outlets}
+        return sorted(
+            (name, catalog.item(row)["id"]) for row in rows
+            for name, (start, end) in ranges.items() if start <= row < end
+        )
+
+    for filters in [{}, {"outlet": "bandra"}, {"min_price": 100, "max_price": 300}, {"veg": True},
+                    {"veg": False}, {"category": "pizza", "max_price": 290}, {"outlet": "andheri", "veg": True},
+                    {"category": "missing"}, {"outlet": "missing"}]:
+        assert rows_to_ids(catalog.search(**filters)) == sorted(reference(**filters)), filters
+
+def test_rows_are_price_sorted_per_outlet_and_round_trip():
+    catalog = Catalog.from_outlets(OUTLETS)
+    rows = catalog.search(outlet="bandra")
+    assert [catalog.item(row)["price"] for row in rows] == [99.0, 299.0, 449.0]
+    assert catalog.item(rows[0]) == {"id": "sd1", "name": "Garlic Bread", "description": "", "category": "sides",
+                                     "image": "", "price": 99.0, "isVeg": True}
+    assert "isVeg" not in catalog.items(catalog.search(category="drinks"))[0]
+    assert catalog.search(limit=2) == rows[:2]
+
+def test_open_memory_maps_a_compiled_file(tmp_path):
+    path = tmp_path / "catalog.bin"
+    path.write_bytes(compile_catalog(OUTLETS))
+    catalog = Catalog.open(str(path))
+    assert catalog.categories == ["drinks", "pizza", "sides"]
+    assert [catalog.item(row)["name"] for row in catalog.search(outlet="andheri")] == ["Cola", "Margherita"]
@@ -0,0 +1,101 @@
+import pytest
+from httpx import AsyncClient
+
+from main import app
+from utils.cors import CORSMiddleware, compile_origins, LOCALHOST_ORIGIN_REGEX
+
+@pytest.fixture
+async def async_client():
+    async with AsyncClient(app=app, base_url="http://test") as client:
+        yield client
+
+def test_compile_origins_splits_exact_and_wildcard():
+    exact, regex, allow_all = compile_origins(
+        ["https://app.example.com/", "https://*.preview.example.com"],
+        LOCALHOST_ORIGIN_REGEX,
+    )
+
+    assert exact == {"https://app.example.com"}
+    assert not allow_all
+    assert regex.fullmatch("https://pr-12.preview.example.com")
+    assert regex.fullmatch("http://localhost:5174")
+    assert not regex.fullmatch("https://evil.com")
+
+def test_origin_headers_are_cached():
+    middleware = CORSMiddleware(None, allow_origins=["https://app.example.com"])
+
+    first = middleware._headers_for(b"https://app.example.com")
+    assert first is middleware._headers_for(b"https://app.example.com")
+    assert middleware._headers_for(b"https://evil.com") is None
+
+@pytest.mark.asyncio
+async def test_preflight_answered_without_router(async_client):
+    response = await async_client.options(
+        "/api/users/address",
+        headers={
+            "Origin": "http://localhost:5173",
+            "Access-Control-Request-Method": "POST",
+            "Access-Control-Request-Headers": "content-type, authorization",
+        },
+    )
+
+    assert response.status_code == 200
+    assert response.headers["access-control-allow-origin"] == "http://localhost:5173"
+    assert response.headers["access-control-allow-credentials"] == "true"
+    assert "POST" in response.headers["access-control-allow-methods"]
+
+@pytest.mark.asyncio
+async def test_preflight_rejects_unknown_origin(async_client):
+    response = await async_client.options(
+        "/api/auth/token",
+        headers={"Origin": "https://evil.com", "Access-Control-Request-Method": "POST"},
+    )
+
+    assert response.status_code == 400
+    assert "access-control-allow-origin" not in response.headers
+
+@pytest.mark.asyncio
+async def test_simple_request_gets_cors_headers(async_client):
+    response = await async_client.get("/", headers={"Origin": "http://127.0.0.1:5175"})
+
+    assert response.status_code == 200
+    assert response.headers["access-control-allow-origin"] == "http://127.0.0.1:5175"
+    assert response.headers["vary"] == "Origin"
+
+    response = await async_client.get("/", headers={"Origin": "https://evil.com"})
+    assert "access-control-allow-origin" not in response.headers
+
+@pytest.mark.asyncio
+async def test_preflight_echoes_requested_headers(async_client):
+    response = await async_client.options(
+        "/api/users/address",
+        headers={
+            "Origin": "http://localhost:5173",
+            "Access-Control-Request-Method": "POST",
+            "Access-Control-Request-Headers": "x-custom-header, content-type",
+        },
+    )
+
+    assert response.status_code == 200
+    assert response.headers["access-control-allow-headers"] == "x-custom-header, content-type"
+
+    middleware = CORSMiddleware(None, allow_origins=["*"], allow_headers=["Content-Type"])
+    messages = []
+
+    async def send(message):
+        messages.append(message)
+
+    await middleware._preflight(middleware._headers_for(b"https://a.com"), b"POST", b"x-custom-header", send)
+    assert messages[0]["status"] == 400
+
+@pytest.mark.asyncio
+async def test_origin_is_merged_into_existing_vary_header():
+    async def app_with_vary(scope, receive, send):
+        await send({"type": "http.response.start", "status": 200, "headers": [(b"vary", b"Accept-Encoding")]})
+        await send({"type": "http.response.body", "body": b""})
+
+    wrapped = CORSMiddleware(app_with_vary, allow_origins=["https://app.example.com"])
+    async with AsyncClient(app=wrapped, base_url="http://test") as client:
+        response = await client.get("/", headers={"Origin": "https://app.example.com"})
+
+    assert response.headers.get_list("vary") == ["Accept-Encoding, Origin"]
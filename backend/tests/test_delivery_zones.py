@@ -0,0 +1,93 @@
+import json
+import os
+
+import pytest
+from httpx import AsyncClient
+
+from database import get_database
+from main import app
+from models.user import User
+from utils import delivery_zones
+from utils.auth import get_current_active_user
+from utils.delivery_zones import DeliveryZones
+
+ZONES = {
+    "zones": [
+        {"id": "bandra", "name": "Bandra", "fee": 30, "minOrder": 199, "etaMinutes": 30,
+         "pincodes": ["400050", "400051"], "ranges": [["400001", "400010"]]},
+        {"id": "andheri", "name": "Andheri", "fee": 40, "pincodes": ["400053"], "ranges": [["400058", "400061"]]},
+    ]
+}
+
+@pytest.fixture
+async def async_client():
+    async with AsyncClient(app=app, base_url="http://test") as client:
+        yield client
+
+@pytest.fixture
+def zones_file(tmp_path, monkeypatch):
+    path = tmp_path / "zones.json"
+    path.write_text(json.dumps(ZONES))
+    monkeypatch.setattr(delivery_zones, "DELIVERY_ZONES_FILE", str(path))
+    monkeypatch.setattr(delivery_zones, "DELIVERY_ZONES_CHECK_INTERVAL", 0)
+    monkeypatch.setattr(delivery_zones, "_state", {"zones": None, "mtime": None, "checked_at": 0.0})
+    return path
+
+def test_lookup_by_pincode_and_range():
+    zones = DeliveryZones(ZONES)
+    assert zones.zone_for("400050")["id"] == "bandra"
+    assert zones.zone_for(" 400 005 ")["id"] == "bandra"
+    assert zones.zone_for("400061") == {"id": "andheri", "name": "Andheri", "fee": 40}
+    assert zones.zone_for("400011") is None
+    assert zones.zone_for("400000") is None
+    assert zones.zone_for("SW1A 1AA") is None
+    assert zones.code_in_text("Flat 2, Hill Road, Mumbai 400050") == "400050"
+    assert zones.code_in_text("Hill Road, Mumbai") is None
+
+def test_overlapping_zones_are_rejected():
+    with pytest.raises(ValueError):
+        DeliveryZones({"zones": [{"id": "a", "ranges": [["100", "200"]]}, {"id": "b", "ranges": [["150", "300"]]}]})
+    with pytest.raises(ValueError):
+        DeliveryZones({"zones": [{"id": "a", "pincodes": ["1"]}, {"id": "b", "pincodes": ["1"]}]})
+
+def test_without_zones_file_everything_is_serviceable(monkeypatch):
+    monkeypatch.setattr(delivery_zones, "DELIVERY_ZONES_FILE", None)
+    assert delivery_zones.check("999999") == (True, None)
+    assert delivery_zones.code_in_address("Mumbai 999999") is None
+
+def test_zone_file_hot_reload_keeps_last_good_zones(zones_file):
+    assert delivery_zones.check("400053")[0]
+    zones_file.write_text(json.dumps({"zones": [{"id": "thane", "pincodes": ["400601"]}]}))
+    os.utime(zones_file, ns=(1, 1))
+    assert not delivery_zones.check("400053")[0]
+    assert delivery_zones.check("400601")[1]["id"] == "thane"
+
+    zones_file.write_text("{not json")
+    os.utime(zones_file, ns=(2, 2))
+    assert delivery_zones.check("400601")[0]
+
+@pytest.mark.asyncio
+async def test_batch_check_and_order_validation(async_client, zones_file):
+    response = await async_client.post("/api/delivery/check", json={"zipCodes": ["400051", "400099"]})
+    assert response.status_code == 200
+    assert [result["serviceable"] for result in response.json()["results"]] == [True, False]
+    assert response.json()["results"][0]["zone"]["etaMinutes"] == 30
+
+    order = {"items": [{"id": "vp1", "quantity": 1, "price": 299, "name": "Margherita"}], "total": 299,
+             "customer_name": "A", "customer_phone": "1", "payment_method": "cash"}
+    response = await async_client.post("/api/orders/", json={**order, "delivery_address": "Hill Road, Mumbai 400099"})
+    assert response.status_code == 422
+    response = await async_client.post("/api/orders/", json={**order, "delivery_address": "Hill Road, Mumbai 400050"})
+    assert response.status_code == 200 and response.json()["delivery_zone"] == "bandra"
+
+@pytest.mark.asyncio
+async def test_address_update_rejects_unserviceable_pincode(async_client, zones_file):
+    app.dependency_overrides[get_current_active_user] = lambda: User(id="1", email="a@example.com", name="A")
+    app.dependency_overrides[get_database] = lambda: object()
+    try:
+        response = await async_client.post("/api/users/address", json={
+            "street": "1 Main St", "city": "Pune", "state": "MH", "zipCode": "411001", "phone": "555",
+        })
+    finally:
+        app.dependency_overrides.clear()
+    assert response.status_code == 422
@@ -0,0 +1,64 @@
+import json
+from datetime import datetime
+
+import pytest
+from bson import ObjectId
+from fastapi.encoders import jsonable_encoder
+from httpx import AsyncClient
+
+from main import app
+from models.user import Address, User, serialize_address, serialize_user
+from routes.order import Order, serialize_order
+from utils.fast_json import dumps, trusted_model
+
+ADDRESS = {"street": "1 Main St", "city": "Pune", "state": "MH", "zipCode": "411001", "phone": "555"}
+
+@pytest.fixture
+async def async_client():
+    async with AsyncClient(app=app, base_url="http://test") as client:
+        yield client
+
+@pytest.mark.parametrize("address", [None, ADDRESS])
+def test_user_serializer_matches_response_model(address):
+    document = {
+        "_id": ObjectId(),
+        "email": "buyer@example.com",
+        "name": "Buyer",
+        "hashed_password": "not-for-clients",
+        "created_at": datetime(2024, 5, 1, 12, 30, 15, 123456),
+        "address": address,
+    }
+    validated = User(
+        id=str(document["_id"]), email=document["email"], name=document["name"],
+        created_at=document["created_at"], address=document["address"],
+    )
+    assert json.loads(dumps(serialize_user(document))) == jsonable_encoder(validated)
+    assert "hashed_password" not in serialize_user(document)
+
+def test_serializers_accept_models():
+    assert serialize_address(Address(**ADDRESS)) == {**ADDRESS, "landmark": None}
+    user = trusted_model(User, id="abc", email="a@example.com", name="A", address=Address(**ADDRESS))
+    assert serialize_user({**user.__dict__, "_id": "abc"})["address"]["city"] == "Pune"
+
+    order = Order(
+        items=[{"id": "vp1", "quantity": 2, "price": 499, "name": "The 4 Cheese Pizza"}],
+        total=998, customer_name="A", customer_phone="1", delivery_address="X", payment_method="cash",
+    )
+    assert serialize_order(order) == jsonable_encoder(order)
+
+@pytest.mark.asyncio
+async def test_order_routes_use_fast_responses(async_client):
+    payload = {
+        "items": [{"id": "vp1", "quantity": 1, "price": 499.0, "name": "The 4 Cheese Pizza"}],
+        "total": 499.0, "customer_name": "A", "customer_phone": "1",
+        "delivery_address": "X", "payment_method": "cash",
+    }
+    response = await async_client.post("/api/orders/", json=payload)
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/json"
+    created = response.json()
+    assert created["items"] == payload["items"]
+    assert created["status"] == "pending"
+
+    response = await async_client.get(f"/api/orders/{created['order_id']}")
+    assert response.json() == created
@@ -0,0 +1,32 @@
+import random
+
+from utils.geo_index import GridIndex, haversine_km
+
+def rows_of(mask):
+    return {row for row in range(mask.bit_length()) if mask >> row & 1}
+
+def test_radius_box_and_nearest_are_exact():
+    rng = random.Random(3)
+    centres = [(25.2, 55.27), (51.5, -0.19), (69.65, 18.96), (-33.87, 151.21)]
+    points = [(lat + rng.gauss(0, 0.05), lng + rng.gauss(0, 0.05)) for _ in range(3000) for lat, lng in [rng.choice(centres)]]
+    # A tight cluster, so some blocks hold enough rows for a bitmap of their own
+    points += [(25.2 + rng.gauss(0, 0.002), 55.27 + rng.gauss(0, 0.002)) for _ in range(1000)]
+    points.append((None, None))  # listings without coordinates never match
+    grid = GridIndex([lat for lat, _ in points], [lng for _, lng in points], dense_fraction=1 / 64)
+    assert grid.block_masks and len(grid) == 4000
+
+    located = [(row, lat, lng) for row, (lat, lng) in enumerate(points) if lat is not None]
+    for lat, lng in centres + [(0.0, 0.0)]:
+        for km in (0.3, 2, 7.5, 40, 400):
+            expected = {row for row, p_lat, p_lng in located if haversine_km(lat, lng, p_lat, p_lng) <= km}
+            assert rows_of(grid.radius_mask(lat, lng, km)) == expected, (lat, lng, km)
+
+        box = (lat - 0.03, lng - 0.05, lat + 0.04, lng + 0.02)
+        assert rows_of(grid.bbox_mask(*box)) == {
+            row for row, p_lat, p_lng in located if box[0] <= p_lat <= box[2] and box[1] <= p_lng <= box[3]
+        }
+
+        by_distance = sorted((haversine_km(lat, lng, p_lat, p_lng), row) for row, p_lat, p_lng in located)
+        assert grid.nearest(lat, lng, 7) == by_distance[:7]
+        odd = [pair for pair in by_distance if pair[1] % 2][:4]
+        assert grid.nearest(lat, lng, 4, accept=lambda row: row % 2 == 1) == odd
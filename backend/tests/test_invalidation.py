@@ -0,0 +1,91 @@
+import asyncio
+import multiprocessing
+import os
+import time
+
+from utils.cache import TTLCache
+from utils.invalidation import InvalidationBus, LocalTransport
+
+WORKERS = 3
+# Not "users": creating a TTLCache registers it in CACHES, which would unhook utils.auth.user_cache
+CACHE = "invalidation_test_users"
+
+def run_worker(socket_dir, ready, evicted):
+    """Worker process: cache a user, then wait for another process to evict it"""
+    async def main():
+        cache = TTLCache(CACHE, ttl=60)
+        cache.set("buyer@example.com", {"name": "Buyer"})
+        done = asyncio.Event()
+
+        def on_evicted(key):
+            evicted.put((os.getpid(), key, cache.get(key), time.time()))
+            done.set()
+
+        bus = InvalidationBus()
+        bus.subscribe(CACHE, on_evicted)
+        await bus.start(LocalTransport(socket_dir))
+        ready.put(os.getpid())
+        try:
+            await asyncio.wait_for(done.wait(), 10)
+        finally:
+            await bus.stop()
+
+    asyncio.run(main())
+
+def test_publish_evicts_entry_in_every_worker(tmp_path):
+    context = multiprocessing.get_context("spawn")
+    ready, evicted = context.Queue(), context.Queue()
+    workers = [
+        context.Process(target=run_worker, args=(str(tmp_path), ready, evicted))
+        for _ in range(WORKERS)
+    ]
+    for worker in workers:
+        worker.start()
+    try:
+        for _ in workers:
+            ready.get(timeout=30)
+
+        async def publish():
+            cache = TTLCache(CACHE, ttl=60)
+            cache.set("buyer@example.com", {"name": "Buyer"})
+            bus = InvalidationBus()
+            await bus.start(LocalTransport(str(tmp_path)))
+            published_at = time.time()
+            bus.publish(CACHE, "buyer@example.com")
+            await bus.stop()
+            # Evicted locally as well
+            assert cache.get("buyer@example.com") is None
+            return published_at
+
+        published_at = asyncio.run(publish())
+        results = [evicted.get(timeout=10) for _ in workers]
+    finally:
+        for worker in workers:
+            worker.join(timeout=10)
+            if worker.is_alive():
+                worker.kill()
+
+    assert sorted(pid for pid, _, _, _ in results) == sorted(worker.pid for worker in workers)
+    for _, key, value, received_at in results:
+        assert key == "buyer@example.com"
+        assert value is None
+        assert received_at - published_at < 1.0
+    assert all(worker.exitcode == 0 for worker in workers)
+
+def test_stale_peer_sockets_are_removed(tmp_path):
+    stale = tmp_path / "999999.sock"
+
+    async def publish():
+        import socket
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        sock.bind(str(stale))
+        sock.close()  # bound file remains, nobody is listening
+
+        bus = InvalidationBus()
+        await bus.start(LocalTransport(str(tmp_path)))
+        bus.publish(CACHE, "buyer@example.com")
+        await bus.stop()
+
+    asyncio.run(publish())
+    assert not stale.exists()
+    assert list(tmp_path.iterdir()) == []
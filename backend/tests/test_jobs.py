@@ -0,0 +1,152 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+from httpx import AsyncClient
+
+from main import app
+from routes import order as order_routes
+from utils import jobs as jobs_module
+from utils.jobs import JOBS, PRIORITY_HIGH, PRIORITY_LOW, JobQueue
+from utils.order_analytics import order_analytics
+
+@pytest.fixture
+async def async_client():
+    async with AsyncClient(app=app, base_url="http://test") as client:
+        yield client
+
+async def wait_until(condition, timeout=2.0):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not condition():
+        assert asyncio.get_running_loop().time() < deadline
+        await asyncio.sleep(0.005)
+
+class FakeCollection:
+    """Just enough of a Motor collection for the queries the job queue makes"""
+
+    def __init__(self):
+        self.documents = {}
+
+    @staticmethod
+    def _matches(document, query):
+        for field, condition in query.items():
+            value = document.get(field)
+            if isinstance(condition, dict):
+                if "$ne" in condition and value == condition["$ne"]:
+                    return False
+                if "$lt" in condition and not value < condition["$lt"]:
+                    return False
+            elif value != condition:
+                return False
+        return True
+
+    async def replace_one(self, query, document, upsert=False):
+        self.documents[query["_id"]] = dict(document)
+
+    async def delete_one(self, query):
+        self.documents.pop(query["_id"], None)
+
+    async def update_one(self, query, update):
+        self.documents[query["_id"]].update(update["$set"])
+
+    async def update_many(self, query, update):
+        for document in self.documents.values():
+            if self._matches(document, query):
+                document.update(update["$set"])
+
+    async def find_one_and_update(self, query, update):
+        for document in self.documents.values():
+            if self._matches(document, query):
+                before = dict(document)
+                document.update(update["$set"])
+                return before
+        return None
+
+@pytest.mark.asyncio
+async def test_priorities_retries_and_bounded_queue():
+    queue = JobQueue(workers=1, max_pending=4, persist=False, retry_delay=0.01)
+    ran, attempts = [], {"flaky": 0}
+
+    @queue.handler("record")
+    async def record(payload):
+        ran.append(payload["n"])
+
+    @queue.handler("flaky", max_attempts=3)
+    async def flaky(payload):
+        attempts["flaky"] += 1
+        if attempts["flaky"] < 3:
+            raise RuntimeError("not yet")
+        ran.append("flaky")
+
+    @queue.handler("broken", max_attempts=2)
+    async def broken(payload):
+        raise RuntimeError("always")
+
+    failed = JOBS.labels("broken", "failed")
+    failed_before = failed.value
+    queue.enqueue("record", {"n": 1}, priority=PRIORITY_LOW)
+    queue.enqueue("record", {"n": 2}, priority=PRIORITY_HIGH)
+    queue.enqueue("flaky")
+    queue.enqueue("broken")
+    assert queue.enqueue("record", {"n": 3}) is None  # full
+
+    await queue.start()
+    try:
+        await wait_until(lambda: len(ran) == 3 and not len(queue) and not queue._running)
+    finally:
+        await queue.stop()
+    assert ran == [2, 1, "flaky"]
+    assert attempts["flaky"] == 3
+    assert failed.value == failed_before + 1
+
+@pytest.mark.asyncio
+async def test_persisted_jobs_are_adopted_by_another_worker(monkeypatch):
+    collection = FakeCollection()
+    first = JobQueue(workers=1, persist=True, heartbeat_interval=10)
+    second = JobQueue(workers=1, persist=True, heartbeat_interval=10)
+    ran = []
+    for queue in (first, second):
+        monkeypatch.setattr(queue, "_collection", lambda: collection)
+        queue.handler("record")(lambda payload: asyncio.sleep(0, ran.append(payload["n"])))
+        queue.handler("secret", persist=False)(lambda payload: asyncio.sleep(0))
+
+    job = first.enqueue("record", {"n": 1})
+    first.enqueue("secret", {"password": "hunter2"})
+    await job.saving
+    assert list(collection.documents) == [job.job_id]
+
+    # The first worker is alive: nothing to adopt
+    await first.heartbeat()
+    assert await second.adopt() == 0
+    # It stopped heartbeating a while ago
+    collection.documents[job.job_id]["updated_at"] = datetime.utcnow() - timedelta(seconds=60)
+    assert await second.adopt() == 1
+
+    await second.start()
+    try:
+        await wait_until(lambda: ran == [1] and not collection.documents)
+    finally:
+        await second.stop()
+
+@pytest.mark.asyncio
+async def test_order_side_effects_are_queued(async_client, monkeypatch):
+    monkeypatch.setattr(order_routes, "orders", [])
+    monkeypatch.setattr(jobs_module.jobs, "_ready", [])
+    payload = {
+        "items": [{"id": "vp1", "name": "Margherita", "price": 299, "quantity": 1}],
+        "total": 299, "customer_name": "Asha", "customer_phone": "9999999999",
+        "delivery_address": "Hill Road, Mumbai", "payment_method": "cash",
+    }
+    try:
+        response = await async_client.post("/api/orders/", json=payload)
+        assert response.status_code == 200
+        order_id = response.json()["order_id"]
+        response = await async_client.put(f"/api/orders/{order_id}/status?status=confirmed")
+        assert response.status_code == 200
+
+        queued = sorted((job.name, job.payload.get("event") or job.payload["status"])
+                        for _, _, job in jobs_module.jobs._ready)
+        assert queued == [("audit.record", "order_created"), ("audit.record", "order_status"),
+                          ("order.notify", "confirmed"), ("order.notify", "pending")]
+    finally:
+        order_analytics.reset()
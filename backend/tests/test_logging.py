@@ -0,0 +1,55 @@
+import json
+import logging
+
+from utils.logging_config import DeferredQueueHandler, JsonFormatter, RequestContextFilter
+from utils.middleware import request_id_var, request_scope_var
+
+class _Route:
+    path = "/api/menu/"
+
+def _record(level=logging.INFO, msg="hello %s", args=("world",)):
+    return logging.LogRecord("global_estates", level, __file__, 1, msg, args, None)
+
+def test_json_formatter_includes_request_id_and_extra_fields():
+    record = _record()
+    record.request_id = "req-1"
+    record.route = "/api/menu/"
+
+    entry = json.loads(JsonFormatter().format(record))
+
+    assert entry["msg"] == "hello world"
+    assert entry["level"] == "INFO"
+    assert entry["request_id"] == "req-1"
+    assert entry["route"] == "/api/menu/"
+
+def test_filter_samples_info_per_request_but_keeps_warnings():
+    log_filter = RequestContextFilter({"/api/menu/": 0.0})
+    scope = {"route": _Route(), "state": {}}
+    id_token = request_id_var.set("req-2")
+    scope_token = request_scope_var.set(scope)
+    try:
+        info = _record()
+        assert log_filter.filter(info) is False
+        assert info.request_id == "req-2"
+        assert log_filter.filter(_record(level=logging.WARNING)) is True
+    finally:
+        request_id_var.reset(id_token)
+        request_scope_var.reset(scope_token)
+
+def test_filter_passes_records_outside_requests():
+    log_filter = RequestContextFilter({"/api/menu/": 0.0})
+    record = _record()
+    assert log_filter.filter(record) is True
+    assert record.request_id is None
+
+def test_deferred_handler_snapshots_mutable_args():
+    handler = DeferredQueueHandler(None)
+    immutable = _record()
+    assert handler.prepare(immutable) is immutable
+
+    items = ["soup"]
+    record = _record(msg="cart %s", args=(items,))
+    prepared = handler.prepare(record)
+    items.append("bread")
+    assert prepared.getMessage() == "cart ['soup']"
+    assert prepared.args is None
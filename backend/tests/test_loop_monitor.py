@@ -0,0 +1,62 @@
+import asyncio
+import time
+
+import pytest
+from fastapi import FastAPI
+from httpx import AsyncClient
+
+from main import app
+from utils import auth
+from utils.loop_monitor import LOOP_BLOCKS, LoopMonitor, LoopMonitorMiddleware
+
+def _blocking_app(monitor: LoopMonitor) -> FastAPI:
+    blocking = FastAPI()
+    blocking.add_middleware(LoopMonitorMiddleware, monitor=monitor)
+
+    @blocking.get("/slow/{item_id}")
+    async def slow(item_id: str):
+        time.sleep(0.3)  # the kind of call that must not run on the loop
+        return {"item_id": item_id}
+
+    @blocking.get("/fast")
+    async def fast():
+        await asyncio.sleep(0.05)
+        return {}
+
+    return blocking
+
+@pytest.mark.asyncio
+async def test_flags_blocking_sleep_with_route_and_stack():
+    monitor = LoopMonitor(threshold=0.05, interval=0.02)
+    monitor.start()
+    try:
+        async with AsyncClient(app=_blocking_app(monitor), base_url="http://test") as client:
+            await client.get("/fast")
+            assert not monitor.events
+            response = await client.get("/slow/1")
+            assert response.status_code == 200
+            await asyncio.sleep(0.1)
+    finally:
+        monitor.stop()
+
+    [event] = monitor.events
+    assert event["route"] == "/slow/{item_id}"
+    assert event["blocked_ms"] >= 200
+    assert any("time.sleep(0.3)" in line for line in event["stack"])
+    assert LOOP_BLOCKS.labels("/slow/{item_id}").value >= 1
+    assert monitor.max_lag >= 0.2
+    assert monitor.scopes == {}
+
+@pytest.mark.asyncio
+async def test_debug_endpoint_requires_admin_token(monkeypatch):
+    async with AsyncClient(app=app, base_url="http://test") as client:
+        monkeypatch.setattr(auth, "ADMIN_TOKEN", None)
+        assert (await client.get("/api/debug/loop")).status_code == 404
+
+        monkeypatch.setattr(auth, "ADMIN_TOKEN", "admin-secret")
+        assert (await client.get("/api/debug/loop")).status_code == 403
+        response = await client.get("/api/debug/loop", headers={"X-Admin-Token": "\xe9".encode("latin-1")})
+        assert response.status_code == 403
+        response = await client.get("/api/debug/loop", headers={"X-Admin-Token": "admin-secret"})
+        assert response.status_code == 200
+        assert set(response.json()) >= {"threshold_ms", "lag_ms", "blocks"}
@@ -0,0 +1,58 @@
+import os
+
+import pytest
+from httpx import AsyncClient
+
+from main import app
+from routes import menu
+from utils.menu_versions import MenuHistory, diff_items
+
+PIZZA = {"id": "vp1", "name": "Margherita", "price": 299, "isVeg": True}
+GARLIC = {"id": "sd1", "name": "Garlic Bread", "price": 99}
+
+def test_diff_items_reports_added_removed_and_changed_fields():
+    diff = diff_items([PIZZA, GARLIC], [{"id": "vp1", "name": "Margherita", "price": 349}, {"id": "dr1", "name": "Cola"}])
+    assert diff["added"] == {"dr1": {"id": "dr1", "name": "Cola"}}
+    assert diff["removed"] == ["sd1"]
+    assert diff["changed"] == {"vp1": ({"price": 349}, ["isVeg"])}
+
+def test_history_composes_deltas_and_requests_resync_when_too_old():
+    history = MenuHistory(size=2)
+    v1 = history.record(100, None, [PIZZA])
+    v2 = history.record(100, [PIZZA], [PIZZA, GARLIC])
+    assert v2 == v1 + 1
+    v3 = history.record(300, [PIZZA, GARLIC], [{**PIZZA, "price": 349}, {**GARLIC, "price": 129}])
+
+    changes = history.changes_since(v1)
+    # Garlic bread was added after v1, so its later price change is folded into the added item
+    assert changes["added"] == [{**GARLIC, "price": 129}]
+    assert changes["changed"] == [{"id": "vp1", "fields": {"price": 349}, "removedFields": []}]
+    assert history.changes_since(v3) == {"added": [], "removed": [], "changed": []}
+    assert history.changes_since(12345) is None
+
+    history.record(400, [{**PIZZA, "price": 349}, {**GARLIC, "price": 129}], [])
+    assert history.changes_since(v1) is None
+    assert history.changes_since(v2)["removed"] == ["vp1", "sd1"]
+
+@pytest.mark.asyncio
+async def test_menu_changes_endpoint_after_file_edit(tmp_path, monkeypatch):
+    menu_file = tmp_path / "menuitems.json"
+    menu_file.write_text('{"items": [{"id": "vp1", "name": "Margherita", "price": 299}]}')
+    monkeypatch.setattr(menu, "MENU_FILE_PATH", str(menu_file))
+    monkeypatch.setattr(menu, "MENU_CHECK_INTERVAL", 0)
+    monkeypatch.setattr(menu, "_menu_cache", {"mtime": None, "items": [], "checked_at": 0.0})
+    monkeypatch.setattr(menu, "menu_history", menu.MenuHistory())
+
+    async with AsyncClient(app=app, base_url="http://test") as client:
+        response = await client.get("/api/menu/")
+        version = int(response.headers["x-menu-version"])
+
+        menu_file.write_text('{"items": [{"id": "vp1", "name": "Margherita", "price": 349}]}')
+        os.utime(menu_file, ns=(version + 10**9, version + 10**9))
+
+        changes = (await client.get(f"/api/menu/changes?since={version}")).json()
+        assert changes["resync"] is False
+        assert changes["version"] > version
+        assert changes["changed"] == [{"id": "vp1", "fields": {"price": 349}, "removedFields": []}]
+
+        assert (await client.get("/api/menu/changes?since=1")).json()["resync"] is True
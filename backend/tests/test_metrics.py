@@ -0,0 +1,60 @@
+import pytest
+from httpx import AsyncClient
+
+from main import app
+from utils import auth
+from utils.metrics import Counter, Histogram, Registry
+
+@pytest.fixture
+async def async_client():
+    async with AsyncClient(app=app, base_url="http://test") as client:
+        yield client
+
+def test_histogram_renders_cumulative_buckets():
+    registry = Registry()
+    histogram = Histogram("test_latency_seconds", "Test latency", ["route"], buckets=(0.1, 1.0), registry=registry)
+    histogram.labels("/a").observe(0.05)
+    histogram.labels("/a").observe(0.5)
+    histogram.labels("/a").observe(5)
+
+    output = registry.render()
+    assert 'test_latency_seconds_bucket{route="/a",le="0.1"} 1' in output
+    assert 'test_latency_seconds_bucket{route="/a",le="1"} 2' in output
+    assert 'test_latency_seconds_bucket{route="/a",le="+Inf"} 3' in output
+    assert 'test_latency_seconds_count{route="/a"} 3' in output
+
+def test_counter_rejects_wrong_label_count():
+    counter = Counter("test_events_total", "Test events", ["kind"], registry=Registry())
+    with pytest.raises(ValueError):
+        counter.labels("a", "b")
+
+@pytest.mark.asyncio
+async def test_metrics_endpoint_labels_route_templates(async_client):
+    await async_client.get("/api/menu/category/Desserts")
+
+    response = await async_client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    body = response.text
+    assert 'route="/api/menu/category/{category}"' in body
+    assert "Desserts" not in body
+    assert "http_requests_in_flight" in body
+    assert "menu_cache_reloads_total" in body
+
+@pytest.mark.asyncio
+async def test_unknown_methods_share_one_label(async_client):
+    await async_client.request("BREW", "/")
+
+    body = (await async_client.get("/metrics")).text
+    assert 'method="BREW"' not in body
+    assert 'method="other"' in body
+
+@pytest.mark.asyncio
+async def test_metrics_token_is_required_when_set(async_client, monkeypatch):
+    monkeypatch.setattr(auth, "METRICS_TOKEN", "scrape-secret")
+
+    assert (await async_client.get("/metrics")).status_code == 401
+    response = await async_client.get("/metrics", headers={"Authorization": "Bearer wrong"})
+    assert response.status_code == 401
+    response = await async_client.get("/metrics", headers={"Authorization": "Bearer scrape-secret"})
+    assert response.status_code == 200
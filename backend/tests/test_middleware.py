@@ -0,0 +1,28 @@
+import pytest
+from httpx import AsyncClient
+
+from main import app
+
+@pytest.fixture
+async def async_client():
+    async with AsyncClient(app=app, base_url="http://test") as client:
+        yield client
+
+@pytest.mark.asyncio
+async def test_request_id_generated_and_echoed(async_client):
+    response = await async_client.get("/")
+    generated = response.headers["x-request-id"]
+    assert len(generated) == 32
+
+    response = await async_client.get("/", headers={"X-Request-ID": "client-abc.123"})
+    assert response.headers["x-request-id"] == "client-abc.123"
+
+@pytest.mark.asyncio
+async def test_malformed_request_id_is_replaced(async_client):
+    response = await async_client.get("/", headers={"X-Request-ID": "bad id with spaces"})
+    assert response.headers["x-request-id"] != "bad id with spaces"
+
+@pytest.mark.asyncio
+async def test_server_timing_header(async_client):
+    response = await async_client.get("/")
+    assert response.headers["server-timing"].startswith("app;dur=")
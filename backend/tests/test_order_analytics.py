@@ -0,0 +1,160 @@
+import copy
+
+import pytest
+from httpx import AsyncClient
+
+from main import app
+from routes import order as order_routes
+from routes import tools
+from utils import auth
+from utils.order_analytics import AnalyticsStore, OrderAnalytics, order_analytics
+
+CATEGORIES = {"vp1": "Veg Pizzas", "vp2": "Veg Pizzas", "nv1": "Non-Veg Pizzas"}
+
+def make_order(order_id, items, created_at="2026-10-19T12:05:00", status="pending"):
+    return {
+        "order_id": order_id, "status": status, "created_at": created_at,
+        "items": [{"id": item_id, "name": item_id.upper(), "price": price, "quantity": quantity}
+                  for item_id, price, quantity in items],
+        "total": sum(price * quantity for _, price, quantity in items),
+    }
+
+@pytest.fixture
+async def async_client():
+    async with AsyncClient(app=app, base_url="http://test") as client:
+        yield client
+
+def test_aggregates_follow_orders_and_cancellations():
+    analytics = OrderAnalytics(hours=2)
+    first = make_order("1", [("vp1", 100, 2), ("nv1", 300, 1)])
+    second = make_order("2", [("vp2", 50, 5)], created_at="2026-10-19T13:10:00")
+    analytics.record_order(first, CATEGORIES.get)
+    analytics.record_order(second, CATEGORIES.get)
+
+    assert [item["id"] for item in analytics.popular_items(2)] == ["vp2", "vp1"]
+    assert analytics.category_revenue() == {"Veg Pizzas": 450.0, "Non-Veg Pizzas": 300.0}
+    assert analytics.summary()["averageTicket"] == 375.0
+
+    analytics.record_status(second, "pending", "cancelled", CATEGORIES.get)
+    assert [item["id"] for item in analytics.popular_items(5)] == ["vp1", "nv1"]
+    summary = analytics.summary()
+    assert (summary["orders"], summary["revenue"], summary["cancelledRevenue"]) == (1, 500.0, 250.0)
+    assert summary["statuses"] == {"pending": 1, "cancelled": 1}
+    assert summary["funnel"] == {"pending": 2, "cancelled": 1}
+    assert analytics.hourly_revenue(24) == [
+        {"hour": "2026-10-19T12", "orders": 1, "revenue": 500.0},
+        {"hour": "2026-10-19T13", "orders": 0, "revenue": 0.0},
+    ]
+
+    # Only the newest hours are kept
+    analytics.record_order(make_order("3", [("vp1", 100, 1)], created_at="2026-10-19T14:00:00"), CATEGORIES.get)
+    assert [hour["hour"] for hour in analytics.hourly_revenue(24)] == ["2026-10-19T13", "2026-10-19T14"]
+
+def test_orders_outside_the_hourly_window():
+    analytics = OrderAnalytics(hours=1)
+    first = make_order("1", [("vp1", 10, 1)], created_at="2026-10-19T12:00:00")
+    analytics.record_order(first, CATEGORIES.get)
+    analytics.record_order(make_order("2", [("vp2", 5, 1)], created_at="2026-10-19T13:00:00"), CATEGORIES.get)
+
+    # The first order's hour has left the window; its totals are still taken back once
+    analytics.record_status(first, "pending", "cancelled", CATEGORIES.get)
+    summary = analytics.summary()
+    assert (summary["orders"], summary["revenue"], summary["cancelledRevenue"]) == (1, 5.0, 10.0)
+    assert analytics.hourly_revenue(24) == [{"hour": "2026-10-19T13", "orders": 1, "revenue": 5.0}]
+
+    # Un-cancelling does not bring the old hour back ahead of the newer one
+    analytics.record_status(first, "cancelled", "pending", CATEGORIES.get)
+    assert (analytics.summary()["revenue"], analytics.summary()["cancelledRevenue"]) == (15.0, 0.0)
+    assert analytics.hourly_revenue(24) == [{"hour": "2026-10-19T13", "orders": 1, "revenue": 5.0}]
+
+class FakeCollection:
+    """Just enough of a Motor collection for $inc, $set and $unset on dotted paths"""
+
+    def __init__(self):
+        self.documents = {}
+
+    async def find_one(self, query):
+        return copy.deepcopy(self.documents.get(query["_id"]))
+
+    async def update_one(self, query, update, upsert=False):
+        document = self.documents.setdefault(query["_id"], {"_id": query["_id"]})
+        for operator, fields in update.items():
+            for path, value in fields.items():
+                *parents, leaf = path.split(".")
+                target = document
+                for part in parents:
+                    target = target.setdefault(part, {})
+                if operator == "$inc":
+                    target[leaf] = target.get(leaf, 0) + value
+                elif operator == "$set":
+                    target[leaf] = value
+                else:
+                    target.pop(leaf, None)
+
+class FakeDatabase:
+    def __init__(self):
+        self.analytics = FakeCollection()
+
+@pytest.mark.asyncio
+async def test_workers_add_to_the_shared_document():
+    db = FakeDatabase()
+    first, second = OrderAnalytics(), OrderAnalytics()
+    first_store, second_store = AnalyticsStore(first), AnalyticsStore(second)
+    await first_store.restore(db)
+
+    first.record_order(make_order("1", [("vp1", 100, 2)]), CATEGORIES.get)
+    # This worker takes an order before it restores: restoring merges instead of skipping
+    second.record_order(make_order("2", [("a.b$c", 50, 1)]), CATEGORIES.get)
+    await second_store.restore(db)
+    await first_store.sync()
+    assert not first.dirty and not second.dirty
+
+    assert first.summary()["orders"] == 2
+    assert first.category_revenue() == {"Veg Pizzas": 200.0, "Uncategorized": 50.0}
+    assert [item["id"] for item in first.popular_items(5)] == ["vp1", "a.b$c"]
+    # The second worker sees the first's order after its next sync
+    assert second.summary()["orders"] == 1
+    await second_store.sync()
+    assert second.summary() == first.summary()
+
+    # A worker restarting with nothing of its own loads everyone's figures
+    restarted = OrderAnalytics()
+    await AnalyticsStore(restarted).restore(db)
+    assert restarted.summary()["revenue"] == 250.0
+    assert restarted.hourly_revenue(24) == [{"hour": "2026-10-19T12", "orders": 2, "revenue": 250.0}]
+
+@pytest.mark.asyncio
+async def test_analytics_endpoints_and_popular_tool(async_client, monkeypatch):
+    monkeypatch.setattr(auth, "ADMIN_TOKEN", "admin-secret")
+    monkeypatch.setattr(order_routes, "orders", [])
+    order_analytics.reset()
+    try:
+        menu_item = next(iter(tools.get_menu_index().by_id.values()))
+        payload = {
+            "items": [{"id": menu_item["id"], "name": menu_item["name"], "price": menu_item["price"], "quantity": 3},
+                      {"id": "retired", "name": "Retired Pizza", "price": 10, "quantity": 9}],
+            "total": menu_item["price"] * 3 + 90,
+            "customer_name": "Asha", "customer_phone": "9999999999",
+            "delivery_address": "Hill Road, Mumbai", "payment_method": "cash",
+        }
+        response = await async_client.post("/api/orders/", json=payload)
+        assert response.status_code == 200
+
+        response = await async_client.get("/api/analytics/popular?limit=1")
+        assert response.json()["items"] == [{"id": "retired", "name": "Retired Pizza", "quantity": 9, "revenue": 90.0}]
+
+        # The voice tool only suggests items still on the menu
+        response = await async_client.post("/api/tools/menu/popular", json={"limit": 2})
+        assert [item["id"] for item in response.json()["items"]] == [menu_item["id"]]
+
+        response = await async_client.get("/api/analytics/summary")
+        assert response.status_code == 403
+        headers = {"X-Admin-Token": "admin-secret"}
+        response = await async_client.get("/api/analytics/summary", headers=headers)
+        assert response.json()["orders"] == 1
+        response = await async_client.get("/api/analytics/revenue/categories", headers=headers)
+        assert response.json()["categories"] == {menu_item["category"]: menu_item["price"] * 3, "Uncategorized": 90.0}
+        response = await async_client.get("/api/analytics/revenue/hourly?hours=1", headers=headers)
+        assert response.json()["hours"][0]["orders"] == 1
+    finally:
+        order_analytics.reset()
@@ -0,0 +1,79 @@
+import asyncio
+import time
+from unittest.mock import MagicMock, patch
+
+import pytest
+from httpx import AsyncClient
+
+from main import app
+from utils import auth
+from utils.profiler import profiler
+
+ADMIN = {"X-Admin-Token": "admin-secret"}
+
+@pytest.fixture
+def profile_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(auth, "ADMIN_TOKEN", "admin-secret")
+    monkeypatch.setattr(profiler, "directory", str(tmp_path))
+    monkeypatch.setattr(profiler, "interval", 0.002)
+    return tmp_path
+
+@pytest.fixture
+async def async_client():
+    async with AsyncClient(app=app, base_url="http://test") as client:
+        yield client
+
+def _busy(seconds):
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        pass
+
+@pytest.mark.asyncio
+async def test_profiles_upstream_await_in_voice_agent(profile_dir, async_client):
+    async def slow_upstream(*args, **kwargs):
+        await asyncio.sleep(0.1)
+        _busy(0.05)
+        response = MagicMock()
+        response.status_code = 200
+        response.json.return_value = {"callId": "abc"}
+        return response
+
+    with patch("httpx.AsyncClient.get", side_effect=slow_upstream):
+        response = await async_client.request(
+            "GET", "/api/voice-agent/calls/abc", headers={"X-Profile": "1", **ADMIN}
+        )
+    assert response.status_code == 200
+    profile_id = response.headers["x-profile-id"]
+
+    listing = (await async_client.get("/api/debug/profiles", headers=ADMIN)).json()["profiles"]
+    assert listing[0]["id"] == profile_id
+    assert listing[0]["route"] == "/api/voice-agent/calls/{call_id}"
+    assert listing[0]["samples"] > 0
+
+    response = await async_client.get(f"/api/debug/profiles/{profile_id}", headers=ADMIN)
+    stacks = [line.rsplit(" ", 1)[0].split(";") for line in response.text.splitlines()]
+    waiting = [stack for stack in stacks if stack[-1] == "[await]"]
+    running = [stack for stack in stacks if stack[-1].startswith("_busy")]
+    # Both the awaited upstream call and the CPU time are attributed to the handler
+    assert any(frame.startswith("get_call_info (voice_agent.py") for frame in waiting[0])
+    assert any(frame.startswith("slow_upstream") for stack in waiting for frame in stack)
+    assert running and any(frame.startswith("get_call_info") for frame in running[0])
+
+@pytest.mark.asyncio
+async def test_profile_requires_admin_token_and_is_bounded(profile_dir, async_client, monkeypatch):
+    response = await async_client.get("/", headers={"X-Profile": "1", "X-Admin-Token": "wrong"})
+    assert "x-profile-id" not in response.headers
+    response = await async_client.get("/", headers={"X-Profile": "1", "X-Admin-Token": "\xe9".encode("latin-1")})
+    assert response.status_code == 200
+    assert "x-profile-id" not in response.headers
+
+    monkeypatch.setattr(profiler, "max_files", 2)
+    for _ in range(3):
+        response = await async_client.get("/", headers={"X-Profile": "1", **ADMIN})
+        assert "x-profile-id" in response.headers
+    assert len(list(profile_dir.glob("*.collapsed"))) == 2
+    assert len(list(profile_dir.glob("*.json"))) == 2
+
+    response = await async_client.post("/api/debug/profiles?seconds=0.05", headers=ADMIN)
+    assert response.json()["kind"] == "window"
+    assert (await async_client.get("/api/debug/profiles/../etc", headers=ADMIN)).status_code == 404
@@ -0,0 +1,116 @@
+import pytest
+from httpx import AsyncClient
+
+from main import app
+from models.property import LOCATION_COORDINATES, mock_properties
+from utils.geo_index import haversine_km
+from utils.property_index import PropertyIndex
+
+PROPERTIES = mock_properties(500)
+
+@pytest.fixture
+async def async_client():
+    async with AsyncClient(app=app, base_url="http://test") as client:
+        yield client
+
+def reference(min_price=0, max_price=float("inf"), beds_at_least=0, property_types=(), features=(),
+              location="", min_area=0, max_area=float("inf")):
+    matches = [
+        item for item in PROPERTIES
+        if min_price <= item["price"] <= max_price and item["beds"] >= beds_at_least
+        and (not property_types or item["propertyType"] in property_types)
+        and all(feature in item["features"] for feature in features)
+        and location.lower() in item["location"].lower()
+        and min_area <= item["sqft"] <= max_area
+    ]
+    return sorted(matches, key=lambda item: (item["price"], item["id"]))
+
+def test_search_matches_filtering_the_list_and_pages_with_cursors():
+    index = PropertyIndex(PROPERTIES)
+    expected = reference(min_price=500000, max_price=5000000, beds_at_least=2,
+                         property_types=("Villa", "Apartment"), features=("Balcony",), min_area=1250, max_area=4000)
+    assert expected
+
+    seen, cursor = [], None
+    while True:
+        page = index.search(min_price=500000, max_price=5000000, beds="2+", property_types=["villa", "Apartment"],
+                            features=["Balcony"], min_area=1250, max_area=4000, cursor=cursor, limit=7)
+        assert page["total"] == len(expected)
+        seen.extend(page["items"])
+        cursor = page["nextCursor"]
+        if cursor is None:
+            break
+    assert seen == expected
+
+    page = index.search(location="dubai", features=["Near Metro Station"], descending=True, limit=5)
+    assert page["items"] == reference(location="dubai", features=("Near Metro Station",))[::-1][:5]
+
+def test_cursor_survives_a_reindex():
+    index = PropertyIndex(PROPERTIES)
+    first = index.search(listing_types=["For Rent"], limit=10)
+    # A listing cheaper than the cursor disappears; the next page is unaffected
+    rebuilt = PropertyIndex([item for item in PROPERTIES if item["id"] != first["items"][0]["id"]])
+    second = rebuilt.search(listing_types=["For Rent"], cursor=first["nextCursor"], limit=10)
+    assert second["items"] == index.search(listing_types=["For Rent"], limit=20)["items"][10:]
+
+def test_invalid_count_and_cursor_are_rejected():
+    index = PropertyIndex(PROPERTIES)
+    with pytest.raises(ValueError):
+        index.search(beds="two")
+    with pytest.raises(ValueError):
+        index.search(cursor="not-a-cursor")
+
+@pytest.mark.asyncio
+async def test_search_endpoint(async_client):
+    response = await async_client.get("/api/properties/search", params={
+        "listingType": "For Sale", "bedrooms": "3+", "amenities": ["Schools"], "limit": 3,
+    })
+    assert response.status_code == 200
+    body = response.json()
+    assert len(body["items"]) == 3 and body["nextCursor"]
+    for item in body["items"]:
+        assert item["listingType"] == "For Sale" and item["beds"] >= 3 and "Near Schools" in item["features"]
+    prices = [item["price"] for item in body["items"]]
+    assert prices == sorted(prices)
+
+    response = await async_client.get("/api/properties/search", params={"bathrooms": "lots"})
+    assert response.status_code == 400
+
+def test_radius_box_and_nearest_match_brute_force():
+    index = PropertyIndex(PROPERTIES)
+    lat, lng = LOCATION_COORDINATES["Downtown Dubai, Dubai"]
+    distance = {item["id"]: haversine_km(lat, lng, item["lat"], item["lng"]) for item in PROPERTIES}
+
+    page = index.search(near=(lat, lng, 3.0), listing_types=["For Sale"], limit=100)
+    expected = [item for item in reference() if distance[item["id"]] <= 3.0 and item["listingType"] == "For Sale"]
+    assert expected and page["items"] == expected[:100] and page["total"] == len(expected)
+
+    box = (25.18, 55.25, 25.21, 55.29)
+    in_box = [item for item in reference() if box[0] <= item["lat"] <= box[2] and box[1] <= item["lng"] <= box[3]]
+    assert index.search(bbox=box, limit=100)["items"] == in_box[:100]
+
+    nearest = index.nearest(lat, lng, 5, property_types=["Villa"])
+    villas = sorted((distance[item["id"]], item["id"]) for item in PROPERTIES if item["propertyType"] == "Villa")
+    assert [(round(km, 9), item["id"]) for km, item in nearest] == [(round(km, 9), i) for km, i in villas[:5]]
+
+    # A point far from every listing still finds the closest ones
+    far = index.nearest(0.0, 0.0, 3)
+    assert [item["id"] for _, item in far] == [i for _, i in sorted(
+        (haversine_km(0.0, 0.0, item["lat"], item["lng"]), item["id"]) for item in PROPERTIES)[:3]]
+
+@pytest.mark.asyncio
+async def test_geo_endpoints(async_client):
+    response = await async_client.get("/api/properties/nearest", params={"place": "palm jumeirah", "limit": 3,
+                                                                        "propertyType": "Villa"})
+    assert response.status_code == 200
+    items = response.json()["items"]
+    assert len(items) == 3 and all(item["propertyType"] == "Villa" for item in items)
+    assert [item["distanceKm"] for item in items] == sorted(item["distanceKm"] for item in items)
+
+    response = await async_client.get("/api/properties/search", params={"place": "Manhattan", "radiusKm": 5})
+    assert response.status_code == 200
+    assert response.json()["items"] and all("New York" in item["location"] for item in response.json()["items"])
+
+    assert (await async_client.get("/api/properties/search", params={"radiusKm": 5})).status_code == 400
+    assert (await async_client.get("/api/properties/nearest", params={"place": "Atlantis"})).status_code == 400
+    assert (await async_client.get("/api/properties/search", params={"bbox": "1,2,3"})).status_code == 400
@@ -0,0 +1,65 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+from httpx import AsyncClient
+
+from main import app
+from utils.rate_limit import ConcurrencyLimiter, MemoryBucketStore, TokenBucketLimiter
+
+@pytest.fixture
+async def async_client():
+    async with AsyncClient(app=app, base_url="http://test") as client:
+        yield client
+
+def test_bucket_refills_lazily():
+    store = MemoryBucketStore()
+    assert store.take("k", burst=2, rate=1.0) == 0
+    assert store.take("k", burst=2, rate=1.0) == 0
+    retry_after = store.take("k", burst=2, rate=1.0)
+    assert 0 < retry_after <= 1.0
+
+    # Pretend a second passed
+    store._shards[hash("k") & (store.SHARDS - 1)]["k"][1] -= 1.0
+    assert store.take("k", burst=2, rate=1.0) == 0
+
+@pytest.mark.asyncio
+async def test_limiter_rejects_with_retry_after():
+    limiter = TokenBucketLimiter("test_burst", "1/60", store=MemoryBucketStore())
+    await limiter.check("203.0.113.7")
+    with pytest.raises(HTTPException) as error:
+        await limiter.check("203.0.113.7")
+    assert error.value.status_code == 429
+    assert int(error.value.headers["Retry-After"]) >= 59
+    # Other keys have their own bucket
+    await limiter.check("203.0.113.8")
+
+@pytest.mark.asyncio
+async def test_concurrency_limiter_sheds_and_hands_over_slots():
+    limiter = ConcurrencyLimiter("test_slots", limit=1, max_wait=0.05)
+    await limiter.acquire()
+
+    with pytest.raises(HTTPException) as error:
+        await limiter.acquire()
+    assert error.value.status_code == 429
+    assert "Retry-After" in error.value.headers
+
+    waiting = asyncio.ensure_future(limiter.acquire())
+    await asyncio.sleep(0)
+    limiter.release()
+    await waiting
+    assert limiter.in_flight == 1
+    limiter.release()
+    assert limiter.in_flight == 0
+
+@pytest.mark.asyncio
+async def test_login_attempts_are_limited_per_account(async_client):
+    form = {"username": "victim@example.com", "password": "wrong"}
+    statuses = []
+    for _ in range(11):
+        response = await async_client.post("/api/auth/token", data=form)
+        statuses.append(response.status_code)
+
+    assert 429 not in statuses[:10]
+    assert statuses[10] == 429
+    assert "Retry-After" in response.headers
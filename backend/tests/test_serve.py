@@ -0,0 +1,61 @@
+import socket
+
+import serve
+
+class FakeProcess:
+    def __init__(self, exitcode=None):
+        self.exitcode = exitcode
+        self.pid = 1
+
+    def is_alive(self):
+        return self.exitcode is None
+
+def _supervisor(monkeypatch, workers=1, max_crashes=2):
+    supervisor = serve.Supervisor(socket.socket(), workers, {}, 30, min_uptime=10, max_crashes=max_crashes)
+    spawned = []
+
+    def spawn(slot):
+        spawned.append(slot)
+        supervisor.processes[slot] = FakeProcess()
+        supervisor.started_at[slot] = now[0]
+        supervisor.restart_at[slot] = None
+
+    now = [0.0]
+    monkeypatch.setattr(supervisor, "spawn", spawn)
+    spawn(0)
+    spawned.clear()
+    return supervisor, spawned, now
+
+def test_crashing_worker_backs_off_then_supervisor_gives_up(monkeypatch):
+    supervisor, spawned, now = _supervisor(monkeypatch)
+
+    supervisor.processes[0].exitcode = 3
+    now[0] = 1
+    assert supervisor.check_workers(now[0]) == []
+    assert supervisor.restart_at[0] == 1 + serve.RESTART_BACKOFF
+    now[0] = 1 + serve.RESTART_BACKOFF
+    assert supervisor.check_workers(now[0]) == [0]
+
+    supervisor.processes[0].exitcode = 3
+    now[0] += 1
+    supervisor.check_workers(now[0])
+    assert supervisor.restart_at[0] == now[0] + 2 * serve.RESTART_BACKOFF
+    now[0] += 2 * serve.RESTART_BACKOFF
+    supervisor.check_workers(now[0])
+
+    supervisor.processes[0].exitcode = 3
+    now[0] += 1
+    supervisor.check_workers(now[0])
+    assert supervisor.crash_looping
+    assert supervisor.should_exit.is_set()
+    assert spawned == [0, 0]
+
+def test_recycled_worker_is_replaced_at_once(monkeypatch):
+    supervisor, spawned, now = _supervisor(monkeypatch)
+    supervisor.crashes[0] = 2
+
+    supervisor.processes[0].exitcode = 0
+    now[0] = 600
+    assert supervisor.check_workers(now[0]) == [0]
+    assert supervisor.crashes[0] == 0
+    assert not supervisor.crash_looping
@@ -0,0 +1,27 @@
+import asyncio
+
+import pytest
+
+from utils.metrics import REGISTRY
+from utils.startup import StartupReport, run_phases
+
+async def _noop():
+    pass
+
+@pytest.mark.asyncio
+async def test_deferred_phases_stay_pending_until_they_finish():
+    report = StartupReport()
+    release = asyncio.Event()
+    await run_phases(report, [("critical", _noop, 1)])
+
+    deferred = [("slow_check", release.wait, 1), ("fast_check", _noop, 1)]
+    report.expect(deferred)
+    task = asyncio.create_task(run_phases(report, deferred, deferred=True))
+    assert report.pending == {"slow_check", "fast_check"}
+    assert "startup_phases_pending 2" in REGISTRY.render()
+
+    release.set()
+    await task
+    assert report.pending == set()
+    assert "startup_phases_pending 0" in REGISTRY.render()
+    assert report.phases["slow_check"]["deferred"] is True
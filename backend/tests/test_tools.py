@@ -0,0 +1,136 @@
+import json
+from types import SimpleNamespace
+
+import pytest
+from httpx import AsyncClient
+from pymongo.errors import DuplicateKeyError
+
+from main import app
+from routes import tools
+from utils.menu_index import MenuIndex
+from utils.tool_carts import CartLimitError, CartStore
+
+MENU = [
+    {"id": "vp1", "name": "The 4 Cheese Pizza", "price": 499, "category": "Veg Pizzas", "isVeg": True},
+    {"id": "vp2", "name": "Margherita", "price": 299, "category": "Veg Pizzas", "isVeg": True},
+    {"id": "vp3", "name": "Double Cheese Margherita", "price": 399, "category": "Veg Pizzas", "isVeg": True},
+    {"id": "nv1", "name": "Chicken Pepperoni", "price": 549, "category": "Non-Veg Pizzas", "isVeg": False},
+]
+
+@pytest.fixture
+async def async_client():
+    async with AsyncClient(app=app, base_url="http://test") as client:
+        yield client
+
+def test_menu_index_ranks_exact_name_first():
+    index = MenuIndex(MENU)
+    assert index.find("margherita") == ["vp2", "vp3"]
+    assert index.find("double cheese")[0] == "vp3"
+    assert len(index.find("pizzas")) == 4
+    assert index.find("sushi") == []
+    assert index.resolve(name="chicken pepperoni") == "nv1"
+    assert json.loads(index.fragments["vp2"]) == {
+        "id": "vp2", "name": "Margherita", "price": 299, "category": "Veg Pizzas", "veg": True
+    }
+
+@pytest.mark.asyncio
+async def test_lookup_add_and_quote(async_client):
+    response = await async_client.post("/api/tools/menu/lookup", json={"query": "margherita", "limit": 1})
+    assert response.status_code == 200
+    [item] = response.json()["items"]
+    assert item["name"] == "Margherita"
+
+    call = {"callId": "tool-call-1"}
+    response = await async_client.post("/api/tools/cart/add", json={**call, "itemId": item["id"], "quantity": 2})
+    assert response.json() == {"added": json.loads(tools.get_menu_index().fragments[item["id"]]),
+                               "quantity": 2, "cartItems": 2, "total": item["price"] * 2}
+    response = await async_client.post("/api/tools/cart/add", json={**call, "name": "margherita"})
+    assert response.json()["quantity"] == 3
+
+    response = await async_client.post("/api/tools/order/quote", json=call)
+    quote = response.json()
+    assert quote["items"] == [{"id": item["id"], "name": "Margherita", "price": item["price"], "quantity": 3}]
+    assert quote["total"] == item["price"] * 3
+
+    response = await async_client.post("/api/tools/cart/add", json={**call, "name": "xyzzy"})
+    assert response.json()["added"] is None
+
+@pytest.mark.asyncio
+async def test_tool_secret_is_enforced(async_client, monkeypatch):
+    monkeypatch.setattr(tools, "TOOL_SECRET", "s3cret")
+    response = await async_client.post("/api/tools/menu/lookup", json={"query": "pizza"})
+    assert response.status_code == 401
+    response = await async_client.post(
+        "/api/tools/menu/lookup", json={"query": "pizza"}, headers={"X-Tool-Secret": "\xe9".encode("latin-1")}
+    )
+    assert response.status_code == 401
+    response = await async_client.post(
+        "/api/tools/menu/lookup", json={"query": "pizza"}, headers={"X-Tool-Secret": "s3cret"}
+    )
+    assert response.status_code == 200
+
+    response = await async_client.get(
+        "/api/tools/definitions?baseUrl=https://api.example.com", headers={"X-Tool-Secret": "s3cret"}
+    )
+    definitions = [tool["temporaryTool"] for tool in response.json()["selectedTools"]]
+    assert definitions[0]["http"]["baseUrlPattern"] == "https://api.example.com/api/tools/menu/lookup"
+    assert definitions[1]["automaticParameters"][0]["knownValue"] == "KNOWN_PARAM_CALL_ID"
+
+class FakeCursor:
+    def __init__(self, documents):
+        self.documents = documents
+
+    async def to_list(self, length=None):
+        return self.documents
+
+class FakeCartCollection:
+    def __init__(self):
+        self.lines = {}
+
+    async def create_index(self, keys, **options):
+        pass
+
+    async def update_one(self, query, update, upsert=False):
+        key = (query["call_id"], query["item_id"])
+        line = self.lines.get(key)
+        if line is not None and line["quantity"] > query.get("quantity", {}).get("$lte", line["quantity"]):
+            if upsert:
+                # The unique (call_id, item_id) index rejects a second line
+                raise DuplicateKeyError("duplicate cart line")
+            return SimpleNamespace(matched_count=0)
+        if line is None:
+            line = self.lines[key] = {"call_id": key[0], "item_id": key[1], "quantity": 0}
+        line["quantity"] += update["$inc"]["quantity"]
+        line.update(update["$set"])
+        return SimpleNamespace(matched_count=1)
+
+    def find(self, query):
+        return FakeCursor([dict(line) for line in self.lines.values() if line["call_id"] == query["call_id"]])
+
+@pytest.mark.asyncio
+async def test_persisted_carts_are_shared_between_workers(monkeypatch):
+    collection = FakeCartCollection()
+    first, second = CartStore(persist=True), CartStore(persist=True)
+    for store in (first, second):
+        monkeypatch.setattr(store, "_collection", lambda: collection)
+
+    assert await first.add("call-1", "vp1", 2) == {"vp1": 2}
+    assert await second.add("call-1", "vp1", 1) == {"vp1": 3}
+    await second.add("call-1", "nv1", 1)
+    assert await first.get("call-1") == {"vp1": 3, "nv1": 1}
+    assert await first.get("call-2") == {}
+
+    with pytest.raises(CartLimitError):
+        await second.add("call-1", "vp1", 3, limit=5)
+    assert await first.add("call-1", "vp1", 2, limit=5) == {"vp1": 5, "nv1": 1}
+
+@pytest.mark.asyncio
+async def test_cart_line_quantity_is_capped_across_adds(async_client):
+    call = {"callId": "tool-call-cap", "itemId": "vp2"}
+    response = await async_client.post("/api/tools/cart/add", json={**call, "quantity": tools.MAX_QUANTITY})
+    assert response.json()["quantity"] == tools.MAX_QUANTITY
+
+    response = await async_client.post("/api/tools/cart/add", json={**call, "quantity": 1})
+    assert response.json()["added"] is None
+    quote = (await async_client.post("/api/tools/order/quote", json={"callId": "tool-call-cap"})).json()
+    assert quote["items"][0]["quantity"] == tools.MAX_QUANTITY
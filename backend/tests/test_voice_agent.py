@@ -1,3 +1,4 @@
+import httpx
 import pytest
 from httpx import AsyncClient
 from unittest.mock import patch, MagicMock
@@ -6,6 +7,7 @@ import asyncio
 
 # Import the app correctly
 from main import app
+from routes import voice_agent
 
 # Create a fixture for the async client
 @pytest.fixture
@@ -22,16 +24,25 @@ def mock_ultravox_response():
     }
 
 @pytest.fixture
-def mock_requests_post():
-    """Fixture to mock requests.post"""
-    with patch("requests.post") as mock_post:
-        mock_response = MagicMock()
-        mock_response.status_code = 200
-        mock_response.json.return_value = {
-            "callId": "test-call-123",
-            "joinUrl": "https://example.com/join/test-call-123"
-        }
-        mock_post.return_value = mock_response
+def mock_ultravox_post():
+    """Fixture to mock httpx.AsyncClient.post for requests to Ultravox only;
+    the test client is an httpx.AsyncClient too"""
+    mock_post = MagicMock()
+    mock_response = MagicMock()
+    mock_response.status_code = 200
+    mock_response.json.return_value = {
+        "callId": "test-call-123",
+        "joinUrl": "https://example.com/join/test-call-123"
+    }
+    mock_post.return_value = mock_response
+    real_post = httpx.AsyncClient.post
+
+    async def post(self, url, *args, **kwargs):
+        if str(url).startswith(voice_agent.ULTRAVOX_BASE_URL):
+            return mock_post(url, *args, **kwargs)
+        return await real_post(self, url, *args, **kwargs)
+
+    with patch.object(httpx.AsyncClient, "post", post):
         yield mock_post
 
 @pytest.fixture
@@ -47,7 +58,7 @@ def mock_httpx_post():
 
 # Make the test functions async
 @pytest.mark.asyncio
-async def test_create_call_basic(async_client, mock_requests_post):
+async def test_create_call_basic(async_client, mock_ultravox_post):
     """Test creating a new call without prior call ID"""
     payload = {
         "model": "test-model",
@@ -64,12 +75,12 @@ async def test_create_call_basic(async_client, mock_requests_post):
     assert "joinUrl" in response.json()
     
     # Verify the request was made correctly
-    mock_requests_post.assert_called_once()
-    called_url = mock_requests_post.call_args[0][0]
+    mock_ultravox_post.assert_called_once()
+    called_url = mock_ultravox_post.call_args[0][0]
     assert called_url.endswith("/api/calls")
 
 @pytest.mark.asyncio
-async def test_create_call_with_prior_call_id(async_client, mock_requests_post):
+async def test_create_call_with_prior_call_id(async_client, mock_ultravox_post):
     """Test creating a call with a prior call ID in query params"""
     payload = {
         "model": "test-model",
@@ -84,12 +95,12 @@ async def test_create_call_with_prior_call_id(async_client, mock_requests_post):
     assert "callId" in response.json()
     
     # Verify the request was made with the correct query parameter
-    mock_requests_post.assert_called_once()
-    called_url = mock_requests_post.call_args[0][0]
+    mock_ultravox_post.assert_called_once()
+    called_url = mock_ultravox_post.call_args[0][0]
     assert "priorCallId=prior-123" in called_url
 
 @pytest.mark.asyncio
-async def test_create_call_with_initial_messages(async_client, mock_requests_post):
+async def test_create_call_with_initial_messages(async_client, mock_ultravox_post):
     """Test creating a call with initial messages that get transformed"""
     payload = {
         "model": "test-model",
@@ -106,7 +117,7 @@ async def test_create_call_with_initial_messages(async_client, mock_requests_pos
     assert response.status_code == 200
     
     # Verify transformation occurred correctly
-    called_json = mock_requests_post.call_args[1]["json"]
+    called_json = mock_ultravox_post.call_args[1]["json"]
     assert "initialMessages" in called_json
     transformed = called_json["initialMessages"]
     
@@ -118,7 +129,7 @@ async def test_create_call_with_initial_messages(async_client, mock_requests_pos
 
 @pytest.mark.asyncio
 @patch("os.getenv")
-async def test_missing_api_key(mock_getenv, async_client, mock_requests_post):
+async def test_missing_api_key(mock_getenv, async_client, mock_ultravox_post):
     """Test error handling when API key is missing"""
     # Configure the mock to return None for ULTRAVOX_API_KEY
     mock_getenv.side_effect = lambda key, default=None: None if key == "ULTRAVOX_API_KEY" else default
@@ -129,23 +140,141 @@ async def test_missing_api_key(mock_getenv, async_client, mock_requests_post):
     assert "not configured" in response.json()["detail"]
 
 @pytest.mark.asyncio
-async def test_hangup_call(async_client, mock_httpx_post):
-    """Test hanging up a call using the hangUp tool"""
+async def test_hangup_call(async_client, mock_ultravox_post):
+    """Hanging up a call created through the backend is answered from the call registry"""
+    await async_client.post("/api/voice-agent/calls", json={"model": "test-model"})
+
     payload = {
         "toolName": "hangUp",
         "responseType": "hang-up"
     }
-    
-    response = await async_client.post("/api/voice-agent/calls/test-call-123/hangup", json=payload)
-    
+
+    with patch("httpx.AsyncClient.get") as mock_get:
+        response = await async_client.post("/api/voice-agent/calls/test-call-123/hangup", json=payload)
+
     assert response.status_code == 200
     assert "success" in response.json()["message"].lower()
-    
-    # Verify the request was made with the correct payload
-    mock_httpx_post.assert_called_once()
-    called_url = mock_httpx_post.call_args[0][0]
-    called_json = mock_httpx_post.call_args[1]["json"]
-    
-    assert called_url.endswith("/calls/test-call-123/tools")
-    assert called_json["toolName"] == "hangUp"
-    assert called_json["responseType"] == "hang-up" 
\ No newline at end of file
+    mock_get.assert_not_called()
+
+@pytest.mark.asyncio
+async def test_local_hangup_does_not_wait_for_an_ultravox_slot(async_client, mock_ultravox_post, monkeypatch):
+    """Only hangups forwarded to Ultravox take an upstream slot"""
+    await async_client.post("/api/voice-agent/calls", json={"model": "test-model"})
+    monkeypatch.setattr(voice_agent.ULTRAVOX_SLOTS, "in_flight", voice_agent.ULTRAVOX_SLOTS.limit)
+    monkeypatch.setattr(voice_agent.ULTRAVOX_SLOTS, "max_wait", 0)
+
+    response = await async_client.post("/api/voice-agent/calls/test-call-123/hangup")
+    assert response.status_code == 200
+
+    with patch("httpx.AsyncClient.get") as mock_get:
+        response = await async_client.post("/api/voice-agent/calls/unknown-call/hangup")
+    assert response.status_code == 429
+    mock_get.assert_not_called()
+
+@pytest.mark.asyncio
+async def test_resuming_a_resumed_call_is_rejected_locally(async_client, mock_ultravox_post):
+    """A prior call that was already resumed is refused without contacting Ultravox"""
+    mock_ultravox_post.return_value.json.return_value = {"callId": "first-call", "joinUrl": "https://example.com/join/1"}
+    await async_client.post("/api/voice-agent/calls", json={"model": "test-model"})
+    mock_ultravox_post.return_value.json.return_value = {"callId": "second-call", "joinUrl": "https://example.com/join/2"}
+    response = await async_client.post("/api/voice-agent/calls?priorCallId=first-call", json={"model": "test-model"})
+    assert response.status_code == 200
+
+    mock_ultravox_post.reset_mock()
+    response = await async_client.post("/api/voice-agent/calls?priorCallId=first-call", json={"model": "test-model"})
+
+    assert response.status_code == 409
+    mock_ultravox_post.assert_not_called()
+
+@pytest.mark.asyncio
+async def test_create_call_with_profile_merges_deltas(async_client, mock_ultravox_post):
+    """A profileId expands to the profile's cached fields, with client deltas applied"""
+    payload = {
+        "profileId": "real-estate",
+        "voice": "Tanya-English",
+        "initialMessages": [{"text": "Hello", "speaker": "user", "type": "text"}]
+    }
+
+    response = await async_client.post("/api/voice-agent/calls", json=payload)
+
+    assert response.status_code == 200
+    sent = json.loads(mock_ultravox_post.call_args[1]["content"])
+    assert "profileId" not in sent
+    assert sent["voice"] == "Tanya-English"
+    assert sent["model"] == "fixie-ai/ultravox-70B"
+    assert "Global Estates" in sent["systemPrompt"]
+    assert [tool["temporaryTool"]["modelToolName"] for tool in sent["selectedTools"]] == [
+        "hangUp", "UpdatePreferences", "SearchProperties"
+    ]
+    assert sent["initialMessages"] == [{"text": "Hello", "role": "USER", "medium": "TEXT"}]
+
+@pytest.mark.asyncio
+async def test_create_call_upstream_failures(async_client, mock_ultravox_post):
+    mock_ultravox_post.side_effect = httpx.ConnectTimeout("timed out")
+    response = await async_client.post("/api/voice-agent/calls", json={"systemPrompt": "Hi"})
+    assert response.status_code == 504
+
+    mock_ultravox_post.side_effect = httpx.ConnectError("refused")
+    response = await async_client.post("/api/voice-agent/calls", json={"systemPrompt": "Hi"})
+    assert response.status_code == 502
+
+@pytest.mark.asyncio
+async def test_create_call_with_unknown_profile(async_client, mock_ultravox_post):
+    response = await async_client.post("/api/voice-agent/calls", json={"profileId": "missing"})
+
+    assert response.status_code == 400
+    mock_ultravox_post.assert_not_called()
+
+def _messages_page(texts, next_cursor=None):
+    response = MagicMock()
+    response.status_code = 200
+    response.json.return_value = {
+        "results": [{"role": "MESSAGE_ROLE_AGENT", "text": text} for text in texts],
+        "next": f"https://api.ultravox.ai/api/calls/c1/messages?cursor={next_cursor}" if next_cursor else None,
+    }
+    return response
+
+@pytest.mark.asyncio
+async def test_call_messages_stream_pages_lazily(async_client):
+    """Messages are relayed as NDJSON, following the upstream cursor page by page"""
+    # request() rather than get(), which is patched for the upstream client
+    pages = [_messages_page(["one", "two"], "abc"), _messages_page(["three"])]
+    with patch("httpx.AsyncClient.get", side_effect=pages) as mock_get:
+        response = await async_client.request("GET", "/api/voice-agent/calls/c1/messages?page_size=2")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert [line["message"]["text"] for line in lines if "message" in line] == ["one", "two", "three"]
+    assert [line["cursor"]["next"] for line in lines if "cursor" in line] == ["abc", None]
+    assert mock_get.call_count == 2
+    assert "cursor" not in mock_get.call_args_list[0][1]["params"]
+    assert mock_get.call_args_list[1][1]["params"] == {"pageSize": 2, "cursor": "abc"}
+
+@pytest.mark.asyncio
+async def test_call_messages_resume_from_cursor_as_sse(async_client):
+    """SSE clients resume with Last-Event-ID; each page ends with its cursor as the event id"""
+    with patch("httpx.AsyncClient.get", side_effect=[_messages_page(["three"])]) as mock_get:
+        response = await async_client.request(
+            "GET", "/api/voice-agent/calls/c1/messages?format=sse",
+            headers={"Last-Event-ID": "abc"},
+        )
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    assert mock_get.call_args[1]["params"]["cursor"] == "abc"
+    assert 'event: message\ndata: {"role":"MESSAGE_ROLE_AGENT","text":"three"}' in response.text
+
+@pytest.mark.asyncio
+async def test_call_messages_upstream_error(async_client):
+    """An upstream error on the first page keeps its status code"""
+    response_404 = MagicMock()
+    response_404.status_code = 404
+    response_404.headers = {"content-type": "application/json"}
+    response_404.json.return_value = {"detail": "Not found."}
+    with patch("httpx.AsyncClient.get", return_value=response_404):
+        response = await async_client.request("GET", "/api/voice-agent/calls/missing/messages")
+    assert response.status_code == 404
+
+    response = await async_client.request("GET", "/api/voice-agent/calls/c1/messages?format=xml")
+    assert response.status_code == 400
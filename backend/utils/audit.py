@@ -0,0 +1,31 @@
+"""Audit trail of account and order events in the ``audit_log`` collection.
+
+``audit(event, **fields)`` only queues the write, so the request that
+triggers it never waits on Mongo.
+"""
+import logging
+import uuid
+from datetime import datetime
+from typing import Any, Dict
+
+from utils.jobs import PRIORITY_LOW, jobs
+
+logger = logging.getLogger("global_estates")
+
+
+@jobs.handler("audit.record", priority=PRIORITY_LOW, max_attempts=5)
+async def write_audit_record(payload: Dict[str, Any]):
+    from database import get_database
+
+    db = get_database()
+    if db is None:
+        logger.info("Audit: %s", payload)
+        return
+    # Keyed by the id made at enqueue time, so a retried write cannot duplicate the record
+    record = {**payload, "at": datetime.fromisoformat(payload["at"])}
+    await db.audit_log.replace_one({"_id": payload["_id"]}, record, upsert=True)
+
+
+def audit(event: str, **fields: Any):
+    jobs.enqueue("audit.record", {"_id": uuid.uuid4().hex, "event": event,
+                                  "at": datetime.utcnow().isoformat(), **fields})
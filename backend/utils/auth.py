@@ -2,14 +2,18 @@ from datetime import datetime, timedelta
 from typing import Optional, Annotated
 from jose import JWTError, jwt
 from passlib.context import CryptContext
-from fastapi import Depends, HTTPException, status, Request
+from fastapi import Depends, Header, HTTPException, status, Request
 from fastapi.security import OAuth2PasswordBearer
 from dotenv import load_dotenv
 import os
+import hmac
 import logging
 from models.user import TokenData, UserInDB, User
 from motor.motor_asyncio import AsyncIOMotorDatabase
 from database import get_database
+from utils.cache import TTLCache
+from utils.fast_json import trusted_model
+from utils.metrics import MONGO_OPERATION_DURATION
 
 # Get logger
 logger = logging.getLogger("global_estates")
@@ -22,9 +26,21 @@ SECRET_KEY = os.getenv("SECRET_KEY")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "30"))
 
-# Password hashing
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Password hashing; hashes made with a different cost are replaced on the next login
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=BCRYPT_ROUNDS)
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/auth/token")
+optional_oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/auth/token", auto_error=False)
+
+# Operator token for the /api/debug and admin analytics endpoints; they are disabled without it
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
+# Bearer token for /metrics scrapers; without it /metrics is open and must stay off public networks
+METRICS_TOKEN = os.getenv("METRICS_TOKEN")
+
+# Every authenticated request looks its user up; keep recent ones per worker.
+# Writes to a user document must call bus.publish("users", email).
+USER_CACHE_TTL = float(os.getenv("USER_CACHE_TTL", "30"))
+user_cache = TTLCache("users", USER_CACHE_TTL, max_entries=int(os.getenv("USER_CACHE_SIZE", "10000")))
 
 def verify_password(plain_password, hashed_password):
     return pwd_context.verify(plain_password, hashed_password)
@@ -32,9 +48,19 @@ def verify_password(plain_password, hashed_password):
 def get_password_hash(password):
     return pwd_context.hash(password)
 
+def password_needs_rehash(hashed_password) -> bool:
+    return pwd_context.needs_update(hashed_password)
+
 async def get_user(db, email: str):
-    if (user := await db.users.find_one({"email": email})) is not None:
-        return UserInDB(**user)
+    cached = user_cache.get(email)
+    if cached is not None:
+        return cached.copy()
+    with MONGO_OPERATION_DURATION.labels("users.find_one").time():
+        user = await db.users.find_one({"email": email})
+    if user is not None:
+        user = UserInDB(**user)
+        user_cache.set(email, user)
+        return user.copy()
     return None
 
 async def authenticate_user(db, email: str, password: str):
@@ -67,7 +93,7 @@ async def get_current_user(
     )
 
     try:
-        logger.debug(f"Validating token: {token[:10]}...")
+        logger.debug("Validating token: %.10s...", token)
         
         # Decode JWT token
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
@@ -77,7 +103,7 @@ async def get_current_user(
             raise credentials_exception
             
         token_data = TokenData(email=email)
-        logger.debug(f"Token data extracted: {token_data}")
+        logger.debug("Token data extracted: %s", token_data)
         
         # Get user from database
         user = await get_user(db, email=token_data.email)
@@ -89,8 +115,9 @@ async def get_current_user(
         if not user.created_at:
             user.created_at = datetime.utcnow()
         
-        # Convert UserInDB to User
-        return User(
+        # Convert UserInDB to User; its fields were validated when it was loaded
+        return trusted_model(
+            User,
             id=str(user.id),
             email=user.email,
             name=user.name,
@@ -106,9 +133,44 @@ async def get_current_user(
         logger.error(f"Unexpected error in get_current_user: {str(e)}")
         raise credentials_exception
 
+async def get_optional_user_email(
+    token: Annotated[Optional[str], Depends(optional_oauth2_scheme)]
+) -> Optional[str]:
+    """Email from a valid bearer token, or None for anonymous requests.
+
+    Only the token is checked; no database lookup is made.
+    """
+    if not token:
+        return None
+    try:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    except JWTError:
+        return None
+    return payload.get("sub")
+
 async def get_current_active_user(
     current_user: Annotated[User, Depends(get_current_user)]
 ):
     if not current_user.is_active:
         raise HTTPException(status_code=400, detail="Inactive user")
-    return current_user 
\ No newline at end of file
+    return current_user
+
+async def require_admin(x_admin_token: Annotated[Optional[str], Header()] = None):
+    """Allow only requests carrying ADMIN_TOKEN in the X-Admin-Token header"""
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
+    # Header values arrive latin-1 decoded; compare_digest only accepts ASCII str, so compare bytes
+    if not hmac.compare_digest((x_admin_token or "").encode("latin-1"), ADMIN_TOKEN.encode("utf-8")):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin token required")
+
+async def require_metrics_token(authorization: Annotated[Optional[str], Header()] = None):
+    """Allow only scrapers sending ``Authorization: Bearer <METRICS_TOKEN>`` when it is set"""
+    if not METRICS_TOKEN:
+        return
+    expected = f"Bearer {METRICS_TOKEN}".encode("utf-8")
+    if not hmac.compare_digest((authorization or "").encode("latin-1"), expected):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Metrics token required",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
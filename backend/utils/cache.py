@@ -0,0 +1,72 @@
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional
+
+from utils.metrics import Counter, Gauge
+
+CACHE_REQUESTS = Counter("cache_requests_total", "Cache lookups", ["cache", "result"])
+CACHE_EVICTIONS = Counter("cache_evictions_total", "Cache entries removed before expiry", ["cache", "reason"])
+CACHE_ENTRIES = Gauge("cache_entries", "Entries currently cached", ["cache"])
+
+_MISSING = object()
+
+
+class TTLCache:
+    """Small per-process LRU cache with a time-to-live per entry.
+
+    Each worker process owns its own instance (shared-nothing); see
+    ``CACHES`` for the named caches used by the app.
+    """
+
+    def __init__(self, name: str, ttl: float, max_entries: int = 10000):
+        self.name = name
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._hits = CACHE_REQUESTS.labels(name, "hit")
+        self._misses = CACHE_REQUESTS.labels(name, "miss")
+        self._size = CACHE_ENTRIES.labels(name)
+        CACHES[name] = self
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        entry = self._entries.get(key, _MISSING)
+        if entry is _MISSING:
+            self._misses.inc()
+            return default
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self._entries[key]
+            self._size.set(len(self._entries))
+            self._misses.inc()
+            return default
+        self._entries.move_to_end(key)
+        self._hits.inc()
+        return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        self._entries[key] = (time.monotonic() + (self.ttl if ttl is None else ttl), value)
+        self._entries.move_to_end(key)
+        if len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            CACHE_EVICTIONS.labels(self.name, "capacity").inc()
+        self._size.set(len(self._entries))
+
+    def invalidate(self, key: Hashable) -> bool:
+        removed = self._entries.pop(key, _MISSING) is not _MISSING
+        if removed:
+            CACHE_EVICTIONS.labels(self.name, "invalidated").inc()
+            self._size.set(len(self._entries))
+        return removed
+
+    def clear(self):
+        if self._entries:
+            CACHE_EVICTIONS.labels(self.name, "invalidated").inc(len(self._entries))
+        self._entries.clear()
+        self._size.set(0)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+# Named caches in this process, by name
+CACHES: Dict[str, TTLCache] = {}
@@ -0,0 +1,122 @@
+"""Ultravox call-lifecycle events: webhook verification and fan-out.
+
+Ultravox signs each webhook delivery with HMAC-SHA256 over the raw body
+followed by the ``X-Ultravox-Webhook-Timestamp`` value. Verified events
+update the call registry and are pushed to every frontend subscribed to that
+call over server-sent events. Deliveries are broadcast on the invalidation
+bus, so subscribers connected to any worker receive them.
+"""
+import asyncio
+import hashlib
+import hmac
+import json
+import logging
+import time
+from datetime import datetime
+from typing import Any, Dict, Optional, Set
+
+from utils.call_registry import call_registry
+from utils.invalidation import bus
+from utils.metrics import Counter, Gauge
+
+logger = logging.getLogger("global_estates")
+
+CALL_EVENTS_RECEIVED = Counter("call_events_received_total", "Verified call webhook events", ["event"])
+WEBHOOK_REJECTIONS = Counter("call_webhook_rejections_total", "Webhook deliveries refused", ["reason"])
+EVENT_SUBSCRIBERS = Gauge("call_event_subscribers", "Open call event streams on this worker")
+EVENTS_DROPPED = Counter("call_events_dropped_total", "Events dropped for slow subscribers")
+
+# Bus channel used to share events between workers
+CHANNEL = "call_events"
+# Events after which nothing more is sent for a call
+TERMINAL_EVENTS = frozenset(["call.ended"])
+
+
+def sign_webhook(secret: str, body: bytes, timestamp: str) -> str:
+    return hmac.new(secret.encode("utf-8"), body + timestamp.encode("utf-8"), hashlib.sha256).hexdigest()
+
+
+def _parse_timestamp(timestamp: str) -> Optional[float]:
+    try:
+        return float(timestamp)
+    except ValueError:
+        pass
+    try:
+        return datetime.fromisoformat(timestamp.replace("Z", "+00:00")).timestamp()
+    except ValueError:
+        return None
+
+
+def verify_webhook(secret: str, body: bytes, timestamp: Optional[str], signatures: Optional[str],
+                   tolerance: float, now: Optional[float] = None) -> Optional[str]:
+    """Return None if the delivery is authentic, else the reason it is not.
+
+    The signature header may hold several comma-separated signatures while
+    the secret is being rotated; any match is accepted.
+    """
+    if not timestamp or not signatures:
+        return "missing_signature"
+    sent_at = _parse_timestamp(timestamp)
+    if sent_at is None or abs((now if now is not None else time.time()) - sent_at) > tolerance:
+        return "stale"
+    expected = sign_webhook(secret, body, timestamp)
+    if not any(hmac.compare_digest(expected, candidate.strip()) for candidate in signatures.split(",")):
+        return "bad_signature"
+    return None
+
+
+class CallEventHub:
+    """Per-call subscriber queues on this worker"""
+
+    def __init__(self, queue_size: int = 64):
+        self.queue_size = queue_size
+        self._subscribers: Dict[str, Set[asyncio.Queue]] = {}
+
+    def subscribe(self, call_id: str) -> asyncio.Queue:
+        queue: asyncio.Queue = asyncio.Queue(self.queue_size)
+        self._subscribers.setdefault(call_id, set()).add(queue)
+        EVENT_SUBSCRIBERS.inc()
+        return queue
+
+    def unsubscribe(self, call_id: str, queue: asyncio.Queue):
+        queues = self._subscribers.get(call_id)
+        if queues is None or queue not in queues:
+            return
+        queues.discard(queue)
+        if not queues:
+            del self._subscribers[call_id]
+        EVENT_SUBSCRIBERS.dec()
+
+    def subscriber_count(self, call_id: str) -> int:
+        return len(self._subscribers.get(call_id, ()))
+
+    def deliver(self, event: Dict[str, Any]):
+        """Apply an event to local call state and push it to subscribers"""
+        call_id = event.get("callId")
+        if not call_id:
+            return
+        if event.get("event") in TERMINAL_EVENTS:
+            call_registry.end(call_id, "upstream")
+        else:
+            call_registry.touch(call_id)
+
+        for queue in self._subscribers.get(call_id, ()):
+            if queue.full():
+                # A stalled client loses its oldest event rather than blocking the others
+                queue.get_nowait()
+                EVENTS_DROPPED.inc()
+            queue.put_nowait(event)
+
+
+hub = CallEventHub()
+bus.subscribe(CHANNEL, lambda event: hub.deliver(event) if event else None)
+
+
+def publish_event(event: Dict[str, Any]):
+    """Deliver a verified event here and on every other worker"""
+    CALL_EVENTS_RECEIVED.labels(event.get("event", "unknown")).inc()
+    bus.publish(CHANNEL, event)
+
+
+def format_sse(event: Dict[str, Any]) -> bytes:
+    return f"event: {event.get('event', 'message')}\ndata: {json.dumps(event, separators=(',', ':'))}\n\n".encode("utf-8")
@@ -0,0 +1,118 @@
+"""Named Ultravox call profiles.
+
+A profile holds the large, rarely changing parts of a call request (system
+prompt, tools, model, voice). Profiles are read from ``call_profiles.json``,
+validated and serialized once; ``create_call`` then only parses the small
+set of per-call fields the client sends and splices them into the cached
+bytes.
+"""
+import json
+import logging
+import os
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger("global_estates")
+
+CALL_PROFILES_PATH = os.getenv(
+    "CALL_PROFILES_PATH",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "call_profiles.json"),
+)
+
+# Fields every profile must define, with their JSON types
+REQUIRED_FIELDS = {"systemPrompt": str, "model": str}
+OPTIONAL_FIELDS = {
+    "voice": str,
+    "temperature": (int, float),
+    "selectedTools": list,
+    "inactivity_messages": list,
+    "recordingEnabled": bool,
+    "languageHint": str,
+    "maxDuration": str,
+    "firstSpeaker": str,
+}
+# Documentation only; never sent upstream
+METADATA_FIELDS = ("description",)
+
+
+def _fragment(key: str, value: Any) -> bytes:
+    """One ``"key":value`` member of a JSON object"""
+    return json.dumps({key: value}, separators=(",", ":"), ensure_ascii=False)[1:-1].encode("utf-8")
+
+
+class CallProfile:
+    def __init__(self, profile_id: str, fields: Dict[str, Any], description: str = ""):
+        self.profile_id = profile_id
+        self.fields = fields
+        self.description = description
+        self.fragments = {key: _fragment(key, value) for key, value in fields.items()}
+        self.size = sum(len(fragment) for fragment in self.fragments.values())
+
+    def render(self, overrides: Dict[str, Any]) -> bytes:
+        """JSON request body: cached fields, with ``overrides`` replacing or adding fields"""
+        parts = [fragment for key, fragment in self.fragments.items() if key not in overrides]
+        parts.extend(_fragment(key, value) for key, value in overrides.items())
+        return b"{" + b",".join(parts) + b"}"
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "description": self.description,
+            "model": self.fields.get("model"),
+            "voice": self.fields.get("voice"),
+            "tools": [
+                tool.get("temporaryTool", {}).get("modelToolName") or tool.get("toolName")
+                for tool in self.fields.get("selectedTools", [])
+            ],
+        }
+
+
+def validate_profile(profile_id: str, data: Any) -> CallProfile:
+    if not isinstance(data, dict):
+        raise ValueError(f"Call profile {profile_id} must be an object")
+    for key, expected in REQUIRED_FIELDS.items():
+        if not isinstance(data.get(key), expected):
+            raise ValueError(f"Call profile {profile_id} is missing {key}")
+    fields = {}
+    for key, value in data.items():
+        if key in METADATA_FIELDS:
+            continue
+        expected = REQUIRED_FIELDS.get(key) or OPTIONAL_FIELDS.get(key)
+        if expected is None:
+            raise ValueError(f"Call profile {profile_id} has unknown field {key}")
+        if not isinstance(value, expected) or (expected is not bool and isinstance(value, bool)):
+            raise ValueError(f"Call profile {profile_id} has an invalid {key}")
+        fields[key] = value
+    return CallProfile(profile_id, fields, data.get("description", ""))
+
+
+def load_call_profiles(path: str = CALL_PROFILES_PATH) -> Dict[str, CallProfile]:
+    """Read, validate and pre-serialize every profile in ``path``"""
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    profiles = {
+        profile_id: validate_profile(profile_id, profile)
+        for profile_id, profile in data.get("profiles", {}).items()
+    }
+    logger.info(f"Loaded {len(profiles)} call profiles from {path}")
+    return profiles
+
+
+_profiles: Optional[Dict[str, CallProfile]] = None
+
+
+def get_call_profiles() -> Dict[str, CallProfile]:
+    """Profiles loaded on first use (or at startup); an unreadable file means no profiles"""
+    global _profiles
+    if _profiles is None:
+        try:
+            _profiles = load_call_profiles()
+        except FileNotFoundError:
+            logger.warning(f"No call profiles file at {CALL_PROFILES_PATH}")
+            _profiles = {}
+        except ValueError as e:
+            logger.error(f"Invalid call profiles file {CALL_PROFILES_PATH}: {e}")
+            _profiles = {}
+    return _profiles
+
+
+def get_call_profile(profile_id: str) -> Optional[CallProfile]:
+    return get_call_profiles().get(profile_id)
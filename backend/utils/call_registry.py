@@ -0,0 +1,324 @@
+"""Server-side record of the voice calls created through this backend.
+
+``create_call`` registers every call Ultravox accepts. The registry then
+answers existence checks (``hangup_call``) locally, refuses resumptions of
+calls it knows are stale, and a reaper task ends calls that stopped showing
+activity. Records live in a bounded in-memory map per worker; with
+``CALL_REGISTRY_PERSIST=true`` they are also written to the ``voice_calls``
+collection so other workers and restarts can see them. Activity, endings and
+resumptions are written as field updates, so a worker that only knows a call
+from the collection can still record them without overwriting the rest.
+"""
+import asyncio
+import logging
+import os
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from utils.metrics import Counter, Gauge
+
+logger = logging.getLogger("global_estates")
+
+ACTIVE_CALLS = Gauge("voice_calls_active", "Voice calls registered and not yet ended")
+CALLS_ENDED = Counter("voice_calls_ended_total", "Voice calls ended, by reason", ["reason"])
+RESUMPTIONS_REJECTED = Counter(
+    "voice_call_resumptions_rejected_total", "priorCallId resumptions refused locally", ["reason"]
+)
+
+# A call with no activity (polls, hangup, tool calls) for this long is ended
+CALL_IDLE_TIMEOUT = float(os.getenv("CALL_IDLE_TIMEOUT", "1800"))
+# How long after its last activity a call can still be resumed with priorCallId
+CALL_RESUME_WINDOW = float(os.getenv("CALL_RESUME_WINDOW", "86400"))
+CALL_REAPER_INTERVAL = float(os.getenv("CALL_REAPER_INTERVAL", "60"))
+CALL_REGISTRY_SIZE = int(os.getenv("CALL_REGISTRY_SIZE", "10000"))
+CALL_REGISTRY_PERSIST = os.getenv("CALL_REGISTRY_PERSIST", "false").lower() in ("1", "true", "yes")
+
+
+class CallRecord:
+    __slots__ = ("call_id", "owner", "prior_call_id", "created_at", "last_activity", "ended_at",
+                 "end_reason", "resumed_by")
+
+    def __init__(self, call_id: str, owner: Optional[str] = None, prior_call_id: Optional[str] = None,
+                 created_at: Optional[float] = None):
+        self.call_id = call_id
+        self.owner = owner
+        self.prior_call_id = prior_call_id
+        self.created_at = created_at if created_at is not None else time.time()
+        self.last_activity = self.created_at
+        self.ended_at: Optional[float] = None
+        self.end_reason: Optional[str] = None
+        # Id of the call that resumed this one, if any
+        self.resumed_by: Optional[str] = None
+
+    @property
+    def active(self) -> bool:
+        return self.ended_at is None
+
+    def to_document(self) -> Dict[str, Any]:
+        return {
+            "_id": self.call_id,
+            "owner": self.owner,
+            "prior_call_id": self.prior_call_id,
+            "created_at": datetime.utcfromtimestamp(self.created_at),
+            "last_activity": datetime.utcfromtimestamp(self.last_activity),
+            "ended_at": datetime.utcfromtimestamp(self.ended_at) if self.ended_at is not None else None,
+            "end_reason": self.end_reason,
+            "resumed_by": self.resumed_by,
+        }
+
+    @classmethod
+    def from_document(cls, document: Dict[str, Any]) -> "CallRecord":
+        record = cls(document["_id"], document.get("owner"), document.get("prior_call_id"),
+                     document["created_at"].timestamp())
+        record.last_activity = document["last_activity"].timestamp()
+        if document.get("ended_at") is not None:
+            record.ended_at = document["ended_at"].timestamp()
+        record.end_reason = document.get("end_reason")
+        record.resumed_by = document.get("resumed_by")
+        return record
+
+
+class StaleCallError(Exception):
+    """Raised when a priorCallId cannot be resumed"""
+
+    def __init__(self, reason: str, message: str):
+        super().__init__(message)
+        self.reason = reason
+
+
+class CallRegistry:
+    """Bounded map of call id to ``CallRecord``, least recently active first"""
+
+    def __init__(self, max_calls: int = CALL_REGISTRY_SIZE, idle_timeout: float = CALL_IDLE_TIMEOUT,
+                 resume_window: float = CALL_RESUME_WINDOW, persist: bool = CALL_REGISTRY_PERSIST):
+        self.max_calls = max_calls
+        self.idle_timeout = idle_timeout
+        self.resume_window = resume_window
+        self.persist = persist
+        self._calls: "OrderedDict[str, CallRecord]" = OrderedDict()
+        self._active = 0
+        self._reaper: Optional[asyncio.Task] = None
+        self._pending = set()
+
+    def __len__(self) -> int:
+        return len(self._calls)
+
+    @property
+    def active_count(self) -> int:
+        return self._active
+
+    def _set_active(self, delta: int):
+        self._active += delta
+        ACTIVE_CALLS.set(self._active)
+
+    def register(self, call_id: str, owner: Optional[str] = None,
+                 prior_call_id: Optional[str] = None) -> CallRecord:
+        record = CallRecord(call_id, owner, prior_call_id)
+        self._remember(record)
+
+        if prior_call_id:
+            # The prior call may only be known to another worker
+            prior = self._calls.get(prior_call_id)
+            if prior is not None:
+                prior.resumed_by = call_id
+            self._update(prior_call_id, {"$set": {"resumed_by": call_id}})
+        self._save(record)
+        return record
+
+    async def adopt(self, call_id: str) -> CallRecord:
+        """Track a call created elsewhere, e.g. first seen through a webhook.
+
+        The stored record is reused when there is one, and a missing one is
+        only inserted, so its owner and resumption links are never overwritten.
+        """
+        record = await self.lookup(call_id)
+        if record is None:
+            record = CallRecord(call_id)
+            self._insert(record)
+        if call_id not in self._calls:
+            self._remember(record)
+        return record
+
+    def _remember(self, record: CallRecord):
+        previous = self._calls.pop(record.call_id, None)
+        if previous is not None and previous.active:
+            self._set_active(-1)
+        self._calls[record.call_id] = record
+        if record.active:
+            self._set_active(1)
+
+        while len(self._calls) > self.max_calls:
+            _, evicted = self._calls.popitem(last=False)
+            if evicted.active:
+                self._set_active(-1)
+                CALLS_ENDED.labels("evicted").inc()
+
+    def get(self, call_id: str) -> Optional[CallRecord]:
+        return self._calls.get(call_id)
+
+    async def lookup(self, call_id: str, fresh: bool = False) -> Optional[CallRecord]:
+        """Find a call in memory, falling back to Mongo when persistence is on.
+
+        ``fresh`` reads Mongo first, for decisions that other workers' updates
+        to the call could change.
+        """
+        record = self._calls.get(call_id)
+        if not self.persist or (record is not None and not fresh):
+            return record
+        collection = self._collection()
+        if collection is None:
+            return record
+        try:
+            document = await collection.find_one({"_id": call_id})
+        except Exception as e:
+            logger.warning("Call registry lookup failed for %s: %s", call_id, e)
+            return record
+        return CallRecord.from_document(document) if document else record
+
+    def touch(self, call_id: str) -> Optional[CallRecord]:
+        now = time.time()
+        record = self._calls.get(call_id)
+        if record is not None and record.active:
+            record.last_activity = now
+            self._calls.move_to_end(call_id)
+        if record is None or record.active:
+            self._update(call_id, {"$set": {"last_activity": datetime.utcfromtimestamp(now)}}, active_only=True)
+        return record
+
+    def end(self, call_id: str, reason: str) -> Optional[CallRecord]:
+        """End a call; one known only from Mongo is ended there"""
+        now = time.time()
+        record = self._calls.get(call_id)
+        if record is not None:
+            if not record.active:
+                return record
+            record.ended_at = record.last_activity = now
+            record.end_reason = reason
+            self._set_active(-1)
+            CALLS_ENDED.labels(reason).inc()
+        ended = datetime.utcfromtimestamp(now)
+        self._update(
+            call_id,
+            {"$set": {"ended_at": ended, "last_activity": ended, "end_reason": reason}},
+            active_only=True,
+        )
+        return record
+
+    def chain(self, call_id: str) -> List[str]:
+        """Call ids from ``call_id`` back through its known priorCallId links"""
+        ids = []
+        record = self._calls.get(call_id)
+        while record is not None and record.call_id not in ids:
+            ids.append(record.call_id)
+            record = self._calls.get(record.prior_call_id) if record.prior_call_id else None
+        return ids
+
+    async def check_resumable(self, prior_call_id: str, owner: Optional[str] = None):
+        """Raise ``StaleCallError`` if the registry knows the call cannot be resumed.
+
+        Calls the registry has never seen are allowed through; Ultravox has
+        the final word on those.
+        """
+        record = await self.lookup(prior_call_id, fresh=True)
+        if record is None:
+            return
+        if record.owner and record.owner != owner:
+            RESUMPTIONS_REJECTED.labels("owner").inc()
+            raise StaleCallError("owner", "Prior call belongs to another user")
+        if record.resumed_by:
+            RESUMPTIONS_REJECTED.labels("resumed").inc()
+            raise StaleCallError("resumed", f"Prior call was already resumed by {record.resumed_by}")
+        if time.time() - record.last_activity > self.resume_window:
+            RESUMPTIONS_REJECTED.labels("expired").inc()
+            raise StaleCallError("expired", "Prior call is too old to resume")
+
+    def reap(self, now: Optional[float] = None) -> List[str]:
+        """End idle calls and forget ended ones that can no longer be resumed"""
+        now = now if now is not None else time.time()
+        reaped = []
+        for call_id, record in list(self._calls.items()):
+            if record.active and now - record.last_activity > self.idle_timeout:
+                self.end(call_id, "idle")
+                reaped.append(call_id)
+            elif not record.active and now - record.ended_at > self.resume_window:
+                del self._calls[call_id]
+        return reaped
+
+    async def _reap_forever(self, interval: float):
+        while True:
+            await asyncio.sleep(interval)
+            reaped = self.reap()
+            if reaped:
+                logger.info("Ended %d idle voice calls", len(reaped))
+
+    async def start(self, interval: float = CALL_REAPER_INTERVAL):
+        if self._reaper is None:
+            self._reaper = asyncio.create_task(self._reap_forever(interval))
+
+    async def stop(self):
+        if self._reaper is not None:
+            self._reaper.cancel()
+            try:
+                await self._reaper
+            except asyncio.CancelledError:
+                pass
+            self._reaper = None
+        await self.flush()
+
+    async def flush(self):
+        """Wait for writes to Mongo that are still in flight"""
+        if self._pending:
+            await asyncio.gather(*self._pending, return_exceptions=True)
+
+    def _collection(self):
+        from database import get_database
+
+        database = get_database()
+        return database.voice_calls if database is not None else None
+
+    def _save(self, record: CallRecord):
+        if not self.persist:
+            return
+        collection = self._collection()
+        if collection is None:
+            return
+        self._write(collection.replace_one({"_id": record.call_id}, record.to_document(), upsert=True))
+
+    def _insert(self, record: CallRecord):
+        """Store a record unless the call is already stored"""
+        if not self.persist:
+            return
+        collection = self._collection()
+        if collection is None:
+            return
+        document = record.to_document()
+        del document["_id"]
+        self._write(collection.update_one({"_id": record.call_id}, {"$setOnInsert": document}, upsert=True))
+
+    def _update(self, call_id: str, update: Dict[str, Any], active_only: bool = False):
+        """Update fields of a stored call without replacing the document"""
+        if not self.persist:
+            return
+        collection = self._collection()
+        if collection is None:
+            return
+        query: Dict[str, Any] = {"_id": call_id}
+        if active_only:
+            query["ended_at"] = None
+        self._write(collection.update_one(query, update))
+
+    def _write(self, operation):
+        task = asyncio.ensure_future(operation)
+        self._pending.add(task)
+        task.add_done_callback(self._saved)
+
+    def _saved(self, task: asyncio.Task):
+        self._pending.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.warning("Failed to persist voice call: %s", task.exception())
+
+
+# Process-wide registry; the reaper is started from the app lifespan
+call_registry = CallRegistry()
@@ -0,0 +1,256 @@
+"""Columnar multi-outlet menu catalog.
+
+Items from any number of outlets (restaurants) are compiled into one binary
+image instead of a list of dicts per outlet:
+
+- every string (ids, names, descriptions, categories, images, outlet ids)
+  is stored once in a UTF-8 blob and referenced by a 32-bit index;
+- prices are a float64 column and veg flags an int8 column;
+- each outlet's items are a contiguous row range, sorted by price, so a price
+  range is two binary searches;
+- veg, non-veg and per-category membership are bitmaps, combined with
+  Python's big-int ``&`` over just the rows in range.
+
+``Catalog`` reads the image through memoryviews, whether it was compiled in
+memory or memory-mapped from a file written by ``python -m utils.catalog``,
+so opening a large catalog costs neither parsing nor per-item objects. Only
+the fields above are kept; other item fields are dropped.
+"""
+import argparse
+import json
+import mmap
+import os
+import struct
+import sys
+from array import array
+from bisect import bisect_left, bisect_right
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+MAGIC = b"GECAT01\0"
+HEADER = struct.Struct("<8sIIIIQ")  # magic, items, outlets, strings, categories, blob bytes
+STRING_FIELDS = ("id", "name", "description", "category", "image")
+VEG, NON_VEG, VEG_UNKNOWN = 1, 0, -1
+
+
+def _align(offset: int) -> int:
+    return (offset + 7) & ~7
+
+
+def _bitmap(rows: Iterable[int], n_items: int) -> bytes:
+    bits = bytearray((n_items + 7) // 8)
+    for row in rows:
+        bits[row >> 3] |= 1 << (row & 7)
+    return bytes(bits)
+
+
+def items_from_menu_file(path: str) -> List[Dict[str, Any]]:
+    """Items from a file in the menuitems.json format (list, ``items`` or ``categories``)"""
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    if isinstance(data, list):
+        return data
+    if "categories" in data:
+        return [item for items in data["categories"].values() for item in items]
+    return data.get("items", [])
+
+
+def compile_catalog(outlets: Dict[str, Sequence[Dict[str, Any]]]) -> bytes:
+    """Binary catalog image for ``{outlet_id: items}``"""
+    if sys.byteorder != "little":
+        raise ValueError("Catalog images are little-endian")
+    strings: Dict[str, int] = {"": 0}
+
+    def intern(value: Any) -> int:
+        text = "" if value is None else str(value)
+        index = strings.get(text)
+        if index is None:
+            index = strings[text] = len(strings)
+        return index
+
+    outlet_names = array("I")
+    outlet_starts = array("I", [0])
+    columns = {field: array("I") for field in STRING_FIELDS}
+    prices = array("d")
+    veg = array("b")
+    for outlet_id, items in outlets.items():
+        outlet_names.append(intern(outlet_id))
+        priced = sorted((item for item in items if item.get("price") is not None), key=lambda item: float(item["price"]))
+        for item in priced:
+            for field in STRING_FIELDS:
+                columns[field].append(intern(item.get(field)))
+            prices.append(float(item["price"]))
+            is_veg = item.get("isVeg")
+            veg.append(VEG_UNKNOWN if is_veg is None else VEG if is_veg else NON_VEG)
+        outlet_starts.append(len(prices))
+
+    n_items = len(prices)
+    category_rows: Dict[int, List[int]] = {}
+    for row, category in enumerate(columns["category"]):
+        category_rows.setdefault(category, []).append(row)
+    category_names = array("I", sorted(category_rows))
+
+    encoded = [text.encode("utf-8") for text in strings]
+    string_offsets = array("I", [0])
+    for data in encoded:
+        string_offsets.append(string_offsets[-1] + len(data))
+    blob = b"".join(encoded)
+
+    sections = [
+        string_offsets.tobytes(), blob, outlet_names.tobytes(), outlet_starts.tobytes(),
+        *(columns[field].tobytes() for field in STRING_FIELDS),
+        prices.tobytes(), veg.tobytes(),
+        _bitmap((row for row, flag in enumerate(veg) if flag == VEG), n_items),
+        _bitmap((row for row, flag in enumerate(veg) if flag == NON_VEG), n_items),
+        category_names.tobytes(),
+        *(_bitmap(category_rows[category], n_items) for category in category_names),
+    ]
+    out = bytearray(HEADER.pack(MAGIC, n_items, len(outlet_names), len(encoded), len(category_names), len(blob)))
+    for section in sections:
+        out.extend(b"\0" * (_align(len(out)) - len(out)))
+        out.extend(section)
+    return bytes(out)
+
+
+class Catalog:
+    def __init__(self, buffer):
+        self._buffer = buffer
+        view = memoryview(buffer)
+        magic, n_items, n_outlets, n_strings, n_categories, blob_len = HEADER.unpack_from(view, 0)
+        if magic != MAGIC:
+            raise ValueError("Not a catalog image")
+        self.n_items = n_items
+        offset = HEADER.size
+        bitmap_len = (n_items + 7) // 8
+
+        def take(length: int, fmt: Optional[str] = None):
+            nonlocal offset
+            offset = _align(offset)
+            section = view[offset:offset + length]
+            offset += length
+            return section.cast(fmt) if fmt else section
+
+        self._string_offsets = take(4 * (n_strings + 1), "I")
+        self._blob = take(blob_len)
+        self._outlet_names = take(4 * n_outlets, "I")
+        self._outlet_starts = take(4 * (n_outlets + 1), "I")
+        self._columns = {field: take(4 * n_items, "I") for field in STRING_FIELDS}
+        self.prices = take(8 * n_items, "d")
+        self.veg = take(n_items, "b")
+        self._veg_bitmap = take(bitmap_len)
+        self._non_veg_bitmap = take(bitmap_len)
+        category_names = take(4 * n_categories, "I")
+        self._category_bitmaps = {self.string(index): take(bitmap_len) for index in category_names}
+        self._outlets = {
+            self.string(index): (self._outlet_starts[i], self._outlet_starts[i + 1])
+            for i, index in enumerate(self._outlet_names)
+        }
+
+    @classmethod
+    def from_outlets(cls, outlets: Dict[str, Sequence[Dict[str, Any]]]) -> "Catalog":
+        return cls(compile_catalog(outlets))
+
+    @classmethod
+    def open(cls, path: str) -> "Catalog":
+        """Memory-map a compiled catalog file; pages are loaded as they are touched"""
+        with open(path, "rb") as f:
+            return cls(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+
+    def __len__(self) -> int:
+        return self.n_items
+
+    @property
+    def outlets(self) -> List[str]:
+        return list(self._outlets)
+
+    @property
+    def categories(self) -> List[str]:
+        return sorted(self._category_bitmaps)
+
+    def string(self, index: int) -> str:
+        return str(self._blob[self._string_offsets[index]:self._string_offsets[index + 1]], "utf-8")
+
+    def outlet_range(self, outlet_id: str) -> Tuple[int, int]:
+        return self._outlets.get(outlet_id, (0, 0))
+
+    def item(self, row: int) -> Dict[str, Any]:
+        item: Dict[str, Any] = {field: self.string(self._columns[field][row]) for field in STRING_FIELDS}
+        item["price"] = self.prices[row]
+        if self.veg[row] != VEG_UNKNOWN:
+            item["isVeg"] = self.veg[row] == VEG
+        return item
+
+    def items(self, rows: Iterable[int]) -> List[Dict[str, Any]]:
+        return [self.item(row) for row in rows]
+
+    def search(self, outlet: Optional[str] = None, min_price: Optional[float] = None,
+               max_price: Optional[float] = None, veg: Optional[bool] = None,
+               category: Optional[str] = None, limit: Optional[int] = None) -> List[int]:
+        """Rows matching every given filter, cheapest first within each outlet"""
+        bitmaps = []
+        if veg is not None:
+            bitmaps.append(self._veg_bitmap if veg else self._non_veg_bitmap)
+        if category is not None:
+            bitmap = self._category_bitmaps.get(category)
+            if bitmap is None:
+                return []
+            bitmaps.append(bitmap)
+
+        if outlet is not None:
+            ranges = [self.outlet_range(outlet)]
+        elif min_price is None and max_price is None:
+            # Outlets are stored back to back, so without a price range they are one span
+            ranges = [(0, self.n_items)]
+        else:
+            ranges = list(self._outlets.values())
+        rows: List[int] = []
+        for start, end in ranges:
+            lo = start if min_price is None else bisect_left(self.prices, min_price, start, end)
+            hi = end if max_price is None else bisect_right(self.prices, max_price, lo, end)
+            if lo >= hi:
+                continue
+            if not bitmaps:
+                rows.extend(range(lo, hi))
+            else:
+                mask = (1 << (hi - lo)) - 1
+                for bitmap in bitmaps:
+                    mask &= int.from_bytes(bitmap[lo >> 3:(hi + 7) >> 3], "little") >> (lo & 7)
+                    if not mask:
+                        break
+                _extend_rows(rows, mask, lo)
+            if limit is not None and len(rows) >= limit:
+                return rows[:limit]
+        return rows
+
+
+def _extend_rows(rows: List[int], mask: int, offset: int):
+    """Append ``offset + i`` for every set bit ``i`` of ``mask``"""
+    bits = bin(mask)[:1:-1]  # least significant bit first
+    matches = bits.count("1")
+    if matches * 16 < len(bits):
+        index = bits.find("1")
+        while index >= 0:
+            rows.append(offset + index)
+            index = bits.find("1", index + 1)
+    else:
+        rows.extend([offset + index for index, bit in enumerate(bits) if bit == "1"])
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description="Compile menu JSON files into a catalog image")
+    parser.add_argument("sources", nargs="+", help="menu JSON files; the outlet id is the file name without .json")
+    parser.add_argument("--out", required=True)
+    args = parser.parse_args()
+
+    outlets = {
+        os.path.splitext(os.path.basename(path))[0]: items_from_menu_file(path)
+        for path in args.sources
+    }
+    image = compile_catalog(outlets)
+    with open(args.out, "wb") as f:
+        f.write(image)
+    catalog = Catalog(image)
+    print(json.dumps({"outlets": len(catalog.outlets), "items": len(catalog), "bytes": len(image)}))
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,219 @@
+import re
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+# Headers are kept as raw (name, value) byte pairs so they can be appended to
+# the ASGI response start message without any further encoding work
+HeaderList = List[Tuple[bytes, bytes]]
+
+ALL_METHODS = ("DELETE", "GET", "HEAD", "OPTIONS", "PATCH", "POST", "PUT")
+# "*" accepts and echoes back whatever headers a preflight asks for
+ALL_HEADERS = ("*",)
+
+# Allow localhost and 127.0.0.1 on any port for local development
+LOCALHOST_ORIGIN_REGEX = r"https?://(localhost|127\.0\.0\.1)(:[0-9]+)?"
+
+
+def compile_origins(
+    allow_origins: Iterable[str], allow_origin_regex: Optional[str] = None
+) -> Tuple[frozenset, Optional["re.Pattern[str]"], bool]:
+    """Split configured origins into an exact-match set and a single regex.
+
+    Entries containing a ``*`` wildcard (for example ``https://*.example.com``)
+    are folded into the regex together with ``allow_origin_regex``. Returns
+    ``(exact_origins, origin_regex, allow_all)``.
+    """
+    exact = set()
+    patterns = []
+    allow_all = False
+
+    for origin in allow_origins:
+        origin = origin.strip().rstrip("/")
+        if not origin:
+            continue
+        if origin == "*":
+            allow_all = True
+        elif "*" in origin:
+            patterns.append(".*".join(re.escape(part) for part in origin.split("*")))
+        else:
+            exact.add(origin)
+
+    if allow_origin_regex:
+        patterns.append(allow_origin_regex)
+
+    regex = None
+    if patterns:
+        regex = re.compile("|".join(f"(?:{pattern})" for pattern in patterns))
+
+    return frozenset(exact), regex, allow_all
+
+
+def _with_vary_origin(headers: HeaderList) -> HeaderList:
+    """Add ``Origin`` to the Vary header, merging with one that is already set"""
+    for index, (name, value) in enumerate(headers):
+        if name.lower() == b"vary":
+            fields = [field.strip().lower() for field in value.split(b",")]
+            if b"origin" not in fields and b"*" not in fields:
+                headers[index] = (name, value + b", Origin")
+            return headers
+    headers.append((b"vary", b"Origin"))
+    return headers
+
+
+class CORSMiddleware:
+    """Pure ASGI CORS layer.
+
+    Allowed origins are compiled once at construction time and the response
+    headers for every origin seen are cached, so a normal request only costs
+    one header scan and a dict lookup. Preflight requests are answered here
+    and never reach the router. An ``Origin`` entry is merged into any Vary
+    header the application already set.
+    """
+
+    def __init__(
+        self,
+        app,
+        allow_origins: Sequence[str] = (),
+        allow_origin_regex: Optional[str] = None,
+        allow_methods: Sequence[str] = ALL_METHODS,
+        allow_headers: Sequence[str] = ALL_HEADERS,
+        expose_headers: Sequence[str] = (),
+        allow_credentials: bool = True,
+        max_age: int = 86400,
+        max_cached_origins: int = 1024,
+    ):
+        self.app = app
+        self.exact_origins, self.origin_regex, self.allow_all = compile_origins(
+            allow_origins, allow_origin_regex
+        )
+        self.allow_credentials = allow_credentials
+        self.max_cached_origins = max_cached_origins
+
+        self.allow_methods = frozenset(method.upper() for method in allow_methods)
+        self.allow_headers = frozenset(header.lower() for header in allow_headers)
+        self.allow_all_headers = "*" in self.allow_headers
+        self.allow_headers -= {"*"}
+
+        # Header blocks that are identical for every allowed origin. Vary is
+        # added per response so it can be merged with the application's own.
+        simple: HeaderList = []
+        if allow_credentials:
+            simple.append((b"access-control-allow-credentials", b"true"))
+        if expose_headers:
+            simple.append(
+                (b"access-control-expose-headers", ", ".join(expose_headers).encode("latin-1"))
+            )
+        self._simple_headers = simple
+
+        preflight: HeaderList = [
+            (b"vary", b"Origin"),
+            (b"access-control-allow-methods", ", ".join(sorted(self.allow_methods)).encode("latin-1")),
+            (b"access-control-max-age", str(max_age).encode("latin-1")),
+            (b"content-type", b"text/plain; charset=utf-8"),
+            (b"content-length", b"2"),
+        ]
+        if allow_credentials:
+            preflight.append((b"access-control-allow-credentials", b"true"))
+        if not self.allow_all_headers:
+            preflight.append(
+                (b"access-control-allow-headers", ", ".join(sorted(self.allow_headers)).encode("latin-1"))
+            )
+        self._preflight_headers = preflight
+
+        # origin -> (simple response headers, preflight headers) or None if disallowed
+        self._origin_cache: Dict[bytes, Optional[Tuple[HeaderList, HeaderList]]] = {}
+
+    def is_allowed_origin(self, origin: str) -> bool:
+        if self.allow_all or origin in self.exact_origins:
+            return True
+        return self.origin_regex is not None and self.origin_regex.fullmatch(origin) is not None
+
+    def _headers_for(self, origin: bytes) -> Optional[Tuple[HeaderList, HeaderList]]:
+        try:
+            return self._origin_cache[origin]
+        except KeyError:
+            pass
+
+        entry = None
+        if self.is_allowed_origin(origin.decode("latin-1")):
+            # Browsers reject a literal "*" when credentials are allowed, so
+            # always echo the concrete origin back
+            allow_origin = [(b"access-control-allow-origin", origin)]
+            entry = (allow_origin + self._simple_headers, allow_origin + self._preflight_headers)
+
+        # Origins are client controlled; don't let the cache grow without bound
+        if len(self._origin_cache) >= self.max_cached_origins:
+            self._origin_cache.clear()
+        self._origin_cache[origin] = entry
+        return entry
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        origin = None
+        request_method = None
+        request_headers = None
+        for name, value in scope["headers"]:
+            if name == b"origin":
+                origin = value
+            elif name == b"access-control-request-method":
+                request_method = value
+            elif name == b"access-control-request-headers":
+                request_headers = value
+
+        if origin is None:
+            await self.app(scope, receive, send)
+            return
+
+        entry = self._headers_for(origin)
+
+        if scope["method"] == "OPTIONS" and request_method is not None:
+            await self._preflight(entry, request_method, request_headers, send)
+            return
+
+        if entry is None:
+            await self.app(scope, receive, send)
+            return
+
+        simple_headers = entry[0]
+
+        async def send_with_cors(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = _with_vary_origin(list(message.get("headers", ()))) + simple_headers
+            await send(message)
+
+        await self.app(scope, receive, send_with_cors)
+
+    async def _preflight(self, entry, request_method: bytes, request_headers: Optional[bytes], send):
+        failures = []
+        if entry is None:
+            failures.append("origin")
+        if request_method.decode("latin-1").upper() not in self.allow_methods:
+            failures.append("method")
+        if request_headers and not self.allow_all_headers:
+            for header in request_headers.decode("latin-1").split(","):
+                header = header.strip().lower()
+                if header and header not in self.allow_headers:
+                    failures.append("headers")
+                    break
+
+        if failures:
+            body = f"Disallowed CORS {', '.join(failures)}".encode("utf-8")
+            await send({
+                "type": "http.response.start",
+                "status": 400,
+                "headers": [
+                    (b"content-type", b"text/plain; charset=utf-8"),
+                    (b"content-length", str(len(body)).encode("latin-1")),
+                    (b"vary", b"Origin"),
+                ],
+            })
+            await send({"type": "http.response.body", "body": body})
+            return
+
+        headers = entry[1]
+        if self.allow_all_headers and request_headers:
+            headers = headers + [(b"access-control-allow-headers", request_headers)]
+        await send({"type": "http.response.start", "status": 200, "headers": headers})
+        await send({"type": "http.response.body", "body": b"OK"})
@@ -0,0 +1,149 @@
+"""Delivery serviceability: which zone, if any, delivers to a postal code.
+
+Zones are loaded from a local JSON file (DELIVERY_ZONES_FILE):
+
+    {
+      "postalCodePattern": "\\\\b\\\\d{6}\\\\b",
+      "zones": [
+        {"id": "bandra", "name": "Bandra", "fee": 30, "minOrder": 199, "etaMinutes": 30,
+         "pincodes": ["400050", "400051"], "ranges": [["400001", "400010"]]}
+      ]
+    }
+
+Listed pincodes go into a dict; numeric ranges are kept as sorted,
+non-overlapping intervals searched with bisect. A lookup is a dict hit or
+one binary search over the ranges. The file is re-read when its
+modification time changes, checked at most every
+DELIVERY_ZONES_CHECK_INTERVAL seconds. A file that fails to load leaves the
+previous zones in place. Without a zones file every address is treated as
+serviceable.
+"""
+import json
+import logging
+import os
+import re
+import time
+from bisect import bisect_right
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from utils.metrics import Counter
+
+logger = logging.getLogger("global_estates")
+
+DELIVERY_ZONES_FILE = os.getenv("DELIVERY_ZONES_FILE")
+DELIVERY_ZONES_CHECK_INTERVAL = float(os.getenv("DELIVERY_ZONES_CHECK_INTERVAL", "5"))
+# Indian PIN codes, as in the app's addresses; zone files can override it
+DEFAULT_POSTAL_CODE_PATTERN = r"\b\d{6}\b"
+ZONE_FIELDS = ("id", "name", "fee", "minOrder", "etaMinutes")
+
+DELIVERY_CHECKS = Counter(
+    "delivery_serviceability_checks_total", "Serviceability lookups by result", ["result"]
+)
+DELIVERY_ZONE_RELOADS = Counter(
+    "delivery_zone_reloads_total", "Delivery zone file loads by outcome", ["outcome"]
+)
+
+
+def normalize_code(code: Any) -> str:
+    return re.sub(r"\s+", "", str(code)).upper()
+
+
+class DeliveryZones:
+    def __init__(self, data: Dict[str, Any]):
+        self.pattern = re.compile(data.get("postalCodePattern") or DEFAULT_POSTAL_CODE_PATTERN)
+        self.zones: Dict[str, Dict[str, Any]] = {}
+        self.by_code: Dict[str, str] = {}
+        intervals: List[Tuple[int, int, str]] = []
+        for zone in data.get("zones", []):
+            zone_id = str(zone["id"])
+            if zone_id in self.zones:
+                raise ValueError(f"Duplicate delivery zone: {zone_id}")
+            self.zones[zone_id] = {field: zone.get(field) for field in ZONE_FIELDS if field in zone}
+            self.zones[zone_id]["id"] = zone_id
+            for code in zone.get("pincodes", []):
+                code = normalize_code(code)
+                if self.by_code.setdefault(code, zone_id) != zone_id:
+                    raise ValueError(f"Pincode {code} is in zones {self.by_code[code]} and {zone_id}")
+            for start, end in zone.get("ranges", []):
+                start, end = int(start), int(end)
+                if start > end:
+                    raise ValueError(f"Empty pincode range {start}-{end} in zone {zone_id}")
+                intervals.append((start, end, zone_id))
+
+        intervals.sort()
+        for (_, end, zone_id), (start, _, other) in zip(intervals, intervals[1:]):
+            if start <= end:
+                raise ValueError(f"Pincode ranges of zones {zone_id} and {other} overlap at {start}")
+        self._starts = [start for start, _, _ in intervals]
+        self._intervals = intervals
+
+    def __len__(self) -> int:
+        return len(self.zones)
+
+    def zone_for(self, code: Any) -> Optional[Dict[str, Any]]:
+        """The zone delivering to ``code``, or None"""
+        code = normalize_code(code)
+        zone_id = self.by_code.get(code)
+        if zone_id is None and code.isdigit() and self._intervals:
+            position = bisect_right(self._starts, int(code)) - 1
+            if position >= 0:
+                _, end, candidate = self._intervals[position]
+                if int(code) <= end:
+                    zone_id = candidate
+        return self.zones[zone_id] if zone_id is not None else None
+
+    def code_in_text(self, text: str) -> Optional[str]:
+        """The last postal code in a free-text address, or None"""
+        codes = self.pattern.findall(text or "")
+        return normalize_code(codes[-1]) if codes else None
+
+
+_state: Dict[str, Any] = {"zones": None, "mtime": None, "checked_at": 0.0}
+
+
+def load_zones() -> Optional[DeliveryZones]:
+    """Current delivery zones, or None when no zones file is configured"""
+    if not DELIVERY_ZONES_FILE:
+        return None
+    now = time.monotonic()
+    if _state["mtime"] is not None and now - _state["checked_at"] < DELIVERY_ZONES_CHECK_INTERVAL:
+        return _state["zones"]
+    _state["checked_at"] = now
+    try:
+        mtime = os.stat(DELIVERY_ZONES_FILE).st_mtime_ns
+        if mtime != _state["mtime"]:
+            with open(DELIVERY_ZONES_FILE, "r", encoding="utf-8") as f:
+                zones = DeliveryZones(json.load(f))
+            _state.update(zones=zones, mtime=mtime)
+            DELIVERY_ZONE_RELOADS.labels("ok").inc()
+            logger.info(f"Loaded {len(zones)} delivery zones from {DELIVERY_ZONES_FILE}")
+    except (OSError, ValueError, KeyError, TypeError, re.error) as e:
+        DELIVERY_ZONE_RELOADS.labels("error").inc()
+        logger.error(f"Error loading delivery zones from {DELIVERY_ZONES_FILE}: {e}")
+        if _state["zones"] is None:
+            # Nothing to fall back on: deliver nowhere rather than everywhere
+            _state["zones"] = DeliveryZones({"zones": []})
+    return _state["zones"]
+
+
+def check(code: Any) -> Tuple[bool, Optional[Dict[str, Any]]]:
+    """(serviceable, zone) for a postal code; everything is serviceable without a zones file"""
+    zones = load_zones()
+    if zones is None:
+        return True, None
+    zone = zones.zone_for(code)
+    DELIVERY_CHECKS.labels("serviceable" if zone else "unserviceable").inc()
+    return zone is not None, zone
+
+
+def check_many(codes: Iterable[Any]) -> List[Dict[str, Any]]:
+    return [
+        {"zipCode": str(code), "serviceable": serviceable, "zone": zone}
+        for code in codes
+        for serviceable, zone in [check(code)]
+    ]
+
+
+def code_in_address(address: str) -> Optional[str]:
+    zones = load_zones()
+    return zones.code_in_text(address) if zones is not None else None
@@ -0,0 +1,120 @@
+"""orjson responses and precompiled serializers for trusted data.
+
+``FastJSONResponse`` is the app's default response class. Returning a model
+or dict from a route still costs FastAPI a validation pass against
+``response_model`` and a ``jsonable_encoder`` walk before anything is
+rendered. For data the server built itself (Mongo documents, already
+validated request bodies) ``compile_serializer`` generates, once per model, a
+function that copies exactly the model's fields into a plain dict, filling
+defaults and recursing into nested models. Routes return it wrapped in
+``FastJSONResponse``, which FastAPI sends as-is. Fields missing from the
+model are never copied, so the output still matches ``response_model``.
+"""
+import typing
+from typing import Any, Callable, Dict, Optional, Type
+
+import orjson
+from bson import ObjectId
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+
+
+def _default(obj: Any) -> Any:
+    if isinstance(obj, ObjectId):
+        return str(obj)
+    if isinstance(obj, BaseModel):
+        return obj.__dict__
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    raise TypeError(f"Type is not JSON serializable: {type(obj).__name__}")
+
+
+def dumps(content: Any) -> bytes:
+    # datetimes are written by orjson in ISO 8601, as datetime.isoformat() does
+    return orjson.dumps(content, default=_default)
+
+
+class FastJSONResponse(JSONResponse):
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+def trusted_model(model: Type[BaseModel], **fields) -> BaseModel:
+    """Build a model from already validated values without validating again"""
+    construct = getattr(model, "model_construct", None) or model.construct
+    return construct(**fields)
+
+
+def _model_fields(model: Type[BaseModel]):
+    """(name, annotation, default, default_factory, required) for pydantic v1 and v2"""
+    if hasattr(model, "model_fields"):
+        for name, field in model.model_fields.items():
+            yield name, field.annotation, field.default, field.default_factory, field.is_required()
+    else:
+        for name, field in model.__fields__.items():
+            yield name, field.outer_type_, field.default, field.default_factory, field.required
+
+
+def _nested(annotation) -> tuple:
+    """("model" | "list" | None, nested model) for Optional/List annotations"""
+    if isinstance(annotation, type) and issubclass(annotation, BaseModel):
+        return "model", annotation
+    origin = typing.get_origin(annotation)
+    args = typing.get_args(annotation)
+    if origin in (list, typing.List) and args:
+        kind, nested = _nested(args[0])
+        return ("list", nested) if kind == "model" else (None, None)
+    if origin is typing.Union:
+        for arg in args:
+            if arg is not type(None):
+                return _nested(arg)
+    return None, None
+
+
+def compile_serializer(model: Type[BaseModel], sources: Optional[Dict[str, str]] = None,
+                       convert: Optional[Dict[str, Callable]] = None) -> Callable[[Any], Dict[str, Any]]:
+    """Generate ``serialize(data) -> dict`` with exactly ``model``'s fields.
+
+    ``data`` is a dict or a model instance. ``sources`` maps a field to a
+    different key in the input (``{"id": "_id"}`` for Mongo documents) and
+    ``convert`` applies a function to a field's value (``{"id": str}``).
+    """
+    sources = sources or {}
+    convert = convert or {}
+    namespace: Dict[str, Any] = {}
+    lines = [
+        "def serialize(d):",
+        "    if type(d) is not dict:",
+        "        d = d.__dict__",
+        "    get = d.get",
+        "    return {",
+    ]
+    for i, (name, annotation, default, default_factory, required) in enumerate(_model_fields(model)):
+        source = sources.get(name, name)
+        kind, nested = _nested(annotation)
+        if kind is not None:
+            namespace[f"_n{i}"] = compile_serializer(nested)
+            value = f"_n{i}(v)" if kind == "model" else f"[_n{i}(x) for x in v]"
+            expr = f"{value} if (v := get({source!r})) is not None else None"
+        elif name in convert:
+            namespace[f"_c{i}"] = convert[name]
+            expr = f"_c{i}(d[{source!r}])" if required else f"_c{i}(v) if (v := get({source!r})) is not None else None"
+        elif required:
+            expr = f"d[{source!r}]"
+        elif default_factory is not None:
+            namespace[f"_f{i}"] = default_factory
+            expr = f"v if (v := get({source!r})) is not None else _f{i}()"
+        elif default is None or isinstance(default, (bool, int, float, str)):
+            expr = f"get({source!r}, {default!r})"
+        else:
+            namespace[f"_d{i}"] = default
+            expr = f"get({source!r}, _d{i})"
+        lines.append(f"        {name!r}: {expr},")
+    lines.append("    }")
+    exec("\n".join(lines), namespace)  # noqa: S102  (source built from model field names only)
+    serialize = namespace["serialize"]
+    serialize.__qualname__ = f"serialize_{model.__name__}"
+    return serialize
+
@@ -0,0 +1,228 @@
+"""Grid spatial index over listing coordinates.
+
+Rows are bucketed into cells of ``cell_deg`` degrees of latitude and
+longitude, like fixed-precision geohashes. Cells are grouped into blocks of
+``block`` x ``block`` cells. A block holding a sizeable share of all rows
+also keeps a bitmap of them, so an area that covers it whole costs one
+big-int OR. Radius and box queries return bitmaps over the rows:
+
+- blocks inside the shape are taken whole;
+- inside the other blocks, cells inside the shape are taken whole;
+- only rows in cells crossing the edge are checked one by one. A planar
+  distance settles all but the rows right at the edge, which get the exact
+  great-circle distance.
+
+Nearest queries search rings of cells outwards from the query point. They
+stop once no unvisited cell can be closer than the n-th best distance found
+so far.
+"""
+import heapq
+import math
+from array import array
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+
+Key = Tuple[int, int]
+
+
+def haversine_km(lat1: float, lng1: float, lat2: float, lng2: float) -> float:
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    d_phi = phi2 - phi1
+    d_lambda = math.radians(lng2 - lng1)
+    a = math.sin(d_phi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(d_lambda / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def planar_margin(lat: float, d_lat: float) -> Optional[float]:
+    """Bound on the relative error of the planar distance within ``d_lat`` degrees of ``lat``,
+    or None where it is too loose to be useful"""
+    widest = abs(lat) + d_lat
+    if widest >= 85:
+        return None
+    # The longitude scale is taken at the query latitude; it drifts by about tan(lat) per radian
+    margin = 2 * math.tan(math.radians(widest)) * math.radians(d_lat) + 1e-3
+    return margin if margin < 0.05 else None
+
+
+def _set_rows(bits: bytearray, rows: Iterable[int]):
+    for row in rows:
+        bits[row >> 3] |= 1 << (row & 7)
+
+
+class GridIndex:
+    def __init__(self, lats: Sequence[Optional[float]], lngs: Sequence[Optional[float]],
+                 cell_deg: float = 0.0025, block: int = 4, dense_fraction: float = 1 / 256):
+        self.cell_deg = cell_deg
+        self.block = block
+        self.lats = array("d", (math.nan if lat is None else lat for lat in lats))
+        self.lngs = array("d", (math.nan if lng is None else lng for lng in lngs))
+        self.n_rows = len(self.lats)
+        cells: Dict[Key, array] = {}
+        for row, (lat, lng) in enumerate(zip(self.lats, self.lngs)):
+            if lat == lat and lng == lng:  # rows without coordinates are not indexed
+                cells.setdefault(self._cell(lat, lng), array("I")).append(row)
+        self.cells = cells
+
+        self.blocks: Dict[Key, List[Key]] = {}
+        for i, j in cells:
+            self.blocks.setdefault((i // block, j // block), []).append((i, j))
+        # A bitmap costs n_rows / 8 bytes, so only blocks above this size get one
+        # (at most 1 / dense_fraction of them)
+        dense = max(1, int(self.n_rows * dense_fraction))
+        self.block_masks: Dict[Key, int] = {}
+        for key, block_cells in self.blocks.items():
+            if sum(len(cells[cell]) for cell in block_cells) >= dense:
+                bits = bytearray((self.n_rows + 7) // 8)
+                for cell in block_cells:
+                    _set_rows(bits, cells[cell])
+                self.block_masks[key] = int.from_bytes(bits, "little")
+        if cells:
+            self._min_i = min(i for i, _ in cells)
+            self._max_i = max(i for i, _ in cells)
+            self._min_j = min(j for _, j in cells)
+            self._max_j = max(j for _, j in cells)
+
+    def __len__(self) -> int:
+        return sum(len(rows) for rows in self.cells.values())
+
+    def _cell(self, lat: float, lng: float) -> Key:
+        return math.floor(lat / self.cell_deg), math.floor(lng / self.cell_deg)
+
+    def _blocks_in(self, south: float, west: float, north: float, east: float) -> List[Key]:
+        size = self.cell_deg * self.block
+        i0, j0 = math.floor(south / size), math.floor(west / size)
+        i1, j1 = math.floor(north / size), math.floor(east / size)
+        if (i1 - i0 + 1) * (j1 - j0 + 1) > len(self.blocks):
+            # A huge area: cheaper to filter the occupied blocks than to enumerate the box
+            return [(i, j) for i, j in self.blocks if i0 <= i <= i1 and j0 <= j <= j1]
+        return [(i, j) for i in range(i0, i1 + 1) for j in range(j0, j1 + 1) if (i, j) in self.blocks]
+
+    def _collect(self, blocks: Iterable[Key], covers: Callable[[float, float, float, float], int],
+                 check_rows: Callable[[bytearray, array], None]) -> int:
+        """Bitmap of the rows in ``blocks``.
+
+        ``covers(south, west, north, east)`` says how much of a rectangle is in
+        the shape: 2 all of it, 1 some, 0 none. Rows of partly covered cells
+        go through ``check_rows``.
+        """
+        bits = bytearray((self.n_rows + 7) // 8)
+        mask = 0
+        cell, size = self.cell_deg, self.cell_deg * self.block
+        for key in blocks:
+            bi, bj = key
+            coverage = covers(bi * size, bj * size, (bi + 1) * size, (bj + 1) * size)
+            if coverage == 0:
+                continue
+            if coverage == 2 and key in self.block_masks:
+                mask |= self.block_masks[key]
+                continue
+            for i, j in self.blocks[key]:
+                rows = self.cells[(i, j)]
+                cell_coverage = 2 if coverage == 2 else covers(i * cell, j * cell, (i + 1) * cell, (j + 1) * cell)
+                if cell_coverage == 2:
+                    _set_rows(bits, rows)
+                elif cell_coverage == 1:
+                    check_rows(bits, rows)
+        return mask | int.from_bytes(bits, "little")
+
+    def bbox_mask(self, south: float, west: float, north: float, east: float) -> int:
+        """Rows inside the box; ``west <= east`` (boxes crossing the antimeridian are not supported)"""
+        lats, lngs = self.lats, self.lngs
+
+        def covers(s: float, w: float, n: float, e: float) -> int:
+            if n < south or s > north or e < west or w > east:
+                return 0
+            return 2 if south <= s and n <= north and west <= w and e <= east else 1
+
+        def check_rows(bits: bytearray, rows: array):
+            _set_rows(bits, (row for row in rows if south <= lats[row] <= north and west <= lngs[row] <= east))
+
+        return self._collect(self._blocks_in(south, west, north, east), covers, check_rows)
+
+    def radius_mask(self, lat: float, lng: float, km: float) -> int:
+        """Rows within ``km`` (great-circle distance) of the point"""
+        d_lat = km / KM_PER_DEGREE
+        d_lng = km / (KM_PER_DEGREE * max(math.cos(math.radians(min(89.9, abs(lat) + d_lat))), 1e-6))
+        lats, lngs = self.lats, self.lngs
+        # Planar squared distance in degrees of latitude, trusted away from the edge
+        scale = math.cos(math.radians(lat))
+        margin = planar_margin(lat, d_lat)
+        inner = -1.0 if margin is None else (d_lat * (1 - margin)) ** 2
+        outer = math.inf if margin is None else (d_lat * (1 + margin)) ** 2
+
+        def covers(s: float, w: float, n: float, e: float) -> int:
+            if haversine_km(lat, lng, min(max(lat, s), n), min(max(lng, w), e)) > km:
+                return 0
+            corners = ((s, w), (s, e), (n, w), (n, e))
+            return 2 if all(haversine_km(lat, lng, c_lat, c_lng) <= km for c_lat, c_lng in corners) else 1
+
+        def check_rows(bits: bytearray, rows: array):
+            for row in rows:
+                dy = lats[row] - lat
+                dx = (lngs[row] - lng) * scale
+                distance = dy * dy + dx * dx
+                if distance <= inner or (distance <= outer and haversine_km(lat, lng, lats[row], lngs[row]) <= km):
+                    bits[row >> 3] |= 1 << (row & 7)
+
+        return self._collect(self._blocks_in(lat - d_lat, lng - d_lng, lat + d_lat, lng + d_lng), covers, check_rows)
+
+    def _ring(self, center: Key, radius: int) -> Iterable[array]:
+        ci, cj = center
+        for i in range(ci - radius, ci + radius + 1):
+            step = 1 if i in (ci - radius, ci + radius) else 2 * radius
+            for j in range(cj - radius, cj + radius + 1, max(step, 1)):
+                rows = self.cells.get((i, j))
+                if rows is not None:
+                    yield rows
+
+    def nearest(self, lat: float, lng: float, n: int,
+                accept: Optional[Callable[[int], bool]] = None) -> List[Tuple[float, int]]:
+        """Up to ``n`` ``(km, row)`` pairs closest to the point, nearest first, among accepted rows"""
+        if not self.cells or n <= 0:
+            return []
+        lats, lngs, cell = self.lats, self.lngs, self.cell_deg
+        scale = math.cos(math.radians(lat))
+        center = self._cell(lat, lng)
+        ci, cj = center
+        # Rings beyond this cover no occupied cell
+        last_ring = max(abs(ci - self._min_i), abs(ci - self._max_i), abs(cj - self._min_j), abs(cj - self._max_j))
+        best: List[Tuple[float, int]] = []  # max-heap of the n nearest, as (-km, row)
+        # Rows with a larger planar squared distance cannot beat the n-th best
+        cutoff = math.inf
+        for radius in range(last_ring + 1):
+            # In sparse surroundings, visit every remaining occupied cell at once instead of ring by ring
+            sweep = 8 * radius > len(self.cells)
+            if sweep:
+                rings = [rows for (i, j), rows in self.cells.items() if max(abs(i - ci), abs(j - cj)) >= radius]
+            else:
+                rings = self._ring(center, radius)
+            for rows in rings:
+                for row in rows:
+                    dy = lats[row] - lat
+                    dx = (lngs[row] - lng) * scale
+                    if dy * dy + dx * dx > cutoff or (accept is not None and not accept(row)):
+                        continue
+                    km = haversine_km(lat, lng, lats[row], lngs[row])
+                    if len(best) < n:
+                        heapq.heappush(best, (-km, row))
+                    elif km < -best[0][0]:
+                        heapq.heapreplace(best, (-km, row))
+                    else:
+                        continue
+                    if len(best) == n:
+                        worst = -best[0][0] / KM_PER_DEGREE
+                        margin = planar_margin(lat, worst)
+                        cutoff = math.inf if margin is None else (worst * (1 + margin)) ** 2
+            if sweep:
+                break
+            if len(best) == n:
+                # Anything outside the rings searched so far is at least this far away
+                edge_lat = min(lat - (ci - radius) * cell, (ci + radius + 1) * cell - lat) * KM_PER_DEGREE
+                widest = min(89.9, abs(lat) + (radius + 1) * cell)
+                edge_lng = (min(lng - (cj - radius) * cell, (cj + radius + 1) * cell - lng)
+                            * KM_PER_DEGREE * math.cos(math.radians(widest)))
+                if -best[0][0] <= min(edge_lat, edge_lng):
+                    break
+        return sorted((-neg_km, row) for neg_km, row in best)
@@ -0,0 +1,246 @@
+"""Cross-worker cache invalidation.
+
+Every worker keeps its own caches (see ``utils.cache``). When one worker
+changes the data behind a cache entry it calls ``bus.publish(cache, key)``:
+the entry is evicted locally right away and the message is broadcast to the
+other workers, which evict it as soon as their event loop reads it.
+
+Transports, chosen with ``INVALIDATION_TRANSPORT``:
+
+- ``local`` (default): one UNIX datagram socket per process in
+  ``INVALIDATION_SOCKET_DIR`` (by default a temp directory per app directory
+  and database name); a publish is one ``sendto`` per peer, so all
+  workers on the host see it within a millisecond or so.
+- ``mongo``: messages are inserted into a collection and read back through a
+  change stream, which reaches workers on every host. Change streams need a
+  replica set.
+- ``none``: local eviction only.
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import socket
+import tempfile
+import uuid
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+from utils.cache import CACHES
+from utils.metrics import Counter
+
+logger = logging.getLogger("global_estates")
+
+INVALIDATION_MESSAGES = Counter(
+    "cache_invalidation_messages_total", "Invalidation messages by direction", ["cache", "direction"]
+)
+
+
+def default_socket_dir() -> str:
+    """A directory per deployment (app directory and database), so separate
+    deployments and test runs on one host do not receive each other's messages"""
+    app_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    deployment = f"{app_dir}|{os.getenv('DATABASE_NAME', 'global_estates')}"
+    digest = hashlib.sha1(deployment.encode("utf-8")).hexdigest()[:12]
+    return os.path.join(tempfile.gettempdir(), f"global_estates_invalidation_{digest}")
+
+
+# A handler receives the invalidated key, or None when the whole cache is cleared
+Handler = Callable[[Optional[Any]], None]
+Deliver = Callable[[Dict[str, Any]], None]
+
+
+class LocalTransport:
+    """Broadcast over UNIX datagram sockets to every process on this host"""
+
+    def __init__(self, directory: Optional[str] = None):
+        self.directory = directory or os.getenv("INVALIDATION_SOCKET_DIR") or default_socket_dir()
+        self.path: Optional[str] = None
+        self.sock: Optional[socket.socket] = None
+        self.deliver: Optional[Deliver] = None
+
+    async def start(self, deliver: Deliver):
+        os.makedirs(self.directory, exist_ok=True)
+        self.path = os.path.join(self.directory, f"{os.getpid()}.sock")
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self.sock.bind(self.path)
+        self.sock.setblocking(False)
+        self.deliver = deliver
+        asyncio.get_running_loop().add_reader(self.sock.fileno(), self._on_readable)
+
+    def _on_readable(self):
+        while True:
+            try:
+                data = self.sock.recv(65536)
+            except (BlockingIOError, InterruptedError):
+                return
+            try:
+                message = json.loads(data)
+            except ValueError:
+                logger.warning("Dropping malformed invalidation message")
+                continue
+            self.deliver(message)
+
+    def send(self, message: Dict[str, Any]):
+        data = json.dumps(message).encode("utf-8")
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            if not name.endswith(".sock") or path == self.path:
+                continue
+            try:
+                self.sock.sendto(data, path)
+            except (ConnectionRefusedError, FileNotFoundError):
+                # The process that owned this socket is gone
+                try:
+                    os.unlink(path)
+                except OSError:
+                    pass
+            except BlockingIOError:
+                logger.warning("Invalidation queue of %s is full; message dropped", name)
+
+    async def stop(self):
+        if self.sock is None:
+            return
+        asyncio.get_running_loop().remove_reader(self.sock.fileno())
+        self.sock.close()
+        self.sock = None
+        try:
+            os.unlink(self.path)
+        except OSError:
+            pass
+
+
+class MongoTransport:
+    """Broadcast through a MongoDB collection watched with a change stream"""
+
+    # Old messages are only kept long enough for a change stream to resume
+    RETENTION_SECONDS = 3600
+    RETRY_SECONDS = 5.0
+
+    def __init__(self, collection_name: str = "cache_invalidations"):
+        self.collection_name = collection_name
+        self.collection = None
+        self._watcher: Optional[asyncio.Task] = None
+        self._pending = set()
+
+    async def start(self, deliver: Deliver):
+        from database import get_database
+
+        database = get_database()
+        if database is None:
+            raise RuntimeError("MongoDB is not configured")
+        self.collection = database[self.collection_name]
+        self._watcher = asyncio.create_task(self._watch(deliver))
+
+    async def _watch(self, deliver: Deliver):
+        pipeline = [{"$match": {"operationType": "insert"}}]
+        while True:
+            try:
+                await self.collection.create_index("created_at", expireAfterSeconds=self.RETENTION_SECONDS)
+                async with self.collection.watch(pipeline) as stream:
+                    async for change in stream:
+                        deliver(change["fullDocument"]["message"])
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning("Invalidation change stream failed, retrying in %.0fs: %s", self.RETRY_SECONDS, e)
+                await asyncio.sleep(self.RETRY_SECONDS)
+
+    def send(self, message: Dict[str, Any]):
+        task = asyncio.ensure_future(
+            self.collection.insert_one({"message": message, "created_at": datetime.utcnow()})
+        )
+        self._pending.add(task)
+        task.add_done_callback(self._sent)
+
+    def _sent(self, task: asyncio.Task):
+        self._pending.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.warning("Failed to publish invalidation: %s", task.exception())
+
+    async def stop(self):
+        if self._watcher is not None:
+            self._watcher.cancel()
+            try:
+                await self._watcher
+            except asyncio.CancelledError:
+                pass
+            self._watcher = None
+
+
+def build_transport(name: Optional[str] = None):
+    name = (name or os.getenv("INVALIDATION_TRANSPORT", "local")).lower()
+    if name == "local":
+        return LocalTransport()
+    if name == "mongo":
+        return MongoTransport()
+    if name == "none":
+        return None
+    raise ValueError(f"Unknown INVALIDATION_TRANSPORT: {name}")
+
+
+class InvalidationBus:
+    """Evicts cache entries in this process and tells the other workers to do the same.
+
+    Messages name a cache and a key (None clears the cache). Named
+    ``TTLCache`` instances are evicted automatically; anything else, such as
+    the menu file cache, registers a handler with ``subscribe``.
+    """
+
+    def __init__(self, transport=None):
+        self.transport = transport
+        self.origin: Optional[str] = None
+        self.handlers: Dict[str, List[Handler]] = {}
+        self.started = False
+
+    def subscribe(self, cache: str, handler: Handler):
+        self.handlers.setdefault(cache, []).append(handler)
+
+    async def start(self, transport=None):
+        if transport is not None:
+            self.transport = transport
+        if self.transport is None:
+            return
+        # Identifies our own messages when the transport echoes them back
+        self.origin = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        await self.transport.start(self._receive)
+        self.started = True
+
+    async def stop(self):
+        if self.started:
+            self.started = False
+            await self.transport.stop()
+
+    def publish(self, cache: str, key: Optional[Any] = None):
+        """Evict ``key`` (or everything) from ``cache`` here and on every other worker"""
+        self._apply(cache, key)
+        if self.started:
+            INVALIDATION_MESSAGES.labels(cache, "sent").inc()
+            self.transport.send({"cache": cache, "key": key, "origin": self.origin})
+
+    def _receive(self, message: Dict[str, Any]):
+        if message.get("origin") == self.origin:
+            return
+        cache = message.get("cache")
+        INVALIDATION_MESSAGES.labels(cache, "received").inc()
+        self._apply(cache, message.get("key"))
+
+    def _apply(self, cache: str, key: Optional[Any]):
+        local = CACHES.get(cache)
+        if local is not None:
+            if key is None:
+                local.clear()
+            else:
+                local.invalidate(key)
+        for handler in self.handlers.get(cache, ()):
+            try:
+                handler(key)
+            except Exception as e:
+                logger.error(f"Invalidation handler for {cache} failed: {e}")
+
+
+# Process-wide bus; started from the app lifespan
+bus = InvalidationBus()
@@ -0,0 +1,326 @@
+"""In-process background jobs.
+
+Request handlers call ``jobs.enqueue(name, payload)`` for work the response
+does not wait on (order notifications, audit records, password re-hashing)
+and return at once. A fixed pool of JOB_WORKERS tasks runs the jobs, lowest
+priority number first and in enqueue order within a priority. A job that
+raises or times out is retried with exponential backoff until its handler's
+``max_attempts`` are used up. At most JOB_QUEUE_SIZE jobs wait at a time;
+beyond that new jobs are dropped and counted rather than queued without
+bound.
+
+With ``JOB_QUEUE_PERSIST=true`` jobs are also written to the ``jobs``
+collection when enqueued and removed when done, so a restart does not lose
+them. Each process refreshes its own queued jobs every
+JOB_HEARTBEAT_INTERVAL seconds and adopts jobs whose owner has stopped
+doing so. A job can therefore run more than once, and handlers must be
+safe to repeat. Handlers registered with ``persist=False`` (their payload
+holds secrets) stay in memory only.
+"""
+import asyncio
+import heapq
+import itertools
+import logging
+import os
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+from utils.metrics import Counter, Gauge, Histogram
+
+logger = logging.getLogger("global_estates")
+
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "4"))
+JOB_QUEUE_SIZE = int(os.getenv("JOB_QUEUE_SIZE", "10000"))
+JOB_QUEUE_PERSIST = os.getenv("JOB_QUEUE_PERSIST", "false").lower() in ("1", "true", "yes")
+# First retry delay in seconds; doubled for every further attempt
+JOB_RETRY_DELAY = float(os.getenv("JOB_RETRY_DELAY", "1"))
+JOB_HEARTBEAT_INTERVAL = float(os.getenv("JOB_HEARTBEAT_INTERVAL", "30"))
+# How long shutdown waits for queued jobs before leaving them (to Mongo, if persisted)
+JOB_DRAIN_TIMEOUT = float(os.getenv("JOB_DRAIN_TIMEOUT", "5"))
+
+PRIORITY_HIGH = 0
+PRIORITY_NORMAL = 5
+PRIORITY_LOW = 9
+
+JOB_QUEUE_DEPTH = Gauge(
+    "job_queue_depth", "Background jobs waiting to run (ready), backing off (retrying) or running", ["state"]
+)
+JOB_WAIT = Histogram(
+    "job_wait_seconds", "Time from enqueue (or the end of a retry backoff) until a worker starts the job", ["job"],
+    buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 30.0, 120.0),
+)
+JOB_DURATION = Histogram("job_duration_seconds", "Time spent running background jobs", ["job"])
+JOBS = Counter("jobs_total", "Background job attempts by outcome", ["job", "outcome"])
+
+Handler = Callable[[Dict[str, Any]], Awaitable[None]]
+
+
+class JobType:
+    __slots__ = ("handler", "priority", "max_attempts", "timeout", "persist")
+
+    def __init__(self, handler: Handler, priority: int, max_attempts: int, timeout: float, persist: bool):
+        self.handler = handler
+        self.priority = priority
+        self.max_attempts = max_attempts
+        self.timeout = timeout
+        self.persist = persist
+
+
+class Job:
+    __slots__ = ("job_id", "name", "payload", "priority", "attempts", "enqueued_at", "ready_at", "persisted", "saving")
+
+    def __init__(self, name: str, payload: Dict[str, Any], priority: int, job_id: Optional[str] = None,
+                 attempts: int = 0, enqueued_at: Optional[datetime] = None):
+        self.job_id = job_id or uuid.uuid4().hex
+        self.name = name
+        self.payload = payload
+        self.priority = priority
+        self.attempts = attempts
+        self.enqueued_at = enqueued_at or datetime.utcnow()
+        self.ready_at = time.monotonic()
+        self.persisted = False
+        # Last write of this job to Mongo; the next one waits for it so they land in order
+        self.saving: Optional[asyncio.Future] = None
+
+    def to_document(self, owner: str) -> Dict[str, Any]:
+        return {
+            "_id": self.job_id,
+            "name": self.name,
+            "payload": self.payload,
+            "priority": self.priority,
+            "attempts": self.attempts,
+            "state": "queued",
+            "owner": owner,
+            "enqueued_at": self.enqueued_at,
+            "updated_at": datetime.utcnow(),
+        }
+
+    @classmethod
+    def from_document(cls, document: Dict[str, Any]) -> "Job":
+        return cls(document["name"], document.get("payload") or {}, document.get("priority", PRIORITY_NORMAL),
+                   document["_id"], document.get("attempts", 0), document.get("enqueued_at"))
+
+
+class JobQueue:
+    def __init__(self, workers: int = JOB_WORKERS, max_pending: int = JOB_QUEUE_SIZE,
+                 persist: bool = JOB_QUEUE_PERSIST, retry_delay: float = JOB_RETRY_DELAY,
+                 heartbeat_interval: float = JOB_HEARTBEAT_INTERVAL):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.persist = persist
+        self.retry_delay = retry_delay
+        self.heartbeat_interval = heartbeat_interval
+        # Identifies this process's jobs in the collection
+        self.owner = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self.types: Dict[str, JobType] = {}
+        self._ready: List[Tuple[int, int, Job]] = []
+        self._sequence = itertools.count()
+        self._retrying: Dict[asyncio.TimerHandle, Job] = {}
+        self._running = 0
+        self._wakeup: Optional[asyncio.Event] = None
+        self._tasks: List[asyncio.Task] = []
+        self._pending: Set[asyncio.Future] = set()
+
+    def __len__(self) -> int:
+        return len(self._ready) + len(self._retrying)
+
+    def handler(self, name: str, priority: int = PRIORITY_NORMAL, max_attempts: int = 3,
+                timeout: float = 30.0, persist: bool = True) -> Callable[[Handler], Handler]:
+        """Register the decorated coroutine function as the handler for jobs called ``name``"""
+        def register(handler: Handler) -> Handler:
+            if name in self.types:
+                raise ValueError(f"Job handler already registered: {name}")
+            self.types[name] = JobType(handler, priority, max_attempts, timeout, persist)
+            return handler
+        return register
+
+    def enqueue(self, name: str, payload: Optional[Dict[str, Any]] = None,
+                priority: Optional[int] = None) -> Optional[Job]:
+        """Queue a job and return it, or None when the queue is full"""
+        job_type = self.types[name]
+        if len(self) >= self.max_pending:
+            JOBS.labels(name, "dropped").inc()
+            logger.warning("Job queue full (%d jobs); dropped %s", len(self), name)
+            return None
+        job = Job(name, payload or {}, job_type.priority if priority is None else priority)
+        if self.persist and job_type.persist:
+            job.persisted = True
+            self._save(job, "replace")
+        self._push(job)
+        return job
+
+    def _push(self, job: Job):
+        job.ready_at = time.monotonic()
+        heapq.heappush(self._ready, (job.priority, next(self._sequence), job))
+        self._update_depth()
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def _retry_later(self, job: Job, delay: float):
+        def retry():
+            del self._retrying[handle]
+            self._push(job)
+
+        handle = asyncio.get_running_loop().call_later(delay, retry)
+        self._retrying[handle] = job
+        self._update_depth()
+
+    def _update_depth(self):
+        JOB_QUEUE_DEPTH.labels("ready").set(len(self._ready))
+        JOB_QUEUE_DEPTH.labels("retrying").set(len(self._retrying))
+        JOB_QUEUE_DEPTH.labels("running").set(self._running)
+
+    async def _work(self):
+        while True:
+            while not self._ready:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+            _, _, job = heapq.heappop(self._ready)
+            await self.run(job)
+
+    async def run(self, job: Job):
+        """Run one attempt of ``job``, then retry it later, record its failure or forget it"""
+        job_type = self.types[job.name]
+        JOB_WAIT.labels(job.name).observe(time.monotonic() - job.ready_at)
+        job.attempts += 1
+        self._running += 1
+        self._update_depth()
+        start = time.perf_counter()
+        try:
+            await asyncio.wait_for(job_type.handler(job.payload), job_type.timeout)
+        except Exception as e:
+            error = str(e) or type(e).__name__
+            if job.attempts < job_type.max_attempts:
+                delay = self.retry_delay * 2 ** (job.attempts - 1)
+                JOBS.labels(job.name, "retried").inc()
+                logger.warning("Job %s %s failed (attempt %d), retrying in %.1f s: %s",
+                               job.name, job.job_id, job.attempts, delay, error)
+                if job.persisted:
+                    self._save(job, "replace")
+                self._retry_later(job, delay)
+            else:
+                JOBS.labels(job.name, "failed").inc()
+                logger.error(f"Job {job.name} {job.job_id} failed after {job.attempts} attempts: {error}")
+                if job.persisted:
+                    # Kept for inspection; only "queued" jobs are adopted
+                    self._save(job, "failed", error)
+        else:
+            JOBS.labels(job.name, "succeeded").inc()
+            if job.persisted:
+                self._save(job, "delete")
+        finally:
+            JOB_DURATION.labels(job.name).observe(time.perf_counter() - start)
+            self._running -= 1
+            self._update_depth()
+
+    async def start(self):
+        if self._tasks:
+            return
+        self._wakeup = asyncio.Event()
+        if self._ready:
+            self._wakeup.set()
+        self._tasks = [asyncio.create_task(self._work()) for _ in range(self.workers)]
+        if self.persist:
+            self._tasks.append(asyncio.create_task(self._maintain_forever()))
+
+    async def stop(self, timeout: float = JOB_DRAIN_TIMEOUT):
+        """Give queued jobs ``timeout`` seconds to finish, then stop the workers"""
+        deadline = time.monotonic() + timeout
+        while (self._ready or self._running) and self._tasks and time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        for handle in self._retrying:
+            handle.cancel()
+        left = [job for _, _, job in self._ready] + list(self._retrying.values())
+        self._ready = []
+        self._retrying = {}
+        self._update_depth()
+        lost = sum(1 for job in left if not job.persisted)
+        if left:
+            logger.warning(f"{len(left)} background jobs left queued at shutdown, {lost} of them not persisted")
+        if self._pending:
+            await asyncio.wait(list(self._pending), timeout=timeout)
+
+    def _collection(self):
+        from database import get_database
+
+        database = get_database()
+        return database.jobs if database is not None else None
+
+    def _save(self, job: Job, action: str, error: Optional[str] = None):
+        collection = self._collection()
+        if collection is None:
+            return
+        previous = job.saving
+        document = job.to_document(self.owner)
+
+        async def write():
+            if previous is not None:
+                await asyncio.wait([previous])
+            if action == "delete":
+                await collection.delete_one({"_id": job.job_id})
+            elif action == "failed":
+                await collection.replace_one({"_id": job.job_id}, {**document, "state": "failed", "error": error},
+                                             upsert=True)
+            else:
+                await collection.replace_one({"_id": job.job_id}, document, upsert=True)
+
+        task = job.saving = asyncio.ensure_future(write())
+        self._pending.add(task)
+        task.add_done_callback(self._saved)
+
+    def _saved(self, task: asyncio.Future):
+        self._pending.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.warning("Failed to persist background job: %s", task.exception())
+
+    async def heartbeat(self):
+        """Mark this process's queued jobs as still owned"""
+        collection = self._collection()
+        if collection is not None:
+            await collection.update_many({"owner": self.owner, "state": "queued"},
+                                         {"$set": {"updated_at": datetime.utcnow()}})
+
+    async def adopt(self) -> int:
+        """Take over queued jobs whose owner has missed three heartbeats; returns how many"""
+        collection = self._collection()
+        if collection is None:
+            return 0
+        cutoff = datetime.utcnow() - timedelta(seconds=3 * self.heartbeat_interval)
+        adopted = 0
+        while len(self) < self.max_pending:
+            document = await collection.find_one_and_update(
+                {"state": "queued", "owner": {"$ne": self.owner}, "updated_at": {"$lt": cutoff}},
+                {"$set": {"owner": self.owner, "updated_at": datetime.utcnow()}},
+            )
+            if document is None:
+                break
+            job = Job.from_document(document)
+            if job.name not in self.types:
+                await collection.update_one({"_id": job.job_id},
+                                            {"$set": {"state": "failed", "error": "No handler for this job"}})
+                continue
+            job.persisted = True
+            self._push(job)
+            adopted += 1
+        if adopted:
+            logger.info("Adopted %d background jobs from stopped workers", adopted)
+        return adopted
+
+    async def _maintain_forever(self):
+        while True:
+            try:
+                await self.heartbeat()
+                await self.adopt()
+            except Exception as e:
+                logger.warning("Background job heartbeat failed: %s", e)
+            await asyncio.sleep(self.heartbeat_interval)
+
+
+# Process-wide queue; handlers register at import, workers start from the app lifespan
+jobs = JobQueue()
@@ -0,0 +1,150 @@
+import atexit
+import copy
+import json
+import logging
+import os
+import queue
+import random
+import sys
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import Dict, Optional
+
+import coloredlogs
+
+from utils.middleware import get_request_id, request_scope_var
+
+LOG_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+
+# Standard LogRecord attributes; anything else was passed through `extra=`
+_RECORD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "request_id"}
+
+_listener: Optional[QueueListener] = None
+
+
+class JsonFormatter(logging.Formatter):
+    """Render records as one JSON object per line"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        request_id = getattr(record, "request_id", None)
+        if request_id:
+            entry["request_id"] = request_id
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRS:
+                entry[key] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class RequestContextFilter(logging.Filter):
+    """Attach the current request id and drop sampled-out INFO/DEBUG records.
+
+    Sampling is decided once per request, so a request is either logged in
+    full or not at all and its lines still correlate. Warnings and errors are
+    never sampled.
+    """
+
+    def __init__(self, sample_rates: Dict[str, float]):
+        super().__init__()
+        self.sample_rates = sample_rates
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = get_request_id()
+        if record.levelno >= logging.WARNING or not self.sample_rates:
+            return True
+
+        scope = request_scope_var.get()
+        if scope is None:
+            return True
+
+        state = scope.setdefault("state", {})
+        sampled = state.get("log_sampled")
+        if sampled is None:
+            route = scope.get("route")
+            rate = self.sample_rates.get(getattr(route, "path", None), 1.0)
+            sampled = state["log_sampled"] = rate >= 1.0 or random.random() < rate
+        return sampled
+
+
+_IMMUTABLE = (str, int, float, bool, bytes, type(None))
+
+
+class DeferredQueueHandler(QueueHandler):
+    """QueueHandler that leaves message formatting to the listener thread.
+
+    The stock handler merges ``msg % args`` before enqueueing, which puts the
+    formatting cost back on the event loop. Records whose args are all
+    immutable are passed through as they are; anything else is formatted here,
+    since the caller may change it before the listener gets to it.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        args = record.args
+        values = args.values() if isinstance(args, dict) else (args or ())
+        if all(isinstance(value, _IMMUTABLE) for value in values):
+            return record
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+
+def _parse_sample_rates(raw: str) -> Dict[str, float]:
+    try:
+        rates = json.loads(raw)
+        return {str(route): float(rate) for route, rate in rates.items()}
+    except (ValueError, AttributeError, TypeError):
+        print(f"Warning: ignoring invalid LOG_SAMPLE_RATES: {raw!r}", file=sys.stderr)
+        return {}
+
+
+def configure_logging(logger_name: str = "global_estates") -> logging.Logger:
+    """Route the application logger through a background queue writer.
+
+    ``LOG_FORMAT=json`` switches to structured output, ``LOG_LEVEL`` sets the
+    level and ``LOG_SAMPLE_RATES`` (a JSON object of route template to keep
+    rate, e.g. ``{"/api/menu/": 0.05}``) samples high-volume INFO logs.
+    """
+    global _listener
+
+    logger = logging.getLogger(logger_name)
+    if _listener is not None:
+        return logger
+
+    level = os.getenv("LOG_LEVEL", "INFO").upper()
+    json_mode = os.getenv("LOG_FORMAT", "text").lower() == "json"
+    sample_rates = _parse_sample_rates(os.getenv("LOG_SAMPLE_RATES", "{}"))
+
+    stream_handler = logging.StreamHandler(sys.stderr)
+    if json_mode:
+        stream_handler.setFormatter(JsonFormatter())
+    else:
+        stream_handler.setFormatter(coloredlogs.ColoredFormatter(fmt=LOG_FORMAT))
+
+    log_queue: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+    queue_handler = DeferredQueueHandler(log_queue)
+    queue_handler.addFilter(RequestContextFilter(sample_rates))
+
+    logger.handlers = [queue_handler]
+    logger.setLevel(level)
+    logger.propagate = False
+
+    _listener = QueueListener(log_queue, stream_handler, respect_handler_level=True)
+    _listener.start()
+    atexit.register(stop_logging)
+    return logger
+
+
+def stop_logging():
+    """Flush queued records and stop the background writer"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
@@ -0,0 +1,168 @@
+"""Event-loop lag sampling and blocked-loop detection.
+
+A heartbeat callback is scheduled on the loop every ``interval`` seconds;
+how late it runs is the loop lag. A watchdog thread checks the heartbeat and,
+if it is more than ``threshold`` seconds overdue, the loop is blocked by
+synchronous code: the watchdog grabs the loop thread's stack right then
+(``sys._current_frames``) together with the route of the request whose task
+is running. The event is recorded once the loop recovers and the true
+duration is known.
+
+The cost is one timer callback per interval on the loop and one wakeup per
+half threshold in the watchdog, so it stays on in production. Requests are
+attributed through ``LoopMonitorMiddleware``.
+"""
+import asyncio
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from typing import Any, Deque, Dict, Optional
+
+from utils.metrics import Counter, Gauge, Histogram
+
+logger = logging.getLogger("global_estates")
+
+LOOP_MONITOR = os.getenv("LOOP_MONITOR", "1").lower() not in ("0", "false", "no")
+LOOP_BLOCK_THRESHOLD = float(os.getenv("LOOP_BLOCK_THRESHOLD_MS", "100")) / 1000
+LOOP_SAMPLE_INTERVAL = float(os.getenv("LOOP_SAMPLE_INTERVAL_MS", "100")) / 1000
+STACK_DEPTH = 25
+
+LOOP_LAG = Histogram(
+    "event_loop_lag_seconds", "How late the loop ran a callback scheduled on time",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5),
+)
+LOOP_LAG_MAX = Gauge("event_loop_lag_max_seconds", "Largest loop lag seen by this worker")
+LOOP_BLOCKS = Counter(
+    "event_loop_blocks_total", "Times synchronous code held the loop longer than the threshold", ["route"]
+)
+
+
+def _route_of(scope: Optional[Dict[str, Any]]) -> str:
+    if scope is None:
+        return "<background>"
+    route = scope.get("route")
+    return getattr(route, "path", None) or "<unmatched>"
+
+
+class LoopMonitor:
+    def __init__(self, threshold: float = LOOP_BLOCK_THRESHOLD, interval: float = LOOP_SAMPLE_INTERVAL,
+                 max_events: int = 50):
+        self.threshold = threshold
+        self.interval = interval
+        self.events: Deque[Dict[str, Any]] = deque(maxlen=max_events)
+        self.last_lag = 0.0
+        self.max_lag = 0.0
+        # ASGI scope of the request each task is serving, maintained by the middleware
+        self.scopes: Dict[asyncio.Task, Dict[str, Any]] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread: Optional[int] = None
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._expected = 0.0
+        self._pending: Optional[Dict[str, Any]] = None
+        self._stop = threading.Event()
+        self._watchdog: Optional[threading.Thread] = None
+
+    @property
+    def running(self) -> bool:
+        return self._loop is not None
+
+    def start(self):
+        """Start monitoring the running loop; call from a coroutine on that loop"""
+        if self.running:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread = threading.get_ident()
+        self._expected = time.monotonic() + self.interval
+        self._timer = self._loop.call_later(self.interval, self._beat)
+        self._stop.clear()
+        self._watchdog = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        self._watchdog.start()
+        logger.info("Loop monitor started (threshold %.0f ms)", self.threshold * 1000)
+
+    def stop(self):
+        if not self.running:
+            return
+        self._stop.set()
+        if self._timer is not None:
+            self._timer.cancel()
+        if self._watchdog is not None:
+            self._watchdog.join(timeout=1)
+        self._loop = self._timer = self._watchdog = None
+
+    def _beat(self):
+        now = time.monotonic()
+        lag = max(0.0, now - self._expected)
+        self.last_lag = lag
+        LOOP_LAG.observe(lag)
+        if lag > self.max_lag:
+            self.max_lag = lag
+            LOOP_LAG_MAX.set(lag)
+
+        pending, self._pending = self._pending, None
+        if pending is not None:
+            pending["blocked_ms"] = round(lag * 1000, 1)
+            self.events.append(pending)
+            LOOP_BLOCKS.labels(pending["route"]).inc()
+            logger.warning(
+                "Event loop blocked for %.0f ms in %s:\n%s",
+                lag * 1000, pending["route"], "".join(pending["stack"]),
+            )
+
+        self._expected = now + self.interval
+        self._timer = self._loop.call_later(self.interval, self._beat)
+
+    def _watch(self):
+        check_every = max(self.threshold / 2, 0.005)
+        captured_for = None
+        while not self._stop.wait(check_every):
+            expected = self._expected
+            if time.monotonic() - expected <= self.threshold or captured_for == expected:
+                continue
+            # Heartbeat overdue: the loop thread is running synchronous code now
+            captured_for = expected
+            frame = sys._current_frames().get(self._loop_thread)
+            if frame is None:
+                continue
+            task = asyncio.current_task(self._loop) if self._loop is not None else None
+            self._pending = {
+                "at": time.time(),
+                "route": _route_of(self.scopes.get(task)),
+                "stack": traceback.format_list(traceback.extract_stack(frame, limit=STACK_DEPTH)),
+            }
+            del frame
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "running": self.running,
+            "threshold_ms": self.threshold * 1000,
+            "interval_ms": self.interval * 1000,
+            "lag_ms": {"last": round(self.last_lag * 1000, 1), "max": round(self.max_lag * 1000, 1)},
+            "blocks": list(reversed(self.events)),
+        }
+
+
+loop_monitor = LoopMonitor()
+
+
+class LoopMonitorMiddleware:
+    """Pure ASGI middleware recording which request each task is serving"""
+
+    def __init__(self, app, monitor: LoopMonitor = loop_monitor):
+        self.app = app
+        self.monitor = monitor
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.monitor.running:
+            await self.app(scope, receive, send)
+            return
+        task = asyncio.current_task()
+        self.monitor.scopes[task] = scope
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.monitor.scopes.pop(task, None)
+
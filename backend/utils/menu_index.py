@@ -0,0 +1,83 @@
+"""In-memory menu indexes for the voice tool endpoints.
+
+Tool calls made by Ultravox during a conversation sit on the voice turn's
+critical path, so they are answered without touching disk or the database:
+each menu load is indexed once (ids, normalized names and a token posting
+list) and every item's compact tool representation is serialized up front.
+"""
+import json
+import re
+from typing import Any, Dict, List, Optional, Set
+
+_WORD = re.compile(r"[a-z0-9]+")
+
+
+def normalize_tokens(text: str) -> List[str]:
+    """Lowercase words with a trailing plural ``s`` dropped ("pizzas" finds "pizza")"""
+    return [word[:-1] if len(word) > 3 and word.endswith("s") else word for word in _WORD.findall(text.lower())]
+
+
+def compact_item(item: Dict[str, Any]) -> Dict[str, Any]:
+    """The fields a voice agent needs to talk about an item"""
+    compact = {"id": item.get("id"), "name": item.get("name"), "price": item.get("price")}
+    if item.get("category"):
+        compact["category"] = item["category"]
+    if "isVeg" in item:
+        compact["veg"] = bool(item["isVeg"])
+    return compact
+
+
+class MenuIndex:
+    def __init__(self, items: List[Dict[str, Any]]):
+        self.by_id: Dict[str, Dict[str, Any]] = {}
+        self.by_name: Dict[str, str] = {}
+        self.postings: Dict[str, Set[str]] = {}
+        # Serialized compact items, spliced into tool responses as-is
+        self.fragments: Dict[str, bytes] = {}
+        self._name_lengths: Dict[str, int] = {}
+
+        for item in items:
+            item_id = item.get("id")
+            if not item_id or item.get("price") is None:
+                continue
+            item_id = str(item_id)
+            self.by_id[item_id] = item
+            name = item.get("name") or ""
+            tokens = normalize_tokens(name)
+            self.by_name[" ".join(tokens)] = item_id
+            self._name_lengths[item_id] = len(tokens)
+            for token in set(tokens + normalize_tokens(item.get("category") or "")):
+                self.postings.setdefault(token, set()).add(item_id)
+            self.fragments[item_id] = json.dumps(
+                compact_item(item), separators=(",", ":"), ensure_ascii=False
+            ).encode("utf-8")
+
+    def __len__(self) -> int:
+        return len(self.by_id)
+
+    def get(self, item_id: str) -> Optional[Dict[str, Any]]:
+        return self.by_id.get(item_id)
+
+    def find(self, query: str, limit: int = 5) -> List[str]:
+        """Item ids best matching ``query``: an exact name first, then by words matched"""
+        tokens = normalize_tokens(query)
+        if not tokens:
+            return []
+        exact = self.by_name.get(" ".join(tokens))
+        scores: Dict[str, int] = {}
+        for token in tokens:
+            for item_id in self.postings.get(token, ()):
+                scores[item_id] = scores.get(item_id, 0) + 1
+        ranked = sorted(scores, key=lambda item_id: (-scores[item_id], self._name_lengths[item_id], item_id))
+        if exact is not None:
+            ranked.remove(exact)
+            ranked.insert(0, exact)
+        return ranked[:limit]
+
+    def resolve(self, item_id: Optional[str] = None, name: Optional[str] = None) -> Optional[str]:
+        """One item by id, or the best match for a spoken name"""
+        if item_id and item_id in self.by_id:
+            return item_id
+        matches = self.find(name or item_id or "", limit=1)
+        return matches[0] if matches else None
+
@@ -0,0 +1,89 @@
+"""Versioned menu catalog with a bounded history of item-level diffs.
+
+Every reload of menuitems.json gets a new version: the file's modification
+time in nanoseconds, bumped if needed so versions only increase. Workers
+reading the same file therefore agree on version numbers. The diff from the
+previous load (items added, removed and the fields that changed) is kept
+for the last ``size`` reloads, so a client that knows version ``v`` can
+fetch only what changed since. Clients further behind than the history, or
+presenting a version this worker never saw, are told to resync.
+"""
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+_MISSING = object()
+
+
+def diff_items(old: List[Dict[str, Any]], new: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Item-level changes from ``old`` to ``new``, matching items by id"""
+    old_by_id = {str(item.get("id")): item for item in old}
+    new_by_id = {str(item.get("id")): item for item in new}
+    added = {item_id: item for item_id, item in new_by_id.items() if item_id not in old_by_id}
+    removed = [item_id for item_id in old_by_id if item_id not in new_by_id]
+    changed = {}
+    for item_id, item in new_by_id.items():
+        before = old_by_id.get(item_id)
+        if before is None or before == item:
+            continue
+        fields = {key: value for key, value in item.items() if before.get(key, _MISSING) != value}
+        dropped = [key for key in before if key not in item]
+        changed[item_id] = (fields, dropped)
+    return {"added": added, "removed": removed, "changed": changed}
+
+
+class MenuHistory:
+    def __init__(self, size: int = 50):
+        self.version: Optional[int] = None
+        # (from_version, to_version, diff), oldest first
+        self._diffs: Deque[Tuple[int, int, Dict[str, Any]]] = deque(maxlen=size)
+
+    def record(self, mtime_ns: int, old: Optional[List[Dict[str, Any]]], new: List[Dict[str, Any]]) -> int:
+        """Register a reload and return its version"""
+        version = mtime_ns if self.version is None else max(mtime_ns, self.version + 1)
+        if self.version is not None and old is not None:
+            self._diffs.append((self.version, version, diff_items(old, new)))
+        self.version = version
+        return version
+
+    def changes_since(self, since: int) -> Optional[Dict[str, Any]]:
+        """Net changes from version ``since`` to now, or None if a full resync is needed"""
+        if since == self.version:
+            return {"added": [], "removed": [], "changed": []}
+        start = next((i for i, (from_version, _, _) in enumerate(self._diffs) if from_version == since), None)
+        if start is None:
+            return None
+
+        added: Dict[str, Dict[str, Any]] = {}
+        removed: Dict[str, None] = {}
+        changed: Dict[str, Tuple[Dict[str, Any], set]] = {}
+        for _, _, diff in list(self._diffs)[start:]:
+            for item_id in diff["removed"]:
+                added.pop(item_id, None)
+                changed.pop(item_id, None)
+                removed[item_id] = None
+            for item_id, item in diff["added"].items():
+                removed.pop(item_id, None)
+                changed.pop(item_id, None)
+                added[item_id] = item
+            for item_id, (fields, dropped) in diff["changed"].items():
+                if item_id in added:
+                    item = {key: value for key, value in added[item_id].items() if key not in dropped}
+                    item.update(fields)
+                    added[item_id] = item
+                    continue
+                net_fields, net_dropped = changed.setdefault(item_id, ({}, set()))
+                for key in dropped:
+                    net_fields.pop(key, None)
+                    net_dropped.add(key)
+                for key, value in fields.items():
+                    net_dropped.discard(key)
+                    net_fields[key] = value
+
+        return {
+            "added": list(added.values()),
+            "removed": list(removed),
+            "changed": [
+                {"id": item_id, "fields": fields, "removedFields": sorted(dropped)}
+                for item_id, (fields, dropped) in changed.items()
+            ],
+        }
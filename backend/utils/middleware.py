@@ -0,0 +1,93 @@
+import re
+import time
+import uuid
+from contextvars import ContextVar
+from typing import Optional
+
+# Request id of the request currently being handled, readable from anywhere
+# in the call stack (log records, upstream calls, background work)
+request_id_var: ContextVar[Optional[str]] = ContextVar("request_id", default=None)
+# ASGI scope of the current request; the route is only known once the router
+# has matched, so consumers read it lazily from here
+request_scope_var: ContextVar[Optional[dict]] = ContextVar("request_scope", default=None)
+
+REQUEST_ID_HEADER = b"x-request-id"
+
+# Incoming ids are echoed back in headers and logs, so only accept short,
+# printable tokens
+_VALID_REQUEST_ID = re.compile(rb"[A-Za-z0-9._:-]{1,128}")
+
+
+def get_request_id() -> Optional[str]:
+    return request_id_var.get()
+
+
+class RequestIdMiddleware:
+    """Pure ASGI middleware that tags every request with an id.
+
+    A well-formed ``X-Request-ID`` sent by the client or proxy is reused,
+    otherwise a new one is generated. The id is stored in ``scope["state"]``
+    and ``request_id_var`` and echoed in the response headers.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        raw_id = None
+        for name, value in scope["headers"]:
+            if name == REQUEST_ID_HEADER:
+                raw_id = value
+                break
+
+        if raw_id is None or not _VALID_REQUEST_ID.fullmatch(raw_id):
+            raw_id = uuid.uuid4().hex.encode("ascii")
+
+        request_id = raw_id.decode("ascii")
+        scope.setdefault("state", {})["request_id"] = request_id
+        token = request_id_var.set(request_id)
+        scope_token = request_scope_var.set(scope)
+
+        async def send_with_request_id(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = list(message.get("headers", ())) + [(REQUEST_ID_HEADER, raw_id)]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_request_id)
+        finally:
+            request_id_var.reset(token)
+            request_scope_var.reset(scope_token)
+
+
+class TimingMiddleware:
+    """Pure ASGI middleware that reports handler time in ``Server-Timing``.
+
+    The duration is measured up to the moment the response headers are sent,
+    which is the time the browser devtools attribute to the server.
+    """
+
+    def __init__(self, app, metric_name: str = "app"):
+        self.app = app
+        self.prefix = f"{metric_name};dur=".encode("ascii")
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                duration_ms = (time.perf_counter() - start) * 1000
+                message["headers"] = list(message.get("headers", ())) + [
+                    (b"server-timing", self.prefix + b"%.2f" % duration_ms)
+                ]
+            await send(message)
+
+        await self.app(scope, receive, send_with_timing)
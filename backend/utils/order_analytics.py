@@ -0,0 +1,325 @@
+"""Order analytics kept up to date as orders are placed and move through statuses.
+
+Every counter is updated in place when an order is created or changes
+status:
+- quantities and revenue per item;
+- revenue per category;
+- orders and revenue per hour;
+- how many orders are in each status now;
+- how many orders have ever entered each status (the funnel);
+- overall totals.
+
+Reads therefore cost the same no matter how many orders there are. The item
+ranking is re-sorted only after a change, and then it is bounded by the
+menu size, not the order count. Cancelled orders are taken back out of the
+item, category and hourly figures and counted in ``cancelledRevenue``
+instead.
+
+Workers share one ``analytics`` document in Mongo. Each worker also keeps
+the changes it made since its last sync. Every ANALYTICS_SNAPSHOT_INTERVAL
+seconds, and on shutdown, it adds them to the document with ``$inc`` and
+reads the document back. Its view is then the stored figures plus whatever
+changed since. Workers never overwrite each other's orders, and each
+worker sees the others' orders within one interval.
+"""
+import asyncio
+import logging
+import os
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger("global_estates")
+
+ANALYTICS_SNAPSHOT_INTERVAL = float(os.getenv("ANALYTICS_SNAPSHOT_INTERVAL", "60"))
+# Hourly buckets kept, one week by default
+ANALYTICS_HOURS = int(os.getenv("ANALYTICS_HOURS", "168"))
+SNAPSHOT_ID = "orders"
+UNCATEGORIZED = "Uncategorized"
+
+CategoryFor = Callable[[str], Optional[str]]
+
+
+def _field(key: str) -> str:
+    """Item ids and categories as Mongo field names, which may not contain "." or start with "$" """
+    return key.replace("%", "%25").replace(".", "%2E").replace("$", "%24")
+
+
+def _unfield(field: str) -> str:
+    return field.replace("%24", "$").replace("%2E", ".").replace("%25", "%")
+
+
+class Aggregates:
+    """One set of order figures: either a worker's whole view or its unsynced changes"""
+
+    def __init__(self):
+        self.orders = 0
+        self.revenue = 0.0
+        self.cancelled_orders = 0
+        self.cancelled_revenue = 0.0
+        self.items: Dict[str, Dict[str, Any]] = {}  # id -> {"name", "quantity", "revenue"}
+        self.categories: Dict[str, float] = {}
+        self.hourly: Dict[str, Dict[str, float]] = {}  # "YYYY-MM-DDTHH" -> {"orders", "revenue"}
+        self.statuses: Dict[str, int] = {}
+        self.funnel: Dict[str, int] = {}
+
+    def __bool__(self) -> bool:
+        return bool(self.orders or self.cancelled_orders or self.items or self.categories
+                    or self.hourly or self.statuses or self.funnel)
+
+    def add_item(self, item_id: str, name: Optional[str], quantity: int, revenue: float):
+        stats = self.items.setdefault(item_id, {"name": name, "quantity": 0, "revenue": 0.0})
+        stats["quantity"] += quantity
+        stats["revenue"] += revenue
+        if name:
+            stats["name"] = name
+
+    def add_category(self, category: str, revenue: float):
+        self.categories[category] = self.categories.get(category, 0.0) + revenue
+
+    def add_hour(self, hour: str, orders: int, revenue: float):
+        bucket = self.hourly.setdefault(hour, {"orders": 0, "revenue": 0.0})
+        bucket["orders"] += orders
+        bucket["revenue"] += revenue
+
+    def add_status(self, status: str, count: int, entered: bool):
+        self.statuses[status] = self.statuses.get(status, 0) + count
+        if entered:
+            self.funnel[status] = self.funnel.get(status, 0) + 1
+
+    def merge(self, other: "Aggregates"):
+        self.orders += other.orders
+        self.revenue += other.revenue
+        self.cancelled_orders += other.cancelled_orders
+        self.cancelled_revenue += other.cancelled_revenue
+        for item_id, stats in other.items.items():
+            self.add_item(item_id, stats.get("name"), stats["quantity"], stats["revenue"])
+        for category, revenue in other.categories.items():
+            self.add_category(category, revenue)
+        for hour, bucket in other.hourly.items():
+            self.add_hour(hour, bucket["orders"], bucket["revenue"])
+        for status, count in other.statuses.items():
+            self.statuses[status] = self.statuses.get(status, 0) + count
+        for status, count in other.funnel.items():
+            self.funnel[status] = self.funnel.get(status, 0) + count
+
+    def trim_hours(self, hours: int) -> List[str]:
+        """Drop all but the newest ``hours`` buckets; returns the dropped hours"""
+        if len(self.hourly) <= hours:
+            return []
+        stale = sorted(self.hourly)[:len(self.hourly) - hours]
+        for hour in stale:
+            del self.hourly[hour]
+        return stale
+
+    def to_update(self) -> Dict[str, Any]:
+        """A Mongo update adding these figures to a stored document"""
+        inc: Dict[str, Any] = {
+            "orders": self.orders, "revenue": self.revenue,
+            "cancelledOrders": self.cancelled_orders, "cancelledRevenue": self.cancelled_revenue,
+        }
+        names = {}
+        for item_id, stats in self.items.items():
+            inc[f"items.{_field(item_id)}.quantity"] = stats["quantity"]
+            inc[f"items.{_field(item_id)}.revenue"] = stats["revenue"]
+            if stats.get("name"):
+                names[f"items.{_field(item_id)}.name"] = stats["name"]
+        for category, revenue in self.categories.items():
+            inc[f"categories.{_field(category)}"] = revenue
+        for hour, bucket in self.hourly.items():
+            inc[f"hourly.{hour}.orders"] = bucket["orders"]
+            inc[f"hourly.{hour}.revenue"] = bucket["revenue"]
+        for status, count in self.statuses.items():
+            inc[f"statuses.{status}"] = count
+        for status, count in self.funnel.items():
+            inc[f"funnel.{status}"] = count
+        update: Dict[str, Any] = {"$inc": inc}
+        if names:
+            update["$set"] = names
+        return update
+
+    @classmethod
+    def from_document(cls, document: Dict[str, Any]) -> "Aggregates":
+        aggregates = cls()
+        aggregates.orders = document.get("orders", 0)
+        aggregates.revenue = document.get("revenue", 0.0)
+        aggregates.cancelled_orders = document.get("cancelledOrders", 0)
+        aggregates.cancelled_revenue = document.get("cancelledRevenue", 0.0)
+        for field, stats in document.get("items", {}).items():
+            aggregates.add_item(_unfield(field), stats.get("name"), stats.get("quantity", 0), stats.get("revenue", 0.0))
+        for field, revenue in document.get("categories", {}).items():
+            aggregates.add_category(_unfield(field), revenue)
+        for hour, bucket in document.get("hourly", {}).items():
+            aggregates.add_hour(hour, bucket.get("orders", 0), bucket.get("revenue", 0.0))
+        aggregates.statuses = dict(document.get("statuses", {}))
+        aggregates.funnel = dict(document.get("funnel", {}))
+        return aggregates
+
+
+class OrderAnalytics:
+    def __init__(self, hours: int = ANALYTICS_HOURS):
+        self.hours = hours
+        self.reset()
+
+    def reset(self):
+        self.totals = Aggregates()
+        # Changes not yet added to the stored document
+        self.changes = Aggregates()
+        self._ranking: Optional[List[Dict[str, Any]]] = None
+
+    @property
+    def dirty(self) -> bool:
+        return bool(self.changes)
+
+    def _both(self) -> Tuple[Aggregates, Aggregates]:
+        self._ranking = None
+        return self.totals, self.changes
+
+    def _apply(self, order: Dict[str, Any], category_for: CategoryFor, sign: int):
+        """Add (sign 1) or take back (sign -1) an order's items, categories, hour and totals"""
+        hour = str(order.get("created_at", ""))[:13]
+        # An hour that has left the window stays out of it
+        in_window = hour in self.totals.hourly or (
+            len(self.totals.hourly) < self.hours or hour > min(self.totals.hourly)
+        )
+        for aggregates in self._both():
+            for item in order["items"]:
+                line_revenue = item["price"] * item["quantity"]
+                aggregates.add_item(item["id"], item.get("name"), sign * item["quantity"], sign * line_revenue)
+                aggregates.add_category(category_for(item["id"]) or UNCATEGORIZED, sign * line_revenue)
+            if in_window:
+                aggregates.add_hour(hour, sign, sign * order["total"])
+            aggregates.orders += sign
+            aggregates.revenue += sign * order["total"]
+        self.totals.trim_hours(self.hours)
+
+    def record_order(self, order: Dict[str, Any], category_for: CategoryFor):
+        self._apply(order, category_for, 1)
+        for aggregates in self._both():
+            aggregates.add_status(order.get("status", "pending"), 1, entered=True)
+
+    def record_status(self, order: Dict[str, Any], previous: str, status: str, category_for: CategoryFor):
+        if previous == status:
+            return
+        if status == "cancelled":
+            self._apply(order, category_for, -1)
+        elif previous == "cancelled":
+            self._apply(order, category_for, 1)
+        for aggregates in self._both():
+            aggregates.add_status(previous, -1, entered=False)
+            aggregates.add_status(status, 1, entered=True)
+            if status == "cancelled":
+                aggregates.cancelled_orders += 1
+                aggregates.cancelled_revenue += order["total"]
+            elif previous == "cancelled":
+                aggregates.cancelled_orders -= 1
+                aggregates.cancelled_revenue -= order["total"]
+
+    def take_changes(self) -> Aggregates:
+        changes, self.changes = self.changes, Aggregates()
+        return changes
+
+    def return_changes(self, changes: Aggregates):
+        """Put back changes that could not be stored, ahead of any made since"""
+        changes.merge(self.changes)
+        self.changes = changes
+
+    def rebase(self, document: Dict[str, Any]):
+        """Make the stored document plus the unsynced changes the current view"""
+        totals = Aggregates.from_document(document)
+        totals.merge(self.changes)
+        totals.trim_hours(self.hours)
+        self.totals = totals
+        self._ranking = None
+
+    def popular_items(self, limit: int = 10) -> List[Dict[str, Any]]:
+        """Items by quantity ordered, then revenue"""
+        if self._ranking is None:
+            self._ranking = sorted(
+                ({"id": item_id, **stats} for item_id, stats in self.totals.items.items() if stats["quantity"] > 0),
+                key=lambda item: (-item["quantity"], -item["revenue"], item["id"]),
+            )
+        return self._ranking[:limit]
+
+    def summary(self) -> Dict[str, Any]:
+        totals = self.totals
+        return {
+            "orders": totals.orders,
+            "revenue": round(totals.revenue, 2),
+            "averageTicket": round(totals.revenue / totals.orders, 2) if totals.orders else 0.0,
+            "cancelledOrders": totals.cancelled_orders,
+            "cancelledRevenue": round(totals.cancelled_revenue, 2),
+            "statuses": {status: count for status, count in totals.statuses.items() if count},
+            "funnel": {status: count for status, count in totals.funnel.items() if count},
+        }
+
+    def hourly_revenue(self, hours: int) -> List[Dict[str, Any]]:
+        """The newest ``hours`` buckets, oldest first"""
+        hourly = self.totals.hourly
+        recent = sorted(hourly)[-hours:] if hours > 0 else []
+        return [{"hour": hour, "orders": hourly[hour]["orders"], "revenue": round(hourly[hour]["revenue"], 2)}
+                for hour in recent]
+
+    def category_revenue(self) -> Dict[str, float]:
+        return {category: round(revenue, 2) for category, revenue in
+                sorted(self.totals.categories.items(), key=lambda entry: -entry[1])}
+
+
+class AnalyticsStore:
+    """Syncs ``analytics`` with the shared ``analytics`` document"""
+
+    def __init__(self, analytics: OrderAnalytics):
+        self.analytics = analytics
+        self._db = None
+        self._task: Optional[asyncio.Task] = None
+
+    async def sync(self):
+        """Add this worker's changes to the stored document and read back everyone's"""
+        if self._db is None:
+            return
+        collection = self._db.analytics
+        changes = self.analytics.take_changes()
+        if changes:
+            try:
+                await collection.update_one({"_id": SNAPSHOT_ID}, changes.to_update(), upsert=True)
+            except Exception:
+                self.analytics.return_changes(changes)
+                raise
+        document = await collection.find_one({"_id": SNAPSHOT_ID}) or {}
+        stale = sorted(document.get("hourly", {}))[:-self.analytics.hours]
+        if stale:
+            await collection.update_one({"_id": SNAPSHOT_ID}, {"$unset": {f"hourly.{hour}": "" for hour in stale}})
+        self.analytics.rebase(document)
+
+    async def restore(self, db):
+        """Load the stored figures, keeping any orders this worker took before"""
+        self._db = db
+        await self.sync()
+
+    async def _sync_forever(self, interval: float):
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.sync()
+            except Exception as e:
+                logger.error(f"Error syncing order analytics: {e}")
+
+    async def start(self, db, interval: float = ANALYTICS_SNAPSHOT_INTERVAL):
+        self._db = db
+        if self._task is None and db is not None:
+            self._task = asyncio.create_task(self._sync_forever(interval))
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        try:
+            await self.sync()
+        except Exception as e:
+            logger.error(f"Error syncing order analytics: {e}")
+
+
+order_analytics = OrderAnalytics()
+analytics_store = AnalyticsStore(order_analytics)
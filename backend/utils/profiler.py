@@ -0,0 +1,277 @@
+"""On-demand sampling profiler writing collapsed stacks.
+
+A profile covers either one request (its asyncio task) or a time window of
+the whole event loop thread. While any profile is active a sampler thread
+wakes every ``PROFILE_INTERVAL_MS`` and records one stack per profile:
+
+- for a window, the loop thread's current stack;
+- for a request, the loop thread's stack while its task is running, and
+  otherwise the task's chain of suspended coroutines ending in ``[await]``,
+  so time spent waiting on Ultravox or MongoDB shows up where it is awaited.
+
+Profiles are written to ``PROFILE_DIR`` in the collapsed-stack format read
+by flamegraph.pl and speedscope (``frame;frame;frame count`` per line),
+next to a small JSON metadata file; only the newest ``PROFILE_MAX_FILES``
+are kept. Nothing runs when no profile is active.
+"""
+import asyncio
+import hmac
+import json
+import logging
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from collections import Counter as StackCounter
+from typing import Any, Dict, List, Optional, Tuple
+
+from utils import auth
+from utils.metrics import Counter
+
+logger = logging.getLogger("global_estates")
+
+DEFAULT_PROFILE_DIR = os.path.join(tempfile.gettempdir(), "global_estates_profiles")
+PROFILE_DIR = os.getenv("PROFILE_DIR", DEFAULT_PROFILE_DIR)
+PROFILE_INTERVAL = float(os.getenv("PROFILE_INTERVAL_MS", "5")) / 1000
+PROFILE_MAX_FILES = int(os.getenv("PROFILE_MAX_FILES", "50"))
+# Profiles running at once; further requests are served unprofiled
+PROFILE_MAX_ACTIVE = int(os.getenv("PROFILE_MAX_ACTIVE", "4"))
+MAX_STACK_DEPTH = 64
+
+PROFILES_WRITTEN = Counter("profiles_written_total", "Profiles saved to PROFILE_DIR", ["kind"])
+
+_labels: Dict[Any, str] = {}
+
+
+def _label(code) -> str:
+    label = _labels.get(code)
+    if label is None:
+        label = _labels[code] = f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+    return label
+
+
+def thread_stack(frame) -> List[Any]:
+    """Frames from outermost to innermost"""
+    frames = []
+    while frame is not None and len(frames) < MAX_STACK_DEPTH:
+        frames.append(frame)
+        frame = frame.f_back
+    frames.reverse()
+    return frames
+
+
+def coroutine_stack(coro) -> List[Any]:
+    """Frames of a suspended coroutine and everything it is awaiting, outermost first"""
+    frames = []
+    while coro is not None and len(frames) < MAX_STACK_DEPTH:
+        frame = getattr(coro, "cr_frame", None) or getattr(coro, "gi_frame", None) or getattr(coro, "ag_frame", None)
+        if frame is None:
+            break
+        frames.append(frame)
+        coro = getattr(coro, "cr_await", None) or getattr(coro, "gi_yieldfrom", None) or getattr(coro, "ag_await", None)
+    return frames
+
+
+class Profile:
+    def __init__(self, kind: str, task: Optional[asyncio.Task] = None):
+        self.profile_id = uuid.uuid4().hex[:16]
+        self.kind = kind
+        self.task = task
+        self.loop = asyncio.get_running_loop()
+        self.thread_id = threading.get_ident()
+        self.started = time.time()
+        self.duration = 0.0
+        self.samples = 0
+        self.stacks: StackCounter = StackCounter()
+
+    def sample(self, thread_frame):
+        if self.task is None:
+            frames, suffix = thread_stack(thread_frame), ()
+        elif asyncio.current_task(self.loop) is self.task:
+            frames, suffix = thread_stack(thread_frame), ()
+            # Drop the event loop's own frames above the task
+            root = getattr(self.task.get_coro(), "cr_frame", None)
+            if root in frames:
+                frames = frames[frames.index(root):]
+        else:
+            frames, suffix = coroutine_stack(self.task.get_coro()), ("[await]",)
+        if frames:
+            self.stacks[tuple(_label(frame.f_code) for frame in frames) + suffix] += 1
+            self.samples += 1
+
+    def collapsed(self) -> str:
+        return "".join(f"{';'.join(stack)} {count}\n" for stack, count in self.stacks.most_common())
+
+
+class SamplingProfiler:
+    def __init__(self, directory: str = PROFILE_DIR, interval: float = PROFILE_INTERVAL,
+                 max_files: int = PROFILE_MAX_FILES, max_active: int = PROFILE_MAX_ACTIVE):
+        self.directory = directory
+        self.interval = interval
+        self.max_files = max_files
+        self.max_active = max_active
+        self._active: List[Profile] = []
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    def begin(self, kind: str, task: Optional[asyncio.Task] = None) -> Optional[Profile]:
+        """Start profiling ``task`` (or the whole loop thread); None if at capacity"""
+        profile = Profile(kind, task)
+        with self._lock:
+            if len(self._active) >= self.max_active:
+                return None
+            self._active.append(profile)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+                self._thread.start()
+        return profile
+
+    def end(self, profile: Profile) -> Profile:
+        with self._lock:
+            if profile in self._active:
+                self._active.remove(profile)
+        profile.duration = time.time() - profile.started
+        return profile
+
+    def _run(self):
+        while True:
+            with self._lock:
+                active = list(self._active)
+                if not active:
+                    self._thread = None
+                    return
+            frames = sys._current_frames()
+            for profile in active:
+                try:
+                    profile.sample(frames.get(profile.thread_id))
+                except Exception:
+                    # The sampled stacks change under us; skip a torn sample
+                    pass
+            del frames
+            time.sleep(self.interval)
+
+    def save(self, profile: Profile, **metadata) -> Dict[str, Any]:
+        """Write the profile and its metadata, then drop the oldest files over the limit"""
+        os.makedirs(self.directory, exist_ok=True)
+        name = f"{int(profile.started * 1000)}-{profile.profile_id}"
+        meta = {
+            "id": profile.profile_id,
+            "kind": profile.kind,
+            "started": profile.started,
+            "duration_ms": round(profile.duration * 1000, 1),
+            "samples": profile.samples,
+            "interval_ms": self.interval * 1000,
+            "pid": os.getpid(),
+            "file": f"{name}.collapsed",
+        }
+        meta.update(metadata)
+        with open(os.path.join(self.directory, f"{name}.collapsed"), "w", encoding="utf-8") as f:
+            f.write(profile.collapsed())
+        with open(os.path.join(self.directory, f"{name}.json"), "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        PROFILES_WRITTEN.labels(profile.kind).inc()
+        self._prune()
+        return meta
+
+    def _names(self) -> List[str]:
+        """Saved profile names, newest first"""
+        try:
+            files = os.listdir(self.directory)
+        except FileNotFoundError:
+            return []
+        return sorted((f[:-5] for f in files if f.endswith(".json")), reverse=True)
+
+    def _prune(self):
+        for name in self._names()[self.max_files:]:
+            for suffix in (".json", ".collapsed"):
+                try:
+                    os.unlink(os.path.join(self.directory, name + suffix))
+                except FileNotFoundError:
+                    pass
+
+    def recent(self, limit: int = 50) -> List[Dict[str, Any]]:
+        profiles = []
+        for name in self._names()[:limit]:
+            try:
+                with open(os.path.join(self.directory, f"{name}.json"), "r", encoding="utf-8") as f:
+                    profiles.append(json.load(f))
+            except (OSError, ValueError):
+                continue
+        return profiles
+
+    def read(self, profile_id: str) -> Optional[str]:
+        for name in self._names():
+            if name.endswith(f"-{profile_id}"):
+                with open(os.path.join(self.directory, f"{name}.collapsed"), "r", encoding="utf-8") as f:
+                    return f.read()
+        return None
+
+
+profiler = SamplingProfiler()
+
+
+def _header(scope, name: bytes) -> Optional[bytes]:
+    for key, value in scope["headers"]:
+        if key == name:
+            return value
+    return None
+
+
+class ProfilerMiddleware:
+    """Pure ASGI middleware profiling requests that ask for it.
+
+    A request is profiled when it sends ``X-Profile: 1`` together with a valid
+    ``X-Admin-Token``, or is picked at ``PROFILE_SAMPLE_RATE``. The response
+    carries the profile id in ``X-Profile-Id``.
+    """
+
+    def __init__(self, app, profiler: SamplingProfiler = profiler, sample_rate: Optional[float] = None):
+        self.app = app
+        self.profiler = profiler
+        self.sample_rate = float(os.getenv("PROFILE_SAMPLE_RATE", "0")) if sample_rate is None else sample_rate
+
+    def _wanted(self, scope) -> Tuple[bool, str]:
+        if auth.ADMIN_TOKEN and _header(scope, b"x-profile") not in (None, b"0"):
+            # Compared as bytes: compare_digest rejects non-ASCII str with a TypeError
+            token = _header(scope, b"x-admin-token") or b""
+            if hmac.compare_digest(token, auth.ADMIN_TOKEN.encode("utf-8")):
+                return True, "request"
+        if self.sample_rate and random.random() < self.sample_rate:
+            return True, "sampled"
+        return False, ""
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        wanted, kind = self._wanted(scope)
+        profile = self.profiler.begin(kind, asyncio.current_task()) if wanted else None
+        if profile is None:
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+
+        async def send_with_profile_id(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                message["headers"] = list(message.get("headers", [])) + [(b"x-profile-id", profile.profile_id.encode("ascii"))]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_profile_id)
+        finally:
+            self.profiler.end(profile)
+            route = scope.get("route")
+            try:
+                await asyncio.to_thread(
+                    self.profiler.save, profile,
+                    method=scope["method"], path=scope["path"],
+                    route=getattr(route, "path", None), status=status_code,
+                )
+            except OSError as e:
+                logger.warning("Could not save profile %s: %s", profile.profile_id, e)
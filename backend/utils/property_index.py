@@ -0,0 +1,259 @@
+"""Multi-attribute property search index.
+
+Listings are stored in rows sorted by ``(price, id)``. A price range is then
+a contiguous slice found by binary search. Every categorical attribute
+(property type, listing type, feature, location, beds, baths) maps each
+value to a bitmap over the rows, held as a Python int. Area is bit-sliced:
+one bitmap per bit of ``sqft``, from which ``sqft <= c`` is computed exactly
+in one pass over the slices. A query is a few dozen big-int ORs and ANDs,
+whose cost depends on the number of listings divided by 64, not on how many
+listings match.
+
+Pages use keyset cursors: the cursor holds the ``(price, id)`` of the last
+row returned, and the next page starts just past that key. A cursor stays
+valid when listings are added or removed, and never repeats or skips a
+listing that was there on both pages.
+
+Radius and bounding-box filters come from a grid index over the listings'
+coordinates (utils/geo_index.py) as bitmaps, ANDed with the others.
+"""
+import base64
+import json
+import re
+from array import array
+from bisect import bisect_left, bisect_right
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from utils.geo_index import GridIndex
+
+CATEGORICAL = ("propertyType", "listingType", "location")
+# About 280 m of latitude per spatial cell
+GEO_CELL_DEG = 0.0025
+
+_NONZERO = re.compile(b"[^\x00]")
+_BYTE_BITS = tuple(tuple(bit for bit in range(8) if value >> bit & 1) for value in range(256))
+_COUNT_SPEC = re.compile(r"^(\d+)(\+?)$")
+
+
+def _popcount(mask: int) -> int:
+    bit_count = getattr(mask, "bit_count", None)  # Python 3.10+
+    return bit_count() if bit_count else bin(mask).count("1")
+
+
+def _to_mask(rows: Iterable[int], n_rows: int) -> int:
+    bits = bytearray((n_rows + 7) // 8)
+    for row in rows:
+        bits[row >> 3] |= 1 << (row & 7)
+    return int.from_bytes(bits, "little")
+
+
+def _span(start: int, end: int) -> int:
+    """Mask of rows ``start`` to ``end - 1``"""
+    return ((1 << (end - start)) - 1) << start if end > start else 0
+
+
+def _first_rows(mask: int, count: int, reverse: bool) -> List[int]:
+    """The ``count`` lowest (or highest) set bits of ``mask``"""
+    data = mask.to_bytes((mask.bit_length() + 7) // 8, "little")
+    rows: List[int] = []
+    if reverse:
+        last = len(data) - 1
+        for match in _NONZERO.finditer(data[::-1]):
+            index = last - match.start()
+            rows.extend(index * 8 + bit for bit in reversed(_BYTE_BITS[data[index]]))
+            if len(rows) >= count:
+                break
+    else:
+        for match in _NONZERO.finditer(data):
+            index = match.start()
+            rows.extend(index * 8 + bit for bit in _BYTE_BITS[data[index]])
+            if len(rows) >= count:
+                break
+    return rows[:count]
+
+
+def encode_cursor(price: float, item_id: str) -> str:
+    raw = json.dumps([price, item_id], separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[float, str]:
+    try:
+        price, item_id = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        return float(price), str(item_id)
+    except (ValueError, TypeError):
+        raise ValueError("Invalid cursor")
+
+
+def parse_count(spec: str) -> Tuple[int, bool]:
+    """``"3"`` -> (3, False), ``"5+"`` -> (5, True)"""
+    match = _COUNT_SPEC.match(spec.strip())
+    if not match:
+        raise ValueError(f"Invalid count: {spec!r}")
+    return int(match.group(1)), bool(match.group(2))
+
+
+class PropertyIndex:
+    def __init__(self, properties: Sequence[Dict[str, Any]]):
+        rows = sorted(properties, key=lambda item: (float(item["price"]), str(item["id"])))
+        self.rows = rows
+        self.n_rows = len(rows)
+        self.prices = array("d", (float(item["price"]) for item in rows))
+        self.ids = [str(item["id"]) for item in rows]
+        sqft = array("l", (max(0, int(item.get("sqft") or 0)) for item in rows))
+        self._all = _span(0, self.n_rows)
+        self.geo = GridIndex([item.get("lat") for item in rows], [item.get("lng") for item in rows], GEO_CELL_DEG)
+
+        postings: Dict[str, Dict[Any, List[int]]] = {
+            name: {} for name in ("propertyType", "listingType", "location", "feature", "beds", "baths")
+        }
+        for row, item in enumerate(rows):
+            for attribute in CATEGORICAL:
+                postings[attribute].setdefault(str(item.get(attribute, "")).casefold(), []).append(row)
+            for feature in item.get("features") or ():
+                postings["feature"].setdefault(feature.casefold(), []).append(row)
+            postings["beds"].setdefault(int(item.get("beds") or 0), []).append(row)
+            postings["baths"].setdefault(int(item.get("baths") or 0), []).append(row)
+        self._bitmaps: Dict[str, Dict[Any, int]] = {
+            name: {value: _to_mask(value_rows, self.n_rows) for value, value_rows in values.items()}
+            for name, values in postings.items()
+        }
+        # _area_slices[i]: rows whose sqft has bit i set
+        self._area_slices = [
+            _to_mask((row for row, value in enumerate(sqft) if value >> bit & 1), self.n_rows)
+            for bit in range(max(sqft, default=0).bit_length())
+        ]
+
+    def __len__(self) -> int:
+        return self.n_rows
+
+    def values(self, attribute: str) -> List[Any]:
+        return sorted(self._bitmaps[attribute])
+
+    def _any_of(self, attribute: str, values: Iterable[str]) -> int:
+        bitmaps = self._bitmaps[attribute]
+        mask = 0
+        for value in values:
+            mask |= bitmaps.get(value.casefold(), 0)
+        return mask
+
+    def _count(self, attribute: str, spec: str) -> int:
+        count, at_least = parse_count(spec)
+        bitmaps = self._bitmaps[attribute]
+        if not at_least:
+            return bitmaps.get(count, 0)
+        mask = 0
+        for value, bitmap in bitmaps.items():
+            if value >= count:
+                mask |= bitmap
+        return mask
+
+    def _area_at_most(self, limit: int) -> int:
+        """Rows with ``sqft <= limit``, from the bit slices (most significant first)"""
+        if limit < 0:
+            return 0
+        if limit >> len(self._area_slices):
+            return self._all
+        below, equal = 0, self._all
+        for bit in range(len(self._area_slices) - 1, -1, -1):
+            bit_slice = self._area_slices[bit]
+            if limit >> bit & 1:
+                below |= equal & (self._all ^ bit_slice)
+                equal &= bit_slice
+            else:
+                equal &= self._all ^ bit_slice
+        return below | equal
+
+    def _area(self, min_area: Optional[int], max_area: Optional[int]) -> int:
+        mask = self._all if max_area is None else self._area_at_most(max_area)
+        if min_area is not None:
+            mask &= self._all ^ self._area_at_most(min_area - 1)
+        return mask
+
+    def _key_position(self, price: float, item_id: str, inclusive: bool) -> int:
+        """Number of rows ordered before ``(price, item_id)``, or up to it if ``inclusive``"""
+        lo = bisect_left(self.prices, price)
+        hi = bisect_right(self.prices, price, lo)
+        ids = self.ids
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if ids[mid] < item_id or (inclusive and ids[mid] == item_id):
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def matching(self, min_price: Optional[float] = None, max_price: Optional[float] = None,
+                 beds: Optional[str] = None, baths: Optional[str] = None,
+                 property_types: Sequence[str] = (), listing_types: Sequence[str] = (),
+                 features: Sequence[str] = (), location: Optional[str] = None,
+                 min_area: Optional[int] = None, max_area: Optional[int] = None,
+                 near: Optional[Tuple[float, float, float]] = None,
+                 bbox: Optional[Tuple[float, float, float, float]] = None) -> int:
+        """Bitmap of the rows matching every given filter.
+
+        ``beds``/``baths`` are ``"N"`` or ``"N+"``; several property or listing
+        types match any of them; every feature must be present; ``location``
+        matches listings whose location contains it. ``near`` is
+        ``(lat, lng, km)`` and ``bbox`` is ``(south, west, north, east)``;
+        listings without coordinates never match either. Raises ValueError
+        for a malformed count.
+        """
+        start = 0 if min_price is None else bisect_left(self.prices, min_price)
+        end = self.n_rows if max_price is None else bisect_right(self.prices, max_price, start)
+        mask = _span(start, end)
+
+        if property_types:
+            mask &= self._any_of("propertyType", property_types)
+        if listing_types:
+            mask &= self._any_of("listingType", listing_types)
+        for feature in features:
+            mask &= self._bitmaps["feature"].get(feature.casefold(), 0)
+        if beds is not None:
+            mask &= self._count("beds", beds)
+        if baths is not None:
+            mask &= self._count("baths", baths)
+        if location:
+            needle = location.casefold().strip()
+            mask &= self._any_of("location", (value for value in self._bitmaps["location"] if needle in value))
+        if min_area is not None or max_area is not None:
+            mask &= self._area(min_area, max_area)
+        # Spatial filters go last: their cost grows with the rows in the area
+        if near is not None and mask:
+            mask &= self.geo.radius_mask(*near)
+        if bbox is not None and mask:
+            mask &= self.geo.bbox_mask(*bbox)
+        return mask
+
+    def search(self, descending: bool = False, cursor: Optional[str] = None, limit: int = 20,
+               **filters) -> Dict[str, Any]:
+        """One page of listings matching ``filters`` (see ``matching``) ordered by price,
+        with the total match count. Raises ValueError for a malformed filter or cursor.
+        """
+        mask = self.matching(**filters)
+        total = _popcount(mask)
+        if cursor is not None:
+            price, item_id = decode_cursor(cursor)
+            if descending:
+                mask &= _span(0, self._key_position(price, item_id, inclusive=False))
+            else:
+                mask &= ~_span(0, self._key_position(price, item_id, inclusive=True))
+
+        page_rows = _first_rows(mask, limit + 1, descending) if mask else []
+        next_cursor = None
+        if len(page_rows) > limit:
+            page_rows = page_rows[:limit]
+            last = page_rows[-1]
+            next_cursor = encode_cursor(self.prices[last], self.ids[last])
+        return {"items": [self.rows[row] for row in page_rows], "total": total, "nextCursor": next_cursor}
+
+    def nearest(self, lat: float, lng: float, n: int = 5, **filters) -> List[Tuple[float, Dict[str, Any]]]:
+        """Up to ``n`` ``(km, listing)`` pairs nearest the point among listings matching ``filters``"""
+        accept = None
+        if filters:
+            mask = self.matching(**filters)
+            if not mask:
+                return []
+            data = mask.to_bytes(len(self.ids) // 8 + 1, "little")
+            accept = lambda row: data[row >> 3] >> (row & 7) & 1  # noqa: E731
+        return [(km, self.rows[row]) for km, row in self.geo.nearest(lat, lng, n, accept)]
@@ -0,0 +1,251 @@
+"""Rate limiting and admission control.
+
+``TokenBucketLimiter`` allows ``burst`` requests per key, refilled at
+``rate`` tokens per second. Buckets are refilled lazily when a key is hit, so
+idle keys cost nothing; they live in sharded dicts, and one shard is swept
+for full (idle) buckets every ``SWEEP_EVERY`` hits to bound memory. With
+``RATE_LIMIT_BACKEND=mongo`` buckets are kept in the ``rate_limits``
+collection instead, shared by every worker (one round trip per check; the
+limiter fails open if Mongo is unavailable).
+
+``ConcurrencyLimiter`` caps in-flight upstream calls; requests over the cap
+wait briefly for a slot, then are shed.
+
+Both reject with 429 and a ``Retry-After`` header.
+"""
+import asyncio
+import logging
+import math
+import os
+import time
+from collections import deque
+from datetime import datetime, timedelta
+from typing import Deque, Dict, List, Optional, Tuple
+
+from fastapi import Depends, HTTPException, Request, status
+
+from utils.auth import get_optional_user_email
+from utils.metrics import Counter, Gauge
+
+logger = logging.getLogger("global_estates")
+
+RATE_LIMIT_REJECTIONS = Counter(
+    "rate_limit_rejections_total", "Requests rejected by a rate or concurrency limiter", ["limiter", "key_type"]
+)
+LIMITER_IN_FLIGHT = Gauge("limiter_in_flight", "Requests holding a concurrency limiter slot", ["limiter"])
+
+RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "memory").lower()
+
+
+def parse_limit(spec: str) -> Tuple[int, float]:
+    """``"10/60"`` means bursts of 10, refilled over 60 seconds: (burst, rate per second)"""
+    count, _, seconds = spec.partition("/")
+    burst = int(count)
+    return burst, burst / float(seconds or 1)
+
+
+def too_many_requests(retry_after: float, detail: str) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+        detail=detail,
+        headers={"Retry-After": str(max(1, math.ceil(retry_after)))},
+    )
+
+
+class MemoryBucketStore:
+    """Per-process buckets: key -> [tokens, last refill time, seconds to refill completely]"""
+
+    SHARDS = 16
+    SWEEP_EVERY = 1024
+
+    def __init__(self):
+        self._shards: List[Dict[str, list]] = [{} for _ in range(self.SHARDS)]
+        self._hits = 0
+        self._next_sweep = 0
+
+    def take(self, key: str, burst: int, rate: float, cost: float = 1) -> float:
+        """Take ``cost`` tokens; returns 0 if allowed, else seconds until they are available"""
+        now = time.monotonic()
+        shard = self._shards[hash(key) & (self.SHARDS - 1)]
+        bucket = shard.get(key)
+        if bucket is None:
+            bucket = shard[key] = [burst, now, burst / rate]
+        else:
+            tokens = bucket[0] + (now - bucket[1]) * rate
+            bucket[0] = burst if tokens > burst else tokens
+            bucket[1] = now
+
+        self._hits += 1
+        if self._hits >= self.SWEEP_EVERY:
+            self._sweep(now)
+
+        if bucket[0] >= cost:
+            bucket[0] -= cost
+            return 0.0
+        return (cost - bucket[0]) / rate
+
+    def _sweep(self, now: float):
+        # A bucket idle long enough to be full again is the same as no bucket
+        self._hits = 0
+        shard = self._shards[self._next_sweep]
+        self._next_sweep = (self._next_sweep + 1) % self.SHARDS
+        for key in [key for key, (_, last, refill) in shard.items() if now - last >= refill]:
+            del shard[key]
+
+    def __len__(self) -> int:
+        return sum(len(shard) for shard in self._shards)
+
+
+class MongoBucketStore:
+    """Buckets shared by all workers, refilled atomically with an update pipeline"""
+
+    def __init__(self, collection_name: str = "rate_limits"):
+        self.collection_name = collection_name
+        self._indexed = False
+
+    async def take(self, key: str, burst: int, rate: float, cost: float = 1) -> float:
+        from database import get_database
+        from pymongo import ReturnDocument
+
+        database = get_database()
+        if database is None:
+            return 0.0
+        collection = database[self.collection_name]
+        now = time.time()
+        refilled = {"$min": [burst, {"$add": [
+            {"$ifNull": ["$tokens", burst]},
+            {"$multiply": [{"$subtract": [now, {"$ifNull": ["$updated", now]}]}, rate]},
+        ]}]}
+        pipeline = [
+            {"$set": {"tokens": refilled, "updated": now,
+                      "expires": datetime.utcnow() + timedelta(seconds=burst / rate)}},
+            {"$set": {"allowed": {"$gte": ["$tokens", cost]}}},
+            {"$set": {"tokens": {"$cond": ["$allowed", {"$subtract": ["$tokens", cost]}, "$tokens"]}}},
+        ]
+        try:
+            if not self._indexed:
+                await collection.create_index("expires", expireAfterSeconds=0)
+                self._indexed = True
+            bucket = await collection.find_one_and_update(
+                {"_id": key}, pipeline, upsert=True, return_document=ReturnDocument.AFTER
+            )
+        except Exception as e:
+            logger.warning("Rate limit store unavailable, allowing request: %s", e)
+            return 0.0
+        return 0.0 if bucket["allowed"] else (cost - bucket["tokens"]) / rate
+
+
+_memory_store = MemoryBucketStore()
+_mongo_store = MongoBucketStore() if RATE_LIMIT_BACKEND == "mongo" else None
+
+
+class TokenBucketLimiter:
+    def __init__(self, name: str, limit: str, store=None):
+        self.name = name
+        self.burst, self.rate = parse_limit(limit)
+        self.store = store if store is not None else (_mongo_store or _memory_store)
+        self._async = isinstance(self.store, MongoBucketStore)
+
+    async def check(self, key: str, key_type: str = "ip"):
+        """Raise 429 if ``key`` has used up its budget for this limiter"""
+        bucket_key = f"{self.name}:{key_type}:{key}"
+        if self._async:
+            retry_after = await self.store.take(bucket_key, self.burst, self.rate)
+        else:
+            retry_after = self.store.take(bucket_key, self.burst, self.rate)
+        if retry_after:
+            RATE_LIMIT_REJECTIONS.labels(self.name, key_type).inc()
+            raise too_many_requests(retry_after, "Too many requests, please retry later")
+
+
+class ConcurrencyLimiter:
+    """At most ``limit`` holders at once; others wait up to ``max_wait`` seconds.
+
+    A released slot is handed straight to the oldest waiter. Waiters are
+    futures created on the running loop, so the limiter can be built at
+    import time.
+    """
+
+    def __init__(self, name: str, limit: int, max_wait: float = 0.0, retry_after: float = 1.0):
+        self.name = name
+        self.limit = limit
+        self.max_wait = max_wait
+        self.retry_after = retry_after
+        self.in_flight = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+        self._gauge = LIMITER_IN_FLIGHT.labels(name)
+
+    async def acquire(self):
+        if self.in_flight < self.limit and not self._waiters:
+            self.in_flight += 1
+            self._gauge.set(self.in_flight)
+            return
+        if self.max_wait > 0:
+            waiter = asyncio.get_running_loop().create_future()
+            self._waiters.append(waiter)
+            try:
+                # release() hands its slot over without touching in_flight
+                await asyncio.wait_for(waiter, self.max_wait)
+                return
+            except asyncio.TimeoutError:
+                if waiter.done() and not waiter.cancelled():
+                    return
+            except BaseException:
+                # Cancelled while waiting; pass on a slot we were just handed
+                if waiter.done() and not waiter.cancelled():
+                    self.release()
+                raise
+            finally:
+                if waiter.cancelled():
+                    try:
+                        self._waiters.remove(waiter)
+                    except ValueError:
+                        pass
+        RATE_LIMIT_REJECTIONS.labels(self.name, "global").inc()
+        raise too_many_requests(self.retry_after, "Service is busy, please retry later")
+
+    def release(self):
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.in_flight -= 1
+        self._gauge.set(self.in_flight)
+
+    async def __aenter__(self):
+        await self.acquire()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self.release()
+
+
+def client_ip(request: Request) -> str:
+    # uvicorn applies X-Forwarded-For from trusted proxies to request.client
+    return request.client.host if request.client else "unknown"
+
+
+def limit_by_user_or_ip(limiter: TokenBucketLimiter):
+    """Dependency: one bucket per authenticated user, or per client IP for anonymous requests"""
+
+    async def dependency(request: Request, email: Optional[str] = Depends(get_optional_user_email)):
+        if email:
+            await limiter.check(email, "user")
+        else:
+            await limiter.check(client_ip(request), "ip")
+
+    return dependency
+
+
+def concurrency_slot(limiter: ConcurrencyLimiter):
+    """Dependency that holds a slot of ``limiter`` for the duration of the request"""
+
+    async def dependency():
+        await limiter.acquire()
+        try:
+            yield
+        finally:
+            limiter.release()
+
+    return dependency
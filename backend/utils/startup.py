@@ -0,0 +1,91 @@
+import asyncio
+import logging
+import os
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+from utils.metrics import Gauge
+
+logger = logging.getLogger("global_estates")
+
+STARTUP_PHASE_SECONDS = Gauge(
+    "startup_phase_seconds", "Duration of each startup phase", ["phase", "status"]
+)
+STARTUP_READY_SECONDS = Gauge(
+    "startup_ready_seconds", "Seconds from lifespan start until the app was ready to serve"
+)
+STARTUP_PHASES_PENDING = Gauge(
+    "startup_phases_pending", "Startup phases scheduled but not finished, deferred ones included"
+)
+
+# "fast" serves as soon as critical phases finish and runs the rest in the
+# background; "full" waits for every check before accepting traffic
+STARTUP_MODE = os.getenv("STARTUP_MODE", "fast").lower()
+# Set by the multi-worker launcher: per-worker caches (voices, Mongo pool for
+# user lookups) are filled before the worker starts accepting connections
+WARM_CACHES = os.getenv("WARM_CACHES", "false").lower() in ("1", "true", "yes")
+
+# A phase is a name, a zero-argument coroutine function and a timeout in seconds
+Phase = Tuple[str, Callable[[], Awaitable[Any]], float]
+
+
+class StartupReport:
+    """Per-phase startup timings, shared with the app via ``app.state``"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.ready_after: Optional[float] = None
+        self.phases: Dict[str, Dict[str, Any]] = {}
+        self.pending: Set[str] = set()
+
+    def expect(self, phases: List[Phase]):
+        """Count phases as pending until they are recorded"""
+        self.pending.update(name for name, _, _ in phases if name not in self.phases)
+        STARTUP_PHASES_PENDING.set(len(self.pending))
+
+    def record(self, name: str, duration: float, status: str, deferred: bool):
+        self.phases[name] = {
+            "duration_ms": round(duration * 1000, 2),
+            "status": status,
+            "deferred": deferred,
+        }
+        STARTUP_PHASE_SECONDS.labels(name, status).set(duration)
+        self.pending.discard(name)
+        STARTUP_PHASES_PENDING.set(len(self.pending))
+
+    def mark_ready(self):
+        self.ready_after = time.perf_counter() - self.started
+        STARTUP_READY_SECONDS.set(self.ready_after)
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "mode": STARTUP_MODE,
+            "ready_ms": round(self.ready_after * 1000, 2) if self.ready_after is not None else None,
+            "phases": self.phases,
+            "pending": sorted(self.pending),
+        }
+
+
+async def run_phase(report: StartupReport, phase: Phase, deferred: bool = False) -> Any:
+    """Run one phase with a timeout; failures are logged, never raised"""
+    name, func, timeout = phase
+    start = time.perf_counter()
+    try:
+        result = await asyncio.wait_for(func(), timeout)
+        status = "ok"
+    except asyncio.TimeoutError:
+        result = None
+        status = "timeout"
+        logger.warning("Startup phase %s timed out after %.1fs", name, timeout)
+    except Exception as e:
+        result = None
+        status = "error"
+        logger.warning("Startup phase %s failed: %s", name, e)
+    report.record(name, time.perf_counter() - start, status, deferred)
+    return result
+
+
+async def run_phases(report: StartupReport, phases: List[Phase], deferred: bool = False) -> List[Any]:
+    """Run independent phases concurrently"""
+    report.expect(phases)
+    return await asyncio.gather(*(run_phase(report, phase, deferred) for phase in phases))
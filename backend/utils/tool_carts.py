@@ -0,0 +1,88 @@
+"""Carts the voice agent builds during a call, keyed by Ultravox call id.
+
+Each cart maps item id to quantity. By default carts live in a per-worker
+TTL cache, which is only correct with a single worker. With several
+workers, one call's ``/cart/add`` and ``/order/quote`` requests can reach
+different processes. ``TOOL_CARTS_PERSIST=true`` therefore keeps them in the
+``tool_carts`` collection instead, one document per cart line, with
+quantities added atomically. ``serve.py`` turns it on when it runs more than
+one worker. Lines expire CALL_IDLE_TIMEOUT seconds after their last change.
+"""
+import logging
+import os
+from datetime import datetime
+from typing import Dict, Optional
+
+from pymongo.errors import DuplicateKeyError
+
+from utils.cache import TTLCache
+from utils.call_registry import CALL_IDLE_TIMEOUT
+
+logger = logging.getLogger("global_estates")
+
+TOOL_CARTS_PERSIST = os.getenv("TOOL_CARTS_PERSIST", "false").lower() in ("1", "true", "yes")
+
+
+class CartLimitError(Exception):
+    """Raised when an add would take a cart line past its quantity limit"""
+
+
+class CartStore:
+    def __init__(self, persist: bool = TOOL_CARTS_PERSIST, ttl: float = CALL_IDLE_TIMEOUT):
+        self.persist = persist
+        self.ttl = ttl
+        self.local = TTLCache("tool_carts", ttl=ttl)
+        self._indexed = False
+
+    def _collection(self):
+        if not self.persist:
+            return None
+        from database import get_database
+
+        database = get_database()
+        return database.tool_carts if database is not None else None
+
+    async def _ensure_indexes(self, collection):
+        if not self._indexed:
+            await collection.create_index([("call_id", 1), ("item_id", 1)], unique=True)
+            await collection.create_index("updated_at", expireAfterSeconds=int(self.ttl))
+            self._indexed = True
+
+    async def get(self, call_id: str) -> Dict[str, int]:
+        collection = self._collection()
+        if collection is None:
+            return dict(self.local.get(call_id) or {})
+        lines = await collection.find({"call_id": call_id}).to_list(length=None)
+        return {line["item_id"]: line["quantity"] for line in lines}
+
+    async def add(self, call_id: str, item_id: str, quantity: int, limit: Optional[int] = None) -> Dict[str, int]:
+        """Add ``quantity`` of an item and return the whole cart.
+
+        With ``limit``, raise ``CartLimitError`` instead of letting the line's
+        total quantity exceed it.
+        """
+        collection = self._collection()
+        if collection is None:
+            cart = self.local.get(call_id) or {}
+            if limit is not None and cart.get(item_id, 0) + quantity > limit:
+                raise CartLimitError(item_id)
+            cart[item_id] = cart.get(item_id, 0) + quantity
+            self.local.set(call_id, cart)
+            return dict(cart)
+        await self._ensure_indexes(collection)
+        query = {"call_id": call_id, "item_id": item_id}
+        if limit is not None:
+            query["quantity"] = {"$lte": limit - quantity}
+        update = {"$inc": {"quantity": quantity}, "$set": {"updated_at": datetime.utcnow()}}
+        try:
+            await collection.update_one(query, update, upsert=True)
+        except DuplicateKeyError:
+            # The line exists but is too full to match, or another worker
+            # inserted it first; only the latter leaves room for this add
+            result = await collection.update_one(query, update)
+            if result.matched_count == 0:
+                raise CartLimitError(item_id)
+        return await self.get(call_id)
+
+
+carts = CartStore()